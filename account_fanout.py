@@ -0,0 +1,141 @@
+"""
+多帳戶下單分派 (Account Fan-out)
+
+同一套行情 / 指標 / 策略決策，同時下到多個子帳戶：
+- 每個帳戶有自己的 WeexClient (各自的 API Key)、OrderTracker 與風控上限
+- 數量依帳戶的 size_multiplier 縮放後向下取整到合約 step
+- 分派時每個帳戶在獨立執行緒中「風控檢查 → 下單」，互不等待
+- 回報每個帳戶從決策到下單完成的耗時，以及最快與最慢帳戶的差距 (spread)
+
+config.ACCOUNTS 為空時不啟用，行為與單一帳戶相同。
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal, ROUND_DOWN
+
+import config
+from exchange_client import WeexClient
+from order_tracker import OrderTracker
+
+
+def _position_size(p):
+    return float(p.get('hold_vol') or p.get('size') or 0)
+
+
+def risk_check(client, symbol, max_open_orders, max_positions, max_position_size):
+    """
+    掛單數 / 持倉數 / 總持倉量檢查
+    回傳 (是否可下單, 攔截原因)
+    """
+    open_orders = client.get_open_orders(symbol)
+    if len(open_orders) >= max_open_orders:
+        return False, f"掛單過多 ({len(open_orders)} 張)"
+
+    positions = client.get_all_positions(symbol)
+    valid_positions = [p for p in positions if _position_size(p) > 0]
+    if len(valid_positions) >= max_positions:
+        return False, f"已有倉位 ({len(valid_positions)} 個)"
+
+    total_position_size = sum(_position_size(p) for p in valid_positions)
+    if total_position_size >= max_position_size:
+        return False, f"總持倉 size 過大 ({total_position_size:.4f} >= {max_position_size})"
+    return True, ""
+
+
+class Account:
+    def __init__(self, name, client, size_multiplier=1.0, max_open_orders=None, max_positions=None,
+                 max_position_size=None, max_attempts=3):
+        self.name = name
+        self.client = client
+        self.size_multiplier = float(size_multiplier)
+        self.max_open_orders = max_open_orders if max_open_orders is not None else config.MAX_OPEN_ORDERS
+        self.max_positions = max_positions if max_positions is not None else config.MAX_POSITIONS
+        self.max_position_size = max_position_size if max_position_size is not None else config.MAX_POSITION_SIZE
+        self.orders = OrderTracker(client, max_attempts=max_attempts)
+
+    def check_risk(self, symbol):
+        return risk_check(self.client, symbol, self.max_open_orders, self.max_positions, self.max_position_size)
+
+    def scale(self, size, size_step=None):
+        """依 size_multiplier 縮放數量，向下取整到 size_step (未提供時沿用原數量的小數位數)"""
+        size = Decimal(str(size))
+        step = Decimal(str(size_step)) if size_step else Decimal(1).scaleb(size.as_tuple().exponent)
+        scaled = (size * Decimal(str(self.size_multiplier)) / step).to_integral_value(rounding=ROUND_DOWN) * step
+        return str(scaled.quantize(step))
+
+    def __repr__(self):
+        return f"Account({self.name}, x{self.size_multiplier})"
+
+
+def load_accounts(entries=None, base_url=None, client_factory=None):
+    """
+    由 config.ACCOUNTS 建立帳戶列表
+    每筆: {"name", "api_key", "secret_key", "passphrase", "size_multiplier", "max_open_orders", "max_positions", "max_position_size"}
+    client_factory(entry, index) 可替換客戶端 (例如紙上交易)
+    """
+    entries = getattr(config, "ACCOUNTS", []) if entries is None else entries
+    accounts = []
+    for i, entry in enumerate(entries):
+        if client_factory is not None:
+            client = client_factory(entry, i)
+        else:
+            client = WeexClient(base_url=base_url, api_key=entry["api_key"], secret_key=entry["secret_key"],
+                                passphrase=entry["passphrase"], machine_id=10 + i)
+        accounts.append(Account(
+            entry.get("name") or f"account_{i}", client,
+            size_multiplier=entry.get("size_multiplier", 1.0),
+            max_open_orders=entry.get("max_open_orders"),
+            max_positions=entry.get("max_positions"),
+            max_position_size=entry.get("max_position_size"),
+        ))
+    return accounts
+
+
+class FanoutDispatcher:
+    def __init__(self, accounts, max_workers=None):
+        if not accounts:
+            raise ValueError("至少需要一個帳戶")
+        self.accounts = list(accounts)
+        # 常駐執行緒池：分派時不用再建立執行緒
+        self.pool = ThreadPoolExecutor(max_workers=max_workers or len(self.accounts), thread_name_prefix="fanout")
+        self.dispatches = 0
+        self.last_report = None
+
+    def dispatch(self, fn):
+        """
+        對每個帳戶並行執行 fn(account)，等待全部完成
+        回傳 {"accounts": {名稱: {"result", "latency_ms", "error"}}, "spread_ms", "elapsed_ms"}
+        """
+        started = time.perf_counter()
+
+        def run(account):
+            try:
+                result, error = fn(account), None
+            except Exception as e:
+                result, error = None, str(e)
+            return result, error, (time.perf_counter() - started) * 1000
+
+        futures = {a.name: self.pool.submit(run, a) for a in self.accounts}
+        report = {"accounts": {}}
+        for name, future in futures.items():
+            result, error, latency = future.result()
+            report["accounts"][name] = {"result": result, "latency_ms": round(latency, 2), "error": error}
+        latencies = [r["latency_ms"] for r in report["accounts"].values()]
+        report["spread_ms"] = round(max(latencies) - min(latencies), 2)
+        report["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        self.dispatches += 1
+        self.last_report = report
+        return report
+
+    def trackers(self):
+        return [a.orders for a in self.accounts]
+
+    def stats(self):
+        stats = {"accounts": [a.name for a in self.accounts], "dispatches": self.dispatches}
+        if self.last_report is not None:
+            stats["last_spread_ms"] = self.last_report["spread_ms"]
+            stats["last_latency_ms"] = {n: r["latency_ms"] for n, r in self.last_report["accounts"].items()}
+        return stats
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False)
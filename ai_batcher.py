@@ -0,0 +1,160 @@
+"""
+多交易對 AI 批次評估 (AI Batcher)
+
+同一根 K 線有多個交易對 (或多個策略實例) 同時觸發訊號時，原本每個都各自呼叫一次 AI，
+每次都要付一次完整的 system prompt、分析要求與網路往返。這裡在短時間窗內收集等待中的請求，
+合併成一次多交易對的結構化 prompt：
+
+- system prompt 與分析要求只送一次，每個交易對只附上自己的行情資料 (prompt token 隨數量次線性成長)
+- 一次往返取得所有決策 (延遲約等於單次呼叫，而不是 N 次)
+- 回覆逐一驗證 (parse_decision)，某個交易對的回覆缺漏或格式錯誤只影響它自己
+- 時間窗內只有一個請求時直接走單一呼叫，內容與未批次時完全相同
+
+呼叫端 (consult_ai_agent) 拿到的仍是各自的決策，AI Log 也照樣逐筆上傳。
+只適用於多交易對部署：每個交易對一個 StrategyManager，共用同一個 AIBatcher
+(StrategyManager(..., ai_batcher=batcher))。main.py 的機器人只交易 config.SYMBOL，
+掛上 batcher 每批永遠只有一個請求，只會多等一個時間窗，所以 main() 不會啟用。
+"""
+import json
+import threading
+import time
+
+from ai_provider import parse_decision
+
+BATCH_INSTRUCTIONS = """
+以下共有 {count} 個交易對同時觸發訊號 (編號 0 ~ {last})，請依上述分析要求「逐一獨立」判斷每一個是否做多，
+不要互相比較或合併結論。
+請只回傳一個 JSON 物件，每個編號都必須有一筆決策：
+{{"decisions": [{{"id": 編號, "symbol": "交易對", "action": "LONG 或 WAIT", "confidence": 0.0 ~ 1.0, "explanation": "100字以內的中文分析"}}]}}
+"""
+
+
+def parse_batch(content, ids):
+    """
+    解析批次回覆，回傳 {id: 決策}；個別格式錯誤的項目略過
+    整份回覆無法解析或沒有任何合法決策時拋出 ValueError (交給 AIRouter 視為不合法回覆)
+    """
+    if isinstance(content, dict):
+        data = content
+    else:
+        data = json.loads(str(content).replace('```json', '').replace('```', '').strip())
+    items = data.get("decisions") if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        raise ValueError(f"批次回覆缺少 decisions 列表: {str(content)[:100]}")
+    decisions = {}
+    for item in items:
+        try:
+            request_id = int(item.get("id"))
+            if request_id in ids:
+                decisions[request_id] = parse_decision(item)
+        except (AttributeError, TypeError, ValueError):
+            continue
+    if not decisions:
+        raise ValueError("批次回覆沒有任何合法決策")
+    return decisions
+
+
+class _Request:
+    def __init__(self, symbol, system_prompt, data_prompt, instructions, market_data):
+        self.symbol = symbol
+        self.system_prompt = system_prompt
+        self.data_prompt = data_prompt
+        self.instructions = instructions
+        self.market_data = market_data
+        self.result = None
+        self.done = threading.Event()
+
+
+class AIBatcher:
+    def __init__(self, router, window=0.2, max_batch=8, max_tokens_per_item=None):
+        self.router = router
+        self.window = window
+        self.max_batch = max_batch
+        self.max_tokens_per_item = max_tokens_per_item or getattr(router.providers[0], "max_tokens", None) or 400
+        self.pending = []
+        self.lock = threading.Lock()
+        self.timer = None
+        self.stats = {"requests": 0, "completions": 0, "batched": 0, "max_batch": 0, "missing": 0}  # 以 self.lock 保護
+
+    def decide(self, symbol, system_prompt, data_prompt, instructions, market_data=None):
+        """
+        排入批次並等待結果，回傳 (決策 dict 或 None, 資訊 dict)，與 AIRouter.decide 相同
+        data_prompt: 該交易對的行情資料；instructions: 分析要求與回覆格式 (批次時只送一次)
+        """
+        request = _Request(symbol, system_prompt, data_prompt, instructions, market_data)
+        with self.lock:
+            self.pending.append(request)
+            self.stats["requests"] += 1
+            if len(self.pending) >= self.max_batch:
+                self._flush_later(0)
+            elif self.timer is None:
+                self._flush_later(self.window)
+        if not request.done.wait(self.window + self.router.deadline + 1.0):
+            return None, {"provider": None, "model": None, "latency_ms": None, "reason": "批次等待逾時",
+                          "batch_size": None, "timed_out": True}
+        return request.result
+
+    def _flush_later(self, delay):
+        if self.timer is not None:
+            self.timer.cancel()
+        self.timer = threading.Timer(delay, self.flush)
+        self.timer.daemon = True
+        self.timer.start()
+
+    def flush(self):
+        with self.lock:
+            requests, self.pending = self.pending, []
+            self.timer = None
+        # system prompt 與分析要求相同的請求才能合併
+        groups = {}
+        for request in requests:
+            groups.setdefault((request.system_prompt, request.instructions), []).append(request)
+        for group in groups.values():
+            for start in range(0, len(group), self.max_batch):
+                self._run(group[start:start + self.max_batch])
+
+    def report(self):
+        with self.lock:
+            return dict(self.stats)
+
+    def _count(self, **deltas):
+        with self.lock:
+            for key, value in deltas.items():
+                self.stats[key] += value
+
+    def _run(self, requests):
+        # 計時器與 max_batch 觸發的 flush 可能在不同執行緒同時執行
+        self._count(completions=1)
+        if len(requests) == 1:
+            request = requests[0]
+            decision, meta = self.router.decide(request.system_prompt, request.data_prompt + request.instructions,
+                                                market_data=request.market_data)
+            request.result = (decision, dict(meta, batch_size=1))
+            request.done.set()
+            return
+
+        with self.lock:
+            self.stats["batched"] += len(requests)
+            self.stats["max_batch"] = max(self.stats["max_batch"], len(requests))
+        ids = set(range(len(requests)))
+        sections = "".join(f"\n### 編號 {i} | {r.symbol}\n{r.data_prompt}" for i, r in enumerate(requests))
+        user_prompt = (requests[0].instructions
+                       + BATCH_INSTRUCTIONS.format(count=len(requests), last=len(requests) - 1)
+                       + sections)
+        batch_data = {"batch": [{"id": i, "symbol": r.symbol, "market_data": r.market_data}
+                                for i, r in enumerate(requests)]}
+        started = time.perf_counter()
+        decisions, meta = self.router.decide(requests[0].system_prompt, user_prompt, market_data=batch_data,
+                                             parse=lambda content: parse_batch(content, ids),
+                                             max_tokens=self.max_tokens_per_item * len(requests))
+        meta = dict(meta, batch_size=len(requests))
+        for i, request in enumerate(requests):
+            decision = (decisions or {}).get(i)
+            if decision is None:
+                self._count(missing=1)
+                reason = meta["reason"] or f"批次回覆缺少 {request.symbol} 的決策"
+                request.result = (None, dict(meta, reason=reason,
+                                             latency_ms=round((time.perf_counter() - started) * 1000, 1)))
+            else:
+                request.result = (decision, meta)
+            request.done.set()
@@ -16,16 +16,38 @@ LOG_FILE_PATH = os.path.join(LOG_DIR, "ai_history.jsonl")
 logger = logging.getLogger("AI_Recorder")
 logger.setLevel(logging.INFO)
 
-# 設定輪替機制 (Rotating)
-# maxBytes=10*1024*1024 (10MB), backupCount=5 (保留最近 5 個檔)
-handler = RotatingFileHandler(LOG_FILE_PATH, maxBytes=10*1024*1024, backupCount=50, encoding='utf-8')
-
 # 設定格式 (這裡我們只存純訊息，因為訊息本身就是 JSON 字串)
 formatter = logging.Formatter('%(message)s')
-handler.setFormatter(formatter)
 
+
+def _file_handler(path):
+    # 設定輪替機制 (Rotating)
+    # maxBytes=10*1024*1024 (10MB), backupCount=50；delay=True：第一次寫入才建立檔案
+    h = RotatingFileHandler(path, maxBytes=10*1024*1024, backupCount=50, encoding='utf-8', delay=True)
+    h.setFormatter(formatter)
+    return h
+
+
+handler = _file_handler(LOG_FILE_PATH)
 logger.addHandler(handler)
 
+
+def set_log_file(path):
+    """
+    改變本地 AI Log 的寫入位置；path=None 時完全不寫檔
+    回放 / 負載測試使用，避免合成的交易紀錄混進正式的 logs/ai_history.jsonl (trade_journal ingest-logs 會讀取)
+    """
+    global handler
+    logger.removeHandler(handler)
+    handler.close()
+    if path is None:
+        handler = logging.NullHandler()
+    else:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        handler = _file_handler(path)
+    logger.addHandler(handler)
+    return handler
+
 def save_local_log(stage, model, input_data, output_data, explanation, order_id=None):
     """
     將 AI 紀錄寫入本地 JSONL 檔案
@@ -45,4 +67,13 @@ def save_local_log(stage, model, input_data, output_data, explanation, order_id=
         json_line = json.dumps(record, ensure_ascii=False)
         logger.info(json_line)
     except Exception as e:
-        print(f"❌ 本地 Log 寫入失敗: {e}")
\ No newline at end of file
+        print(f"❌ 本地 Log 寫入失敗: {e}")
+
+    # 同步寫入 SQLite 交易日誌 (有索引，方便查詢績效)
+    try:
+        import config
+        if getattr(config, "ENABLE_TRADE_JOURNAL", True):
+            from trade_journal import get_journal
+            get_journal().record_decision(record)
+    except Exception as e:
+        print(f"❌ 交易日誌寫入失敗: {e}")
\ No newline at end of file
@@ -0,0 +1,299 @@
+"""
+AI 決策後端 (AI Provider)
+
+consult_ai_agent 原本直接呼叫模組層級的 OpenAI client，沒有逾時：回應慢的時候整筆交易
+(以及行情執行緒) 會被卡住，直到 HTTP 函式庫自己放棄為止。這裡改為可替換的後端：
+
+- AIProvider: 單一後端，complete(system_prompt, user_prompt, market_data, timeout) -> 原始回覆
+  - OpenAIProvider: OpenAI Chat Completions (逾時傳給 HTTP 請求，不自動重試)
+  - LocalProvider: 本地決定性的回覆 (測試 / 回放 / 回測用，不送出網路請求)
+- AIRouter: 每次呼叫有截止時間 (deadline)；可選擇對冗餘後端「對沖」(hedge) 同時發送，
+  取第一個合法回覆；截止時間內沒有合法回覆時回傳 None，meta["timed_out"] 區分「逾時」與「後端錯誤 / 格式錯誤」
+- 每個後端記錄延遲分佈 (p50 / p90 / p99)、成功 / 失敗 / 逾時 / 格式錯誤 / 勝出次數與 token 用量
+"""
+import json
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import config
+from lazy_import import lazy_module
+
+openai = lazy_module("openai")
+
+ACTIONS = ("LONG", "WAIT")
+
+
+def parse_decision(content):
+    """
+    解析並驗證模型回覆 (允許 ```json 包裝)
+    回傳 {"action", "confidence", "explanation"}；格式不符時拋出 ValueError
+    """
+    if isinstance(content, dict):
+        decision = content
+    else:
+        clean_json = str(content).replace('```json', '').replace('```', '').strip()
+        decision = json.loads(clean_json)
+    if not isinstance(decision, dict):
+        raise ValueError(f"AI 回覆不是 JSON 物件: {content!r:.100}")
+    action = str(decision.get("action", "")).upper()
+    if action not in ACTIONS:
+        raise ValueError(f"AI 回覆的 action 不合法: {decision.get('action')!r}")
+    confidence = float(decision.get("confidence"))
+    if not 0.0 <= confidence <= 1.0:
+        raise ValueError(f"AI 回覆的 confidence 超出範圍: {confidence}")
+    return {"action": action, "confidence": confidence, "explanation": str(decision.get("explanation", ""))}
+
+
+class LatencyStats:
+    """單一後端的延遲分佈與結果計數 (保留最近 window 筆樣本)"""
+
+    def __init__(self, window=500):
+        self.samples = deque(maxlen=window)
+        self.counts = {"ok": 0, "error": 0, "timeout": 0, "invalid": 0, "won": 0}
+        self.lock = threading.Lock()
+
+    def record(self, outcome, latency_ms=None):
+        with self.lock:
+            self.counts[outcome] += 1
+            if latency_ms is not None:
+                self.samples.append(latency_ms)
+
+    def percentile(self, pct):
+        with self.lock:
+            samples = sorted(self.samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+    def snapshot(self):
+        result = dict(self.counts)
+        for pct in (50, 90, 99):
+            value = self.percentile(pct)
+            result[f"p{pct}_ms"] = round(value, 1) if value is not None else None
+        with self.lock:
+            result["max_ms"] = round(max(self.samples), 1) if self.samples else None
+        return result
+
+
+class AIProvider:
+    """
+    後端只負責 complete() 取得原始回覆 (字串或 dict)，解析與驗證由呼叫端 (AIRouter) 決定，
+    單一交易對與批次 (ai_batcher.py) 共用同一個後端
+    """
+    name = "provider"
+    model = None
+
+    def __init__(self):
+        self.usage = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+        self._usage_lock = threading.Lock()
+
+    def _add_usage(self, prompt_tokens, completion_tokens):
+        with self._usage_lock:
+            self.usage["calls"] += 1
+            self.usage["prompt_tokens"] += int(prompt_tokens or 0)
+            self.usage["completion_tokens"] += int(completion_tokens or 0)
+
+    def complete(self, system_prompt, user_prompt, market_data=None, timeout=None, max_tokens=None):
+        raise NotImplementedError
+
+    def decide(self, system_prompt, user_prompt, market_data=None, timeout=None):
+        return parse_decision(self.complete(system_prompt, user_prompt, market_data, timeout=timeout))
+
+
+class OpenAIProvider(AIProvider):
+    def __init__(self, model=None, api_key=None, temperature=None, max_tokens=None):
+        super().__init__()
+        self.model = model or config.OPENAI_MODEL
+        self.name = f"openai:{self.model}"
+        self.api_key = api_key
+        self.temperature = 0.4 if temperature is None else temperature
+        self.max_tokens = 400 if max_tokens is None else max_tokens
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        # 延遲建立 (第一次諮詢 AI 時才 import openai 並初始化)
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    # 重試交給 AIRouter 的截止時間決定，不讓 SDK 自己重試而超過期限
+                    self._client = openai.OpenAI(api_key=self.api_key or config.OPENAI_API_KEY, max_retries=0)
+        return self._client
+
+    def complete(self, system_prompt, user_prompt, market_data=None, timeout=None, max_tokens=None):
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            temperature=self.temperature,
+            max_tokens=max_tokens or self.max_tokens,
+            timeout=timeout,
+        )
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            self._add_usage(usage.prompt_tokens, usage.completion_tokens)
+        return response.choices[0].message.content
+
+
+def estimate_tokens(text):
+    """粗估 token 數 (本地後端用來比較 prompt 大小，不需精確)"""
+    return (len(text) + 3) // 4
+
+
+class LocalProvider(AIProvider):
+    """
+    本地決定性的後端：固定回覆 (可加上固定延遲)，或以 rule(market_data) 依快照決定
+    同樣的輸入永遠得到同樣的輸出，回放 / 回測結果可重現；token 用量以字數粗估
+    market_data 為 {"batch": [...]} 時 (ai_batcher.py) 回傳每個請求各自的決策
+    """
+
+    def __init__(self, action="WAIT", confidence=0.0, latency=0.0, rule=None, name="local"):
+        super().__init__()
+        self.name = name
+        self.model = name
+        self.action = action
+        self.confidence = confidence
+        self.latency = latency
+        self.rule = rule
+        self.calls = 0
+
+    def _verdict(self, market_data):
+        if self.rule is not None:
+            return dict(self.rule(market_data or {}))
+        return {"action": self.action, "confidence": self.confidence, "explanation": f"{self.name} stub"}
+
+    def complete(self, system_prompt, user_prompt, market_data=None, timeout=None, max_tokens=None):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if isinstance(market_data, dict) and "batch" in market_data:
+            result = {"decisions": [dict(self._verdict(item["market_data"]), id=item["id"], symbol=item["symbol"])
+                                    for item in market_data["batch"]]}
+        else:
+            result = self._verdict(market_data)
+        content = json.dumps(result, ensure_ascii=False)
+        self._add_usage(estimate_tokens(system_prompt) + estimate_tokens(user_prompt), estimate_tokens(content))
+        return content
+
+
+class AIRouter:
+    """
+    依截止時間呼叫一或多個後端
+    hedge=True 時同時 (或延遲 hedge_delay 秒後) 送給第二個後端，採用先回來的合法答案
+    """
+
+    def __init__(self, providers, deadline=8.0, hedge=False, hedge_delay=0.0, max_workers=4):
+        if not providers:
+            raise ValueError("至少需要一個 AI 後端")
+        self.providers = list(providers)
+        self.deadline = deadline
+        self.hedge = hedge and len(self.providers) > 1
+        self.hedge_delay = hedge_delay
+        self.stats = {p.name: LatencyStats() for p in self.providers}
+        self.fallbacks = 0
+        # 逾時的呼叫仍會在背景跑完 (無法中斷)，執行緒池要留足空間
+        self.pool = ThreadPoolExecutor(max_workers=max(max_workers, len(self.providers) * 2),
+                                       thread_name_prefix="ai")
+
+    def _call(self, provider, system_prompt, user_prompt, market_data, timeout, parse, max_tokens):
+        started = time.perf_counter()
+        try:
+            decision = parse(provider.complete(system_prompt, user_prompt, market_data, timeout=timeout,
+                                               max_tokens=max_tokens))
+            outcome = "ok"
+        except ValueError as e:
+            decision, outcome = e, "invalid"
+        except Exception as e:
+            decision, outcome = e, "error"
+        latency_ms = (time.perf_counter() - started) * 1000
+        self.stats[provider.name].record(outcome, latency_ms)
+        return provider, decision, latency_ms
+
+    def decide(self, system_prompt, user_prompt, market_data=None, deadline=None, parse=parse_decision,
+               max_tokens=None):
+        """
+        回傳 (決策, 資訊 dict)；截止時間內沒有合法回覆時決策為 None
+        決策為 parse(原始回覆) 的結果 (預設 parse_decision)，parse 拋出 ValueError 視為不合法
+        資訊: {"provider", "model", "latency_ms", "reason", "timed_out"}
+        timed_out=True 只代表截止時間到了仍有呼叫未回覆；後端全部回錯誤 / 格式錯誤時為 False
+        """
+        deadline = self.deadline if deadline is None else deadline
+        started = time.perf_counter()
+        expires = started + deadline
+        providers = self.providers[:2] if self.hedge else self.providers[:1]
+
+        futures = {}  # future -> provider
+
+        def launch(provider, timeout):
+            future = self.pool.submit(self._call, provider, system_prompt, user_prompt, market_data, timeout,
+                                      parse, max_tokens)
+            futures[future] = provider
+            return future
+
+        pending = {launch(providers[0], deadline)}
+        waiting = list(providers[1:])
+        errors = []
+        while pending or waiting:
+            now = time.perf_counter()
+            if now >= expires:
+                break
+            timeout = expires - now
+            if waiting:
+                hedge_at = started + self.hedge_delay
+                if now >= hedge_at or not pending:
+                    # 對沖：主要後端太慢 (或已失敗) 時，同一份 prompt 送給下一個後端
+                    pending.add(launch(waiting.pop(0), expires - now))
+                    continue
+                timeout = min(timeout, hedge_at - now)
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                provider, decision, latency_ms = future.result()
+                if not isinstance(decision, Exception):
+                    self.stats[provider.name].record("won")
+                    return decision, {"provider": provider.name, "model": provider.model,
+                                      "latency_ms": round(latency_ms, 1), "reason": None, "timed_out": False}
+                errors.append(f"{provider.name}: {decision}")
+
+        # 截止時間到仍未回覆的呼叫記為逾時 (之後回來的答案不再採用，但延遲仍會記入分佈)
+        for future in pending:
+            self.stats[futures[future].name].record("timeout")
+            errors.append(f"{futures[future].name}: 超過 {deadline:g} 秒未回覆")
+        self.fallbacks += 1
+        return None, {"provider": None, "model": None,
+                      "latency_ms": round((time.perf_counter() - started) * 1000, 1), "reason": "; ".join(errors),
+                      "timed_out": bool(pending)}
+
+    def report(self):
+        return {"fallbacks": self.fallbacks,
+                "providers": {p.name: dict(self.stats[p.name].snapshot(), **p.usage) for p in self.providers}}
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False)
+
+
+def build_router(providers=None):
+    """
+    依 config 建立 AIRouter
+    AI_PROVIDER: "openai" (預設) / "local"；AI_HEDGE_MODEL 設定時對第二個模型對沖
+    """
+    if providers is None:
+        if getattr(config, "AI_PROVIDER", "openai") == "local":
+            providers = [LocalProvider()]
+        else:
+            temperature = getattr(config, "AI_TEMPERATURE", None)
+            max_tokens = getattr(config, "AI_MAX_TOKENS", None)
+            providers = [OpenAIProvider(config.OPENAI_MODEL, temperature=temperature, max_tokens=max_tokens)]
+            hedge_model = getattr(config, "AI_HEDGE_MODEL", None)
+            if hedge_model:
+                providers.append(OpenAIProvider(hedge_model, temperature=temperature, max_tokens=max_tokens))
+    return AIRouter(
+        providers,
+        deadline=getattr(config, "AI_DEADLINE_SECONDS", 8.0),
+        hedge=len(providers) > 1,
+        hedge_delay=getattr(config, "AI_HEDGE_DELAY", 0.0),
+    )
@@ -1,13 +1,31 @@
 import time
-import pandas as pd
+import threading
+import unicodedata
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from exchange_client import WeexClient
+from kill_switch import flatten_all, halt
+from account_fanout import load_accounts
+from contract_info import ContractInfoCache
 import config
 
-# 設定 pandas 顯示選項
-pd.set_option('display.max_columns', None)
-pd.set_option('display.width', 1000)
-pd.set_option('display.unicode.east_asian_width', True)
+def _display_width(text):
+    """終端機顯示寬度 (中文等全形字元佔 2 格)"""
+    return sum(2 if unicodedata.east_asian_width(ch) in ('W', 'F') else 1 for ch in text)
+
+def format_table(rows):
+    """
+    將 dict 列表排成右對齊的文字表格 (取代 pandas DataFrame.to_string，避免載入 pandas 拖慢啟動)
+    """
+    if not rows:
+        return ""
+    columns = list(rows[0].keys())
+    cells = [[str(c) for c in columns]] + [["NaN" if r.get(c) is None else str(r.get(c)) for c in columns] for r in rows]
+    widths = [max(_display_width(row[i]) for row in cells) for i in range(len(columns))]
+    lines = []
+    for row in cells:
+        lines.append(" ".join(" " * (w - _display_width(v)) + v for v, w in zip(row, widths)))
+    return "\n".join(lines)
 
 def timestamp_to_str(ts):
     if not ts: return "-"
@@ -66,7 +84,7 @@ def show_open_orders(client):
             "已成": o.get('filled_qty', 0),
             "訂單ID": o.get('order_id') or o.get('orderId')
         })
-    print(pd.DataFrame(data_list).to_string(index=False))
+    print(format_table(data_list))
 
 def show_history_orders(client):
     page_size = input(f"請輸入顯示筆數 (例如 10, 20): ").strip()
@@ -101,7 +119,7 @@ def show_history_orders(client):
             "盈虧": o.get('totalProfits', 0),
             "狀態": status
         })
-    print(pd.DataFrame(data_list).to_string(index=False))
+    print(format_table(data_list))
 
 def show_positions(client):
     print(f"\n📊 [當前持倉詳情] (交易對: {config.SYMBOL})")
@@ -153,8 +171,7 @@ def show_positions(client):
         })
         
     if data_list:
-        df = pd.DataFrame(data_list)
-        print(df.to_string(index=False))
+        print(format_table(data_list))
     else:
         print("✅ 無持倉。")
 
@@ -245,6 +262,16 @@ def modify_leverage(client):
         print("⚠️ 請輸入有效的整數數字！")
         return
 
+    # 先依合約規格檢查槓桿上下限，不合規就不送出
+    contracts = ContractInfoCache(client)
+    contracts.load()
+    spec = contracts.get(config.SYMBOL)
+    if spec is not None:
+        errors = spec.validate(leverage=int(new_lev))
+        if errors:
+            print(f"⚠️ {'; '.join(errors)}")
+            return
+
     try:
         # 呼叫 API 調整槓桿
         res = client.set_leverage(symbol=config.SYMBOL, leverage=int(new_lev), margin_mode=1)
@@ -351,6 +378,131 @@ def cancel_all_orders_ui(client):
     else:
         print("❌ 未輸入 YES，操作取消。")
 
+# --- 即時監控面板 (Live Dashboard) ---
+class TTLCache:
+    """簡易 TTL 快取：手續費、槓桿等變動很慢的資料不必每次刷新都打 API"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.data = {}
+
+    def get(self, key, loader, ttl):
+        now = time.time()
+        with self.lock:
+            hit = self.data.get(key)
+            if hit and now - hit[0] < ttl:
+                return hit[1]
+        value = loader()
+        if value:  # 失敗的結果不快取，下次刷新再試
+            with self.lock:
+                self.data[key] = (now, value)
+        return value
+
+def _dashboard_lines(snapshot, refresh_seconds):
+    """把一次刷新的資料轉成固定順序的文字列 (逐列比對用)"""
+    assets, positions, orders, detail, elapsed = snapshot
+    lines = [
+        f"📺 WEEX 即時監控 | {config.SYMBOL} | 每 {refresh_seconds}s 刷新 | Ctrl+C 離開",
+        f"🕒 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} | 本次查詢耗時 {elapsed * 1000:.0f} ms",
+        "",
+        "💰 [資金]",
+    ]
+    usdt = next((a for a in assets or [] if isinstance(a, dict) and a.get('coinName') == 'USDT'), None)
+    if usdt:
+        lines.append(f"  權益 {float(usdt.get('equity', 0)):.4f} | 可用 {float(usdt.get('available', 0)):.4f} | "
+                     f"凍結 {float(usdt.get('frozen', 0)):.4f} | 未結盈虧 {float(usdt.get('unrealizePnl', 0)):.4f}")
+    else:
+        lines.append("  ⚠️ 找不到 USDT 資產資料")
+
+    lines += ["", f"📊 [持倉] ({len(positions or [])})"]
+    for p in positions or []:
+        size = p.get('hold_vol') or p.get('size') or 0
+        lines.append(f"  {p.get('side', '-'):5} x{p.get('leverage', '-'):>3} | 數量 {size} | "
+                     f"均價 {p.get('open_avg_price') or p.get('open_price') or '-'} | "
+                     f"未結盈虧 {float(p.get('unrealized_pnl') or p.get('unrealizePnl') or 0):.2f}")
+    if not positions:
+        lines.append("  ✅ 無持倉")
+
+    lines += ["", f"📋 [掛單] ({len(orders or [])})"]
+    side_map = {'1': '開多', '2': '開空', '3': '平多', '4': '平空'}
+    for o in orders or []:
+        lines.append(f"  {timestamp_to_str(o.get('createTime') or o.get('cTime'))} | "
+                     f"{side_map.get(str(o.get('type')), o.get('type'))} | 價格 {o.get('price')} | "
+                     f"數量 {o.get('size')} | 已成 {o.get('filled_qty', 0)} | ID {o.get('order_id') or o.get('orderId')}")
+    if not orders:
+        lines.append("  ✅ 無掛單")
+
+    lines += ["", "⚙️ [設定] (快取)"]
+    acc = detail.get('account', {}) if isinstance(detail, dict) else {}
+    lev = next((l for l in acc.get('leverageSetting', []) if l.get('symbol') == config.SYMBOL), {})
+    fee = next((f for f in acc.get('feeSetting', []) if f.get('symbol') == config.SYMBOL),
+               acc.get('defaultFeeSetting', {}))
+    lines.append(f"  全倉槓桿 x{lev.get('cross_leverage', 'N/A')} | "
+                 f"Taker {fee.get('taker_fee_rate', 'N/A')} | Maker {fee.get('maker_fee_rate', 'N/A')}")
+    return lines
+
+def live_dashboard(client, refresh_seconds=5, detail_ttl=300):
+    """
+    並行抓取資產 / 持倉 / 掛單 / 帳戶詳情，定時刷新，只重畫有變動的列
+    - 四個查詢同時發出，整體耗時約等於一次往返 (RTT)
+    - 帳戶詳情 (手續費、槓桿) 使用 TTL 快取，避免頻繁打 API
+    """
+    cache = TTLCache()
+    previous = []
+
+    def load_detail():
+        res = client.get_account_detail(coin="USDT")
+        return res if isinstance(res, dict) and 'account' in res else None
+
+    print("\033[2J", end="")  # 清除畫面
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        try:
+            while True:
+                started = time.time()
+                futures = [
+                    pool.submit(client.get_account_assets),
+                    pool.submit(client.get_all_positions, config.SYMBOL),
+                    pool.submit(client.get_open_orders, config.SYMBOL),
+                    pool.submit(cache.get, "account_detail", load_detail, detail_ttl),
+                ]
+                results, errors = [], []
+                for fut in futures:
+                    try:
+                        results.append(fut.result())
+                    except Exception as e:
+                        results.append(None)
+                        errors.append(f"❌ 查詢失敗: {e}")
+                elapsed = time.time() - started
+                lines = _dashboard_lines((*results, elapsed), refresh_seconds) + errors
+
+                # 只重畫內容有變動的列，游標移到該列後覆寫並清除行尾
+                out = []
+                for row, line in enumerate(lines):
+                    if row >= len(previous) or previous[row] != line:
+                        out.append(f"\033[{row + 1};1H{line}\033[K")
+                for row in range(len(lines), len(previous)):
+                    out.append(f"\033[{row + 1};1H\033[K")
+                out.append(f"\033[{len(lines) + 1};1H")
+                print("".join(out), end="", flush=True)
+                previous = lines
+
+                time.sleep(max(refresh_seconds - elapsed, 0.5))
+        except KeyboardInterrupt:
+            print("\n已離開即時監控。")
+
+def kill_switch_ui(client):
+    print(f"\n🛑 [Kill Switch] 緊急全平：停止機器人進場，並行撤銷所有帳戶的普通掛單、計畫單，並市價平倉所有交易對")
+    confirm = input("請輸入 'YES' 確認執行: ")
+    if confirm == 'YES':
+        # 與 kill_switch.py 相同：先寫入停機旗標，再平倉主帳戶與 config.ACCOUNTS 的所有子帳戶
+        halt("kill switch (check_account)")
+        clients = {"default": client}
+        clients.update({account.name: account.client for account in load_accounts()})
+        flatten_all(clients, symbols=[config.SYMBOL])
+        print("ℹ️ 機器人已停止進場，確認後執行 python kill_switch.py --resume 恢復")
+    else:
+        print("❌ 未輸入 YES，操作取消。")
+
 def main():
     client = WeexClient()
     while True:
@@ -365,9 +517,11 @@ def main():
         print("6. 🔧 調整槓桿倍數 ")
         print("7. 🚨 一鍵全平倉 (Close All) [NEW]")
         print("8. 🗑️  撤銷所有掛單 (Cancel Orders) [NEW]")
+        print("9. 📺 即時監控面板 (Live Dashboard)")
+        print("K. 🛑 緊急全平 (Kill Switch)")
         print("Q. 🚪 離開 (Quit)")
         
-        choice = input("\n請輸入選項 (1-6/Q): ").upper().strip()
+        choice = input("\n請輸入選項 (1-9/Q): ").upper().strip()
         
         if choice == '1': show_assets(client)
         elif choice == '2': show_open_orders(client)
@@ -377,6 +531,8 @@ def main():
         elif choice == '6': modify_leverage(client)
         elif choice == '7': close_all_positions_ui(client)
         elif choice == '8': cancel_all_orders_ui(client)
+        elif choice == '9': live_dashboard(client, refresh_seconds=getattr(config, "DASHBOARD_REFRESH_SECONDS", 5))
+        elif choice == 'K': kill_switch_ui(client)
         elif choice == 'Q': break
         else: print("⚠️ 無效輸入")
         
@@ -22,12 +22,73 @@ RSI_OVERBOUGHT = 70   # 超買閥值 (超過此值做空)
 # 布林通道設定
 BB_LENGTH = 20
 BB_STD = 2.0
+RANGE_BB_WIDTH = 0.05  # 布林寬度 (上軌-下軌)/中軌 小於此值視為盤整區間
 
 # 風控設定
 COOLDOWN_HOURS = 2    # 交易冷卻時間(小時)
 
 # 系統設定
 ENABLE_AI_LOG = True  # 是否上傳 AI Log
+PAPER_TRADING = False  # True: 紙上交易 (行情走真實 API，下單/倉位在本地模擬)
+ENABLE_TRADE_JOURNAL = True  # 決策/訂單/成交寫入 SQLite 交易日誌
+TRADE_JOURNAL_PATH = "logs/trade_journal.db"
+
+# check_account.py 即時監控面板 (選項 9) 的刷新秒數
+DASHBOARD_REFRESH_SECONDS = 5
+
+# 訂單簿 (WebSocket depth 頻道)
+ENABLE_ORDER_BOOK = False  # 維護本地 L2 訂單簿，下單前評估滑價 (depth 頻道格式確認後再開啟)
+DEPTH_LEVELS = 15          # 訂閱檔位數
+ORDER_BOOK_MAX_AGE = 5.0   # 超過此秒數未更新視為過期 (改回一般市價單)
+MAX_SLIPPAGE_BPS = 10.0    # 市價單可接受的最大預估滑價 (bps)，超過則縮量改 IOC 限價
+
+# 合約規格 (tick / 數量精度 / 上下限) 快取秒數
+CONTRACT_INFO_TTL = 3600
+
+# 階梯進場：策略訊號成立時拆成 levels 檔限價買單 (每檔往下 step_pct)，以批次下單一次送出
+# 未成交的檔位在 ttl_seconds 後撤單 (省略 = 一根 STRATEGY_INTERVAL K 線)；預設關閉 (全部市價單)
+LADDER_BY_STRATEGY = {
+    # "range_reversion": {"levels": 3, "step_pct": 0.001, "ttl_seconds": 300},
+}
+
+# REST 請求逾時 (秒)；下單逾時時以同一個 client_oid 重送，最多 ORDER_MAX_ATTEMPTS 次
+REQUEST_TIMEOUT = 10
+ORDER_MAX_ATTEMPTS = 3
+
+# 多帳戶：同一個策略決策並行下到多個子帳戶 (空列表 = 只用上方的單一帳戶)
+# 行情與歷史資料仍使用上方的主帳戶；各帳戶可覆寫數量倍數與風控上限
+ACCOUNTS = [
+    # {"name": "sub1", "api_key": "...", "secret_key": "...", "passphrase": "...",
+    #  "size_multiplier": 1.0, "max_open_orders": 10, "max_positions": 1, "max_position_size": 1},
+]
+
+# 狀態快照 (冷卻計時 / K 線緩衝區)，重啟時還原；設為 None 關閉
+STATE_SNAPSHOT_PATH = "data/strategy_state.json"
+STATE_SNAPSHOT_MIN_INTERVAL = 5.0  # 背景寫入快照的最短間隔 (秒)，期間的更新合併為一次；下單後的冷卻計時不受限
+
+# 健康監控 (supervisor.py)
+FEED_STALE_SECONDS = 30      # 任一訂閱頻道超過此秒數沒有資料 → 強制重連並暫停進場
+HISTORY_MAX_AGE = None       # 歷史 K 線多久未更新視為過期 (秒)；None = max(2 個週期, 15 分鐘) + 2 分鐘
+MAX_REST_ERROR_RATE = 0.5    # 最近 60 秒 REST 錯誤率上限，超過暫停進場
+MAX_CALLBACK_MS = 500        # 行情回呼平均耗時上限 (ms)，超過暫停進場
+HEALTH_HOST = "127.0.0.1"
+HEALTH_PORT = None           # GET /health 與 /debug/* 管理端點的埠號 (例如 8787)；None = 不開啟
+HALT_FILE = "data/HALT"      # kill_switch.py 寫入的停機旗標檔 (跨行程)，存在時不進場；python kill_switch.py --resume 清除
+
+# 線上效能剖析 (profiler.py)：kill -USR1 <pid> 取樣、kill -USR2 <pid> 印出執行緒堆疊，
+# 或 GET /debug/profile?seconds=10、/debug/stacks (掛在上方的健康檢查端點，只監聽 HEALTH_HOST)
+ENABLE_PROFILE_SIGNALS = True
+PROFILE_SECONDS = 30         # SIGUSR1 / /debug/profile/start 預設取樣秒數
+PROFILE_INTERVAL_MS = 5      # 取樣間隔 (ms)
+PROFILE_DIR = "data/profiles"  # .folded (火焰圖) 與執行緒堆疊輸出目錄
+
+# 共用行情常駐程序 (market_data_daemon.py)：同一台機器跑多個機器人時只連一條 WebSocket、共用 K 線緩衝區
+# 先啟動 python market_data_daemon.py，再設定為同一個 socket 路徑；None = 各自直接連線交易所
+MARKET_DATA_SOCKET = None  # 例如 "/tmp/weex_market_data.sock"
+
+# 行情錄製 (原始 WebSocket 訊息寫入二進位分段檔，可用 market_recorder.py / 回放工具讀取)
+ENABLE_MARKET_RECORDER = False
+MARKET_RECORD_DIR = "data/market"
 
 #  OpenAI 設定 ---
 OPENAI_API_KEY = "您的_OPENAI_API_KEY"  # 請填入您的 sk-....
@@ -38,6 +99,12 @@ AI_CONFIDENCE_THRESHOLD = 0.6
 AI_COOLDOWN_SECONDS = 60
 AI_TEMPERATURE = 0.4  # 控制回應的隨機性 (0.0 - 1.0
 AI_MAX_TOKENS = 400   # 回應的最大 token 數量
+AI_PROVIDER = "openai"      # "openai" / "local" (本地固定回覆，測試與回測用，不送出網路請求)
+AI_DEADLINE_SECONDS = 8.0   # 每次諮詢的截止時間，逾時不再等待
+AI_HEDGE_MODEL = None       # 設定第二個模型 (例如 "gpt-4o-mini") 時同時送出，採用先回來的合法答案
+AI_HEDGE_DELAY = 0.0        # 主要模型超過此秒數未回才送出對沖請求 (0 = 同時送出)
+AI_TIMEOUT_FALLBACK = "WAIT"  # AI 逾時 (超過 AI_DEADLINE_SECONDS) 時: "WAIT" 放棄這次訊號，"RULE" 依規則訊號下單
+                              # (回覆格式錯誤 / API 錯誤一律放棄，不會改用規則)
 
 # 風控設定 (保留)
 MAX_OPEN_ORDERS = 10
@@ -0,0 +1,167 @@
+"""
+合約規格快取 (Contract Info)
+
+啟動時一次載入所有交易對的規格 (GET /capi/v2/market/contracts)，之後依 TTL 在背景更新：
+- 價格最小變動 (tick)：priceEndStep × 10^-tick_size   (tick_size 為小數位數)
+- 數量最小變動 (step)：10^-size_increment                 (size_increment 為小數位數)
+- 最小 / 最大下單量、最小 / 最大槓桿
+
+下單前在本地完成取整與檢查，不合規的單不送出，避免被交易所拒單後再重試一趟。
+"""
+import threading
+import time
+from decimal import Decimal, ROUND_DOWN, ROUND_HALF_UP, ROUND_UP
+
+ROUNDING = {"nearest": ROUND_HALF_UP, "down": ROUND_DOWN, "up": ROUND_UP}
+
+
+class ContractError(ValueError):
+    """訂單不符合合約規格"""
+
+
+def _dec(value, default=None):
+    if value in (None, ""):
+        return default
+    return Decimal(str(value))
+
+
+def _decimal_places_to_step(places, end_step="1"):
+    return _dec(end_step, Decimal(1)) * Decimal(1).scaleb(-int(Decimal(str(places))))
+
+
+class ContractSpec:
+    def __init__(self, symbol, tick_size, size_step, min_size=None, max_size=None,
+                 min_leverage=None, max_leverage=None, raw=None):
+        self.symbol = symbol
+        self.tick_size = Decimal(str(tick_size))
+        self.size_step = Decimal(str(size_step))
+        self.min_size = _dec(min_size)
+        self.max_size = _dec(max_size)
+        self.min_leverage = int(min_leverage) if min_leverage not in (None, "") else None
+        self.max_leverage = int(max_leverage) if max_leverage not in (None, "") else None
+        self.raw = raw or {}
+
+    @classmethod
+    def from_api(cls, item):
+        """解析 /capi/v2/market/contracts 的一筆資料"""
+        return cls(
+            symbol=item["symbol"],
+            tick_size=_decimal_places_to_step(item.get("tick_size", 2), item.get("priceEndStep", 1)),
+            size_step=_decimal_places_to_step(item.get("size_increment", 4)),
+            min_size=item.get("minOrderSize"),
+            max_size=item.get("maxOrderSize"),
+            min_leverage=item.get("minLeverage"),
+            max_leverage=item.get("maxLeverage"),
+            raw=item,
+        )
+
+    def round_price(self, price, mode="nearest"):
+        """取整到 tick，回傳字串 (直接放進下單參數)"""
+        ticks = (Decimal(str(price)) / self.tick_size).to_integral_value(rounding=ROUNDING[mode])
+        return str((ticks * self.tick_size).quantize(self.tick_size))
+
+    def round_size(self, size):
+        """數量一律向下取整到 step，避免超出預期部位"""
+        steps = (Decimal(str(size)) / self.size_step).to_integral_value(rounding=ROUND_DOWN)
+        return str((steps * self.size_step).quantize(self.size_step))
+
+    def validate(self, size=None, price=None, leverage=None):
+        """回傳錯誤訊息列表 (空列表代表可以送出)；未提供的欄位不檢查"""
+        errors = []
+        if size is not None:
+            size = Decimal(str(size))
+            if size <= 0:
+                errors.append(f"數量必須大於 0 ({size})")
+            elif size % self.size_step != 0:
+                errors.append(f"數量 {size} 不是 {self.size_step} 的整數倍")
+            if self.min_size is not None and size < self.min_size:
+                errors.append(f"數量 {size} 小於最小下單量 {self.min_size}")
+            if self.max_size is not None and size > self.max_size:
+                errors.append(f"數量 {size} 大於最大下單量 {self.max_size}")
+        if price is not None:
+            price = Decimal(str(price))
+            if price <= 0 or price % self.tick_size != 0:
+                errors.append(f"價格 {price} 不符合最小變動 {self.tick_size}")
+        if leverage is not None:
+            if self.max_leverage is not None and int(leverage) > self.max_leverage:
+                errors.append(f"槓桿 x{leverage} 超過上限 x{self.max_leverage}")
+            if self.min_leverage is not None and int(leverage) < self.min_leverage:
+                errors.append(f"槓桿 x{leverage} 低於下限 x{self.min_leverage}")
+        return errors
+
+    def check(self, size=None, price=None, leverage=None):
+        errors = self.validate(size, price, leverage)
+        if errors:
+            raise ContractError(f"{self.symbol}: " + "; ".join(errors))
+
+    def __repr__(self):
+        return (f"ContractSpec({self.symbol}, tick={self.tick_size}, step={self.size_step}, "
+                f"size=[{self.min_size}, {self.max_size}], leverage<={self.max_leverage})")
+
+
+class ContractInfoCache:
+    """
+    所有交易對的規格快取
+    啟動時呼叫 load() 同步載入；get() 在下單路徑上只查本地資料，過期或尚未載入時改由背景執行緒更新，
+    從不同步打 REST (沒有資料時回傳 None，由呼叫端放棄下單)
+    """
+
+    def __init__(self, client, ttl=3600, retry_interval=60):
+        self.client = client
+        self.ttl = ttl
+        self.retry_interval = retry_interval
+        self.specs = {}
+        self.loaded_at = 0.0
+        self.last_attempt = 0.0
+        self.lock = threading.Lock()
+        self._refreshing = False
+
+    def load(self):
+        self.last_attempt = time.time()
+        try:
+            items = self.client.get_contracts()
+        except Exception as e:
+            print(f"⚠️ 合約規格載入失敗: {e}")
+            return False
+        if not isinstance(items, list) or not items:
+            print(f"⚠️ 合約規格載入失敗: {items}")
+            return False
+        specs = {}
+        for item in items:
+            try:
+                spec = ContractSpec.from_api(item)
+            except (KeyError, ValueError, ArithmeticError) as e:
+                print(f"⚠️ 無法解析合約規格 {item.get('symbol')}: {e}")
+                continue
+            specs[spec.symbol] = spec
+        with self.lock:
+            self.specs = specs
+            self.loaded_at = time.time()
+        print(f"📐 已載入 {len(specs)} 個合約規格")
+        return True
+
+    def load_async(self):
+        """在背景執行緒載入；已在載入中時回傳 None"""
+        with self.lock:
+            if self._refreshing:
+                return None
+            self._refreshing = True
+            self.last_attempt = time.time()
+        t = threading.Thread(target=self._refresh, name="contract-info", daemon=True)
+        t.start()
+        return t
+
+    def _refresh(self):
+        try:
+            self.load()
+        finally:
+            with self.lock:
+                self._refreshing = False
+
+    def get(self, symbol):
+        """取得規格；沒有資料或查無此交易對時回傳 None"""
+        if not self.specs or time.time() - self.loaded_at > self.ttl:
+            # 背景載入中或剛失敗過就不重試
+            if not self._refreshing and time.time() - self.last_attempt > self.retry_interval:
+                self.load_async()
+        return self.specs.get(symbol)
@@ -0,0 +1,197 @@
+"""
+行程內事件匯流排 (Event Bus)
+
+行情 → 策略 → 下單 → 紀錄 之間改以事件串接：
+- publish() 只把事件放進各訂閱者自己的有界佇列後立即返回，不會被慢的訂閱者卡住
+- 每個訂閱者有自己的工作執行緒；佇列滿了依 policy 丟棄最舊 (drop_oldest) 或最新 (drop_new) 的事件並計數，
+  遙測類 (AI Log 上傳) 使用；稽核類 (交易日誌) 使用 block：佇列滿時發佈者等待空位，事件不會遺失
+- inline=True 的訂閱者直接在發佈者的執行緒中執行 (只適合非常快的處理)
+- 沒有訂閱者的事件類型，publish() 只做一次 dict 查詢
+
+事件類型見下方常數；事件內容為 dict (event.data)。
+"""
+import threading
+import time
+from collections import deque
+
+# --- 事件類型 ---
+TICK = "tick"                        # interval, price
+CANDLE_CLOSED = "candle_closed"      # interval, prev_high, prev_low, rsi, bb_upper
+SIGNAL = "signal"                    # strategy, price, context
+AI_VERDICT = "ai_verdict"            # stage, model, input_data, output_data, explanation
+ORDER_SUBMITTED = "order_submitted"  # strategy, size, price, order_args
+ORDER_ACKED = "order_acked"          # strategy, result, size, price, take_profit, stop_loss, decision_source
+EVENT_TYPES = (TICK, CANDLE_CLOSED, SIGNAL, AI_VERDICT, ORDER_SUBMITTED, ORDER_ACKED)
+
+
+class Event:
+    __slots__ = ("type", "data", "ts", "published_at")
+
+    def __init__(self, type, data):
+        self.type = type
+        self.data = data
+        self.ts = time.time()
+        self.published_at = time.perf_counter()
+
+    def __repr__(self):
+        return f"Event({self.type}, {self.data})"
+
+
+class Consumer:
+    def __init__(self, name, handler, types, maxsize, policy, inline):
+        if policy not in ("drop_oldest", "drop_new", "block"):
+            raise ValueError(f"未知的 policy: {policy}")
+        self.name = name
+        self.handler = handler
+        self.types = set(types) if types else None
+        self.maxsize = maxsize
+        self.policy = policy
+        self.inline = inline
+        self.queue = deque()
+        self.cond = threading.Condition()
+        self.running = False
+        self.thread = None
+        self.busy = False
+        self.delivered = 0
+        self.dropped = 0
+        self.blocked = 0
+        self.errors = 0
+        self.max_lag = 0.0
+
+    def offer(self, event):
+        if self.inline:
+            self._handle(event)
+            return
+        with self.cond:
+            if len(self.queue) >= self.maxsize:
+                if self.policy == "block":
+                    self.blocked += 1
+                    while self.running and len(self.queue) >= self.maxsize:
+                        self.cond.wait()
+                else:
+                    self.dropped += 1
+                    if self.policy == "drop_new":
+                        return
+                    self.queue.popleft()
+            if self.running or self.policy != "block":
+                self.queue.append(event)
+                self.cond.notify_all()
+                return
+        # 已停止 (關機中) 的 block 訂閱者：直接在發佈者執行緒處理，不丟棄
+        self._handle(event)
+
+    def _handle(self, event):
+        lag = time.perf_counter() - event.published_at
+        if lag > self.max_lag:
+            self.max_lag = lag
+        try:
+            self.handler(event)
+        except Exception as e:
+            self.errors += 1
+            print(f"❌ [EventBus] 訂閱者 {self.name} 處理 {event.type} 失敗: {e}")
+        self.delivered += 1
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while self.running and not self.queue:
+                    self.cond.wait()
+                if not self.queue:
+                    return  # 已停止且佇列清空
+                event = self.queue.popleft()
+                self.busy = True
+                self.cond.notify_all()  # 喚醒等待空位的發佈者 (block)
+            try:
+                self._handle(event)
+            finally:
+                with self.cond:
+                    self.busy = False
+                    self.cond.notify_all()
+
+    def start(self):
+        if self.inline or self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name=f"bus-{self.name}", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+
+    def drain(self, timeout):
+        deadline = time.time() + timeout
+        with self.cond:
+            while (self.queue or self.busy) and self.running:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self.cond.wait(remaining)
+        return True
+
+    def stats(self):
+        return {
+            "queued": len(self.queue), "delivered": self.delivered, "dropped": self.dropped,
+            "blocked": self.blocked, "errors": self.errors, "max_lag_ms": round(self.max_lag * 1000, 3),
+        }
+
+
+class EventBus:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.consumers = {}
+        self._routes = {}   # event type -> tuple(consumers)，publish 時不需加鎖
+        self.published = 0
+
+    def subscribe(self, name, handler, types=None, maxsize=1000, policy="drop_oldest", inline=False):
+        """
+        註冊訂閱者；types 為 None 代表訂閱所有事件
+        policy: 佇列滿時 drop_oldest / drop_new 丟棄並計數 (遙測)，block 讓發佈者等待空位 (稽核紀錄，不可遺失)
+        handler(event) 在訂閱者自己的執行緒中執行 (inline=True 時在發佈者執行緒)
+        """
+        with self.lock:
+            if name in self.consumers:
+                raise ValueError(f"訂閱者 {name} 已存在")
+            consumer = Consumer(name, handler, types, maxsize, policy, inline)
+            self.consumers[name] = consumer
+            self._rebuild_routes()
+        consumer.start()
+        return consumer
+
+    def unsubscribe(self, name):
+        with self.lock:
+            consumer = self.consumers.pop(name, None)
+            self._rebuild_routes()
+        if consumer:
+            consumer.stop()
+
+    def _rebuild_routes(self):
+        types = set(EVENT_TYPES)
+        for c in self.consumers.values():
+            types |= c.types or set()
+        self._routes = {t: tuple(c for c in self.consumers.values() if c.types is None or t in c.types)
+                        for t in types}
+
+    def publish(self, type, **data):
+        consumers = self._routes.get(type)
+        if not consumers:
+            return None
+        event = Event(type, data)
+        self.published += 1
+        for consumer in consumers:
+            consumer.offer(event)
+        return event
+
+    def drain(self, timeout=5.0):
+        """等待所有佇列處理完 (測試 / 回放 / 關機前使用)"""
+        deadline = time.time() + timeout
+        return all(c.drain(max(deadline - time.time(), 0)) for c in list(self.consumers.values()))
+
+    def stop(self, timeout=5.0):
+        self.drain(timeout)
+        for c in list(self.consumers.values()):
+            c.stop()
+
+    def stats(self):
+        return {name: c.stats() for name, c in self.consumers.items()}
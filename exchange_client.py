@@ -4,11 +4,29 @@ import hmac
 import hashlib
 import base64
 import requests
-from threading import Lock
+from threading import Lock, Condition, local
+from collections import deque
+from contextlib import contextmanager
 from datetime import datetime
 import config
 from ai_logger import save_local_log
 
+# batchOrders 每次最多可送出的訂單數
+BATCH_ORDER_LIMIT = 20
+
+# WebSocket 週期名稱 -> REST K 線 granularity
+INTERVAL_GRANULARITY = {
+    "MINUTE_1": "1m", "MINUTE_5": "5m", "MINUTE_15": "15m", "MINUTE_30": "30m",
+    "HOUR_1": "1h", "HOUR_4": "4h", "HOUR_12": "12h", "DAY_1": "1d", "WEEK_1": "1w"
+}
+
+# 交易所回應中代表成功的 code (查詢類 API 常不帶 code)
+SUCCESS_CODES = {None, "00000", "0", 0, "200", 200}
+
+
+class QueryError(Exception):
+    """查詢失敗 (連線錯誤、逾時、API 錯誤碼)：與「查無資料」不同，呼叫端不能當成空結果"""
+
 class ClientOrderIdGenerator:
     def __init__(self, machine_id: int):
         self.machine_id = f"{machine_id:02d}"
@@ -29,13 +47,65 @@ class ClientOrderIdGenerator:
         ms = f"{now_ms % 1000:03d}"
         return f"{prefix}{ms}{self.machine_id}{seq:05d}"
 
+class RateLimiter:
+    """Token Bucket 限流器 (執行緒安全)，rate = 每秒可用的請求權重"""
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = Lock()
+
+    def acquire(self, weight=1):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= weight:
+                    self.tokens -= weight
+                    return
+                wait = (weight - self.tokens) / self.rate
+            time.sleep(wait)
+
 class WeexClient:
-    def __init__(self):
-        self.base_url = config.REST_URL
-        self.api_key = config.API_KEY
-        self.secret_key = config.SECRET_KEY
-        self.passphrase = config.PASSPHRASE
-        self.id_gen = ClientOrderIdGenerator(machine_id=1)
+    def __init__(self, base_url=None, timeout=None, api_key=None, secret_key=None, passphrase=None, machine_id=1):
+        self.base_url = base_url or config.REST_URL
+        # 請求逾時 (秒)；逾時視為狀態未知，由呼叫端決定是否重送
+        self.timeout = timeout or getattr(config, "REQUEST_TIMEOUT", 10)
+        # 未指定時使用 config 的主帳戶 (多帳戶見 account_fanout.py)
+        self.api_key = api_key or config.API_KEY
+        self.secret_key = secret_key or config.SECRET_KEY
+        self.passphrase = passphrase or config.PASSPHRASE
+        self.id_gen = ClientOrderIdGenerator(machine_id=machine_id)
+        # 共用連線池 (Keep-Alive)，並行查詢時省去重複的 TCP/TLS 握手
+        self.session = requests.Session()
+        # 最近請求的結果 (時間, 是否成功)，供 supervisor 計算錯誤率
+        self.request_log = deque(maxlen=500)
+        # 優先通道：緊急平倉期間，其他執行緒的一般請求會先等待
+        self._priority_cond = Condition()
+        self._priority_active = 0
+        self._priority_local = local()
+
+    @contextmanager
+    def priority(self):
+        """在此區塊內由目前執行緒送出的請求享有優先權 (kill switch 用)"""
+        with self._priority_cond:
+            self._priority_active += 1
+        self._priority_local.enabled = True
+        try:
+            yield self
+        finally:
+            self._priority_local.enabled = False
+            with self._priority_cond:
+                self._priority_active -= 1
+                self._priority_cond.notify_all()
+
+    def _wait_for_priority(self, max_wait=30):
+        if getattr(self._priority_local, "enabled", False):
+            return
+        with self._priority_cond:
+            self._priority_cond.wait_for(lambda: self._priority_active == 0, timeout=max_wait)
 
     def _generate_signature(self, timestamp, method, request_path, query_string="", body=""):
         message = timestamp + method.upper() + request_path + query_string + body
@@ -47,6 +117,7 @@ class WeexClient:
         return base64.b64encode(signature).decode('utf-8')
 
     def _send_request(self, method, endpoint, query_params="", body_dict=None):
+        self._wait_for_priority()
         timestamp = str(int(time.time() * 1000))
         request_path = endpoint
         
@@ -69,18 +140,28 @@ class WeexClient:
         
         try:
             if method == "GET":
-                response = requests.get(full_url, headers=headers)
+                response = self.session.get(full_url, headers=headers, timeout=self.timeout)
             else:
-                response = requests.post(full_url, headers=headers, data=body_str)
+                response = self.session.post(full_url, headers=headers, data=body_str, timeout=self.timeout)
             
             if response.status_code != 200:
                 print(f"⚠️ API Error [{response.status_code}]: {response.text}")
+            self.request_log.append((time.time(), response.status_code < 500))
 
             return response.json()
         except Exception as e:
+            self.request_log.append((time.time(), False))
             print(f"❌ API Request Failed: {e}")
             return None
 
+    def error_rate(self, window=60):
+        """最近 window 秒內的請求數與失敗比例 (逾時 / 連線錯誤 / 5xx)"""
+        since = time.time() - window
+        recent = [ok for ts, ok in list(self.request_log) if ts >= since]
+        if not recent:
+            return 0, 0.0
+        return len(recent), 1 - sum(recent) / len(recent)
+
     # --- [關鍵新增] 通用資料提取器 ---
     def _extract_data(self, response):
         """
@@ -112,12 +193,28 @@ class WeexClient:
             
         return []
 
+    def _extract_list(self, response, what, strict=False):
+        """
+        查詢類 API 的結果 (List)
+        strict=False：維持舊行為，失敗時回傳 []
+        strict=True：連線失敗 / 錯誤碼 / 非 List 時丟出 QueryError，讓 kill switch 與對帳能分辨「失敗」與「空」
+        """
+        if not strict:
+            return self._extract_data(response)
+        if response is None:
+            raise QueryError(f"{what} 請求失敗 (無回應)")
+        if isinstance(response, dict):
+            if response.get("code") not in SUCCESS_CODES:
+                raise QueryError(f"{what} 回傳錯誤 [{response.get('code')}]: {response.get('msg')}")
+            if response.get("data", []) is None:
+                return []
+        data = self._extract_data(response)
+        if not isinstance(data, list):
+            raise QueryError(f"{what} 回傳格式非 List: {str(response)[:200]}")
+        return data
+
     def _map_interval(self, interval):
-        mapping = {
-            "MINUTE_1": "1m", "MINUTE_5": "5m", "MINUTE_15": "15m", "MINUTE_30": "30m",
-            "HOUR_1": "1h", "HOUR_4": "4h", "HOUR_12": "12h", "DAY_1": "1d", "WEEK_1": "1w"
-        }
-        return mapping.get(interval, "1m")
+        return INTERVAL_GRANULARITY.get(interval, "1m")
 
     # --- API 功能實作 ---
 
@@ -134,22 +231,32 @@ class WeexClient:
         # K線有時直接回傳 List，有時包在 data，使用 _extract_data 統一處理
         return self._extract_data(response)
 
+    def get_contracts(self, symbol=None):
+        """
+        查詢合約規格 (Get Futures Information)
+        Endpoint: /capi/v2/market/contracts，不帶 symbol 時回傳所有交易對
+        """
+        query = f"?symbol={symbol}" if symbol else ""
+        response = self._send_request("GET", "/capi/v2/market/contracts", query)
+        return self._extract_data(response)
+
     def get_account_assets(self):
         """查詢帳戶資產 (修正: 直接回傳 List)"""
         response = self._send_request("GET", "/capi/v2/account/assets")
         return self._extract_data(response)
 
-    def get_all_positions(self, symbol=None):
+    def get_all_positions(self, symbol=None, strict=False):
         """
         查詢當前倉位 (Get All Positions)
         Ref: Get_all_position.pdf
         Endpoint: /capi/v2/account/position/allPosition
+        strict=True 時查詢失敗丟出 QueryError (見 _extract_list)
         """
         endpoint = "/capi/v2/account/position/allPosition"
         
         # 根據文件，此 API 不需要參數 (Request parameters: NONE)
         response = self._send_request("GET", endpoint)
-        all_positions = self._extract_data(response)
+        all_positions = self._extract_list(response, "allPosition", strict)
         
         # 如果使用者有指定 symbol，我們在 Client 端幫忙過濾
         if symbol and all_positions:
@@ -158,7 +265,8 @@ class WeexClient:
             
         return all_positions
 
-    def get_open_orders(self, symbol=None, order_id=None, start_time=None, end_time=None, limit=100, page=0):
+    def get_open_orders(self, symbol=None, order_id=None, start_time=None, end_time=None, limit=100, page=0,
+                        strict=False):
         """查詢當前掛單 (修正: 根據 PDF 直接回傳 List)"""
         symbol = symbol or config.SYMBOL
         endpoint = "/capi/v2/order/current"
@@ -166,26 +274,38 @@ class WeexClient:
         if order_id: query += f"&orderId={order_id}"
         
         response = self._send_request("GET", endpoint, query)
-        return self._extract_data(response)
+        return self._extract_list(response, "order/current", strict)
 
-    def get_history_orders(self, symbol=None, page_size=20, create_date=None, end_create_date=None):
-        """查詢歷史訂單"""
+    def get_current_plan_orders(self, symbol=None, strict=False):
+        """查詢當前計畫委託 (止盈止損等條件單)"""
+        symbol = symbol or config.SYMBOL
+        endpoint = "/capi/v2/order/currentPlan"
+        query = f"?symbol={symbol}"
+        response = self._send_request("GET", endpoint, query)
+        return self._extract_list(response, "order/currentPlan", strict)
+
+    def get_history_orders(self, symbol=None, page_size=20, create_date=None, end_create_date=None, strict=False):
+        """查詢歷史訂單 (create_date / end_create_date 為毫秒時間戳，用於分頁)"""
         symbol = symbol or config.SYMBOL
         endpoint = "/capi/v2/order/history"
         query = f"?symbol={symbol}&pageSize={page_size}"
         if create_date: query += f"&createDate={create_date}"
+        if end_create_date: query += f"&endCreateDate={end_create_date}"
         
         response = self._send_request("GET", endpoint, query)
-        return self._extract_data(response)
+        return self._extract_list(response, "order/history", strict)
 
-    def get_fills(self, symbol=None, limit=100):
-        """查詢成交明細"""
+    def get_fills(self, symbol=None, limit=100, start_time=None, end_time=None, order_id=None, strict=False):
+        """查詢成交明細 (start_time / end_time 為毫秒時間戳，用於分頁)"""
         symbol = symbol or config.SYMBOL
         endpoint = "/capi/v2/order/fills"
         query = f"?symbol={symbol}&limit={limit}"
+        if order_id: query += f"&orderId={order_id}"
+        if start_time: query += f"&startTime={start_time}"
+        if end_time: query += f"&endTime={end_time}"
         
         response = self._send_request("GET", endpoint, query)
-        return self._extract_data(response)
+        return self._extract_list(response, "order/fills", strict)
 
     def get_order_detail(self, order_id):
         endpoint = "/capi/v2/order/detail"
@@ -326,12 +446,22 @@ class WeexClient:
     """
         
         endpoint = "/capi/v2/order/placeOrder"
+        body = self._order_body(side, size, price, match_price, order_type, client_oid,
+                                preset_take_profit, preset_stop_loss)
+        body["symbol"] = config.SYMBOL
+        if margin_mode: body["marginMode"] = int(margin_mode)
+        if extra_params: body.update(extra_params)
+        
+        print(f"🚀 下單: 方向={side} | 數量={size} | 價格={price}")
+        return self._send_request("POST", endpoint, body_dict=body)
+
+    def _order_body(self, side, size, price=None, match_price="0", order_type="0",
+                    client_oid=None, preset_take_profit=None, preset_stop_loss=None):
+        """單筆訂單的欄位 (placeOrder 與 batchOrders 共用)"""
         client_oid = client_oid or self.id_gen.generate()
         if str(match_price) == "0" and not price:
             raise ValueError("Limit order requires price")
-            
         body = {
-            "symbol": config.SYMBOL,
             "client_oid": str(client_oid),
             "size": str(size),
             "type": str(side),
@@ -341,11 +471,55 @@ class WeexClient:
         if price: body["price"] = str(price)
         if preset_take_profit: body["presetTakeProfitPrice"] = str(preset_take_profit)
         if preset_stop_loss: body["presetStopLossPrice"] = str(preset_stop_loss)
-        if margin_mode: body["marginMode"] = int(margin_mode)
-        if extra_params: body.update(extra_params)
-        
-        print(f"🚀 下單: 方向={side} | 數量={size} | 價格={price}")
-        return self._send_request("POST", endpoint, body_dict=body)
+        return body
+
+    def place_batch_orders(self, orders, symbol=None, margin_mode=None):
+        """
+        批次下單 (POST /capi/v2/order/batchOrders)，每批最多 BATCH_ORDER_LIMIT 筆
+
+        orders: list of dict，欄位與 place_order 相同 (side, size, price, match_price, order_type,
+                client_oid, preset_take_profit, preset_stop_loss)；未給 client_oid 時自動產生
+        回傳與 orders 同順序的 list，每筆為：
+        - {"client_oid", "order_id"}：成功
+        - {"client_oid", "code", "msg"}：交易所拒單
+        - None：整批請求逾時 / 伺服器錯誤，狀態未知 (可用同一 client_oid 重送)
+        """
+        endpoint = "/capi/v2/order/batchOrders"
+        symbol = symbol or config.SYMBOL
+        bodies = [self._order_body(**order) for order in orders]
+        results = []
+        for start in range(0, len(bodies), BATCH_ORDER_LIMIT):
+            chunk = bodies[start:start + BATCH_ORDER_LIMIT]
+            body = {"symbol": symbol, "orderDataList": chunk}
+            if margin_mode: body["marginMode"] = int(margin_mode)
+            print(f"🚀 批次下單: {len(chunk)} 筆 | {symbol}")
+            response = self._send_request("POST", endpoint, body_dict=body)
+            results.extend(self._map_batch_results(chunk, response))
+        return results
+
+    def _map_batch_results(self, chunk, response):
+        """把批次回應依 client_oid 對回每一筆訂單"""
+        oids = [item["client_oid"] for item in chunk]
+        if not isinstance(response, dict) or str(response.get("code", "")).startswith("5"):
+            return [None] * len(chunk)
+        info = response.get("order_info")
+        if info is None and isinstance(response.get("data"), dict):
+            info = response["data"].get("order_info")
+        if info is None:
+            # 整批被拒 (參數 / 權限錯誤)
+            return [{"client_oid": oid, "code": response.get("code"), "msg": response.get("msg")} for oid in oids]
+        by_oid = {str(item.get("client_oid")): item for item in info}
+        results = []
+        for oid in oids:
+            item = by_oid.get(oid)
+            if item is None:
+                results.append(None)
+            elif item.get("order_id") and item.get("result", True) not in (False, "false"):
+                results.append({"client_oid": oid, "order_id": str(item["order_id"])})
+            else:
+                results.append({"client_oid": oid, "code": item.get("error_code") or "batch_error",
+                                "msg": item.get("error_message") or "rejected"})
+        return results
 
     def cancel_batch_orders(self, order_ids=None):
         endpoint = "/capi/v2/order/cancel_batch_orders"
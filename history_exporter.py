@@ -0,0 +1,237 @@
+"""
+歷史訂單 / 成交明細匯出工具 (Streaming Exporter)
+
+- 把日期區間切成多個時間窗，多個時間窗並行抓取 (共用 RateLimiter，不超過交易所限流)
+- 每個時間窗內由新到舊翻頁：以本頁最舊一筆的時間當作下一頁的 endTime，同毫秒的紀錄以 ID 去重
+- 每頁資料立刻追加寫入 JSONL 後即丟棄，記憶體用量與總筆數無關
+- 寫入與游標檔 (state.json) 更新在同一步完成 (游標檔同時記錄輸出檔已確認的長度)，
+  中斷後重跑會截掉游標之後多寫的部分，再從上次的游標繼續，不會重複也不會遺漏
+- 查詢失敗 (逾時、連線錯誤、錯誤碼) 一律重試，不會被當成「沒有資料」而把時間窗標記完成
+
+使用方式：
+    python history_exporter.py --start 2025-01-01 --end 2026-01-01 --kinds fills orders
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+import config
+from exchange_client import WeexClient, RateLimiter, QueryError
+
+DAY_MS = 86_400_000
+
+# 每種資料的抓取方式：(分頁大小, 時間欄位, ID 欄位)
+KINDS = {
+    "fills": {"page_size": 100, "time_keys": ("createdTime", "cTime"), "id_keys": ("tradeId", "id", "fillId")},
+    "orders": {"page_size": 100, "time_keys": ("createTime", "cTime"), "id_keys": ("order_id", "orderId")},
+}
+
+
+def _first(record, keys):
+    for k in keys:
+        if record.get(k) not in (None, ""):
+            return record[k]
+    return None
+
+
+class JsonlWriter:
+    """
+    多執行緒共用的 JSONL 追加寫入器
+    有 state 時，每次寫入後在同一個鎖內更新游標與本檔已確認的長度；
+    開檔時截掉超過已確認長度的部分 (上次寫入後、游標更新前中斷所留下的紀錄)
+    """
+    def __init__(self, path, state=None):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.lock = threading.Lock()
+        self.state = state
+        self.key = os.path.basename(path)
+        self.file = open(path, "ab")
+        committed = state.committed(self.key) if state is not None else None
+        if committed is not None and self.file.seek(0, os.SEEK_END) > committed:
+            print(f"⚠️ {path} 有 {self.file.tell() - committed} bytes 未記入游標，截掉後從游標重抓")
+            self.file.truncate(committed)
+        self.count = 0
+
+    def write_many(self, records, task_id=None, **progress):
+        """寫入 records；task_id 不為 None 時同時更新該時間窗的游標 (progress)"""
+        data = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records).encode("utf-8")
+        with self.lock:
+            if data:
+                self.file.write(data)
+                self.file.flush()
+                os.fsync(self.file.fileno())
+                self.count += len(records)
+            if task_id is not None and self.state is not None:
+                self.state.update(task_id, committed=(self.key, self.file.seek(0, os.SEEK_END)), **progress)
+
+    def close(self):
+        self.file.close()
+
+
+class CursorState:
+    """
+    時間窗游標 (原子寫入)，格式: {task_id: {"cursor": endTime, "boundary_ids": [...], "done": bool}}
+    "_committed": {輸出檔名: 已確認的 bytes} 與游標一起寫入
+    """
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.data = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.data = json.load(f)
+
+    def get(self, task_id):
+        return self.data.get(task_id, {})
+
+    def committed(self, key):
+        return self.data.get("_committed", {}).get(key)
+
+    def update(self, task_id, committed=None, **kwargs):
+        with self.lock:
+            self.data.setdefault(task_id, {}).update(kwargs)
+            if committed is not None:
+                key, size = committed
+                self.data.setdefault("_committed", {})[key] = size
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.data, f)
+            os.replace(tmp, self.path)
+
+
+class HistoryExporter:
+    def __init__(self, client, out_dir="exports", rate=8.0, workers=4, window_days=1, max_retries=5, backoff=0.2):
+        self.client = client
+        self.out_dir = out_dir
+        self.limiter = RateLimiter(rate)
+        self.workers = workers
+        self.window_ms = int(window_days * DAY_MS)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        os.makedirs(out_dir, exist_ok=True)
+        self.state = CursorState(os.path.join(out_dir, "state.json"))
+
+    def _fetch_page(self, kind, symbol, start_ms, end_ms, page_size):
+        """strict 查詢：失敗時丟出例外，不會回傳空頁"""
+        self.limiter.acquire()
+        if kind == "fills":
+            return self.client.get_fills(symbol=symbol, limit=page_size, start_time=start_ms, end_time=end_ms,
+                                         strict=True)
+        return self.client.get_history_orders(symbol=symbol, page_size=page_size,
+                                              create_date=start_ms, end_create_date=end_ms, strict=True)
+
+    def _fetch_with_retry(self, task_id, kind, symbol, start_ms, end_ms, page_size):
+        retries = 0
+        while True:
+            try:
+                page = self._fetch_page(kind, symbol, start_ms, end_ms, page_size)
+                if isinstance(page, list):
+                    return page
+                error = f"回傳格式非 List: {str(page)[:200]}"
+            except (QueryError, OSError) as e:  # ConnectionError / TimeoutError 皆為 OSError
+                error = e
+            retries += 1
+            if retries > self.max_retries:
+                # 不更新游標：重跑時從同一頁繼續
+                raise RuntimeError(f"{task_id} 連續查詢失敗: {error}")
+            time.sleep(min(2 ** retries * self.backoff, 5))
+
+    def _export_window(self, kind, symbol, start_ms, end_ms, writer):
+        spec = KINDS[kind]
+        task_id = f"{kind}:{symbol}:{start_ms}:{end_ms}"
+        saved = self.state.get(task_id)
+        if saved.get("done"):
+            return 0
+        cursor = saved.get("cursor", end_ms)
+        boundary_ids = set(saved.get("boundary_ids", []))
+        written = 0
+
+        while True:
+            page = self._fetch_with_retry(task_id, kind, symbol, start_ms, cursor, spec["page_size"])
+
+            fresh = []
+            for r in page:
+                ts = int(_first(r, spec["time_keys"]) or 0)
+                rid = str(_first(r, spec["id_keys"]))
+                if ts < start_ms or ts > cursor or (ts == cursor and rid in boundary_ids):
+                    continue
+                fresh.append(r)
+            written += len(fresh)
+
+            if len(page) < spec["page_size"]:
+                writer.write_many(fresh, task_id, done=True, cursor=start_ms, boundary_ids=[])
+                return written
+
+            # 下一頁：以本頁最舊的時間為 endTime (含)，同毫秒的紀錄靠 ID 去重
+            oldest = min(int(_first(r, spec["time_keys"]) or 0) for r in page)
+            same_ms = {str(_first(r, spec["id_keys"])) for r in page
+                       if int(_first(r, spec["time_keys"]) or 0) == oldest}
+            if oldest == cursor:
+                # 整頁都在同一毫秒，無法再以時間細分，只能往前跳過這一毫秒
+                print(f"⚠️ {task_id} 在 {oldest} 同毫秒紀錄超過一頁，可能有遺漏")
+                cursor, boundary_ids = oldest - 1, set()
+            else:
+                cursor, boundary_ids = oldest, same_ms
+            if cursor < start_ms:
+                writer.write_many(fresh, task_id, done=True, cursor=start_ms, boundary_ids=[])
+                return written
+            # 本頁紀錄與下一頁的游標一起確認
+            writer.write_many(fresh, task_id, cursor=cursor, boundary_ids=sorted(boundary_ids))
+
+    def export(self, symbol, start_ms, end_ms, kinds=("fills", "orders")):
+        writers = {k: JsonlWriter(os.path.join(self.out_dir, f"{symbol}_{k}.jsonl"), self.state) for k in kinds}
+        tasks = []
+        window_start = start_ms
+        while window_start < end_ms:
+            window_end = min(window_start + self.window_ms, end_ms) - 1
+            for kind in kinds:
+                tasks.append((kind, symbol, window_start, window_end))
+            window_start = window_end + 1
+
+        started = time.time()
+        print(f"📦 匯出 {symbol} {kinds}: {len(tasks)} 個時間窗，並行 {self.workers}")
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                futures = {pool.submit(self._export_window, *t, writers[t[0]]): t for t in tasks}
+                for i, fut in enumerate(as_completed(futures), 1):
+                    try:
+                        fut.result()
+                    except Exception as e:
+                        print(f"❌ {futures[fut]} 失敗 (重跑可續傳): {e}")
+                    if i % 20 == 0 or i == len(tasks):
+                        total = sum(w.count for w in writers.values())
+                        print(f"⏱️ {i}/{len(tasks)} 時間窗 | 已寫入 {total} 筆 | {time.time() - started:.1f}s")
+        finally:
+            for w in writers.values():
+                w.close()
+        return {k: w.count for k, w in writers.items()}
+
+
+def _parse_date(s):
+    return int(datetime.strptime(s, "%Y-%m-%d").timestamp() * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="匯出歷史訂單與成交明細 (可續傳)")
+    parser.add_argument("--symbol", default=config.SYMBOL)
+    parser.add_argument("--start", required=True, help="YYYY-MM-DD")
+    parser.add_argument("--end", default=None, help="YYYY-MM-DD (預設為現在)")
+    parser.add_argument("--kinds", nargs="+", default=["fills", "orders"], choices=list(KINDS))
+    parser.add_argument("--out", default="exports")
+    parser.add_argument("--rate", type=float, default=8.0, help="每秒最多請求數")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--window-days", type=float, default=1)
+    args = parser.parse_args()
+
+    end_ms = _parse_date(args.end) if args.end else int(time.time() * 1000)
+    exporter = HistoryExporter(WeexClient(), out_dir=args.out, rate=args.rate,
+                               workers=args.workers, window_days=args.window_days)
+    counts = exporter.export(args.symbol, _parse_date(args.start), end_ms, tuple(args.kinds))
+    print(f"✅ 匯出完成: {counts}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""
+緊急全平 (Kill Switch)
+
+一次對所有帳戶、所有交易對：
+1. 並行送出：撤銷普通掛單 + 撤銷計畫單 (止盈止損) + 市價全平倉
+2. 以全新的倉位 / 掛單查詢驗證結果，不相信下單 API 的回傳；
+   撤單是帳戶層級 (所有交易對)，驗證也涵蓋合約列表 (get_contracts) 上的每個交易對，
+   合約列表取不到時只驗證指定的交易對，並且不回報「已清空」
+3. 若仍有殘留，針對殘留的交易對重試，直到清空或超過期限 (deadline)
+4. 回報每個帳戶與整體的「歸零時間」(time-to-flat)
+
+帳戶 = config 的主帳戶 + config.ACCOUNTS 的所有子帳戶。
+驗證查詢使用 strict 模式：連線失敗 / API 錯誤不會被當成「沒有倉位」，而是視為未確認並持續重試到期限。
+
+所有請求都在 WeexClient.priority() 區塊內送出，期間同一 client 上的其他一般請求會先暫停。
+機器人在另一個行程執行，priority() 擋不到它，所以開始前會先寫入停機旗標檔 (HALT_FILE)：
+main.py 下單前與 Supervisor 每次檢查都會讀取，旗標存在時不再進場，直到 --resume 清除。
+
+使用方式：
+    python kill_switch.py            # 互動確認
+    python kill_switch.py --yes      # 直接執行
+    python kill_switch.py --resume   # 清除停機旗標，機器人恢復進場
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime
+import config
+from exchange_client import WeexClient
+from account_fanout import load_accounts
+
+
+def halt_file():
+    return getattr(config, "HALT_FILE", "data/HALT")
+
+
+def halt(reason="kill switch"):
+    """寫入停機旗標檔 (跨行程)：機器人看到後停止進場"""
+    path = halt_file()
+    if not path:
+        return None
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"reason": reason, "pid": os.getpid(), "time": datetime.now().isoformat(timespec="seconds")},
+                  f, ensure_ascii=False)
+    print(f"⛔ 已寫入停機旗標 {path}，機器人將停止進場")
+    return path
+
+
+def clear_halt():
+    """清除停機旗標，回傳是否原本存在"""
+    path = halt_file()
+    if not path or not os.path.exists(path):
+        return False
+    os.remove(path)
+    print(f"▶️ 已清除停機旗標 {path}")
+    return True
+
+
+def is_halted():
+    """停機旗標存在時回傳原因，否則回傳 None (每次下單前呼叫，只做一次 stat)"""
+    path = halt_file()
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f).get("reason") or "halted"
+    except (OSError, ValueError):
+        return "halted"  # 檔案損毀或正在寫入，仍視為停機
+
+
+def _call(client, fn, *args, **kwargs):
+    """在優先通道中執行單一請求，錯誤以結果回傳而不是丟出"""
+    with client.priority():
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            return {"error": str(e)}
+
+
+def _position_size(p):
+    return float(p.get('hold_vol') or p.get('size') or 0)
+
+
+def _contract_symbols(items):
+    """合約列表中的所有交易對；查詢失敗時回傳 None"""
+    if not isinstance(items, list) or not items:
+        return None
+    return {item["symbol"] for item in items if isinstance(item, dict) and item.get("symbol")} or None
+
+
+def fetch_residual(client, pool, symbols):
+    """
+    以全新查詢取得殘留狀態
+    回傳 {symbol: {"positions": n, "orders": n, "plans": n}}，只包含仍有殘留的交易對
+    """
+    positions = _call(client, client.get_all_positions, strict=True)
+    if not isinstance(positions, list):
+        positions = None  # 查詢失敗，視為未確認
+    open_positions = [p for p in positions or [] if _position_size(p) > 0]
+    symbols = set(symbols) | {p.get('symbol') for p in open_positions}
+
+    order_futs = {s: pool.submit(_call, client, client.get_open_orders, s, strict=True) for s in symbols}
+    plan_futs = {s: pool.submit(_call, client, client.get_current_plan_orders, s, strict=True) for s in symbols}
+
+    residual = {}
+    for s in symbols:
+        orders = order_futs[s].result()
+        plans = plan_futs[s].result()
+        state = {
+            "positions": sum(1 for p in open_positions if p.get('symbol') == s) if positions is not None else -1,
+            "orders": len(orders) if isinstance(orders, list) else -1,
+            "plans": len(plans) if isinstance(plans, list) else -1,
+        }
+        # -1 代表查詢失敗，不能當作已清空
+        if any(v != 0 for v in state.values()):
+            residual[s] = state
+    return residual
+
+
+def flatten_account(client, pool, symbols, deadline, retry_interval=0.3, name="default"):
+    """單一帳戶的撤單 + 平倉 + 驗證流程"""
+    started = time.time()
+    attempts = 0
+
+    # 合約列表與第一輪同時查詢，用來驗證所有交易對 (帳戶層級的撤單涵蓋的範圍)
+    contracts = pool.submit(_call, client, client.get_contracts)
+    # 第一輪：帳戶層級的撤單與平倉同時送出 (不帶 symbol = 全部交易對)
+    futures = [contracts,
+        pool.submit(_call, client, client.cancel_all_orders, None, "normal"),
+        pool.submit(_call, client, client.cancel_all_orders, None, "plan"),
+        pool.submit(_call, client, client.close_all_positions, None),
+    ]
+    # 針對已知交易對也同步送出，避免帳戶層級請求單點失敗
+    for s in symbols:
+        futures += [
+            pool.submit(_call, client, client.cancel_all_orders, s, "normal"),
+            pool.submit(_call, client, client.cancel_all_orders, s, "plan"),
+            pool.submit(_call, client, client.close_all_positions, s),
+        ]
+    wait(futures, timeout=max(deadline - time.time(), 0))
+    attempts += 1
+
+    all_symbols = _contract_symbols(contracts.result()) if contracts.done() else None
+    if all_symbols is None:
+        print(f"⚠️ [{name}] 無法取得合約列表，只能驗證 {sorted(symbols)} 與有倉位的交易對")
+    checked = set(symbols) | (all_symbols or set())
+    residual = fetch_residual(client, pool, checked)
+    while residual and time.time() < deadline:
+        print(f"🔁 [{name}] 第 {attempts} 輪後仍有殘留: {residual}，重試中...")
+        time.sleep(retry_interval)
+        futures = []
+        for s, state in residual.items():
+            if state["orders"] != 0:
+                futures.append(pool.submit(_call, client, client.cancel_all_orders, s, "normal"))
+            if state["plans"] != 0:
+                futures.append(pool.submit(_call, client, client.cancel_all_orders, s, "plan"))
+            if state["positions"] != 0:
+                futures.append(pool.submit(_call, client, client.close_all_positions, s))
+        wait(futures, timeout=max(deadline - time.time(), 0))
+        attempts += 1
+        residual = fetch_residual(client, pool, residual.keys())
+
+    elapsed = time.time() - started
+    # 沒有驗證到所有交易對時不能宣稱已清空 (其他交易對可能還有掛單)
+    flat = not residual and all_symbols is not None
+    return {
+        "account": name,
+        "flat": flat,
+        "time_to_flat": round(elapsed, 3) if flat else None,
+        "elapsed": round(elapsed, 3),
+        "attempts": attempts,
+        "residual": residual,
+        "symbols_checked": len(checked),
+        "all_symbols": all_symbols is not None,
+    }
+
+
+def flatten_all(clients=None, symbols=None, deadline_seconds=15, max_workers=32):
+    """
+    對所有帳戶並行執行 kill switch
+    clients: {名稱: client} 或 client 列表；預設為 config 的主帳戶 + config.ACCOUNTS 的所有子帳戶
+    """
+    if clients is None:
+        clients = {"default": WeexClient()}
+        clients.update({account.name: account.client for account in load_accounts()})
+    elif not isinstance(clients, dict):
+        clients = {f"account_{i}": c for i, c in enumerate(clients)}
+    symbols = list(symbols or [config.SYMBOL])
+
+    started = time.time()
+    deadline = started + deadline_seconds
+    print(f"🛑 [Kill Switch] 啟動 | 帳戶數 {len(clients)} | 交易對 {symbols} | 期限 {deadline_seconds}s")
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool, \
+            ThreadPoolExecutor(max_workers=max(len(clients), 1)) as account_pool:
+        futures = {
+            name: account_pool.submit(flatten_account, client, pool, symbols, deadline, name=name)
+            for name, client in clients.items()
+        }
+        reports = [f.result() for f in futures.values()]
+
+    total = time.time() - started
+    all_flat = all(r["flat"] for r in reports)
+    for r in reports:
+        icon = "🟢 已清空" if r["flat"] else ("🔴 未清空" if r["residual"] else "🟡 未能驗證所有交易對")
+        print(f"  • {r['account']}: {icon} | 耗時 {r['elapsed']}s | 輪數 {r['attempts']} | "
+              f"驗證 {r['symbols_checked']} 個交易對 | 殘留 {r['residual'] or '-'}")
+    print(f"⏱️ 總歸零時間 (time-to-flat): {total:.3f}s" if all_flat else
+          f"⚠️ 期限內未能全部清空，已耗時 {total:.3f}s，請立即人工處理！")
+    return {"flat": all_flat, "time_to_flat": round(total, 3) if all_flat else None, "accounts": reports}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="緊急全平 (撤銷所有掛單/計畫單並市價平倉)")
+    parser.add_argument("--yes", action="store_true", help="跳過確認")
+    parser.add_argument("--deadline", type=float, default=15, help="最長重試時間 (秒)")
+    parser.add_argument("--symbol", action="append", help="額外要驗證的交易對 (可重複)")
+    parser.add_argument("--resume", action="store_true", help="清除停機旗標 (不平倉)，機器人恢復進場")
+    args = parser.parse_args()
+
+    if args.resume:
+        if not clear_halt():
+            print(f"ℹ️ 沒有停機旗標 ({halt_file()})")
+        return
+
+    if not args.yes:
+        confirm = input("🚨 即將撤銷所有掛單並市價平倉【所有帳戶、所有交易對】，請輸入 'YES' 確認: ")
+        if confirm != 'YES':
+            print("❌ 未輸入 YES，操作取消。")
+            return
+    # 先停機再平倉，避免機器人在平倉期間重新進場
+    halt("kill switch")
+    flatten_all(symbols=args.symbol, deadline_seconds=args.deadline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+延遲載入工具
+
+pandas / pandas_ta / openai 的 import 各要數百毫秒，直接在模組頂端 import 會拖慢冷啟動。
+lazy_module() 回傳一個代理物件，第一次存取屬性時才真正 import；
+preload() 則在背景執行緒提前載入，讓 WebSocket 連線與歷史資料下載可以同時進行。
+"""
+import importlib
+import threading
+import types
+
+
+class LazyModule(types.ModuleType):
+    def __init__(self, name):
+        super().__init__(name)
+        self.__dict__["_lazy_lock"] = threading.Lock()
+        self.__dict__["_lazy_module"] = None
+
+    def _load(self):
+        module = self.__dict__["_lazy_module"]
+        if module is None:
+            with self.__dict__["_lazy_lock"]:
+                module = self.__dict__["_lazy_module"]
+                if module is None:
+                    module = importlib.import_module(self.__name__)
+                    self.__dict__["_lazy_module"] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+
+def lazy_module(name):
+    return LazyModule(name)
+
+
+def preload(*modules):
+    """在背景執行緒載入模組 (LazyModule 或模組名稱)，回傳該執行緒"""
+    def _run():
+        for m in modules:
+            try:
+                if isinstance(m, LazyModule):
+                    m._load()
+                else:
+                    importlib.import_module(m)
+            except Exception as e:
+                print(f"⚠️ 背景載入 {getattr(m, '__name__', m)} 失敗: {e}")
+
+    t = threading.Thread(target=_run, name="preload", daemon=True)
+    t.start()
+    return t
@@ -0,0 +1,394 @@
+"""
+行情負載產生器 (Load Generator)
+
+在加入更多交易對之前，先量出 MarketStream + callback_wrapper 每秒能處理多少訊息才開始落後：
+
+- 伺服器端：weex_simulator.WeexSimulator 跑在「獨立子行程」(不與被測程式搶 GIL)，
+  N 個交易對 × M 個週期的 kline 頻道，每根 K 線的 OHLC / 成交量逐筆累積，附帶送出時間 (sentAt)；
+  可加上定期突發 (--burst-every / --burst-size) 與伺服器 ping (--ping-interval)
+- 客戶端：每個交易對一條真正的 MarketStream 連線 (websocket-client)，回呼為 main.make_tick_handler
+  產生的 callback_wrapper (StrategyManager + PaperClient + 本地 AI 後端，不送出任何外部請求)
+- 逐段提高總推送速率 (--rates)，每段量測：實際送出 / 處理完成的 msg/s、排隊延遲 (送出 → 回呼結束)
+  p50 / p99 / max、本行程 CPU 時間 (換算每核心每秒可處理的訊息數) 與 RSS 記憶體成長
+- 「可承受」的條件：處理量 ≥ 送出量的 95%、且 p99 延遲 ≤ --max-lag-ms；第一段不可承受後停止加壓
+
+使用方式：
+    python load_generator.py --symbols 10 --intervals MINUTE_1,MINUTE_15 --rates 500,1000,2000,4000,8000
+    python load_generator.py --symbols 50 --burst-every 1 --burst-size 3 --duration 10
+    python load_generator.py --symbols 10 --bare   # 空回呼：只量 MarketStream 本身 (解析 + 分派)
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import threading
+import time
+from contextlib import nullcontext, redirect_stdout
+
+import config
+from market_stream import MarketStream
+from weex_simulator import WeexSimulator, INTERVAL_MS, WS_INTERVAL_MAP
+
+SENT_AT_MARKER = '"sentAt": '
+
+
+class LoadFrameFactory:
+    """
+    逐頻道維護當根 K 線 (開盤價 / 最高 / 最低 / 累積成交量)，換根時重新開盤
+    推送格式與交易所相同，最後附上送出時間 sentAt (MarketStream 不會讀取這個欄位)
+    """
+
+    def __init__(self, price_model, seed=5):
+        self.prices = price_model
+        self.rng = random.Random(seed)
+        self.candles = {}
+
+    def __call__(self, channel):
+        parts = channel.split(".")
+        symbol, interval = parts[2], parts[3]
+        price = self.prices.step(symbol)
+        now = time.time()
+        now_ms = int(now * 1000)
+        step_ms = INTERVAL_MS.get(WS_INTERVAL_MAP.get(interval, "1m"), 60_000)
+        start = now_ms - now_ms % step_ms
+        candle = self.candles.get(channel)
+        if candle is None or candle["start"] != start:
+            candle = self.candles[channel] = {"start": start, "open": price, "high": price, "low": price,
+                                              "volume": 0.0}
+        candle["high"] = max(candle["high"], price)
+        candle["low"] = min(candle["low"], price)
+        candle["volume"] += abs(self.rng.gauss(0.5, 0.2))
+        return {
+            "event": "payload",
+            "channel": channel,
+            "data": [{
+                "symbol": symbol, "startTime": str(start),
+                "open": f"{candle['open']:.2f}", "high": f"{candle['high']:.2f}", "low": f"{candle['low']:.2f}",
+                "close": f"{price:.2f}", "volume": f"{candle['volume']:.4f}", "ts": str(now_ms),
+            }],
+            "sentAt": now,
+        }
+
+
+def sent_at(message):
+    """從原始訊息尾端取出 sentAt (不重新解析整份 JSON)；沒有則回傳 None (ping、訂閱確認等)"""
+    idx = message.rfind(SENT_AT_MARKER)
+    if idx < 0:
+        return None
+    try:
+        return float(message[idx + len(SENT_AT_MARKER):message.rindex("}")])
+    except ValueError:
+        return None
+
+
+def rss_mb():
+    """本行程目前的常駐記憶體 (MB)；無法取得時回傳 None"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, AttributeError, IndexError):
+        pass
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # Linux 為 KB (峰值)
+    except (ImportError, OSError):
+        return None
+
+
+def _percentile(ordered, pct):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class LagRecorder:
+    """記錄每筆 kline 從伺服器送出到回呼處理完的延遲 (各 MarketStream 執行緒共用)"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = []
+        self.total = 0
+
+    def record(self, message):
+        sent = sent_at(message)
+        if sent is None:
+            return
+        lag = time.time() - sent
+        with self.lock:
+            self.samples.append(lag)
+            self.total += 1
+
+    def take(self):
+        with self.lock:
+            samples, self.samples = self.samples, []
+        return samples
+
+
+def _serve(conn, options):
+    """子行程：啟動模擬交易所，依父行程的指令調整推送速率 / 回報統計"""
+    with redirect_stdout(open(os.devnull, "w", encoding="utf-8")):
+        sim = WeexSimulator(symbols=options["symbols"], push_rate=0, verify_signature=False,
+                            burst_every=options["burst_every"], burst_size=options["burst_size"],
+                            ping_interval=options["ping_interval"]).start()
+    sim.frame_factory = LoadFrameFactory(sim.prices)
+    conn.send(sim.ws_url)
+    try:
+        while True:
+            command, arg = conn.recv()
+            if command == "rate":
+                sim.push_rate = arg
+                conn.send(True)
+            elif command == "stats":
+                conn.send({"ws_messages": sim.stats["ws_messages"],
+                           "connections": len(sim._snapshot_connections()),
+                           "channels": sum(len(c.channels) for c in sim._snapshot_connections())})
+            else:
+                break
+    except EOFError:
+        pass
+    finally:
+        sim.stop()
+
+
+class LoadServer:
+    """父行程端的子行程控制介面"""
+
+    def __init__(self, symbols, burst_every=0, burst_size=0, ping_interval=5):
+        self.conn, child = multiprocessing.Pipe()
+        options = {"symbols": list(symbols), "burst_every": burst_every, "burst_size": burst_size,
+                   "ping_interval": ping_interval}
+        self.process = multiprocessing.Process(target=_serve, args=(child, options), daemon=True)
+        self.process.start()
+        self.ws_url = self.conn.recv()
+
+    def set_rate(self, per_channel_rate):
+        self.conn.send(("rate", per_channel_rate))
+        self.conn.recv()
+
+    def stats(self):
+        self.conn.send(("stats", None))
+        return self.conn.recv()
+
+    def stop(self):
+        try:
+            self.conn.send(("stop", None))
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+def bot_handler_factory(symbols, start_price=95000.0):
+    """
+    每個交易對一組 StrategyManager + PaperClient，回傳 factory(symbol) -> 真正的 callback_wrapper
+    歷史 K 線的指標以 main.refresh_history_many 對所有交易對一次向量化計算 (多交易對部署的啟動方式)
+    """
+    import main as bot
+    from ai_provider import AIRouter, LocalProvider
+    from paper_client import PaperClient
+    from replay import ReplayMarketClient
+    from trade_journal import get_journal
+    from weex_simulator import PriceModel
+    import ai_logger
+
+    get_journal(":memory:")  # 先建立日誌實例，避免寫進正式的交易日誌
+    ai_logger.set_log_file(None)  # 本地 AI Log 也不寫入 logs/ai_history.jsonl
+
+    handlers = {}
+    strategies = []
+    for symbol in symbols:
+        client = PaperClient(market_client=ReplayMarketClient(PriceModel([bot.SYMBOL], start_price=start_price)))
+        strategy = bot.StrategyManager(client, seed_history=False, ai=AIRouter([LocalProvider(name="load")]))
+        strategies.append(strategy)
+        handlers[symbol] = bot.make_tick_handler(strategy, client, paper_trading=True, refresh_history=False)
+    bot.refresh_history_many(strategies)
+    return handlers.__getitem__
+
+
+def bare_handler_factory():
+    """空回呼：只量 MarketStream 的收訊、解析與分派"""
+    return lambda symbol: (lambda interval, price: None)
+
+
+def evaluate_stage(stage, max_lag_ms, min_delivery=0.95):
+    """處理量跟得上送出量、且 p99 延遲在門檻內才算可承受"""
+    sent = stage["sent"]
+    stage["sustained"] = (sent > 0 and stage["delivered"] >= sent * min_delivery
+                          and stage["lag_p99_ms"] is not None and stage["lag_p99_ms"] <= max_lag_ms)
+    # 伺服器送不到目標速率 (產生器本身是瓶頸) 時結果只是下限
+    stage["generator_bound"] = stage["sent_per_s"] < stage["target"] * 0.9
+    return stage
+
+
+def find_saturation(stages):
+    """最高的可承受處理量 (msg/s) 與該段的每核心處理量；沒有任何一段可承受時回傳 None"""
+    sustained = [s for s in stages if s["sustained"]]
+    if not sustained:
+        return None
+    best = max(sustained, key=lambda s: s["delivered_per_s"])
+    return {"throughput": best["delivered_per_s"], "per_core": best["per_core"], "target": best["target"]}
+
+
+def run_load(symbols=10, intervals=("MINUTE_1", "MINUTE_15"), rates=(500, 1000, 2000, 4000), duration=5.0,
+             burst_every=0, burst_size=0, ping_interval=5, max_lag_ms=100.0, handler_factory=None,
+             stop_on_saturation=True, quiet=True):
+    """
+    依序以各總速率 (msg/s) 加壓，回傳 {"stages": [...], "saturation": ..., ...}
+    handler_factory(symbol) -> callback(interval, price)；預設為真正的 callback_wrapper
+    """
+    names = [f"cmt_load{i:03d}usdt" for i in range(symbols)]
+    channels = symbols * len(intervals)
+    server = LoadServer(names, burst_every=burst_every, burst_size=burst_size, ping_interval=ping_interval)
+    recorder = LagRecorder()
+    disconnects = []
+    streams = []
+    out = open(os.devnull, "w", encoding="utf-8") if quiet else None
+    stages = []
+    try:
+        with redirect_stdout(out) if quiet else nullcontext():
+            factory = handler_factory or bot_handler_factory(names)
+            rss_before_streams = rss_mb()
+            for name in names:
+                stream = MarketStream(name, list(intervals), factory(name), url=server.ws_url)
+                stream_on_message = stream.on_message
+
+                def on_message(ws, message, _handle=stream_on_message):
+                    _handle(ws, message)
+                    recorder.record(message)
+
+                # 不自動重連：負載測試中斷線直接記錄
+                stream.on_message = on_message
+                stream.on_close = lambda ws, code, msg, _name=name: disconnects.append(_name)
+                stream.start()
+                streams.append(stream)
+
+            deadline = time.time() + 30
+            while server.stats()["channels"] < channels and time.time() < deadline:
+                time.sleep(0.05)
+            rss_start = rss_mb()
+
+            for target in rates:
+                per_channel = target / channels
+                server.set_rate(per_channel)
+                time.sleep(min(1.0, duration / 5))  # 暖身，讓佇列達到穩態
+                recorder.take()
+                before = server.stats()["ws_messages"]
+                cpu_before = time.process_time()
+                rss_before = rss_mb()
+                started = time.perf_counter()
+                time.sleep(duration)
+                elapsed = time.perf_counter() - started
+                samples = sorted(recorder.take())
+                cpu = time.process_time() - cpu_before
+                sent = server.stats()["ws_messages"] - before
+                rss_after = rss_mb()
+                stage = evaluate_stage({
+                    "target": target,
+                    "per_channel_rate": per_channel,
+                    "sent": sent,
+                    "sent_per_s": sent / elapsed,
+                    "delivered": len(samples),
+                    "delivered_per_s": len(samples) / elapsed,
+                    "lag_p50_ms": _percentile(samples, 50) * 1000 if samples else None,
+                    "lag_p99_ms": _percentile(samples, 99) * 1000 if samples else None,
+                    "lag_max_ms": samples[-1] * 1000 if samples else None,
+                    "cpu_s": cpu,
+                    "cpu_util": cpu / elapsed,
+                    # 每核心每秒可處理的訊息數 = 處理量 / 消耗的 CPU 秒數
+                    "per_core": len(samples) / cpu if cpu > 0 else None,
+                    "rss_growth_mb": (rss_after - rss_before) if rss_before is not None else None,
+                }, max_lag_ms)
+                stages.append(stage)
+                if stop_on_saturation and not stage["sustained"]:
+                    break
+
+            server.set_rate(0)
+            # 等積壓的訊息處理完，才量最終記憶體 (仍持續成長代表有洩漏)
+            last_total, settle_deadline = -1, time.time() + 10
+            while recorder.total != last_total and time.time() < settle_deadline:
+                last_total = recorder.total
+                time.sleep(0.3)
+            rss_end = rss_mb()
+            disconnect_count = len(disconnects)  # 之後的斷線是收尾時主動關閉
+    finally:
+        for stream in streams:
+            try:
+                stream.ws.close()
+            except Exception:
+                pass
+        server.stop()
+        if out is not None:
+            out.close()
+
+    return {
+        "symbols": symbols,
+        "intervals": list(intervals),
+        "channels": channels,
+        "cpu_count": os.cpu_count(),
+        "stages": stages,
+        "saturation": find_saturation(stages),
+        "rss_streams_mb": (rss_start - rss_before_streams) if rss_before_streams is not None else None,
+        "rss_growth_mb": (rss_end - rss_start) if rss_start is not None else None,
+        "disconnects": disconnect_count,
+    }
+
+
+def print_report(report):
+    print(f"\n🏋️ 負載測試: {report['symbols']} 交易對 × {len(report['intervals'])} 週期 = {report['channels']} 頻道 "
+          f"| CPU 核心數 {report['cpu_count']}")
+    print(f"{'目標(msg/s)':>12}{'送出/s':>10}{'處理/s':>10}{'p50(ms)':>10}{'p99(ms)':>10}{'max(ms)':>10}"
+          f"{'CPU%':>7}{'每核心/s':>11}{'RSS+MB':>8}  結果")
+    for s in report["stages"]:
+        fmt = lambda v, spec: format(v, spec) if v is not None else "-"
+        verdict = "✅" if s["sustained"] else "❌ 落後"
+        if s["generator_bound"]:
+            verdict += " (產生器未達目標)"
+        print(f"{s['target']:>12,.0f}{s['sent_per_s']:>10,.0f}{s['delivered_per_s']:>10,.0f}"
+              f"{fmt(s['lag_p50_ms'], '>10.1f')}{fmt(s['lag_p99_ms'], '>10.1f')}{fmt(s['lag_max_ms'], '>10.1f')}"
+              f"{s['cpu_util'] * 100:>7.0f}{fmt(s['per_core'], '>11,.0f')}{fmt(s['rss_growth_mb'], '>8.1f')}  {verdict}")
+    saturation = report["saturation"]
+    if saturation:
+        print(f"📈 飽和前最高處理量: {saturation['throughput']:,.0f} msg/s "
+              f"(每核心約 {saturation['per_core']:,.0f} msg/CPU 秒)")
+    else:
+        print("📉 第一段即無法承受，請降低 --rates")
+    print(f"🧠 記憶體: 建立連線 +{report['rss_streams_mb'] or 0:.1f} MB | 全程成長 {report['rss_growth_mb'] or 0:+.1f} MB "
+          f"| 斷線 {report['disconnects']} 次")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MarketStream + callback_wrapper 負載測試")
+    parser.add_argument("--symbols", type=int, default=10, help="交易對數 (每個一條 WebSocket 連線)")
+    parser.add_argument("--intervals", default=f"MINUTE_1,{getattr(config, 'STRATEGY_INTERVAL', 'MINUTE_15')}",
+                        help="逗號分隔的週期 (預設與 main.py 的 INTERVALS 相同)")
+    parser.add_argument("--rates", default="500,1000,2000,4000,8000,16000", help="逗號分隔的總推送速率 (msg/s)")
+    parser.add_argument("--duration", type=float, default=5.0, help="每段量測秒數")
+    parser.add_argument("--burst-every", type=float, default=0, help="每 N 秒一次突發")
+    parser.add_argument("--burst-size", type=int, default=0, help="突發時每個頻道額外推送的訊息數")
+    parser.add_argument("--ping-interval", type=float, default=5, help="伺服器 ping 間隔 (秒)")
+    parser.add_argument("--max-lag-ms", type=float, default=100.0, help="p99 延遲超過此值視為落後")
+    parser.add_argument("--bare", action="store_true", help="使用空回呼，只量 MarketStream 本身")
+    parser.add_argument("--no-stop", action="store_true", help="落後後仍跑完所有速率")
+    parser.add_argument("--json", help="將報表寫入 JSON 檔")
+    parser.add_argument("--verbose", action="store_true", help="顯示策略輸出")
+    args = parser.parse_args()
+
+    report = run_load(
+        symbols=args.symbols,
+        intervals=[s.strip() for s in args.intervals.split(",") if s.strip()],
+        rates=[float(r) for r in args.rates.split(",") if r.strip()],
+        duration=args.duration, burst_every=args.burst_every, burst_size=args.burst_size,
+        ping_interval=args.ping_interval, max_lag_ms=args.max_lag_ms,
+        handler_factory=bare_handler_factory() if args.bare else None,
+        stop_on_saturation=not args.no_stop, quiet=not args.verbose,
+    )
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,75 +1,245 @@
 import time
-import pandas as pd
-import pandas_ta as ta
+import threading
 import json
+import numpy as np
 from datetime import datetime, timedelta
-from openai import OpenAI  # [修改] 匯入 OpenAI
+from decimal import Decimal
+from lazy_import import lazy_module, preload
 from exchange_client import WeexClient
+from paper_client import PaperClient
 from market_stream import MarketStream
+from market_data_daemon import MarketDataClient
+from order_book import OrderBook, plan_market_order, plan_ladder, BUY
+from market_recorder import MarketRecorder
+from trigger_plan import build_trigger_plan
+from contract_info import ContractInfoCache
+from order_tracker import OrderTracker, UNKNOWN
+from supervisor import Supervisor, interval_seconds
+from profiler import SamplingProfiler, register_routes, install_signal_handlers
+from state_snapshot import SnapshotWriter, load_snapshot, missing_candles, merge_candles
+from account_fanout import FanoutDispatcher, load_accounts, risk_check
+from ai_provider import build_router
+import indicators
+from event_bus import EventBus, TICK, CANDLE_CLOSED, SIGNAL, AI_VERDICT, ORDER_SUBMITTED, ORDER_ACKED
+from kill_switch import is_halted
 import config
 from ai_logger import save_local_log
+from trade_journal import get_journal
+
+# 啟動計時 (用於量測 import 與首次決策耗時)
+PROCESS_START = time.perf_counter()
+
+# pandas / openai 延遲載入：第一次使用時才 import，或由 preload() 在背景提前載入
+# (RSI / 布林通道由 indicators.py 以 NumPy 計算，不再需要 pandas_ta)
+pd = lazy_module("pandas")
+openai = lazy_module("openai")
 
 DECISION_AI = "AI_ASSISTED"
 DECISION_RULE = "RULE_BASED"
 
 
-# 初始化 OpenAI Client
-ai_client = OpenAI(api_key=config.OPENAI_API_KEY)
-
 # 仍然保留這兩個方便調用的常數，但指向 Config
 SYMBOL = config.SYMBOL
 STRATEGY_INTERVAL = config.STRATEGY_INTERVAL
 
 # 始終訂閱 MINUTE_1 (監控用) + 策略設定的週期 (分析用)
-INTERVALS = ["MINUTE_1", STRATEGY_INTERVAL] 
+INTERVALS = ["MINUTE_1", STRATEGY_INTERVAL]
 
+# 策略使用的歷史 K 線根數
+HISTORY_LIMIT = 100 
 
-AI_TEMPERATURE = 0.4 if config.AI_TEMPERATURE is None else config.AI_TEMPERATURE
-AI_MAX_TOKENS = 400 if config.AI_MAX_TOKENS is None else config.AI_MAX_TOKENS
 
 class StrategyManager:
-    def __init__(self, client):
+    def __init__(self, client, seed_history=True, bus=None, ai=None, ai_batcher=None):
         self.client = client
-        self.history_df = pd.DataFrame()
+        # AI 決策後端 (截止時間 / 對沖 / 延遲統計)，見 ai_provider.py
+        self.ai = ai if ai is not None else build_router()
+        # 多交易對批次評估 (ai_batcher.py)：只用於多交易對部署 (多個 StrategyManager 共用同一個 batcher)，
+        # main() 的單一交易對機器人不使用
+        self.ai_batcher = ai_batcher
+        # 事件匯流排：AI Log 上傳、本地 Log、交易日誌都在各自的執行緒處理，不佔用行情執行緒
+        self.bus = bus if bus is not None else EventBus()
+        self.bus.subscribe("ai_log_upload", self._upload_ai_log, types=[AI_VERDICT], maxsize=100)
+        self.bus.subscribe("trade_log", self._log_order, types=[ORDER_ACKED], maxsize=1000, policy="block")
+        self.history_df = None  # 首次 refresh_history 後才是 DataFrame (避免建構時就載入 pandas)
         self.last_trade_time = datetime.min
         self.last_ai_req_time = 0  # [新增] AI 請求冷卻計時器
         self.prev_high = 0.0
         self.prev_low = 0.0
+        self.history_ready = threading.Event()
+        self.order_book = None  # L2 訂單簿 (由 MarketStream 維護)，用於滑價感知的下單
+        self.trigger_plan = None  # 每根 K 線預先算好的觸發價位 (見 trigger_plan.py)
+        self.history_lock = threading.Lock()  # history_df 與 trigger_plan 一起更新 / 讀取
+        self.contracts = None  # 合約規格快取 (ContractInfoCache)，用於下單前取整與檢查
+        # 訂單狀態機 (以 client_oid 為鍵)：逾時以同一 client_oid 重送，未知狀態批次對帳
+        self.orders = OrderTracker(client, max_attempts=getattr(config, "ORDER_MAX_ATTEMPTS", 3))
+        self.first_decision_at = None
+        self.last_history_refresh = 0.0  # 最後一次成功更新歷史 K 線的時間 (supervisor 監控用)
+        self.pause_reasons = {}  # 暫停交易的原因 (由 supervisor 設定)，非空時不進場
+        self._seed_thread = None
+        self.raw_klines = []  # 目前 history_df 的原始 K 線 (依時間排序)，寫入狀態快照用
+        self.snapshot_path = None  # 設定後，更新歷史 / 下單 / 呼叫 AI 時寫入狀態快照 (見 state_snapshot.py)
+        self.snapshot_writer = None  # 第一次寫入時建立 (背景執行緒寫檔，不佔用行情執行緒)
+        self.accounts = None  # 多帳戶分派 (FanoutDispatcher)；設定後下單改為同時送到各子帳戶
+        self.market_data = client  # 歷史 K 線來源；使用行情常駐程序時替換為 MarketDataClient
         
-        # 初始化數據
-        self.refresh_history()
+        # 初始化數據 (seed_history=False 時由呼叫端以 seed_history_async() 背景載入)
+        if seed_history:
+            self.refresh_history()
 
-    def check_risk_limits(self):
-        """[新增] 風險檢查：避免訂單過多或倉位過大"""
-        # 1. 檢查掛單數量
-        open_orders = self.client.get_open_orders(config.SYMBOL)
-        if len(open_orders) >= config.MAX_OPEN_ORDERS:
-            print(f"🚫 [風控攔截] 掛單過多 ({len(open_orders)} 張)，停止下單。")
-            return False
+    # --- 事件訂閱者 (在匯流排的工作執行緒中執行) ---
+    def _upload_ai_log(self, event):
+        self.client.upload_ai_log(**event.data)
 
-        # 2. 檢查持倉數量
-        positions = self.client.get_all_positions(config.SYMBOL)
-        valid_positions = [p for p in positions if float(p.get('hold_vol', 0) or p.get('size', 0)) > 0]
-        if len(valid_positions) >= config.MAX_POSITIONS:
-            print(f"🚫 [風控攔截] 已有倉位 ({len(valid_positions)} 個)，停止下單。")
-            return False
-            
-        # 3. 持倉 size
-        total_position_size = 0.0
+    def _log_order(self, event):
+        data = event.data
+        result = data["result"]
+        order_id = result.get("order_id") if isinstance(result, dict) else None
+        client_oid = result.get("client_oid") if isinstance(result, dict) else None
 
-        for p in positions:
-            size = float(p.get('hold_vol') or p.get('size') or 0)
-            if size > 0:
-                total_position_size += size    
-        
-            # 3. 【新增】總持倉 size 上限
-        if total_position_size >= config.MAX_POSITION_SIZE:
-            print(
-                f"🚫 [風控攔截] 總持倉 size 過大 "
-                f"({total_position_size:.4f} >= {config.MAX_POSITION_SIZE})，停止下單。"
+        # 寫入交易日誌 (策略名稱只有在這裡知道，平倉成交會依此歸屬)
+        if order_id or client_oid:
+            try:
+                get_journal().record_order(
+                    order_id=order_id, client_oid=client_oid,
+                    symbol=SYMBOL, strategy=data["strategy"], side=1, size=data["size"], price=data["price"],
+                    take_profit=data["take_profit"], stop_loss=data["stop_loss"],
+                    decision_source=data["decision_source"], payload=result
+                )
+            except Exception as e:
+                print(f"❌ 交易日誌寫入失敗: {e}")
+
+        # 統一寫本機決策 log（不管 AI / 非 AI）
+        log_payload = {
+            "strategy": data["strategy"],
+            "decision_source": data["decision_source"],
+            "symbol": config.SYMBOL,
+            "price": data["price"],
+            "timestamp": int(event.ts * 1000)
+        }
+        if data.get("context"):
+            log_payload["context"] = data["context"]
+
+        save_local_log(
+            stage="Trade Execution",
+            model=data["decision_source"],
+            input_data=log_payload,
+            output_data={
+                "order_id": order_id,
+                "client_oid": client_oid,
+                "action": "OPEN_LONG"
+            },
+            explanation=(
+                "Trade executed automatically based on AI-assisted decision."
+                if data["decision_source"] == DECISION_AI
+                else
+                "Trade executed automatically based on predefined rule-based strategy."
             )
-            return False
-        return True
+        )
+
+    def has_history(self):
+        return self.history_df is not None and not self.history_df.empty
+
+    def seed_history_async(self, candles=None):
+        """
+        背景下載歷史 K 線，讓 WebSocket 可以同時連線 (上一次還在下載時不重複啟動)
+        candles: 快照中的 K 線，提供時只補抓缺少的部分
+        """
+        if self._seed_thread is not None and self._seed_thread.is_alive():
+            return self._seed_thread
+        target = (lambda: self.backfill_history(candles)) if candles else self.refresh_history
+        self._seed_thread = threading.Thread(target=target, name="history-seed", daemon=True)
+        self._seed_thread.start()
+        return self._seed_thread
+
+    # --- 狀態快照 (warm restart) ---
+    def snapshot_state(self):
+        return {
+            "symbol": SYMBOL,
+            "interval": STRATEGY_INTERVAL,
+            "strategy": {
+                "last_trade_time": self.last_trade_time.timestamp() if self.last_trade_time != datetime.min else None,
+                "last_ai_req_time": self.last_ai_req_time,
+                "prev_high": float(self.prev_high),
+                "prev_low": float(self.prev_low),
+                "last_history_refresh": self.last_history_refresh,
+            },
+            "candles": self.raw_klines,
+        }
+
+    def save_snapshot(self, urgent=False):
+        """交給背景寫入器 (間隔 STATE_SNAPSHOT_MIN_INTERVAL 秒合併寫入)；urgent=True 時盡快寫入"""
+        if not self.snapshot_path:
+            return
+        if self.snapshot_writer is None:
+            self.snapshot_writer = SnapshotWriter(
+                self.snapshot_path, min_interval=getattr(config, "STATE_SNAPSHOT_MIN_INTERVAL", 5.0))
+        self.snapshot_writer.request(self.snapshot_state(), urgent=urgent)
+
+    def flush_snapshot(self, timeout=5.0):
+        """關機前寫出最後一份快照"""
+        if self.snapshot_writer is not None:
+            self.snapshot_writer.close(timeout)
+
+    def restore_snapshot(self, snapshot):
+        """還原冷卻計時與策略基準 (不需要網路)，回傳快照中的 K 線供 seed_history_async 補抓"""
+        state = snapshot.get("strategy", {})
+        if state.get("last_trade_time"):
+            self.last_trade_time = datetime.fromtimestamp(state["last_trade_time"])
+        self.last_ai_req_time = max(self.last_ai_req_time, state.get("last_ai_req_time") or 0)
+        self.prev_high = state.get("prev_high", self.prev_high)
+        self.prev_low = state.get("prev_low", self.prev_low)
+        candles = snapshot.get("candles") or []
+        age = time.time() - snapshot.get("saved_at", 0)
+        print(f"♻️ 已還原狀態快照 (保存於 {age:.0f} 秒前) | 上次下單: "
+              f"{self.last_trade_time if self.last_trade_time != datetime.min else '無'} | K 線: {len(candles)} 根")
+        return candles
+
+    def backfill_history(self, candles):
+        """以快照的 K 線為基礎，只補抓之後缺少的 K 線；缺太多就整段重新下載"""
+        interval_ms = interval_seconds(STRATEGY_INTERVAL) * 1000
+        now_ms = int(time.time() * 1000)
+        candles = sorted(candles, key=lambda row: int(row[0]))
+        # 多抓一根：快照時最後一根可能尚未收盤
+        needed = missing_candles(int(candles[-1][0]), now_ms, interval_ms) + 1
+        if needed >= HISTORY_LIMIT:
+            print(f"♻️ 快照缺少 {needed} 根 K 線，改為重新下載")
+            return self.refresh_history()
+
+        new_rows = self.market_data.get_history_candles(
+            symbol=SYMBOL,
+            granularity=self.client._map_interval(STRATEGY_INTERVAL),
+            end_time=now_ms,
+            limit=needed
+        )
+        if not new_rows:
+            print("⚠️ 補抓 K 線失敗，改為重新下載")
+            return self.refresh_history()
+        print(f"♻️ 由快照還原 {len(candles)} 根 K 線，補抓 {len(new_rows)} 根")
+        self._apply_klines(merge_candles(candles, new_rows, HISTORY_LIMIT))
+
+    def pause(self, reason, detail=""):
+        if reason not in self.pause_reasons:
+            print(f"⏸️ 暫停交易 [{reason}] {detail}")
+        self.pause_reasons[reason] = detail
+
+    def resume(self, reason):
+        if self.pause_reasons.pop(reason, None) is not None:
+            print(f"▶️ 恢復交易 [{reason}]" + (f" (仍暫停: {', '.join(self.pause_reasons)})" if self.pause_reasons else ""))
+
+    def check_risk_limits(self):
+        """[新增] 風險檢查：避免訂單過多或倉位過大 (多帳戶時改在各帳戶下單前檢查)"""
+        if self.accounts is not None:
+            return True
+        ok, reason = risk_check(self.client, config.SYMBOL, config.MAX_OPEN_ORDERS,
+                                config.MAX_POSITIONS, config.MAX_POSITION_SIZE)
+        if not ok:
+            print(f"🚫 [風控攔截] {reason}，停止下單。")
+        return ok
+
+    def trackers(self):
+        """所有帳戶的訂單追蹤器 (背景對帳用)"""
+        return [self.orders] + (self.accounts.trackers() if self.accounts is not None else [])
     
     # --- 動態取得布林上軌欄位名 ---
     def _get_bbu_col_name(self, df):
@@ -93,7 +263,10 @@ class StrategyManager:
         )
 
     def consult_ai_agent(self, market_data):
-        """諮詢 OpenAI GPT-4o-mini (傳入歷史 K 線增強分析深度)"""
+        """
+        諮詢 AI 後端 (傳入歷史 K 線增強分析深度)；截止時間內沒有合法回覆時回傳 fallback=True
+        timed_out=True 只在截止時間到仍未回覆時設定 (格式錯誤 / API 錯誤不算)，決定能否改用規則下單
+        """
 
         # 1. 準備最近 30 筆 K 線數據
         try:
@@ -124,7 +297,8 @@ class StrategyManager:
         你的任務是根據提供的歷史數據與當前快照，判斷是否進行「做多 (LONG)」操作。
         """
 
-        user_prompt = f"""
+        # 行情資料 (每個交易對各自一份) 與分析要求 (批次評估時只送一次) 分開建構
+        data_prompt = f"""
         交易對: {config.SYMBOL} ({config.STRATEGY_INTERVAL})
         
         【當前市場快照】
@@ -134,7 +308,9 @@ class StrategyManager:
         
         【最近 30 根 K 線數據 (包含 RSI 與 BB上軌)】
         {history_str}
-        
+        """
+
+        instructions = """
         【分析要求】
         1. 觀察最近的價格趨勢：是急漲、緩漲還是高檔震盪？
         2. 尋找疲弱訊號：是否有長上影線 (Wicks)、吞噬形態 (Engulfing) 或 RSI 背離？
@@ -146,29 +322,27 @@ class StrategyManager:
         - "explanation": 100字以內的中文分析。**請不要只報數字**,請描述你看到的結構(例如:「連續三根紅K後出現十字星,且RSI高檔鈍化,顯示多頭力竭...」）。
         """
         system_prompt = self.normalize_prompt(system_prompt)
-        user_prompt = self.normalize_prompt(user_prompt)
+        data_prompt = self.normalize_prompt(data_prompt)
+        instructions = self.normalize_prompt(instructions)
+        user_prompt = data_prompt + instructions
 
         try:
-            response = ai_client.chat.completions.create(
-                model=config.OPENAI_MODEL,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=AI_TEMPERATURE,
-                max_tokens=AI_MAX_TOKENS
-            )
-            
-            content = response.choices[0].message.content
-            clean_json = content.replace('```json', '').replace('```', '').strip()
-            
-            # 解析並列印 AI 回覆
-            ai_decision = json.loads(clean_json)
+            if self.ai_batcher is not None:
+                # 同一時間窗內其他交易對的請求合併成一次呼叫
+                ai_decision, meta = self.ai_batcher.decide(SYMBOL, system_prompt, data_prompt, instructions,
+                                                           market_data=market_data)
+            else:
+                ai_decision, meta = self.ai.decide(system_prompt, user_prompt, market_data=market_data)
+            if ai_decision is None:
+                print(f"⌛ AI 未在 {self.ai.deadline} 秒內給出合法決策 ({meta['latency_ms']:.0f} ms): {meta['reason']}")
+                return {"action": "WAIT", "confidence": 0, "explanation": f"AI fallback: {meta['reason']}",
+                        "fallback": True, "timed_out": meta.get("timed_out", False)}
 
-            # 上傳 AI Log (如果啟用)
-            self.client.upload_ai_log(
+            # 上傳 AI Log (如果啟用)，交給匯流排的上傳執行緒，不阻塞行情
+            self.bus.publish(
+                AI_VERDICT,
                 stage="Decision Making",
-                model=config.OPENAI_MODEL,
+                model=meta["model"],
                 input_data={
                     "prompt": [
                     {"role": "system", "content": system_prompt},
@@ -184,53 +358,78 @@ class StrategyManager:
                 output_data={
                     "action": ai_decision["action"],
                     "confidence": ai_decision["confidence"],
-                    "explanation": ai_decision["explanation"]
+                    "explanation": ai_decision["explanation"],
+                    "provider": meta["provider"],
+                    "latency_ms": meta["latency_ms"],
+                    "batch_size": meta.get("batch_size", 1)
                 },
                 explanation=ai_decision["explanation"]
             )
 
-            print(f"🤖 [AI 深度分析] {json.dumps(ai_decision, ensure_ascii=False)}")
+            print(f"🤖 [AI 深度分析] ({meta['provider']} {meta['latency_ms']:.0f} ms) {json.dumps(ai_decision, ensure_ascii=False)}")
             
             return ai_decision
                 
         except Exception as e:
-            print(f"❌ OpenAI 諮詢出錯: {e}")
-            return {"action": "WAIT", "confidence": 0, "explanation": f"API Error: {str(e)}"}
+            print(f"❌ AI 諮詢出錯: {e}")
+            return {"action": "WAIT", "confidence": 0, "explanation": f"API Error: {str(e)}", "fallback": True,
+                    "timed_out": False}
 
     def refresh_history(self):
         """根據 Config 設定的週期抓取歷史數據"""
+        raw_klines = self.fetch_history()
+        if raw_klines:
+            self._apply_klines(raw_klines)
+
+    def fetch_history(self):
+        """下載歷史 K 線 (不計算指標)；失敗時回傳 None"""
         print(f"🔄 正在更新 {SYMBOL} {STRATEGY_INTERVAL} 歷史數據...")
         
         now_ms = int(time.time() * 1000)
         
-        limit_count = 100 
-        
-        raw_klines = self.client.get_history_candles(
+        raw_klines = self.market_data.get_history_candles(
             symbol=SYMBOL, 
             granularity=self.client._map_interval(STRATEGY_INTERVAL),
             end_time=now_ms,
-            limit=limit_count
+            limit=HISTORY_LIMIT
         )
         
         if not raw_klines:
             print("⚠️ 無法獲取 K 線數據，等待下次更新")
-            return
+            return None
+        return raw_klines
 
-        # 整理數據
+    @staticmethod
+    def _klines_frame(raw_klines):
+        """原始 K 線 → 依時間排序的 DataFrame (尚未計算指標)"""
         df = pd.DataFrame(raw_klines, columns=['time', 'open', 'high', 'low', 'close', 'vol', 'quote_vol'])
         df['time'] = df['time'].astype(int) # 確保時間是整數
         df['close'] = df['close'].astype(float)
         df['high'] = df['high'].astype(float)
         df['low'] = df['low'].astype(float)
-        df = df.sort_values('time').reset_index(drop=True)
-        
-        # 計算技術指標
-        df['RSI'] = ta.rsi(df['close'], length=config.RSI_PERIOD)
-        bb = ta.bbands(df['close'], length=config.BB_LENGTH, std=config.BB_STD)
-        df = pd.concat([df, bb], axis=1)
-        
-        self.history_df = df
+        return df.sort_values('time').reset_index(drop=True)
+
+    def _apply_klines(self, raw_klines, df=None, columns=None):
+        """
+        由原始 K 線建立 history_df、計算指標並更新策略基準
+        df / columns: apply_klines_many() 已整理好的 DataFrame 與一次算好的指標欄位
+        """
+        # 整理數據
+        if df is None:
+            df = self._klines_frame(raw_klines)
+        self.raw_klines = sorted((list(row) for row in raw_klines), key=lambda row: int(row[0]))
         
+        # 計算技術指標 (欄位名稱與 pandas_ta 相同: RSI, BBL_20_2.0, BBM_..., BBU_..., BBB_..., BBP_...)
+        if columns is None:
+            columns = indicators.indicator_columns(df['close'].to_numpy(), config.RSI_PERIOD,
+                                                   config.BB_LENGTH, config.BB_STD)
+        df = df.assign(**columns)
+
+        # 策略基準與觸發價位先由新的 df 算好，再與 history_df 一起更新，
+        # 避免 tick 執行緒看到新的 K 線卻搭配舊 K 線的觸發價位 (快速路徑會誤判)
+        prev_high, prev_low, plan = self.prev_high, self.prev_low, None
+        candle_closed = None
+
         # --- [保留] 智慧判斷取哪一根 
         if len(df) >= 2:
             # 1. 算出「當下時間點」理論上的 K 線開盤時間
@@ -268,8 +467,8 @@ class StrategyManager:
                 idx_used = -1
 
             # 設定策略基準
-            self.prev_high = last_completed['high']
-            self.prev_low = last_completed['low']
+            prev_high = last_completed['high']
+            prev_low = last_completed['low']
             rsi_val = last_completed['RSI']
             
             # 取得布林上軌
@@ -279,20 +478,64 @@ class StrategyManager:
             # 轉換時間顯示方便除錯
             kline_time_str = datetime.fromtimestamp(int(last_completed['time'])/1000).strftime('%H:%M')
             
-            print(f"📊 [{STRATEGY_INTERVAL}] 策略基準 (取idx {idx_used}, K線時間{kline_time_str}): {SYMBOL} 前高={self.prev_high}, RSI={rsi_val:.2f} (閥值:{config.RSI_OVERBOUGHT}), BB上軌={bb_upper_val:.2f}")
+            print(f"📊 [{STRATEGY_INTERVAL}] 策略基準 (取idx {idx_used}, K線時間{kline_time_str}): {SYMBOL} 前高={prev_high}, RSI={rsi_val:.2f} (閥值:{config.RSI_OVERBOUGHT}), BB上軌={bb_upper_val:.2f}")
+            candle_closed = dict(interval=STRATEGY_INTERVAL, prev_high=prev_high,
+                                 prev_low=prev_low, rsi=rsi_val, bb_upper=bb_upper_val)
+
+            try:
+                plan = self._build_trigger_plan(df, prev_high)
+            except Exception as e:
+                # 算不出觸發價位時不沿用舊的 (on_tick 會改走完整判斷)
+                print(f"⚠️ 觸發價位計算失敗: {e}")
+
+        # 一起更新：K 線不足兩根或計算失敗時 trigger_plan 清為 None
+        with self.history_lock:
+            self.prev_high, self.prev_low = prev_high, prev_low
+            self.trigger_plan = plan
+            self.history_df = df
+        self.history_ready.set()
+        self.last_history_refresh = time.time()
+
+        if candle_closed is not None:
+            self.bus.publish(CANDLE_CLOSED, **candle_closed)
+
+        self.save_snapshot()
+
+    def _build_trigger_plan(self, df, prev_high):
+        """K 線更新後算一次各進場條件的價格門檻，tick 時只需比較價格 (df 尚未發佈為 history_df)"""
+        last = df.iloc[-1]
+        bb_col = self._get_bbu_col_name(df)
+        bb_lower_cols = [c for c in df.columns if str(c).startswith('BBL_')]
+        plan = build_trigger_plan(
+            closes=df['close'].tolist(),
+            rsi_length=config.RSI_PERIOD,
+            prev_high=prev_high,
+            bb_upper=last[bb_col] if bb_col else 999999,
+            bb_lower=last[bb_lower_cols[0]] if bb_lower_cols else None,
+            is_range=self.is_range_market(df),
+            rsi_overbought=config.RSI_OVERBOUGHT,
+        )
+        print(f"🎯 觸發價位: 突破 > {plan.breakout_trigger:.2f} | RSI>{config.RSI_OVERBOUGHT} 於 {plan.rsi_overbought_price:.2f} | "
+              f"區間盤: {'是' if plan.is_range else '否'}")
+        return plan
 
 
-    def is_range_market(self):
-        """判斷目前市場是否處於盤整區間 (布林通道寬度小於 5%)"""
-        if self.history_df.empty:
+    def is_range_market(self, history=None):
+        """
+        判斷目前市場是否處於盤整區間 (布林通道寬度小於 RANGE_BB_WIDTH，預設 5%)
+        history: 要判斷的 K 線 DataFrame，預設為目前的 history_df
+        """
+        if history is None:
+            history = self.history_df
+        if history is None or history.empty:
             return False
 
-        df = self.history_df.iloc[-1]
+        df = history.iloc[-1]
 
-        bb_upper = df.get(self._get_bbu_col_name(self.history_df), None)
-        bb_lower_cols = [c for c in self.history_df.columns if str(c).startswith('BBL_')]
+        bb_upper = df.get(self._get_bbu_col_name(history), None)
+        bb_lower_cols = [c for c in history.columns if str(c).startswith('BBL_')]
         bb_lower = df[bb_lower_cols[0]] if bb_lower_cols else None
-        bb_mid_cols = [c for c in self.history_df.columns if str(c).startswith('BBM_')]
+        bb_mid_cols = [c for c in history.columns if str(c).startswith('BBM_')]
         bb_mid = df[bb_mid_cols[0]] if bb_mid_cols else None
 
         if not bb_upper or not bb_lower or not bb_mid:
@@ -302,14 +545,16 @@ class StrategyManager:
         bb_width = (bb_upper - bb_lower) / bb_mid
         #print("is_range_market debug:")
         #print("bb_upper:", bb_upper, "bb_lower:", bb_lower, "bb_mid:", bb_mid, "bb_width:", bb_width,"是否為盤整區間:", bb_width < 0.05)
-        return bb_width < 0.05
+        return bb_width < getattr(config, "RANGE_BB_WIDTH", 0.05)
     
-    def check_range_reversion(self, price, real_time_rsi):
-        """判斷是否符合盤整區間反轉進場條件"""
-        df = self.history_df.iloc[-1]
+    def check_range_reversion(self, price, real_time_rsi, history=None):
+        """判斷是否符合盤整區間反轉進場條件 (history 預設為目前的 history_df)"""
+        if history is None:
+            history = self.history_df
+        df = history.iloc[-1]
 
         # 取得 BB 下軌
-        bb_lower_cols = [c for c in self.history_df.columns if str(c).startswith('BBL_')]
+        bb_lower_cols = [c for c in history.columns if str(c).startswith('BBL_')]
         if not bb_lower_cols:
             return False
         bb_lower = df[bb_lower_cols[0]]
@@ -333,33 +578,44 @@ class StrategyManager:
         if (now - self.last_trade_time).total_seconds() < config.COOLDOWN_HOURS * 3600:
             return 
 
-        if self.history_df.empty:
+        if not self.has_history():
             return
-        
 
-        # --- 計算即時 RSI ---
-        closes = self.history_df['close'].copy()
-        temp_series = pd.concat([closes, pd.Series([current_price])], ignore_index=True)
-        
-        rsi_series = ta.rsi(temp_series, length=config.RSI_PERIOD)
-        if rsi_series is None or len(rsi_series) == 0:
+        # 監控發現行情 / 資料 / API 異常時暫停進場
+        if self.pause_reasons:
             return
-            
-        real_time_rsi = rsi_series.iloc[-1]
+
+        if self.first_decision_at is None:
+            self.first_decision_at = time.perf_counter()
+            print(f"⏱️ 啟動至首次策略判斷耗時: {(self.first_decision_at - PROCESS_START) * 1000:.0f} ms")
+
+        # 同一次判斷使用同一組 K 線與觸發價位 (背景更新歷史時不會拿到新舊混合的資料)
+        with self.history_lock:
+            history, plan, prev_high = self.history_df, self.trigger_plan, self.prev_high
+
+        # 快速路徑：價格沒碰到任何觸發價位就不用重算指標
+        if plan is not None and not plan.may_trigger(current_price):
+            return
+
+        # --- 計算即時 RSI ---
+        closes = np.append(history['close'].to_numpy(), current_price)
+        real_time_rsi = indicators.rsi(closes, config.RSI_PERIOD)[-1]
 
 
 
         # --- 策略邏輯 ---
-        # 判斷市場狀態
-        is_range = self.is_range_market()
+        # 判斷市場狀態 (同一根 K 線內不變，優先用預先算好的結果)
+        is_range = plan.is_range if plan is not None else self.is_range_market(history)
 
         # --- 1. 區間盤：抄底策略 ---
         if is_range:
-            if self.check_range_reversion(current_price, real_time_rsi):
+            if self.check_range_reversion(current_price, real_time_rsi, history):
                 if not self.check_risk_limits():
                     return
 
                 print("📉 區間盤抄底訊號成立，執行回歸交易")
+                self.bus.publish(SIGNAL, strategy="range_reversion", price=current_price,
+                                 context={"rsi": real_time_rsi, "market_regime": "range"})
                 self.execute_trade_with_decision(
                 price=current_price,
                 decision_source=DECISION_RULE,
@@ -373,14 +629,16 @@ class StrategyManager:
 
         # --- 2. 趨勢盤：假突破做多策略 ---
         # 取得布林通道上軌
-        df_last = self.history_df.iloc[-1]
-        bb_upper = df_last.get(self._get_bbu_col_name(self.history_df), 999999)
-        is_valid_breakout = current_price > self.prev_high * 1.001  # 假突破過濾
+        df_last = history.iloc[-1]
+        bb_upper = df_last.get(self._get_bbu_col_name(history), 999999)
+        is_valid_breakout = current_price > prev_high * 1.001  # 假突破過濾
         is_overextended = (real_time_rsi > config.RSI_OVERBOUGHT) or (current_price > bb_upper * 1.001)
         
         if is_valid_breakout and is_overextended:
             # 1. 風控檢查 (新增)
             if not self.check_risk_limits(): return
+            self.bus.publish(SIGNAL, strategy="breakout_momentum_ai", price=current_price,
+                             context={"prev_high": prev_high, "rsi": real_time_rsi, "bb_upper": bb_upper})
 
             # [新增] AI API 頻率限制
             # 限制每 xx 秒最多呼叫一次(config.AI_COOLDOWN_SECONDS)
@@ -391,9 +649,30 @@ class StrategyManager:
             
             # 更新 API 呼叫時間
             self.last_ai_req_time = time.time()
+            self.save_snapshot()
 
             # 2. AI 最終決策
             ai_res = self.consult_ai_agent({"price": current_price, "rsi": real_time_rsi, "bb_upper": bb_upper})
+
+            if ai_res.get("fallback"):
+                # 只有 AI 逾時 (截止時間到仍未回覆) 才依 AI_TIMEOUT_FALLBACK 改用純規則決策；
+                # 格式錯誤 / 驗證失敗 / API 錯誤代表後端本身有問題，一律放棄這次訊號
+                if not ai_res.get("timed_out"):
+                    print(f"🚫 AI 回覆無效，放棄這次訊號: {ai_res['explanation']}")
+                elif getattr(config, "AI_TIMEOUT_FALLBACK", "WAIT") == "RULE":
+                    print(f"📏 AI 無回覆，改以規則訊號下單 | 價格: {current_price}, RSI: {real_time_rsi:.2f}")
+                    self.execute_trade_with_decision(
+                        price=current_price,
+                        decision_source=DECISION_RULE,
+                        strategy_name="breakout_momentum_ai",
+                        extra_context={
+                            "prev_high": prev_high,
+                            "rsi": real_time_rsi,
+                            "bb_upper": bb_upper,
+                            "ai_fallback": ai_res["explanation"]
+                        }
+                    )
+                return
             
             if ai_res["action"] == "LONG" and ai_res["confidence"] >= config.AI_CONFIDENCE_THRESHOLD:
                 print(f"   - 當前價格: {current_price}, RSI: {real_time_rsi:.2f}, BB上軌: {bb_upper:.2f}")
@@ -406,7 +685,7 @@ class StrategyManager:
                 decision_source=DECISION_AI,
                 strategy_name="breakout_momentum_ai",
                 extra_context={
-                    "prev_high": self.prev_high,
+                    "prev_high": prev_high,
                     "rsi": real_time_rsi,
                     "bb_upper": bb_upper,
                     "ai_confidence": ai_res["confidence"]
@@ -422,75 +701,238 @@ class StrategyManager:
     ):
         """
         統一交易執行入口，並記錄決策來源（AI / 規則）
+        kill_switch.py 在另一個行程執行時以旗標檔通知停機，這裡在每次下單前確認
         """
+        halted = is_halted()
+        if halted:
+            print(f"⛔ [停機旗標] {halted}，不下單")
+            return None
         size = config.ORDER_SIZE_BY_STRATEGY.get(
         strategy_name,
         config.DEFAULT_ORDER_SIZE
     )
-        # === 1. 下單（沿用原本的 execute_trade 內容） ===
-        order_result = self.execute_trade(price=price, size=size, strategy_name=strategy_name)
+        # 下單；本機決策 log 與交易日誌由匯流排的 trade_log 訂閱者寫入（不管 AI / 非 AI）
+        if self.accounts is not None:
+            return self.fan_out(price, size, strategy_name, decision_source, extra_context)
+        return self._execute(price, size, strategy_name, decision_source, extra_context)
+
+    def _execute(self, price, size, strategy_name, decision_source, extra_context, orders=None, account=None):
+        ladder = getattr(config, "LADDER_BY_STRATEGY", {}).get(strategy_name)
+        if ladder and ladder.get("levels", 1) > 1:
+            return self.execute_ladder(price=price, size=size, strategy_name=strategy_name,
+                                       levels=ladder["levels"], step_pct=ladder.get("step_pct", 0.001),
+                                       decision_source=decision_source, extra_context=extra_context,
+                                       orders=orders, account=account, ttl=ladder.get("ttl_seconds"))
+        return self.execute_trade(price=price, size=size, strategy_name=strategy_name,
+                                  decision_source=decision_source, extra_context=extra_context,
+                                  orders=orders, account=account)
 
-        if not order_result:
+    def fan_out(self, price, size, strategy_name, decision_source, extra_context):
+        """同一個決策並行下到所有子帳戶 (各自風控與數量)，回報最快 / 最慢帳戶的送單時間差"""
+        spec = self.contracts.get(SYMBOL) if self.contracts is not None else None
+        if self._spec_missing(spec):
             return None
 
-        order_id = order_result.get("order_id") \
-            if isinstance(order_result, dict) else None
+        def submit(account):
+            ok, reason = account.check_risk(SYMBOL)
+            if not ok:
+                print(f"🚫 [風控攔截] {account.name}: {reason}")
+                return None
+            account_size = account.scale(size, spec.size_step if spec is not None else None)
+            if Decimal(account_size) <= 0:
+                print(f"🚫 [{account.name}] 縮放後數量為 0，略過")
+                return None
+            return self._execute(price, account_size, strategy_name, decision_source, extra_context,
+                                 orders=account.orders, account=account.name)
 
-        # === 2. 統一寫本機決策 log（不管 AI / 非 AI） ===
-        log_payload = {
-            "strategy": strategy_name,
-            "decision_source": decision_source,
-            "symbol": config.SYMBOL,
-            "price": price,
-            "timestamp": int(time.time() * 1000)
-        }
+        report = self.accounts.dispatch(submit)
+        for name, item in report["accounts"].items():
+            status = "❌ " + item["error"] if item["error"] else ("✅" if item["result"] else "⏭️ 未下單")
+            print(f"   • {name}: {status} | {item['latency_ms']:.1f} ms")
+        print(f"🔀 [多帳戶] {len(report['accounts'])} 個帳戶 | 總耗時 {report['elapsed_ms']:.1f} ms | "
+              f"最快與最慢差距 {report['spread_ms']:.1f} ms")
+        return report
 
-        if extra_context:
-            log_payload["context"] = extra_context
+    def _spec_missing(self, spec):
+        """有合約規格快取但還沒有此交易對的規格 (啟動載入失敗、背景重試中) 時直接放棄下單"""
+        if spec is None and self.contracts is not None:
+            print(f"🚫 [合約規格] {SYMBOL} 規格尚未載入，放棄下單")
+            return True
+        return False
 
-        save_local_log(
-            stage="Trade Execution",
-            model=decision_source,
-            input_data=log_payload,
-            output_data={
-                "order_id": order_id,
-                "action": "OPEN_LONG"
-            },
-            explanation=(
-                "Trade executed automatically based on AI-assisted decision."
-                if decision_source == DECISION_AI
-                else
-                "Trade executed automatically based on predefined rule-based strategy."
-            )
-        )
+    def _tp_sl_pct(self, strategy_name):
+        cfg = config.TP_SL_BY_STRATEGY.get(strategy_name, {})
+        return cfg.get("tp", config.DEFAULT_TAKE_PROFIT_PCT), cfg.get("sl", config.DEFAULT_STOP_LOSS_PCT)
 
-        return order_result
+    def execute_ladder(self, price, size, strategy_name, levels, step_pct, decision_source=None, extra_context=None,
+                       orders=None, account=None, ttl=None):
+        """
+        階梯進場：把 size 拆成 levels 檔限價買單 (每檔往下 step_pct)，一次批次送出
+        每檔各自帶止盈止損 (以該檔價格計算)；回傳各檔的下單結果 (未確認的為 None)
+        orders / account: 多帳戶時使用該帳戶的 OrderTracker 與名稱
+        ttl: 未成交檔位的存活秒數，到期由背景對帳撤單；None = 一根策略 K 線 (下一根 K 線開始前撤掉)
+        """
+        ttl = ttl if ttl is not None else interval_seconds(STRATEGY_INTERVAL)
+        tracker = orders or self.orders
+        if account:
+            extra_context = dict(extra_context or {}, account=account)
+        tp_pct, sl_pct = self._tp_sl_pct(strategy_name)
+        spec = self.contracts.get(SYMBOL) if self.contracts is not None else None
+        if self._spec_missing(spec):
+            return None
 
-    def execute_trade(self, price, size, strategy_name):
+        legs = []
+        for leg_price, leg_size in plan_ladder(price, size, levels, step_pct, side=BUY,
+                                               size_step=spec.size_step if spec is not None else None):
+            if spec is not None:
+                limit_price = spec.round_price(leg_price, "down")
+                tp_price = spec.round_price(leg_price * (1 + tp_pct))
+                sl_price = spec.round_price(leg_price * (1 - sl_pct))
+                errors = spec.validate(leg_size, limit_price)
+                if errors:
+                    print(f"🚫 [合約規格] 略過階梯檔位 {limit_price}: {'; '.join(errors)}")
+                    continue
+            else:
+                limit_price = str(round(leg_price, 2))
+                tp_price = round(leg_price * (1 + tp_pct), 2)
+                sl_price = round(leg_price * (1 - sl_pct), 2)
+            legs.append({"side": 1, "size": leg_size, "price": limit_price, "match_price": "0", "order_type": "0",
+                           "preset_take_profit": str(tp_price), "preset_stop_loss": str(sl_price)})
+        if not legs:
+            print("🚫 階梯掛單沒有可送出的檔位，取消下單")
+            return None
+
+        self.bus.publish(ORDER_SUBMITTED, strategy=strategy_name, size=size, price=price, order_args={"ladder": legs})
+        try:
+            tracked = tracker.submit_batch(legs, margin_mode=1, ttl=ttl)
+        except Exception as e:
+            print(f"❌ 批次下單失敗: {e}")
+            return None
+
+        results = []
+        for order in tracked:
+            result = order.result()
+            results.append(result)
+            if result is None:
+                print(f"⚠️ 階梯檔位未確認 | client_oid={order.client_oid} 狀態={order.state} {order.error or ''}")
+                continue
+            self.bus.publish(ORDER_ACKED, strategy=strategy_name, result=result, size=order.size,
+                             price=float(order.params["price"]), take_profit=order.take_profit,
+                             stop_loss=order.stop_loss, decision_source=decision_source, context=extra_context)
+        acked = sum(r is not None for r in results)
+        if acked or any(order.state == UNKNOWN for order in tracked):
+            # 未確認的檔位可能已在交易所掛著，同樣開始冷卻，避免下一個 tick 再送一組新的 client_oid
+            self._mark_traded()
+        print(f"🪜 階梯掛單完成 | strategy={strategy_name} {acked}/{len(tracked)} 檔 | "
+              f"{legs[0]['price']} ~ {legs[-1]['price']} | TP {tp_pct*100:.2f}% SL {sl_pct*100:.2f}% | "
+              f"未成交 {ttl:g} 秒後撤單")
+        return results
+
+    def execute_trade(self, price, size, strategy_name, decision_source=None, extra_context=None,
+                      orders=None, account=None):
+        tracker = orders or self.orders  # 多帳戶時為該帳戶的 OrderTracker
+        if account:
+            extra_context = dict(extra_context or {}, account=account)
         # 從 config 取得該策略 TP/SL
-        cfg = config.TP_SL_BY_STRATEGY.get(strategy_name, {})
-        tp_pct = cfg.get("tp", config.DEFAULT_TAKE_PROFIT_PCT)
-        sl_pct = cfg.get("sl", config.DEFAULT_STOP_LOSS_PCT)
+        tp_pct, sl_pct = self._tp_sl_pct(strategy_name)
+
+        # 依合約規格取整 (未設定規格快取時沿用小數 2 位，例如回放)
+        spec = self.contracts.get(SYMBOL) if self.contracts is not None else None
+        if self._spec_missing(spec):
+            return None
+        if spec is not None:
+            tp_price = spec.round_price(price * (1 + tp_pct))
+            sl_price = spec.round_price(price * (1 - sl_pct))
+        else:
+            tp_price = round(price * (1 + tp_pct), 2)
+            sl_price = round(price * (1 - sl_pct), 2)
+
+        # 依本地訂單簿評估滑價：流動性不足時縮量並改用 IOC 限價單，完全不足則放棄
+        plan = plan_market_order(self.order_book, size, side=BUY,
+                                 max_slippage_bps=getattr(config, "MAX_SLIPPAGE_BPS", 10.0),
+                                 size_step=spec.size_step if spec is not None else None)
+        if plan["action"] == "skip":
+            print(f"🚫 [滑價控制] 訂單簿 {getattr(config, 'MAX_SLIPPAGE_BPS', 10.0)} bps 內流動性不足，放棄下單")
+            return None
+        if plan["slippage_bps"] is not None:
+            print(f"📚 [訂單簿] 預估成交 {plan['expected_price']:.2f} | 滑價 {plan['slippage_bps']:.2f} bps | "
+                  f"下單方式 {plan['action']} ({plan['reason']})")
+        size = plan["size"]
+        if plan["action"] == "ioc_limit":
+            limit_price = spec.round_price(plan["price"], "down") if spec is not None else str(round(plan["price"], 2))
+            order_args = {"price": limit_price, "match_price": "0", "order_type": "3"}
+        else:
+            order_args = {"match_price": "1"}
 
-        tp_price = round(price * (1 + tp_pct), 2)
-        sl_price = round(price * (1 - sl_pct), 2)
+        # 本地檢查數量 / 價格是否符合規格，不合規就不送出 (省下一次被拒單的來回)
+        if spec is not None:
+            size = spec.round_size(size)
+            errors = spec.validate(size, order_args.get("price"))
+            if errors:
+                print(f"🚫 [合約規格] 訂單不合規，取消下單: {'; '.join(errors)}")
+                return None
 
+        self.bus.publish(ORDER_SUBMITTED, strategy=strategy_name, size=size, price=price, order_args=order_args)
         try:
-            self.client.place_order(
+            order = tracker.submit(
                 side=1,
                 size=size,
-                match_price="1",
                 preset_take_profit=str(tp_price),
                 preset_stop_loss=str(sl_price),
-                margin_mode=1
-            )
-            print(
-                f"🛡️ 下單完成 | strategy={strategy_name} "
-                f"TP={tp_price} ({tp_pct*100:.2f}%) "
-                f"SL={sl_price} ({sl_pct*100:.2f}%)"
+                margin_mode=1,
+                **order_args
             )
         except Exception as e:
             print(f"❌ 下單失敗: {e}")
+            return None
+
+        result = order.result()
+        if result is None:
+            # 未確認的訂單留在追蹤器中，由背景對帳決定最終狀態
+            print(f"⚠️ 下單未確認 | {account or ''} strategy={strategy_name} client_oid={order.client_oid} 狀態={order.state} {order.error or ''}")
+            if order.state == UNKNOWN:
+                # 交易所可能已經收到：開始冷卻，避免下一個 tick 以新的 client_oid 再下一筆
+                self._mark_traded()
+            return None
+        print(
+            f"🛡️ 下單完成 | {account or ''} strategy={strategy_name} size={size} "
+            f"TP={tp_price} ({tp_pct*100:.2f}%) "
+            f"SL={sl_price} ({sl_pct*100:.2f}%) | {order.state}"
+        )
+
+        self.bus.publish(ORDER_ACKED, strategy=strategy_name, result=result, size=size, price=price,
+                         take_profit=tp_price, stop_loss=sl_price, decision_source=decision_source,
+                         context=extra_context)
+        self._mark_traded()
+        return result
+
+    def _mark_traded(self):
+        """下單成功後開始冷卻 (COOLDOWN_HOURS)，並寫入快照讓重啟後冷卻仍然有效"""
+        self.last_trade_time = datetime.now()
+        self.save_snapshot(urgent=True)
+
+
+def apply_klines_many(strategies, raw_klines_list):
+    """
+    多個 StrategyManager (例如每個交易對一個) 在同一根 K 線收盤時一起更新
+    所有收盤價左側補 NaN 疊成 (交易對 × 時間) 陣列，指標只算一次，而不是每個交易對各跑一輪 pandas
+    """
+    frames = [StrategyManager._klines_frame(raw) for raw in raw_klines_list]
+    closes = indicators.pad_left([df['close'].to_numpy() for df in frames])
+    columns = indicators.indicator_columns(closes, config.RSI_PERIOD, config.BB_LENGTH, config.BB_STD)
+    for i, (strategy, raw, df) in enumerate(zip(strategies, raw_klines_list, frames)):
+        # 補 NaN 的部分在左側，取右側 len(df) 個值即為該交易對單獨計算的結果
+        row = {name: values[i, values.shape[1] - len(df):] for name, values in columns.items()}
+        strategy._apply_klines(raw, df=df, columns=row)
+
+
+def refresh_history_many(strategies):
+    """多個 StrategyManager 一起更新歷史 K 線：各自下載，指標由 apply_klines_many 一次算完"""
+    fetched = [(strategy, strategy.fetch_history()) for strategy in strategies]
+    fetched = [(strategy, raw) for strategy, raw in fetched if raw]
+    if fetched:
+        apply_klines_many([strategy for strategy, _ in fetched], [raw for _, raw in fetched])
+    return len(fetched)
             
 # --- 智慧判斷換線邏輯 ---
 def should_refresh_data(last_refresh_time):
@@ -532,48 +974,127 @@ def should_refresh_data(last_refresh_time):
     return False
 
 # --- 主程式 ---
-if __name__ == "__main__":
-    client = WeexClient()
-    strategy = StrategyManager(client)
-    
-    last_update_time = time.time()
-    last_heartbeat_time = 0
+def make_tick_handler(strategy, client, order_book=None, paper_trading=False, refresh_history=True):
+    """
+    建立 MarketStream 的價格回呼 (紙上撮合 → 策略判斷 → 心跳 → 週期更新)
+    實盤與回放 (replay.py) 共用同一份流程；refresh_history=False 時不重新抓取歷史 K 線
+    """
+    state = {"last_update_time": time.time(), "last_heartbeat_time": 0}
+
+    publish = strategy.bus.publish
+    # 紙上交易時每個子帳戶都有自己的 PaperClient，需要同樣的價格來撮合
+    paper_clients = [client]
+    if paper_trading and strategy.accounts is not None:
+        paper_clients += [a.client for a in strategy.accounts.accounts if a.client is not client]
 
     def callback_wrapper(interval, price):
-        global last_update_time, last_heartbeat_time
-        
+        publish(TICK, interval=interval, price=price)
+        if paper_trading:
+            for paper_client in paper_clients:
+                paper_client.on_tick(SYMBOL, price)
+
         strategy.on_tick(interval, price)
         
         # 心跳顯示 (每 30 秒)
-        if time.time() - last_heartbeat_time > 30:
+        if time.time() - state["last_heartbeat_time"] > 30:
             current_rsi = 0
             current_bb_upper = 0
             
-            if not strategy.history_df.empty:
-                closes = strategy.history_df['close'].copy()
-                temp_series = pd.concat([closes, pd.Series([price])], ignore_index=True)
+            if strategy.has_history():
+                closes = np.append(strategy.history_df['close'].to_numpy(), price)
                 
                 # 1. 重算即時 RSI
-                rsi_s = ta.rsi(temp_series, length=config.RSI_PERIOD)
-                if rsi_s is not None:
-                    current_rsi = rsi_s.iloc[-1]
+                current_rsi = indicators.rsi(closes, config.RSI_PERIOD)[-1]
                 
                 # 2. [修正] 重算即時 BB 上軌
-                bb_df = ta.bbands(temp_series, length=config.BB_LENGTH, std=config.BB_STD)
-                bb_col = strategy._get_bbu_col_name(bb_df)
-                if bb_col:
-                    current_bb_upper = bb_df.iloc[-1][bb_col]
+                current_bb_upper = indicators.bbands(closes, config.BB_LENGTH, config.BB_STD)["upper"][-1]
 
             print(f"💓 [監控中] {SYMBOL} {config.STRATEGY_INTERVAL} | 現價: {price} | 前高: {strategy.prev_high} | RSI: {current_rsi:.2f} (閥值:{config.RSI_OVERBOUGHT}) | BB上軌: {current_bb_upper:.2f}")            
-            last_heartbeat_time = time.time()
+            if order_book is not None and order_book.is_fresh():
+                spread = order_book.spread_bps()
+                depth = order_book.depth_within_bps(getattr(config, "MAX_SLIPPAGE_BPS", 10.0))
+                print(f"📚 [訂單簿] 點差: {spread:.2f} bps | {getattr(config, 'MAX_SLIPPAGE_BPS', 10.0)} bps 內賣盤深度: {depth:.4f}")
+            if paper_trading:
+                print(f"🧾 [Paper] {client.summary()}")
+            # 未結束的訂單 (未知 / 未成交 / 止盈止損未觸發) 在背景批次對帳
+            for tracker in strategy.trackers():
+                tracker.reconcile_async()
+            state["last_heartbeat_time"] = time.time()
 
-        if should_refresh_data(last_update_time):
+        if refresh_history and should_refresh_data(state["last_update_time"]):
             print(f"🔄 週期({config.STRATEGY_INTERVAL})結算或定時更新...")
             strategy.refresh_history()
-            last_update_time = time.time()
+            state["last_update_time"] = time.time()
+            # 背景同步成交明細到交易日誌 (不阻塞行情執行緒)
+            if getattr(config, "ENABLE_TRADE_JOURNAL", True):
+                threading.Thread(target=get_journal().sync_fills, args=(client, SYMBOL), name="journal-sync",
+                                 daemon=True).start()
+
+    return callback_wrapper
+
+
+if __name__ == "__main__":
+    # 紙上交易模式：行情仍走真實 API，下單與倉位在本地模擬
+    paper_trading = getattr(config, "PAPER_TRADING", False)
+    print(f"⏱️ 主程式 import 完成: {(time.perf_counter() - PROCESS_START) * 1000:.0f} ms")
+    # 背景先載入重量級模組，與 WebSocket 連線、歷史資料下載同時進行
+    preload(pd, openai)
 
-    stream = MarketStream(SYMBOL, INTERVALS, callback_wrapper)
+    client = PaperClient(market_client=WeexClient()) if paper_trading else WeexClient()
+    # 單一交易對 (config.SYMBOL) 不掛 AIBatcher：沒有其他交易對可合併，只會多等一個時間窗
+    strategy = StrategyManager(client, seed_history=False)
+    # 啟動時同步載入合約規格 (之後只在背景更新)；失敗時由背景重試，規格到位前不下單
+    strategy.contracts = ContractInfoCache(client, ttl=getattr(config, "CONTRACT_INFO_TTL", 3600))
+    strategy.contracts.load()
+    # 共用行情常駐程序：MarketStream 依 config 自動改接 Unix socket，歷史 K 線也改向常駐程序查詢
+    market_data_socket = getattr(config, "MARKET_DATA_SOCKET", None)
+    if market_data_socket:
+        strategy.market_data = MarketDataClient(market_data_socket, fallback=client)
+        print(f"📡 使用行情常駐程序: {market_data_socket}")
+    # 多帳戶：同一個決策並行下到 config.ACCOUNTS 的每個子帳戶
+    if getattr(config, "ACCOUNTS", None):
+        market_client = client.market_client if paper_trading else client
+        factory = (lambda entry, i: PaperClient(market_client=market_client)) if paper_trading else None
+        strategy.accounts = FanoutDispatcher(load_accounts(client_factory=factory))
+        print(f"🔀 多帳戶模式: {[a.name for a in strategy.accounts.accounts]}")
+    order_book = None
+    if getattr(config, "ENABLE_ORDER_BOOK", False):
+        order_book = OrderBook(SYMBOL, max_age=getattr(config, "ORDER_BOOK_MAX_AGE", 5.0))
+        strategy.order_book = order_book
+    
+    callback_wrapper = make_tick_handler(strategy, client, order_book=order_book, paper_trading=paper_trading)
+
+    recorder = None
+    if getattr(config, "ENABLE_MARKET_RECORDER", False):
+        recorder = MarketRecorder(getattr(config, "MARKET_RECORD_DIR", "data/market"), prefix=SYMBOL)
+        print(f"🎞️ 行情錄製中: {recorder.directory}")
+
+    stream = MarketStream(SYMBOL, INTERVALS, callback_wrapper, order_book=order_book, recorder=recorder)
+    # 狀態快照：冷卻計時立即還原，K 線只補抓缺少的部分
+    strategy.snapshot_path = getattr(config, "STATE_SNAPSHOT_PATH", "data/strategy_state.json")
+    snapshot = load_snapshot(strategy.snapshot_path, symbol=SYMBOL, interval=STRATEGY_INTERVAL) if strategy.snapshot_path else None
+    candles = strategy.restore_snapshot(snapshot) if snapshot else None
+    strategy.seed_history_async(candles)
     stream.start()
 
-    while True:
-        time.sleep(1)
\ No newline at end of file
+    # 健康監控：行情中斷自動重連、歷史資料過期重新下載、API 異常時暫停進場
+    supervisor = Supervisor(
+        stream, strategy, client,
+        feed_stale_seconds=getattr(config, "FEED_STALE_SECONDS", 30),
+        history_max_age=getattr(config, "HISTORY_MAX_AGE", None),
+        max_rest_error_rate=getattr(config, "MAX_REST_ERROR_RATE", 0.5),
+        max_callback_ms=getattr(config, "MAX_CALLBACK_MS", 500),
+    )
+    # 線上效能剖析：kill -USR1 / -USR2 或管理端點 /debug/profile、/debug/stacks (見 profiler.py)
+    profiler = SamplingProfiler(interval=getattr(config, "PROFILE_INTERVAL_MS", 5) / 1000,
+                                output_dir=getattr(config, "PROFILE_DIR", "data/profiles"))
+    if getattr(config, "ENABLE_PROFILE_SIGNALS", True):
+        install_signal_handlers(profiler, getattr(config, "PROFILE_SECONDS", 30))
+    health_port = getattr(config, "HEALTH_PORT", None)
+    if health_port:
+        register_routes(supervisor, profiler)
+        supervisor.serve(getattr(config, "HEALTH_HOST", "127.0.0.1"), health_port)
+    try:
+        supervisor.run()
+    finally:
+        strategy.flush_snapshot()
\ No newline at end of file
@@ -0,0 +1,534 @@
+"""
+共用行情常駐程序 (Market Data Daemon)
+
+多個機器人 (不同策略 / 不同帳戶) 跑在同一台機器上時，每個程序原本都會自己連一條 WebSocket、
+自己下載歷史 K 線。這個常駐程序只對交易所保持一條連線，再透過 Unix socket 分送給本機的機器人：
+
+- 行情：各頻道以引用計數訂閱 (第一個機器人訂閱時才向交易所訂閱，最後一個取消時才退訂)，
+  收到的原始訊息原封不動轉送給有訂閱的機器人，MarketStream 的解析 / 訂單簿 / 錄製邏輯完全不變
+- depth 頻道：已訂閱的頻道有新機器人加入時，向交易所重新訂閱以取得新快照 (所有訂閱者一起重置訂單簿)
+- K 線：每個 (交易對, 週期) 維護一份緩衝區，第一次查詢時以 REST 下載，之後由 kline 推送更新；
+  每 resync_seconds 以 REST 重新校正一次。所有機器人共用這份緩衝區，不重複呼叫 REST
+- 處理太慢的機器人 (佇列滿) 直接斷線，由它自行重連並重新訂閱，不拖慢其他機器人
+
+協定：每行一個 JSON
+  機器人 -> 常駐程序: {"op": "subscribe" / "unsubscribe", "channel": ...}
+                      {"op": "candles", "symbol", "granularity", "end_time", "start_time", "limit"}
+                      {"op": "stats"}
+  常駐程序 -> 機器人: 交易所原始訊息 / {"event": "subscribed", "channel"} / {"op": "candles", "data": [...]}
+
+機器人端：config.MARKET_DATA_SOCKET 設定後，MarketStream 自動改接常駐程序 (DaemonConnection)，
+歷史 K 線改用 MarketDataClient 查詢 (常駐程序無法連線時退回直接呼叫 REST)。
+
+啟動: python market_data_daemon.py --socket /tmp/weex_market_data.sock
+"""
+import argparse
+import json
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+
+import config
+from exchange_client import WeexClient, INTERVAL_GRANULARITY
+from market_stream import MarketStream
+from supervisor import interval_seconds
+
+DEFAULT_SOCKET_PATH = "/tmp/weex_market_data.sock"
+GRANULARITY_INTERVAL = {v: k for k, v in INTERVAL_GRANULARITY.items()}
+
+
+def _line(obj):
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+
+
+class CandleBuffer:
+    """單一 (交易對, 週期) 的 K 線緩衝區，列格式與 get_history_candles 相同"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.rows = {}          # 開盤時間 -> [time, open, high, low, close, vol, quote_vol]
+        self.seeded_at = 0.0
+        self.lock = threading.Lock()
+
+    def seed(self, rows):
+        with self.lock:
+            self.rows = {int(row[0]): list(row) for row in rows}
+            self._trim()
+            self.seeded_at = time.time()
+
+    def update(self, data):
+        """以 kline 推送更新 (新的一根直接加入；同一根的高低點取聯集)"""
+        try:
+            start = int(data.get("startTime") or data.get("t"))
+        except (TypeError, ValueError):
+            return
+        close = str(data.get("close") or data.get("c"))
+        high = str(data.get("high") or close)
+        low = str(data.get("low") or close)
+        with self.lock:
+            if not self.rows:
+                return  # 尚未下載歷史，等第一次查詢時再建立
+            row = self.rows.get(start)
+            if row is None:
+                quote = str(data.get("turnover") or data.get("quoteVolume") or "0")
+                self.rows[start] = [str(start), str(data.get("open") or close), high, low, close,
+                                    str(data.get("volume") or "0"), quote]
+                self._trim()
+                return
+            if float(high) > float(row[2]):
+                row[2] = high
+            if float(low) < float(row[3]):
+                row[3] = low
+            row[4] = close
+            if data.get("volume") is not None:
+                row[5] = str(data["volume"])
+
+    def _trim(self):
+        for t in sorted(self.rows)[:-self.limit]:
+            del self.rows[t]
+
+    def latest(self, limit):
+        with self.lock:
+            return [list(self.rows[t]) for t in sorted(self.rows)[-limit:]]
+
+    def __len__(self):
+        return len(self.rows)
+
+
+class _UpstreamStream(MarketStream):
+    """常駐程序對交易所的唯一連線：訂閱的頻道隨機器人動態增減，收到的訊息交給常駐程序分送"""
+
+    def __init__(self, daemon, url=None):
+        super().__init__(None, [], None, url=url, daemon_socket=False)
+        self.daemon = daemon
+        self.subscribed = set()
+        self.closing = False
+
+    def channels(self):
+        return sorted(self.subscribed)
+
+    def _send(self, payload):
+        try:
+            if self.ws is not None and self.ws.sock is not None and self.ws.sock.connected:
+                self.ws.send(json.dumps(payload))
+        except Exception as e:
+            # 尚未連線或正在重連：on_open 會重新訂閱所有頻道
+            print(f"⚠️ [Daemon] 上游送出失敗 ({payload.get('event')} {payload.get('channel')}): {e}")
+
+    def subscribe(self, channel, resubscribe=False):
+        if resubscribe:
+            self._send({"event": "unsubscribe", "channel": channel})
+        self.subscribed.add(channel)
+        self._send({"event": "subscribe", "channel": channel})
+
+    def unsubscribe(self, channel):
+        self.subscribed.discard(channel)
+        self._send({"event": "unsubscribe", "channel": channel})
+
+    def on_open(self, ws):
+        self.connects += 1
+        print(f"✅ [Daemon] 上游連線已建立，訂閱 {len(self.subscribed)} 個頻道")
+        for channel in sorted(self.subscribed):
+            ws.send(json.dumps({"event": "subscribe", "channel": channel}))
+
+    def on_message(self, ws, message):
+        try:
+            data = json.loads(message)
+        except json.JSONDecodeError:
+            if message == 'ping':
+                ws.send('pong')
+            return
+        if not isinstance(data, dict):
+            return
+        if data.get('event') == 'ping':
+            self.last_message_at['ping'] = time.time()
+            ws.send(json.dumps({"event": "pong", "time": data.get('time')}))
+            return
+        channel = data.get('channel')
+        if channel and 'data' in data:
+            self.last_message_at[channel] = time.time()
+            started = time.perf_counter()
+            self.daemon.on_frame(channel, data, message)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.callback_ms_avg += (elapsed_ms - self.callback_ms_avg) * 0.05
+            if elapsed_ms > self.callback_ms_max:
+                self.callback_ms_max = elapsed_ms
+
+    def on_close(self, ws, close_status_code, close_msg):
+        if self.closing:
+            return
+        super().on_close(ws, close_status_code, close_msg)
+
+
+class _Subscriber:
+    """一個機器人連線：有界佇列 + 寫出執行緒，上游執行緒只負責放進佇列"""
+
+    def __init__(self, sock, queue_size):
+        self.sock = sock
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.channels = set()
+        self.alive = True
+        self.sent = 0
+        threading.Thread(target=self._writer, name="daemon-writer", daemon=True).start()
+
+    def send(self, line):
+        if not self.alive:
+            return False
+        try:
+            self.queue.put_nowait(line)
+            return True
+        except queue.Full:
+            print("🐢 [Daemon] 機器人處理太慢 (佇列已滿)，中斷連線讓它重新訂閱")
+            self.close()
+            return False
+
+    def _writer(self):
+        while self.alive:
+            line = self.queue.get()
+            if line is None:
+                break
+            try:
+                self.sock.sendall(line.encode('utf-8') + b"\n")
+                self.sent += 1
+            except OSError:
+                self.close()
+
+    def close(self):
+        if not self.alive:
+            return
+        self.alive = False
+        try:
+            self.queue.put_nowait(None)
+        except queue.Full:
+            pass
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+class _DaemonHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        daemon = self.server.daemon
+        subscriber = _Subscriber(self.request, daemon.queue_size)
+        daemon.add_subscriber(subscriber)
+        try:
+            for raw in self.rfile:
+                try:
+                    request = json.loads(raw)
+                except ValueError:
+                    continue
+                if isinstance(request, dict):
+                    daemon.handle_request(subscriber, request)
+        except OSError:
+            pass
+        finally:
+            daemon.remove_subscriber(subscriber)
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class MarketDataDaemon:
+    def __init__(self, socket_path=DEFAULT_SOCKET_PATH, url=None, rest_client=None, candle_limit=500,
+                 queue_size=10000, resync_seconds=900, feed_stale_seconds=30, check_interval=5.0):
+        self.socket_path = socket_path
+        self.rest_client = rest_client or WeexClient()
+        self.candle_limit = candle_limit
+        self.queue_size = queue_size
+        self.resync_seconds = resync_seconds
+        self.feed_stale_seconds = feed_stale_seconds
+        self.check_interval = check_interval
+
+        self.upstream = _UpstreamStream(self, url=url)
+        self.subscribers = set()
+        self.routes = {}            # channel -> tuple(_Subscriber)，複製後替換，分送時不用加鎖
+        self.lock = threading.Lock()
+        self.buffers = {}           # (symbol, interval) -> CandleBuffer
+        self.buffer_locks = {}
+        self.server = None
+        self.last_reconnect = 0.0
+        self.counters = {"frames": 0, "relayed": 0, "candle_hits": 0, "candle_rest": 0}
+        self._stop = threading.Event()
+
+    # --- 訂閱 ---
+    def add_subscriber(self, subscriber):
+        with self.lock:
+            self.subscribers.add(subscriber)
+
+    def remove_subscriber(self, subscriber):
+        subscriber.close()
+        with self.lock:
+            self.subscribers.discard(subscriber)
+            channels = list(subscriber.channels)
+        for channel in channels:
+            self.unsubscribe(subscriber, channel)
+        if channels:
+            print(f"🔌 [Daemon] 機器人離線，退訂 {len(channels)} 個頻道 (目前 {len(self.subscribers)} 個連線)")
+
+    def subscribe(self, subscriber, channel):
+        with self.lock:
+            current = self.routes.get(channel, ())
+            if subscriber in current:
+                first = False
+            else:
+                first = not current
+                self.routes[channel] = current + (subscriber,)
+            subscriber.channels.add(channel)
+        subscriber.send(_line({"event": "subscribed", "channel": channel}))
+        if first:
+            print(f"📡 [Daemon] 向上游訂閱: {channel}")
+            self.upstream.subscribe(channel)
+        elif channel.startswith("depth."):
+            # 新加入的機器人需要訂單簿快照
+            self.upstream.subscribe(channel, resubscribe=True)
+
+    def unsubscribe(self, subscriber, channel):
+        with self.lock:
+            subscriber.channels.discard(channel)
+            remaining = tuple(s for s in self.routes.get(channel, ()) if s is not subscriber)
+            if remaining:
+                self.routes[channel] = remaining
+            else:
+                self.routes.pop(channel, None)
+        if not remaining:
+            self.upstream.unsubscribe(channel)
+
+    def on_frame(self, channel, data, raw):
+        """上游行情 (在 WebSocket 執行緒)：更新 K 線緩衝區後轉送給訂閱者"""
+        self.counters["frames"] += 1
+        if channel.startswith("kline."):
+            parts = channel.split(".")
+            buffer = self.buffers.get((parts[2], parts[3])) if len(parts) >= 4 else None
+            if buffer is not None:
+                payload = data["data"]
+                for item in (payload if isinstance(payload, list) else [payload]):
+                    if isinstance(item, dict):
+                        buffer.update(item)
+        if "\n" in raw:
+            raw = _line(data)
+        for subscriber in self.routes.get(channel, ()):
+            if subscriber.send(raw):
+                self.counters["relayed"] += 1
+
+    # --- K 線 ---
+    def _buffer_is_live(self, symbol, interval, buffer):
+        channel = f"kline.LAST_PRICE.{symbol}.{interval}"
+        last = self.upstream.last_message_at.get(channel)
+        return (len(buffer) > 0 and channel in self.upstream.subscribed and last is not None
+                and time.time() - last < self.feed_stale_seconds
+                and time.time() - buffer.seeded_at < self.resync_seconds)
+
+    def get_candles(self, symbol, granularity, end_time=None, start_time=None, limit=100):
+        interval = GRANULARITY_INTERVAL.get(granularity)
+        now_ms = int(time.time() * 1000)
+        recent = interval is not None and start_time is None and (
+            end_time is None or int(end_time) >= now_ms - interval_seconds(interval) * 1000)
+        if not recent:
+            # 指定區間的查詢直接轉給 REST (不快取)
+            self.counters["candle_rest"] += 1
+            return self.rest_client.get_history_candles(symbol, granularity, start_time=start_time,
+                                                        end_time=end_time, limit=limit)
+
+        key = (symbol, interval)
+        with self.lock:
+            buffer = self.buffers.setdefault(key, CandleBuffer(max(self.candle_limit, limit)))
+            buffer_lock = self.buffer_locks.setdefault(key, threading.Lock())
+        # 同時有多個機器人查詢時只下載一次，其餘等待後直接讀緩衝區
+        with buffer_lock:
+            if not (self._buffer_is_live(symbol, interval, buffer) and limit <= len(buffer)):
+                rows = self.rest_client.get_history_candles(symbol, granularity, end_time=now_ms,
+                                                            limit=max(buffer.limit, limit))
+                self.counters["candle_rest"] += 1
+                if not rows:
+                    return []
+                buffer.limit = max(buffer.limit, limit)
+                buffer.seed(rows)
+            else:
+                self.counters["candle_hits"] += 1
+        return buffer.latest(limit)
+
+    # --- 請求 ---
+    def handle_request(self, subscriber, request):
+        op = request.get("op")
+        if op == "subscribe" and request.get("channel"):
+            self.subscribe(subscriber, request["channel"])
+        elif op == "unsubscribe" and request.get("channel"):
+            self.unsubscribe(subscriber, request["channel"])
+        elif op == "candles":
+            try:
+                rows = self.get_candles(request.get("symbol"), request.get("granularity"),
+                                        end_time=request.get("end_time"), start_time=request.get("start_time"),
+                                        limit=int(request.get("limit") or 100))
+                subscriber.send(_line({"op": "candles", "id": request.get("id"), "data": rows}))
+            except Exception as e:
+                subscriber.send(_line({"op": "error", "id": request.get("id"), "msg": str(e)}))
+        elif op == "stats":
+            subscriber.send(_line({"op": "stats", "data": self.stats()}))
+
+    def stats(self):
+        return dict(self.counters,
+                    subscribers=len(self.subscribers),
+                    upstream_channels=self.upstream.channels(),
+                    upstream_connects=self.upstream.connects,
+                    buffers={f"{s}.{i}": len(b) for (s, i), b in self.buffers.items()})
+
+    # --- 生命週期 ---
+    def _watchdog(self):
+        """上游頻道太久沒有資料就重連 (機器人端不需要各自處理)"""
+        while not self._stop.wait(self.check_interval):
+            stale = [ch for ch in self.upstream.feed_channels() if self.upstream.message_age(ch) > self.feed_stale_seconds]
+            if stale and time.time() - self.last_reconnect > self.feed_stale_seconds:
+                self.last_reconnect = time.time()
+                print(f"🔁 [Daemon] 上游行情中斷 {stale}，重新連線")
+                self.upstream.reconnect()
+
+    def start(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)  # 上次未正常關閉留下的 socket 檔
+        self.server = _UnixServer(self.socket_path, _DaemonHandler)
+        self.server.daemon = self
+        threading.Thread(target=self.server.serve_forever, name="daemon-server", daemon=True).start()
+        threading.Thread(target=self._watchdog, name="daemon-watchdog", daemon=True).start()
+        self.upstream.start()
+        print(f"📡 行情常駐程序已啟動: {self.socket_path} -> {self.upstream.url}")
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self.upstream.closing = True
+        if self.upstream.ws is not None:
+            self.upstream.ws.close()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+        for subscriber in list(self.subscribers):
+            subscriber.close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+class DaemonConnection:
+    """
+    機器人端：連到常駐程序，介面與 websocket.WebSocketApp 相同 (run_forever / send / close 與四個回呼)，
+    MarketStream 不需要區分行情來自交易所還是常駐程序
+    """
+
+    def __init__(self, socket_path, on_open=None, on_message=None, on_error=None, on_close=None):
+        self.socket_path = socket_path
+        self.on_open = on_open
+        self.on_message = on_message
+        self.on_error = on_error
+        self.on_close = on_close
+        self.sock = None
+        self.closed = False
+        self.send_lock = threading.Lock()
+
+    def run_forever(self):
+        try:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.connect(self.socket_path)
+        except OSError as e:
+            self.sock = None
+            if self.on_error:
+                self.on_error(self, e)
+            if self.on_close:
+                self.on_close(self, None, str(e))
+            return
+        if self.on_open:
+            self.on_open(self)
+        try:
+            for line in self.sock.makefile("r", encoding="utf-8"):
+                self.on_message(self, line.rstrip("\n"))
+        except (OSError, ValueError) as e:
+            if not self.closed and self.on_error:
+                self.on_error(self, e)
+        finally:
+            self.sock.close()
+            if self.on_close:
+                self.on_close(self, None, None)
+
+    def send(self, text):
+        """只轉送訂閱 / 退訂；pong 等連線維持訊息由常駐程序處理"""
+        try:
+            data = json.loads(text)
+        except (TypeError, ValueError):
+            return
+        if not isinstance(data, dict) or data.get("event") not in ("subscribe", "unsubscribe"):
+            return
+        with self.send_lock:
+            if self.sock is None:
+                raise ConnectionError("market data daemon not connected")
+            self.sock.sendall((_line({"op": data["event"], "channel": data.get("channel")}) + "\n").encode('utf-8'))
+
+    def close(self):
+        self.closed = True
+        if self.sock is not None:
+            try:
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+class MarketDataClient:
+    """
+    機器人端的歷史 K 線查詢：向常駐程序取得 (共用緩衝區)，常駐程序無法連線時改用 fallback 直接呼叫 REST
+    介面與 WeexClient.get_history_candles 相同，可直接替換 StrategyManager.market_data
+    """
+
+    def __init__(self, socket_path, fallback=None, timeout=5.0):
+        self.socket_path = socket_path
+        self.fallback = fallback
+        self.timeout = timeout
+        self.served = 0
+        self.fallbacks = 0
+
+    def request(self, payload):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            sock.sendall((_line(payload) + "\n").encode('utf-8'))
+            line = sock.makefile("r", encoding="utf-8").readline()
+        return json.loads(line)
+
+    def _map_interval(self, interval):
+        return INTERVAL_GRANULARITY.get(interval, "1m")
+
+    def get_history_candles(self, symbol, granularity, start_time=None, end_time=None, limit=100):
+        try:
+            reply = self.request({"op": "candles", "symbol": symbol, "granularity": granularity,
+                                  "start_time": start_time, "end_time": end_time, "limit": limit})
+            if reply.get("op") == "candles":
+                self.served += 1
+                return reply["data"]
+            print(f"⚠️ 行情常駐程序查詢失敗: {reply.get('msg')}")
+        except (OSError, ValueError) as e:
+            print(f"⚠️ 無法連線行情常駐程序 ({self.socket_path}): {e}")
+        if self.fallback is None:
+            return []
+        self.fallbacks += 1
+        return self.fallback.get_history_candles(symbol, granularity, start_time=start_time,
+                                                 end_time=end_time, limit=limit)
+
+    def stats(self):
+        return self.request({"op": "stats"}).get("data")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="共用行情常駐程序 (Unix socket)")
+    parser.add_argument("--socket", default=getattr(config, "MARKET_DATA_SOCKET", None) or DEFAULT_SOCKET_PATH)
+    parser.add_argument("--url", default=None, help="上游 WebSocket (預設 config.WS_URL)")
+    parser.add_argument("--candles", type=int, default=500, help="每個週期保留的 K 線根數")
+    args = parser.parse_args()
+
+    daemon = MarketDataDaemon(args.socket, url=args.url, candle_limit=args.candles).start()
+    try:
+        while True:
+            time.sleep(60)
+            print(f"📊 [Daemon] {daemon.stats()}")
+    except KeyboardInterrupt:
+        daemon.stop()
@@ -0,0 +1,202 @@
+"""
+原始行情錄製 (Market Data Recorder)
+
+把 WebSocket 收到的每一則原始訊息連同接收時間 (ns) 追加寫入二進位分段檔，
+事後可用 mmap 讀回，作為事故重現、確定性回放 (replay) 與解碼效能測試的資料來源。
+
+分段檔格式 (little-endian)：
+    檔頭   : b"WXMD" + uint16 版本 + uint16 保留
+    每筆   : int64 接收時間(ns) + uint32 長度 + 原始訊息 bytes (UTF-8)
+每筆額外成本只有 12 bytes；程序異常中斷時最後一筆可能不完整，讀取時會自動略過。
+
+檔名為 {prefix}-{第一筆接收時間 ns}.seg，依檔名排序即為時間順序。
+超過 segment_bytes 或 segment_seconds 時換新檔。
+
+使用方式：
+    python market_recorder.py stats data/market
+    python market_recorder.py bench data/market      # 讀取 + json 解碼速度
+    python market_recorder.py dump data/market --limit 20
+"""
+import argparse
+import glob
+import heapq
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+
+MAGIC = b"WXMD"
+VERSION = 1
+FILE_HEADER = struct.Struct("<4sHH")
+RECORD_HEADER = struct.Struct("<qI")
+SEGMENT_SUFFIX = ".seg"
+
+
+class MarketRecorder:
+    def __init__(self, directory="data/market", prefix="stream", segment_bytes=64 * 1024 * 1024,
+                 segment_seconds=3600, flush_interval=1.0, buffer_size=1024 * 1024):
+        self.directory = directory
+        self.prefix = prefix
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.flush_interval = flush_interval
+        self.buffer_size = buffer_size
+        self.lock = threading.Lock()
+        self.file = None
+        self.path = None
+        self.segment_size = 0
+        self.segment_started = 0.0
+        self.last_flush = 0.0
+        self.count = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _open_segment(self, recv_ns):
+        self._close_segment()
+        self.path = os.path.join(self.directory, f"{self.prefix}-{recv_ns}{SEGMENT_SUFFIX}")
+        self.file = open(self.path, "ab", buffering=self.buffer_size)
+        self.file.write(FILE_HEADER.pack(MAGIC, VERSION, 0))
+        self.segment_size = FILE_HEADER.size
+        self.segment_started = time.time()
+
+    def _close_segment(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def record(self, message, recv_ns=None):
+        """在 WebSocket 執行緒中呼叫；只做一次 struct.pack + 緩衝寫入"""
+        if recv_ns is None:
+            recv_ns = time.time_ns()
+        payload = message.encode("utf-8") if isinstance(message, str) else bytes(message)
+        with self.lock:
+            if (self.file is None or self.segment_size >= self.segment_bytes
+                    or time.time() - self.segment_started >= self.segment_seconds):
+                self._open_segment(recv_ns)
+            self.file.write(RECORD_HEADER.pack(recv_ns, len(payload)))
+            self.file.write(payload)
+            self.segment_size += RECORD_HEADER.size + len(payload)
+            self.count += 1
+            now = time.monotonic()
+            if now - self.last_flush >= self.flush_interval:
+                self.file.flush()
+                self.last_flush = now
+
+    def flush(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.flush()
+
+    def close(self):
+        with self.lock:
+            self._close_segment()
+
+
+class SegmentReader:
+    """以 mmap 讀取單一分段檔，逐筆產生 (接收時間 ns, 原始 bytes)"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def __iter__(self):
+        size = os.path.getsize(self.path)
+        if size < FILE_HEADER.size:
+            return
+        with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            magic, version, _ = FILE_HEADER.unpack_from(mm, 0)
+            if magic != MAGIC:
+                raise ValueError(f"{self.path} 不是行情錄製檔")
+            if version != VERSION:
+                raise ValueError(f"{self.path} 版本 {version} 不支援")
+            offset = FILE_HEADER.size
+            header_size = RECORD_HEADER.size
+            unpack = RECORD_HEADER.unpack_from
+            while offset + header_size <= size:
+                recv_ns, length = unpack(mm, offset)
+                start = offset + header_size
+                end = start + length
+                if end > size:
+                    break  # 最後一筆寫到一半
+                yield recv_ns, mm[start:end]
+                offset = end
+
+
+def list_segments(directory, prefix=None):
+    pattern = f"{prefix}-*{SEGMENT_SUFFIX}" if prefix else f"*{SEGMENT_SUFFIX}"
+    paths = glob.glob(os.path.join(directory, pattern))
+    return sorted(paths, key=lambda p: int(os.path.basename(p)[:-len(SEGMENT_SUFFIX)].rsplit("-", 1)[1]))
+
+
+def read_frames(directory, prefix=None, start_ns=None, end_ns=None, decode=True):
+    """
+    依接收時間順序讀出所有訊息 (多個 prefix 的錄製檔會合併排序)
+    產生 (接收時間 ns, 訊息)；decode=True 時訊息為 str，否則為 bytes
+    """
+    streams = {}
+    for path in list_segments(directory, prefix):
+        name = os.path.basename(path)[:-len(SEGMENT_SUFFIX)].rsplit("-", 1)[0]
+        streams.setdefault(name, []).append(path)
+
+    def _iter_prefix(paths):
+        for path in paths:
+            yield from SegmentReader(path)
+
+    merged = heapq.merge(*(_iter_prefix(paths) for paths in streams.values()), key=lambda r: r[0])
+    for recv_ns, payload in merged:
+        if start_ns is not None and recv_ns < start_ns:
+            continue
+        if end_ns is not None and recv_ns > end_ns:
+            break
+        yield recv_ns, payload.decode("utf-8") if decode else payload
+
+
+def _stats(args):
+    segments = list_segments(args.directory, args.prefix)
+    count, total_bytes, first, last = 0, 0, None, None
+    for recv_ns, payload in read_frames(args.directory, args.prefix, decode=False):
+        count += 1
+        total_bytes += len(payload)
+        first = recv_ns if first is None else first
+        last = recv_ns
+    print(f"📁 分段檔: {len(segments)} | 訊息數: {count} | 原始大小: {total_bytes / 1e6:.2f} MB")
+    if count:
+        span = (last - first) / 1e9
+        print(f"🕒 時間範圍: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(first / 1e9))} ~ "
+              f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(last / 1e9))} ({span:.1f}s)")
+
+
+def _bench(args):
+    started = time.perf_counter()
+    count = sum(1 for _ in read_frames(args.directory, args.prefix, decode=False))
+    read_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _, text in read_frames(args.directory, args.prefix):
+        json.loads(text)
+    decode_s = time.perf_counter() - started
+    if count:
+        print(f"⚡ 讀取: {count / read_s:,.0f} msg/s | 讀取 + JSON 解碼: {count / decode_s:,.0f} msg/s ({count} 筆)")
+    else:
+        print("📭 沒有資料")
+
+
+def _dump(args):
+    for i, (recv_ns, text) in enumerate(read_frames(args.directory, args.prefix)):
+        if i >= args.limit:
+            break
+        print(recv_ns, text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="行情錄製檔工具")
+    parser.add_argument("command", choices=["stats", "bench", "dump"])
+    parser.add_argument("directory")
+    parser.add_argument("--prefix", default=None)
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+    {"stats": _stats, "bench": _bench, "dump": _dump}[args.command](args)
+
+
+if __name__ == "__main__":
+    main()
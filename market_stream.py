@@ -5,10 +5,12 @@ import json
 import hmac
 import hashlib
 import base64
+from urllib.parse import urlparse
 import config
 
 class MarketStream:
-    def __init__(self, symbol, intervals, on_price_update_callback):
+    def __init__(self, symbol, intervals, on_price_update_callback, url=None, order_book=None, depth_levels=None,
+                 recorder=None, daemon_socket=None):
         self.api_key = config.API_KEY
         self.api_secret = config.SECRET_KEY
         self.api_passphrase = config.PASSPHRASE
@@ -18,12 +20,32 @@ class MarketStream:
         self.callback = on_price_update_callback
         
         # 請確認 URL 是否正確，部分合約 WS 需要加上 /v2/ws/public
-        self.request_path = "/v2/ws/public"
-        self.url = f"wss://ws-contract.weex.com{self.request_path}"
+        # 可透過參數或 config.WS_URL 指向本地模擬器 (weex_simulator.py)
+        self.url = url or getattr(config, "WS_URL", "wss://ws-contract.weex.com/v2/ws/public")
+        self.request_path = urlparse(self.url).path or "/v2/ws/public"
+        # 共用行情常駐程序 (market_data_daemon.py)：設定後改由 Unix socket 接收，不自行連線交易所
+        self.daemon_socket = daemon_socket if daemon_socket is not None else getattr(config, "MARKET_DATA_SOCKET", None)
+        
+        # L2 訂單簿 (可選)：訂閱 depth 頻道並以快照 + 增量維護
+        self.order_book = order_book
+        self.depth_channel = None
+        if order_book is not None:
+            levels = depth_levels or getattr(config, "DEPTH_LEVELS", 15)
+            self.depth_channel = f"depth.{self.symbol}.{levels}"
+        
+        # 原始訊息錄製 (可選)，見 market_recorder.py
+        self.recorder = recorder
         
         self.ws = None
         self.wst = None
 
+        # 健康狀態 (供 supervisor.py 監控)：各頻道最後收到資料的時間、回呼處理耗時
+        self.started_at = None
+        self.last_message_at = {}   # channel -> time.time()
+        self.connects = 0
+        self.callback_ms_max = 0.0  # 上次 reset_callback_stats() 之後的最大回呼耗時
+        self.callback_ms_avg = 0.0  # 指數平均
+
     def generate_headers(self):
         timestamp = str(int(time.time() * 1000))
         message = timestamp + self.request_path
@@ -44,6 +66,7 @@ class MarketStream:
 
     def on_open(self, ws):
         print(f"✅ WebSocket 連線已建立，正在訂閱 {self.intervals}...")
+        self.connects += 1
         
         # 發送訂閱請求
         for interval in self.intervals:
@@ -55,7 +78,38 @@ class MarketStream:
             ws.send(json.dumps(subscribe_payload))
             print(f"📡 已發送訂閱: {channel_name}")
 
+        if self.depth_channel:
+            # 重連後舊的訂單簿不可信，等待新快照
+            self.order_book.reset()
+            ws.send(json.dumps({"event": "subscribe", "channel": self.depth_channel}))
+            print(f"📡 已發送訂閱: {self.depth_channel}")
+
+    def resubscribe_depth(self, ws):
+        """訂單簿失效 (版本缺口) 時重新訂閱，以取得新的快照"""
+        self.order_book.reset()
+        ws.send(json.dumps({"event": "unsubscribe", "channel": self.depth_channel}))
+        ws.send(json.dumps({"event": "subscribe", "channel": self.depth_channel}))
+
+    def on_depth(self, ws, market_data):
+        if isinstance(market_data, list):
+            market_data = market_data[0] if market_data else {}
+        bids, asks = market_data.get('bids'), market_data.get('asks')
+        end_version = market_data.get('endVersion', market_data.get('version'))
+        if str(market_data.get('depthType', '')).upper() == 'SNAPSHOT':
+            self.order_book.apply_snapshot(bids, asks, version=end_version)
+            return
+        if not self.order_book.apply_delta(bids, asks, market_data.get('startVersion'), end_version):
+            # 快照尚未到達前的增量直接丟棄；若是缺口則重新訂閱
+            if self.order_book.version is not None:
+                print(f"🔁 [OrderBook] 重新訂閱 {self.depth_channel} 取得快照")
+                self.resubscribe_depth(ws)
+
     def on_message(self, ws, message):
+        if self.recorder is not None:
+            try:
+                self.recorder.record(message)
+            except Exception as e:
+                print(f"⚠️ 行情錄製失敗: {e}")
         try:
             # 1. 嘗試解析 JSON
             data = json.loads(message)
@@ -63,6 +117,7 @@ class MarketStream:
             # 2. [關鍵修正] 處理伺服器的主動 Ping
             # 格式: {"event":"ping","time":"1693208170000"}
             if isinstance(data, dict) and data.get('event') == 'ping':
+                self.last_message_at['ping'] = time.time()
                 server_time = data.get('time')
                 pong_payload = {
                     "event": "pong",
@@ -82,6 +137,11 @@ class MarketStream:
             if 'data' in data and 'channel' in data:
                 channel = data['channel']
                 market_data = data['data']
+                self.last_message_at[channel] = time.time()
+
+                if self.depth_channel and channel.startswith('depth.'):
+                    self.on_depth(ws, market_data)
+                    return
                 
                 # 解析週期 (從 channel 字串中取出 MINUTE_1 或 HOUR_4)
                 interval = channel.split('.')[-1]
@@ -92,7 +152,12 @@ class MarketStream:
                 if isinstance(market_data, dict):
                     # 嘗試抓取 close (收盤價/最新價)
                     price = float(market_data.get('close') or market_data.get('c', 0))
+                    started = time.perf_counter()
                     self.callback(interval, price)
+                    elapsed_ms = (time.perf_counter() - started) * 1000
+                    self.callback_ms_avg += (elapsed_ms - self.callback_ms_avg) * 0.05
+                    if elapsed_ms > self.callback_ms_max:
+                        self.callback_ms_max = elapsed_ms
             
         except json.JSONDecodeError:
             # 萬一收到純字串訊息 (雖然根據您的描述應該都是 JSON)
@@ -109,19 +174,70 @@ class MarketStream:
         time.sleep(5)
         self.start()
 
+    def channels(self):
+        """應持續有資料的頻道"""
+        channels = [f"kline.LAST_PRICE.{self.symbol}.{interval}" for interval in self.intervals]
+        if self.depth_channel:
+            channels.append(self.depth_channel)
+        return channels
+
+    def feed_channels(self):
+        """
+        用來判斷行情中斷的頻道 (只有 K 線)
+        depth 頻道沒有資料只代表訂單簿不可用 (OrderBook.is_fresh() 為 False，下單改回市價)，不應暫停交易或觸發重連
+        """
+        return [f"kline.LAST_PRICE.{self.symbol}.{interval}" for interval in self.intervals]
+
+    def message_age(self, channel):
+        """距離該頻道最後一筆資料的秒數 (從未收到或剛重連則以 (重新) 啟動時間計算)"""
+        last = max(self.last_message_at.get(channel) or 0.0, self.started_at or 0.0)
+        return time.time() - last if last else float("inf")
+
+    def reset_callback_stats(self):
+        peak = self.callback_ms_max
+        self.callback_ms_max = 0.0
+        return peak
+
+    def is_running(self):
+        return self.wst is not None and self.wst.is_alive()
+
+    def reconnect(self):
+        """強制重連：關閉目前連線 (on_close 會重新 start)；執行緒已經死掉時直接重新啟動"""
+        print("🔌 強制重新連線 WebSocket...")
+        self.started_at = time.time()
+        if self.is_running() and self.ws is not None:
+            try:
+                self.ws.close()
+                return
+            except Exception as e:
+                print(f"⚠️ 關閉 WebSocket 失敗: {e}")
+        self.start()
+
     def start(self):
+        if self.started_at is None:
+            self.started_at = time.time()
         try:
-            auth_headers = self.generate_headers()
-            websocket.enableTrace(False)
-            self.ws = websocket.WebSocketApp(
-                self.url,
-                on_open=self.on_open,
-                on_message=self.on_message,
-                on_error=self.on_error,
-                on_close=self.on_close,
-                header=auth_headers
-            )
-            self.wst = threading.Thread(target=self.ws.run_forever)
+            if self.daemon_socket:
+                from market_data_daemon import DaemonConnection
+                self.ws = DaemonConnection(
+                    self.daemon_socket,
+                    on_open=self.on_open,
+                    on_message=self.on_message,
+                    on_error=self.on_error,
+                    on_close=self.on_close
+                )
+            else:
+                auth_headers = self.generate_headers()
+                websocket.enableTrace(False)
+                self.ws = websocket.WebSocketApp(
+                    self.url,
+                    on_open=self.on_open,
+                    on_message=self.on_message,
+                    on_error=self.on_error,
+                    on_close=self.on_close,
+                    header=auth_headers
+                )
+            self.wst = threading.Thread(target=self.ws.run_forever, name=f"market-stream-{self.symbol}")
             self.wst.daemon = True
             self.wst.start()
         except Exception as e:
@@ -0,0 +1,409 @@
+"""
+策略參數掃描優化器 (Parameter Sweep Optimizer)
+
+在本地快取的歷史 K 線上，平行回測多組策略參數：
+- RSI_PERIOD / RSI_OVERBOUGHT / BB_LENGTH / BB_STD
+- 盤整判斷的布林寬度門檻 (RANGE_BB_WIDTH，原本寫死 5%)
+- TP_SL_BY_STRATEGY 的止盈止損
+
+設計重點：
+- 相同 lookback (RSI_PERIOD, BB_LENGTH, BB_STD) 的指標序列只算一次，放進 SharedMemory 給所有 worker 共用
+- 使用 ProcessPoolExecutor，結果邊算邊寫入 JSONL，中斷後重跑會自動跳過已完成的組合 (可續跑)
+- 每筆結果帶有本次執行的指紋 (K 線區間與內容、手續費、冷卻)，重新下載資料或改設定後不會沿用舊結果
+- 突破策略在回測中不呼叫 AI，視為 AI 全部放行 (上限估計)
+
+使用方式：
+    python optimizer.py fetch --days 180
+    python optimizer.py run --samples 5000 --workers 8
+    python optimizer.py top --n 20
+"""
+import argparse
+import csv
+import hashlib
+import itertools
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+import config
+import indicators
+
+DATA_DIR = "data"
+RESULTS_DIR = os.path.join(DATA_DIR, "optimizer")
+
+# 預設搜尋空間 (可用 --space 指定 JSON 檔覆寫)
+DEFAULT_SPACE = {
+    "rsi_period": [7, 10, 14, 21],
+    "rsi_overbought": [65, 70, 75, 80],
+    "bb_length": [14, 20, 30],
+    "bb_std": [1.5, 2.0, 2.5],
+    "range_bb_width": [0.02, 0.03, 0.05, 0.08],
+    "range_tp": [0.004, 0.008, 0.012],
+    "range_sl": [0.004, 0.006, 0.01],
+    "breakout_tp": [0.015, 0.03, 0.05],
+    "breakout_sl": [0.01, 0.015, 0.025],
+}
+
+INTERVAL_MS = {
+    "MINUTE_1": 60_000, "MINUTE_5": 300_000, "MINUTE_15": 900_000, "MINUTE_30": 1_800_000,
+    "HOUR_1": 3_600_000, "HOUR_4": 14_400_000, "HOUR_12": 43_200_000,
+}
+
+
+# --- 歷史資料快取 ---
+def history_path(symbol, interval):
+    return os.path.join(DATA_DIR, f"{symbol}_{interval}.csv")
+
+
+def fetch_history(client, symbol, interval, days, path=None, page_limit=100):
+    """由新到舊分頁抓取 K 線並寫入 CSV 快取"""
+    path = path or history_path(symbol, interval)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    step_ms = INTERVAL_MS.get(interval, 60_000)
+    granularity = client._map_interval(interval)
+    end_time = int(time.time() * 1000)
+    start_limit = end_time - days * 86_400_000
+
+    rows = {}
+    while end_time > start_limit:
+        page = client.get_history_candles(symbol=symbol, granularity=granularity,
+                                          end_time=end_time, limit=page_limit)
+        if not page:
+            break
+        for r in page:
+            rows[int(r[0])] = r[:6]
+        oldest = min(int(r[0]) for r in page)
+        if oldest >= end_time:
+            break
+        end_time = oldest - step_ms
+        print(f"📥 已抓取 {len(rows)} 根 K 線 (最舊: {pd.to_datetime(oldest, unit='ms')})")
+
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["time", "open", "high", "low", "close", "vol"])
+        for ts in sorted(rows):
+            if ts >= start_limit:
+                writer.writerow(rows[ts])
+    print(f"✅ 已寫入 {path}")
+    return path
+
+
+def load_history(path):
+    df = pd.read_csv(path)
+    df = df.sort_values("time").drop_duplicates("time").reset_index(drop=True)
+    return df
+
+
+# --- 參數空間 ---
+def config_key(params):
+    """參數組合的穩定雜湊 (續跑用)"""
+    raw = json.dumps(params, sort_keys=True)
+    return hashlib.sha1(raw.encode()).hexdigest()[:16]
+
+
+def run_fingerprint(df, settings):
+    """K 線資料 (區間、根數、收盤價) 與回測設定的雜湊；任一項改變，續跑時就不能沿用舊結果"""
+    meta = {"bars": len(df), "start": int(df["time"].iloc[0]) if len(df) else None,
+            "end": int(df["time"].iloc[-1]) if len(df) else None, "settings": settings}
+    h = hashlib.sha1(json.dumps(meta, sort_keys=True).encode())
+    h.update(np.ascontiguousarray(df["close"].to_numpy(dtype=np.float64)).tobytes())
+    return h.hexdigest()[:12]
+
+
+def indicator_key(params):
+    return (int(params["rsi_period"]), int(params["bb_length"]), float(params["bb_std"]))
+
+
+def iter_grid(space):
+    names = sorted(space)
+    for values in itertools.product(*(space[n] for n in names)):
+        yield dict(zip(names, values))
+
+
+def sample_space(space, n, seed=0):
+    """從網格中不重複隨機抽樣 n 組 (網格太大時使用)"""
+    rng = random.Random(seed)
+    names = sorted(space)
+    sizes = [len(space[k]) for k in names]
+    total = int(np.prod(sizes))
+    if n >= total:
+        return list(iter_grid(space))
+    picked = rng.sample(range(total), n)
+    result = []
+    for flat in picked:
+        params = {}
+        for name, size in zip(reversed(names), reversed(sizes)):
+            flat, idx = divmod(flat, size)
+            params[name] = space[name][idx]
+        result.append(params)
+    return result
+
+
+# --- 指標計算 (與 main.py _apply_klines 相同的 indicators.py 函式) ---
+def compute_indicators(close, rsi_period, bb_length, bb_std):
+    """回傳 (rsi, bb_lower, bb_mid, bb_upper)，長度與 close 相同"""
+    close = np.asarray(close, dtype=float)
+    bands = indicators.bbands(close, bb_length, bb_std)
+    return indicators.rsi(close, rsi_period), bands["lower"], bands["mid"], bands["upper"]
+
+
+class SharedSeries:
+    """
+    把 OHLC 與所有不重複 lookback 的指標放進同一塊 SharedMemory
+    列配置: 0=high, 1=low, 2=close, 之後每個 lookback 佔 4 列 (rsi, bbl, bbm, bbu)
+    """
+
+    def __init__(self, df, keys):
+        self.keys = sorted(set(keys))
+        self.index = {k: 3 + 4 * i for i, k in enumerate(self.keys)}
+        self.shape = (3 + 4 * len(self.keys), len(df))
+        nbytes = int(np.prod(self.shape)) * 8
+        self.shm = shared_memory.SharedMemory(create=True, size=max(nbytes, 8))
+        arr = np.ndarray(self.shape, dtype=np.float64, buffer=self.shm.buf)
+        close = df["close"].to_numpy(dtype=float)
+        arr[0] = df["high"].to_numpy(dtype=float)
+        arr[1] = df["low"].to_numpy(dtype=float)
+        arr[2] = close
+        for key in self.keys:
+            row = self.index[key]
+            arr[row:row + 4] = np.vstack(compute_indicators(close, *key))
+        del arr
+
+    def spec(self):
+        return {"name": self.shm.name, "shape": self.shape, "index": self.index}
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+_WORKER = {}
+
+
+def _attach_shared(name):
+    # 由父行程負責 unlink；Python 3.13+ 可直接關閉 worker 端的 resource_tracker 追蹤
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+def _init_worker(spec, settings):
+    shm = _attach_shared(spec["name"])
+    _WORKER["shm"] = shm
+    _WORKER["arr"] = np.ndarray(spec["shape"], dtype=np.float64, buffer=shm.buf)
+    _WORKER["index"] = spec["index"]
+    _WORKER["settings"] = settings
+
+
+# --- 回測核心 ---
+def _find_exit(high, low, start, tp, sl):
+    """從 start 開始找第一根觸及 TP 或 SL 的 K 線 (同根同時觸及時保守視為先止損)"""
+    n = len(high)
+    window = 64
+    i = start
+    while i < n:
+        j = min(n, i + window)
+        hit_sl = low[i:j] <= sl
+        hit_tp = high[i:j] >= tp
+        hit = hit_sl | hit_tp
+        if hit.any():
+            k = int(np.argmax(hit))
+            return i + k, (sl if hit_sl[k] else tp)
+        i = j
+        window *= 2
+    return None, None
+
+
+def backtest(params, arr, index, settings):
+    high, low, close = arr[0], arr[1], arr[2]
+    row = index[indicator_key(params)]
+    rsi, bbl, bbm, bbu = arr[row], arr[row + 1], arr[row + 2], arr[row + 3]
+    cooldown = settings["cooldown_bars"]
+    fee = settings["fee_rate"]
+
+    # 以前一根 (已結算) K 線的指標 + 本根收盤價當作 tick，與 on_tick 的判斷一致
+    prev_bbl, prev_bbm, prev_bbu, prev_high = bbl[:-1], bbm[:-1], bbu[:-1], high[:-1]
+    price, rt_rsi = close[1:], rsi[1:]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        is_range = (prev_bbu - prev_bbl) / prev_bbm < params["range_bb_width"]
+        range_sig = is_range & (prev_bbl < price) & (price < prev_bbl * 1.005) & (rt_rsi > 40)
+        breakout_sig = (~range_sig) & (price > prev_high * 1.001) & (
+            (rt_rsi > params["rsi_overbought"]) | (price > prev_bbu * 1.001))
+
+    candidates = np.flatnonzero(range_sig | breakout_sig) + 1
+    trades = []
+    next_allowed = 0
+    for i in candidates:
+        if i < next_allowed:
+            continue
+        entry = close[i]
+        if range_sig[i - 1]:
+            tp_pct, sl_pct = params["range_tp"], params["range_sl"]
+        else:
+            tp_pct, sl_pct = params["breakout_tp"], params["breakout_sl"]
+        exit_idx, exit_price = _find_exit(high, low, i + 1, entry * (1 + tp_pct), entry * (1 - sl_pct))
+        if exit_idx is None:
+            break
+        trades.append((exit_price / entry - 1) - 2 * fee)
+        # MAX_POSITIONS=1: 平倉前不再進場；另外遵守 COOLDOWN_HOURS
+        next_allowed = max(exit_idx + 1, i + cooldown)
+
+    if not trades:
+        return {"trades": 0, "total_return": 0.0, "win_rate": 0.0, "max_drawdown": 0.0, "profit_factor": 0.0}
+    pnl = np.array(trades)
+    equity = np.cumsum(pnl)
+    drawdown = np.max(np.maximum.accumulate(np.concatenate(([0.0], equity)))[1:] - equity)
+    gains, losses = pnl[pnl > 0].sum(), -pnl[pnl < 0].sum()
+    return {
+        "trades": int(len(pnl)),
+        "total_return": round(float(equity[-1]), 6),
+        "win_rate": round(float((pnl > 0).mean()), 4),
+        "max_drawdown": round(float(drawdown), 6),
+        "profit_factor": round(float(gains / losses), 4) if losses > 0 else None,
+    }
+
+
+def _run_chunk(chunk):
+    results = []
+    for params in chunk:
+        metrics = backtest(params, _WORKER["arr"], _WORKER["index"], _WORKER["settings"])
+        results.append({"key": config_key(params), "params": params, **metrics})
+    return results
+
+
+# --- 主流程 ---
+def load_done_keys(path, run):
+    """同一個指紋 (run) 已完成的參數組合"""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+                if row.get("run") == run:
+                    done.add(row["key"])
+            except (ValueError, KeyError, AttributeError):
+                continue  # 中斷時寫到一半的行
+    return done
+
+
+def run_sweep(df, configs, results_path, workers=None, chunk_size=50, fee_rate=0.0006,
+              cooldown_hours=None, interval=None):
+    os.makedirs(os.path.dirname(results_path) or ".", exist_ok=True)
+    interval = interval or config.STRATEGY_INTERVAL
+    cooldown_hours = config.COOLDOWN_HOURS if cooldown_hours is None else cooldown_hours
+    settings = {
+        "fee_rate": fee_rate,
+        "cooldown_bars": int(cooldown_hours * 3_600_000 / INTERVAL_MS.get(interval, 300_000)),
+    }
+    run = run_fingerprint(df, settings)
+    done = load_done_keys(results_path, run)
+    pending = [p for p in configs if config_key(p) not in done]
+    print(f"🧮 [{run}] 共 {len(configs)} 組參數，已完成 {len(configs) - len(pending)}，待跑 {len(pending)}")
+    if not pending:
+        return results_path
+
+    # 依指標 key 排序，讓同一 chunk 盡量使用相同的共享序列 (cache locality)
+    pending.sort(key=indicator_key)
+    shared = SharedSeries(df, [indicator_key(p) for p in pending])
+    print(f"📐 不重複 lookback 組合: {len(shared.keys)} 組 (已預先計算並共享)")
+
+    chunks = [pending[i:i + chunk_size] for i in range(0, len(pending), chunk_size)]
+    started = time.time()
+    finished = 0
+    try:
+        with open(results_path, "a", encoding="utf-8") as out, \
+                ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                    initargs=(shared.spec(), settings)) as pool:
+            futures = [pool.submit(_run_chunk, c) for c in chunks]
+            for fut in as_completed(futures):
+                for res in fut.result():
+                    out.write(json.dumps(dict(res, run=run)) + "\n")
+                out.flush()
+                finished += 1
+                if finished % 20 == 0 or finished == len(chunks):
+                    rate = finished * chunk_size / (time.time() - started)
+                    print(f"⏱️ {finished}/{len(chunks)} chunks | 約 {rate:.0f} 組/秒")
+    finally:
+        shared.close()
+    print(f"✅ 完成，共耗時 {time.time() - started:.1f} 秒，結果: {results_path}")
+    return results_path
+
+
+def top_results(results_path, n=10, sort_by="total_return", min_trades=5, run=None):
+    """
+    最佳結果；只比較同一個指紋 (run) 的結果，run=None 時取檔案中最後一次執行的指紋
+    (不同資料區間 / 手續費的結果不能混在一起排名)
+    """
+    rows = []
+    with open(results_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                rows.append(json.loads(line))
+            except ValueError:
+                continue
+    if run is None and rows:
+        run = rows[-1].get("run")
+    rows = [r for r in rows if r.get("run") == run and r["trades"] >= min_trades]
+    rows.sort(key=lambda r: r.get(sort_by) or 0, reverse=True)
+    return rows[:n]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="策略參數掃描優化器")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_fetch = sub.add_parser("fetch", help="下載歷史 K 線到本地快取")
+    p_fetch.add_argument("--days", type=int, default=90)
+
+    p_run = sub.add_parser("run", help="執行參數掃描")
+    p_run.add_argument("--space", help="參數空間 JSON 檔 (預設使用 DEFAULT_SPACE)")
+    p_run.add_argument("--samples", type=int, default=0, help="隨機抽樣組數 (0 = 完整網格)")
+    p_run.add_argument("--seed", type=int, default=0)
+    p_run.add_argument("--workers", type=int, default=None)
+    p_run.add_argument("--chunk-size", type=int, default=50)
+    p_run.add_argument("--fee", type=float, default=0.0006, help="單邊手續費率")
+
+    p_top = sub.add_parser("top", help="列出最佳結果")
+    p_top.add_argument("--n", type=int, default=10)
+    p_top.add_argument("--sort-by", default="total_return")
+    p_top.add_argument("--min-trades", type=int, default=5)
+    p_top.add_argument("--run", default=None, help="只列出此指紋的結果 (預設為最後一次執行)")
+
+    for p in (p_fetch, p_run, p_top):
+        p.add_argument("--symbol", default=config.SYMBOL)
+        p.add_argument("--interval", default=config.STRATEGY_INTERVAL)
+    args = parser.parse_args()
+
+    results_path = os.path.join(RESULTS_DIR, f"{args.symbol}_{args.interval}.jsonl")
+
+    if args.cmd == "fetch":
+        from exchange_client import WeexClient
+        fetch_history(WeexClient(), args.symbol, args.interval, args.days)
+
+    elif args.cmd == "run":
+        space = DEFAULT_SPACE
+        if args.space:
+            with open(args.space, encoding="utf-8") as f:
+                space = json.load(f)
+        configs = sample_space(space, args.samples, args.seed) if args.samples else list(iter_grid(space))
+        df = load_history(history_path(args.symbol, args.interval))
+        print(f"📊 載入 {len(df)} 根 K 線")
+        run_sweep(df, configs, results_path, workers=args.workers, chunk_size=args.chunk_size,
+                  fee_rate=args.fee, interval=args.interval)
+
+    elif args.cmd == "top":
+        for r in top_results(results_path, args.n, args.sort_by, args.min_trades, args.run):
+            print(f"{r['total_return']:+.4f} | 交易 {r['trades']:4d} | 勝率 {r['win_rate']:.2%} | "
+                  f"MDD {r['max_drawdown']:.4f} | {json.dumps(r['params'])}")
+
+
+if __name__ == "__main__":
+    main()
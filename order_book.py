@@ -0,0 +1,291 @@
+"""
+L2 訂單簿 (Order Book)
+
+- 由 WebSocket depth 頻道維護：先收快照 (SNAPSHOT)，之後套用增量 (CHANGED)
+- 每筆增量檢查版本號是否連續；出現缺口或買賣價交叉時標記為失效，由 MarketStream 重新訂閱取得新快照
+- 價格以排序列表 + dict 保存，最佳價 O(1)、單一價位更新 O(log n)
+- 提供點差、N bps 內深度、指定數量的預估成交均價等查詢，全部在本地計算，不需要 REST 請求
+
+plan_market_order() 依訂單簿決定下單數量與方式 (市價 / IOC 限價 / 放棄)。
+plan_ladder() 把一筆進場拆成多檔限價單 (階梯掛單)，搭配批次下單一次送出。
+"""
+import threading
+import time
+from bisect import bisect_left, insort
+from decimal import Decimal, ROUND_DOWN
+
+BUY = "buy"    # 吃賣單 (asks)
+SELL = "sell"  # 吃買單 (bids)
+
+
+def _parse_levels(levels):
+    """支援 [[price, size], ...] 與 [{"price":..,"size":..}, ...] 兩種格式"""
+    parsed = []
+    for lv in levels or []:
+        if isinstance(lv, dict):
+            price, size = lv.get("price", lv.get("p")), lv.get("size", lv.get("s", lv.get("qty")))
+        else:
+            price, size = lv[0], lv[1]
+        parsed.append((float(price), float(size)))
+    return parsed
+
+
+class _BookSide:
+    """單邊價位：prices 遞增排序，sizes 為 {price: size}"""
+    def __init__(self, descending):
+        self.descending = descending
+        self.prices = []
+        self.sizes = {}
+
+    def clear(self):
+        self.prices = []
+        self.sizes = {}
+
+    def set(self, price, size):
+        if size <= 0:
+            if price in self.sizes:
+                del self.sizes[price]
+                idx = bisect_left(self.prices, price)
+                if idx < len(self.prices) and self.prices[idx] == price:
+                    self.prices.pop(idx)
+            return
+        if price not in self.sizes:
+            insort(self.prices, price)
+        self.sizes[price] = size
+
+    def best(self):
+        if not self.prices:
+            return None
+        price = self.prices[-1] if self.descending else self.prices[0]
+        return price, self.sizes[price]
+
+    def walk(self):
+        """由最佳價往外走"""
+        order = reversed(self.prices) if self.descending else self.prices
+        for price in order:
+            yield price, self.sizes[price]
+
+    def levels(self, n=None):
+        out = []
+        for lv in self.walk():
+            if n is not None and len(out) >= n:
+                break
+            out.append(lv)
+        return out
+
+
+class OrderBook:
+    def __init__(self, symbol, max_age=5.0):
+        self.symbol = symbol
+        self.max_age = max_age
+        self.bids = _BookSide(descending=True)
+        self.asks = _BookSide(descending=False)
+        self.version = None
+        self.ready = False
+        self.last_update = 0.0
+        self.gaps = 0
+        self.lock = threading.Lock()
+
+    # --- 維護 ---
+    def reset(self):
+        with self.lock:
+            self.bids.clear()
+            self.asks.clear()
+            self.version = None
+            self.ready = False
+
+    def apply_snapshot(self, bids, asks, version=None):
+        with self.lock:
+            self.bids.clear()
+            self.asks.clear()
+            for price, size in _parse_levels(bids):
+                self.bids.set(price, size)
+            for price, size in _parse_levels(asks):
+                self.asks.set(price, size)
+            self.version = int(version) if version is not None else None
+            self.ready = True
+            self.last_update = time.time()
+
+    def apply_delta(self, bids, asks, start_version=None, end_version=None):
+        """
+        套用增量；回傳 False 代表訂單簿已失效 (版本缺口或價格交叉)，需重新取得快照
+        """
+        with self.lock:
+            if not self.ready:
+                return False
+            if end_version is not None and self.version is not None:
+                start = int(start_version if start_version is not None else end_version)
+                end = int(end_version)
+                if end <= self.version:
+                    return True  # 重複或過期的增量，略過
+                if start > self.version + 1:
+                    self.ready = False
+                    self.gaps += 1
+                    print(f"⚠️ [OrderBook] {self.symbol} 版本缺口: 本地 {self.version}，收到 {start}-{end}")
+                    return False
+                self.version = end
+            for price, size in _parse_levels(bids):
+                self.bids.set(price, size)
+            for price, size in _parse_levels(asks):
+                self.asks.set(price, size)
+            self.last_update = time.time()
+
+            bid, ask = self.bids.best(), self.asks.best()
+            if bid and ask and bid[0] >= ask[0]:
+                self.ready = False
+                self.gaps += 1
+                print(f"⚠️ [OrderBook] {self.symbol} 買賣價交叉 ({bid[0]} >= {ask[0]})，等待重新快照")
+                return False
+            return True
+
+    # --- 查詢 ---
+    def is_fresh(self):
+        return self.ready and time.time() - self.last_update <= self.max_age
+
+    def best_bid(self):
+        with self.lock:
+            return self.bids.best()
+
+    def best_ask(self):
+        with self.lock:
+            return self.asks.best()
+
+    def mid(self):
+        with self.lock:
+            return self._mid()
+
+    def _mid(self):
+        bid, ask = self.bids.best(), self.asks.best()
+        if not bid or not ask:
+            return None
+        return (bid[0] + ask[0]) / 2
+
+    def spread(self):
+        with self.lock:
+            bid, ask = self.bids.best(), self.asks.best()
+            if not bid or not ask:
+                return None
+            return ask[0] - bid[0]
+
+    def spread_bps(self):
+        with self.lock:
+            mid = self._mid()
+            if not mid:
+                return None
+            return (self.asks.best()[0] - self.bids.best()[0]) / mid * 10_000
+
+    def depth_within_bps(self, bps, side=BUY):
+        """距中間價 bps 以內可吃到的總數量 (buy 看 asks，sell 看 bids)"""
+        with self.lock:
+            mid = self._mid()
+            if not mid:
+                return 0.0
+            if side == BUY:
+                limit = mid * (1 + bps / 10_000)
+                book, inside = self.asks, (lambda p: p <= limit)
+            else:
+                limit = mid * (1 - bps / 10_000)
+                book, inside = self.bids, (lambda p: p >= limit)
+            total = 0.0
+            for price, size in book.walk():
+                if not inside(price):
+                    break
+                total += size
+            return total
+
+    def expected_fill(self, size, side=BUY):
+        """
+        以目前訂單簿模擬市價單
+        回傳 (預估成交均價, 可成交數量)；訂單簿為空時回傳 (None, 0.0)
+        """
+        with self.lock:
+            book = self.asks if side == BUY else self.bids
+            remaining = float(size)
+            cost = 0.0
+            for price, level_size in book.walk():
+                take = min(remaining, level_size)
+                cost += take * price
+                remaining -= take
+                if remaining <= 1e-12:
+                    break
+            filled = float(size) - max(remaining, 0.0)
+            if filled <= 0:
+                return None, 0.0
+            return cost / filled, filled
+
+    def slippage_bps(self, size, side=BUY):
+        """預估成交均價相對中間價的滑價 (bps，不利方向為正)"""
+        avg, filled = self.expected_fill(size, side)
+        mid = self.mid()
+        if avg is None or not mid:
+            return None
+        diff = avg - mid if side == BUY else mid - avg
+        return diff / mid * 10_000
+
+    def snapshot(self, depth=5):
+        with self.lock:
+            return {"symbol": self.symbol, "version": self.version, "ready": self.ready,
+                    "bids": self.bids.levels(depth), "asks": self.asks.levels(depth)}
+
+
+def _floor_to_step(value, step):
+    return Decimal(str(value)).quantize(Decimal(str(step)), rounding=ROUND_DOWN)
+
+
+def plan_market_order(book, size, side=BUY, max_slippage_bps=10.0, size_step=None):
+    """
+    依訂單簿決定下單方式
+    - 流動性足夠且預估滑價在上限內：維持市價單
+    - 否則改成 IOC 限價單，限價 = 中間價 ± 滑價上限，數量縮為該價格內可成交的量
+      (向下取整到 size_step；未提供時依原數量的小數位數)
+    - 連縮減後都為 0：放棄下單
+    - 沒有可用的訂單簿 (未啟用 / 尚未快照 / 資料過期)：維持原本的市價單
+    回傳 dict: action ("market" / "ioc_limit" / "skip"), size (str), price, expected_price, slippage_bps, reason
+    """
+    size_str = str(size)
+    plan = {"action": "market", "size": size_str, "price": None,
+            "expected_price": None, "slippage_bps": None, "reason": "no_book"}
+    if book is None or not book.is_fresh():
+        return plan
+
+    qty = float(size_str)
+    avg, filled = book.expected_fill(qty, side)
+    mid = book.mid()
+    if avg is None or not mid:
+        plan["reason"] = "empty_book"
+        return plan
+
+    slip = (avg - mid if side == BUY else mid - avg) / mid * 10_000
+    plan.update(expected_price=avg, slippage_bps=slip)
+    if filled >= qty and slip <= max_slippage_bps:
+        plan["reason"] = "ok"
+        return plan
+
+    limit_price = mid * (1 + max_slippage_bps / 10_000) if side == BUY else mid * (1 - max_slippage_bps / 10_000)
+    available = book.depth_within_bps(max_slippage_bps, side)
+    step = Decimal(str(size_step)) if size_step else Decimal(1).scaleb(Decimal(size_str).as_tuple().exponent)
+    new_size = _floor_to_step(min(qty, available), step)
+    if new_size <= 0:
+        plan.update(action="skip", size="0", reason="insufficient_liquidity")
+        return plan
+    plan.update(action="ioc_limit", size=str(new_size), price=limit_price,
+                reason="thin_book" if filled < qty else "slippage")
+    return plan
+
+
+def plan_ladder(price, size, levels, step_pct, side=BUY, size_step=None):
+    """
+    階梯掛單：把 size 平均分到 levels 檔，第 i 檔價格 = price × (1 ∓ i × step_pct)
+    (買單往下掛、賣單往上掛)。各檔數量向下取整到 size_step，餘數併入第一檔；數量為 0 的檔位略過
+    回傳 [(price, size_str), ...]，價格尚未取整到 tick
+    """
+    size_str = str(size)
+    step = Decimal(str(size_step)) if size_step else Decimal(1).scaleb(Decimal(size_str).as_tuple().exponent)
+    total = _floor_to_step(size_str, step)
+    levels = max(int(levels), 1)
+    leg = _floor_to_step(total / levels, step)
+    sizes = [leg] * levels
+    sizes[0] += total - leg * levels
+    direction = -1 if side == BUY else 1
+    return [(price * (1 + direction * i * step_pct), str(q))
+            for i, q in enumerate(sizes) if q > 0]
@@ -0,0 +1,458 @@
+"""
+訂單生命週期追蹤 (Order Tracker)
+
+每筆訂單以 client_oid (ClientOrderIdGenerator 產生) 為唯一鍵，狀態機如下：
+
+    PENDING → SUBMITTED → ACKED → FILLED → TP_TRIGGERED / SL_TRIGGERED / CLOSED
+                  │          └──→ CANCELED
+                  ├──→ UNKNOWN (逾時 / 無回應，之後由對帳決定)
+                  └──→ REJECTED
+
+- 逾時或伺服器錯誤時以「同一個」client_oid 重送：交易所對重複的 client_oid 只會回傳原訂單，不會多開倉
+- 只有明確的錯誤碼 (4xx 類參數 / 餘額錯誤) 才視為 REJECTED；重送時回覆「client_oid 重複」代表前一次已送達，
+  沒有錯誤碼也沒有 order_id 的回應無法判斷，兩者都留在 UNKNOWN 交給對帳
+- 重送次數用完仍未確認的訂單留在 UNKNOWN，由 reconcile() 批次對帳：
+  每個交易對只查一次當前掛單 + 一次歷史訂單，比對 client_oid / order_id；
+  只有兩份清單都找不到、但已有 order_id 的訂單才個別查 get_order_detail (有上限，並行送出)
+- 對帳查詢失敗 (連線錯誤 / API 錯誤) 與「查無訂單」分開處理：查詢失敗的那一輪不會把 UNKNOWN 判成未送達
+- 帶止盈止損的訂單成交後持續追蹤，對到平倉單時標記為止盈 / 止損觸發
+- 有期限 (ttl) 的限價單 (階梯掛單) 到期仍未成交時，於背景對帳前批次撤單
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+
+PENDING = "PENDING"
+SUBMITTED = "SUBMITTED"
+UNKNOWN = "UNKNOWN"
+ACKED = "ACKED"
+FILLED = "FILLED"
+CANCELED = "CANCELED"
+REJECTED = "REJECTED"
+TP_TRIGGERED = "TP_TRIGGERED"
+SL_TRIGGERED = "SL_TRIGGERED"
+CLOSED = "CLOSED"
+
+TERMINAL_STATES = {CANCELED, REJECTED, TP_TRIGGERED, SL_TRIGGERED, CLOSED}
+
+# 允許的狀態轉換；晚到的舊狀態 (例如成交後才收到 ack) 直接忽略
+TRANSITIONS = {
+    PENDING: {SUBMITTED, REJECTED},
+    SUBMITTED: {UNKNOWN, ACKED, FILLED, CANCELED, REJECTED},
+    UNKNOWN: {SUBMITTED, ACKED, FILLED, CANCELED, REJECTED},
+    ACKED: {FILLED, CANCELED},
+    FILLED: {TP_TRIGGERED, SL_TRIGGERED, CLOSED},
+}
+
+# 交易所訂單狀態 → 追蹤狀態
+EXCHANGE_STATUS = {
+    "pending": ACKED, "open": ACKED, "partial_filled": ACKED, "untriggered": ACKED,
+    "filled": FILLED, "full_filled": FILLED,
+    "canceling": CANCELED, "canceled": CANCELED, "cancelled": CANCELED,
+}
+
+# 開倉方向 → 對應的平倉方向
+CLOSE_SIDE = {"1": "3", "2": "4"}
+
+# 下單回應中代表成功的 code (沒有 order_id 時無法判斷結果)
+SUCCESS_CODES = {"", "00000", "0", "200"}
+# 重送時 client_oid 重複的錯誤訊息：代表前一次請求其實已送達
+DUPLICATE_HINTS = ("duplicate", "already exist", "重复", "重複")
+
+
+class TrackedOrder:
+    def __init__(self, client_oid, symbol, side, size, params):
+        self.client_oid = client_oid
+        self.symbol = symbol
+        self.side = str(side)
+        self.size = str(size)
+        self.params = params
+        self.take_profit = params.get("preset_take_profit")
+        self.stop_loss = params.get("preset_stop_loss")
+        self.state = PENDING
+        self.order_id = None
+        self.filled_qty = None
+        self.price_avg = None
+        self.filled_at = 0
+        self.exit_order_id = None
+        self.exit_price = None
+        self.attempts = 0
+        self.error = None
+        self.created_at = time.time()
+        self.last_attempt_at = 0.0
+        self.expires_at = None     # 到期未成交自動撤單 (cancel_expired)
+        self.updated_at = self.created_at
+        self.history = [(self.created_at, PENDING)]
+
+    @property
+    def terminal(self):
+        if self.state == FILLED:
+            return not (self.take_profit or self.stop_loss)
+        return self.state in TERMINAL_STATES
+
+    def result(self):
+        """與 place_order 相同格式的回傳值；尚未確認 order_id 時為 None"""
+        if self.order_id is None:
+            return None
+        return {"client_oid": self.client_oid, "order_id": self.order_id}
+
+    def as_dict(self):
+        return {
+            "client_oid": self.client_oid, "order_id": self.order_id, "symbol": self.symbol,
+            "side": self.side, "size": self.size, "state": self.state, "attempts": self.attempts,
+            "filled_qty": self.filled_qty, "price_avg": self.price_avg,
+            "take_profit": self.take_profit, "stop_loss": self.stop_loss,
+            "exit_order_id": self.exit_order_id, "exit_price": self.exit_price, "error": self.error,
+        }
+
+    def __repr__(self):
+        return f"TrackedOrder({self.client_oid}, {self.state}, order_id={self.order_id})"
+
+
+def _is_server_error(result):
+    """5xx 類錯誤碼：交易所可能已收到請求，視為狀態未知"""
+    return str(result.get("code", "")).startswith("5")
+
+
+def _is_duplicate(result):
+    """client_oid 重複：同一筆訂單先前已送達，需要對帳取得 order_id，不能當成拒單"""
+    text = f"{result.get('msg') or ''} {result.get('error_message') or ''}".lower()
+    return any(hint in text for hint in DUPLICATE_HINTS)
+
+
+def _is_rejection(result):
+    """明確的拒單：帶有非成功、非 5xx 的錯誤碼，且不是 client_oid 重複"""
+    code = str(result.get("code") or "")
+    return code not in SUCCESS_CODES and not _is_server_error(result) and not _is_duplicate(result)
+
+
+class OrderTracker:
+    def __init__(self, client, max_attempts=3, retry_backoff=0.2, not_found_grace=10.0,
+                 history_page_size=100, max_detail_lookups=10):
+        self.client = client
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.not_found_grace = not_found_grace
+        self.history_page_size = history_page_size
+        self.max_detail_lookups = max_detail_lookups
+        self.orders = {}          # client_oid -> TrackedOrder
+        self.lock = threading.RLock()
+        self.lookups = 0          # 對帳送出的查詢次數
+        self._reconciling = False
+
+    # --- 狀態機 ---
+    def _transition(self, order, state, **fields):
+        with self.lock:
+            if state != order.state and state not in TRANSITIONS.get(order.state, ()):
+                return False
+            for key, value in fields.items():
+                if value not in (None, ""):
+                    setattr(order, key, value)
+            if state != order.state:
+                order.state = state
+                order.updated_at = time.time()
+                order.history.append((order.updated_at, state))
+        return True
+
+    def get(self, client_oid):
+        return self.orders.get(client_oid)
+
+    def active(self):
+        with self.lock:
+            return [o for o in self.orders.values() if not o.terminal]
+
+    # --- 下單 ---
+    def submit(self, side, size, symbol=None, **params):
+        """
+        以新的 client_oid 下單；逾時 / 5xx 時用同一個 client_oid 重送
+        回傳 TrackedOrder (狀態可能是 ACKED / FILLED / REJECTED / UNKNOWN)
+        """
+        symbol = symbol or config.SYMBOL
+        order = TrackedOrder(self.client.id_gen.generate(), symbol, side, size, params)
+        with self.lock:
+            self.orders[order.client_oid] = order
+
+        for attempt in range(self.max_attempts):
+            if attempt:
+                time.sleep(self.retry_backoff * attempt)
+                print(f"🔁 [OrderTracker] 以相同 client_oid 重送 ({attempt + 1}/{self.max_attempts}): {order.client_oid}")
+            self._transition(order, SUBMITTED)
+            order.attempts += 1
+            order.last_attempt_at = time.time()
+            try:
+                result = self.client.place_order(side=side, size=size, client_oid=order.client_oid, **params)
+            except ValueError as e:
+                # 參數錯誤：送不出去，不需要重試
+                self._transition(order, REJECTED, error=str(e))
+                raise
+            except Exception as e:
+                order.error = str(e)
+                result = None
+
+            if self._apply_result(order, result):
+                break
+
+        if order.state == UNKNOWN:
+            # 重送用完或 client_oid 重複仍未確認：馬上對帳一次，交易所可能其實已經收到
+            print(f"⚠️ [OrderTracker] 訂單狀態未知，對帳中: {order.client_oid}")
+            self.reconcile(symbol)
+        return order
+
+    def submit_batch(self, orders, symbol=None, margin_mode=None, ttl=None):
+        """
+        批次下單 (client.place_batch_orders，一批一個來回)
+        orders: list of dict (side, size, 其餘同 place_order 參數)；回傳同順序的 TrackedOrder list
+        狀態未知的訂單以同一 client_oid 再批次重送
+        ttl: 秒數，到期仍未成交的訂單由 cancel_expired() 撤單 (None = 不過期)
+        """
+        symbol = symbol or config.SYMBOL
+        tracked = []
+        for item in orders:
+            params = {k: v for k, v in item.items() if k not in ("side", "size")}
+            order = TrackedOrder(self.client.id_gen.generate(), symbol, item["side"], item["size"], params)
+            if ttl is not None:
+                order.expires_at = order.created_at + ttl
+            tracked.append(order)
+        with self.lock:
+            for order in tracked:
+                self.orders[order.client_oid] = order
+
+        todo = tracked
+        for attempt in range(self.max_attempts):
+            if attempt:
+                time.sleep(self.retry_backoff * attempt)
+                print(f"🔁 [OrderTracker] 批次重送 {len(todo)} 筆 ({attempt + 1}/{self.max_attempts})")
+            now = time.time()
+            for order in todo:
+                self._transition(order, SUBMITTED)
+                order.attempts += 1
+                order.last_attempt_at = now
+            payload = [dict(o.params, side=o.side, size=o.size, client_oid=o.client_oid) for o in todo]
+            try:
+                results = self.client.place_batch_orders(payload, symbol=symbol, margin_mode=margin_mode)
+            except ValueError as e:
+                for order in todo:
+                    self._transition(order, REJECTED, error=str(e))
+                raise
+            except Exception as e:
+                results = [None] * len(todo)
+                for order in todo:
+                    order.error = str(e)
+            todo = [o for o, r in zip(todo, results) if not self._apply_result(o, r)]
+            if not todo:
+                break
+
+        unknown = sum(o.state == UNKNOWN for o in tracked)
+        if unknown:
+            print(f"⚠️ [OrderTracker] {unknown} 筆批次訂單狀態未知，對帳中")
+            self.reconcile(symbol)
+        return tracked
+
+    def _apply_result(self, order, result):
+        """
+        套用下單回應；回傳 True 代表不需要再重送，False 代表以同一 client_oid 重送
+        - 有 order_id → ACKED；明確錯誤碼 → REJECTED
+        - client_oid 重複 → UNKNOWN，不再重送 (前一次已送達)，由對帳取得結果
+        - 逾時 / 5xx / 沒有錯誤碼也沒有 order_id → UNKNOWN，重送
+        """
+        if isinstance(result, dict) and result.get("order_id"):
+            self._transition(order, ACKED, order_id=str(result["order_id"]))
+            return True
+        if isinstance(result, dict) and _is_rejection(result):
+            self._transition(order, REJECTED, error=result.get("msg") or str(result))
+            return True
+        self._transition(order, UNKNOWN, error=str(result.get("msg")) if isinstance(result, dict) else None)
+        if isinstance(result, dict) and _is_duplicate(result):
+            print(f"🔂 [OrderTracker] client_oid 重複 (前一次已送達)，改由對帳確認: {order.client_oid}")
+            return True
+        return False
+
+    # --- 對帳 ---
+    def reconcile(self, symbol=None):
+        """批次確認所有未結束訂單的狀態，回傳本次有變化的訂單"""
+        with self.lock:
+            pending = [o for o in self.orders.values() if not o.terminal and o.state != PENDING
+                       and (symbol is None or o.symbol == symbol)]
+        if not pending:
+            return []
+        before = {o.client_oid: o.state for o in pending}
+
+        by_symbol = {}
+        for order in pending:
+            by_symbol.setdefault(order.symbol, []).append(order)
+        for sym, orders in by_symbol.items():
+            self._reconcile_symbol(sym, orders)
+        return [o for o in pending if o.state != before[o.client_oid]]
+
+    def reconcile_async(self):
+        """背景對帳 (行情執行緒呼叫；上一輪還沒跑完就略過)"""
+        with self.lock:
+            if self._reconciling or not self.active():
+                return None
+            self._reconciling = True
+        t = threading.Thread(target=self._reconcile_background, name="order-reconcile", daemon=True)
+        t.start()
+        return t
+
+    def cancel_expired(self, now=None):
+        """
+        撤銷到期仍未成交的掛單 (一次批次撤單)；回傳送出撤單的訂單
+        撤單請求失敗時保留期限，下一輪再試；實際狀態 (CANCELED / 已成交) 由對帳確認
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            expired = [o for o in self.orders.values()
+                       if o.expires_at is not None and o.expires_at <= now and o.state == ACKED and o.order_id]
+        if not expired:
+            return []
+        try:
+            result = self.client.cancel_batch_orders([o.order_id for o in expired])
+        except Exception as e:
+            result, error = None, str(e)
+        else:
+            failed = isinstance(result, dict) and str(result.get("code") or "") not in SUCCESS_CODES
+            error = (result.get("msg") or str(result)) if failed else None
+        if result is None or error:
+            print(f"⚠️ [OrderTracker] 到期掛單撤單失敗，下一輪重試: {error or '無回應'}")
+            return []
+        for order in expired:
+            order.expires_at = None
+        print(f"⌛ [OrderTracker] 撤銷 {len(expired)} 筆到期未成交掛單: {[o.order_id for o in expired]}")
+        return expired
+
+    def _reconcile_background(self):
+        try:
+            self.cancel_expired()
+            self.reconcile()
+        except Exception as e:
+            print(f"❌ [OrderTracker] 對帳失敗: {e}")
+        finally:
+            with self.lock:
+                self._reconciling = False
+
+    def _fetch(self, method, *args, **kwargs):
+        """查詢掛單 / 歷史訂單；查詢失敗回傳 None (與查無資料的 [] 區分)"""
+        self.lookups += 1
+        try:
+            rows = method(*args, strict=True, **kwargs)
+        except Exception as e:
+            print(f"⚠️ [OrderTracker] 對帳查詢失敗: {e}")
+            return None
+        return rows if isinstance(rows, list) else None
+
+    def _reconcile_symbol(self, symbol, orders):
+        open_rows = self._fetch(self.client.get_open_orders, symbol)
+        # 任一查詢失敗時，這一輪「找不到」不代表交易所沒有這筆訂單
+        fetch_failed = open_rows is None
+        by_oid, by_id = {}, {}
+        for row in open_rows or []:
+            self._index(row, by_oid, by_id)
+
+        unresolved = [o for o in orders if o.state != FILLED and self._match(o, by_oid, by_id) is None]
+        # 帶止盈止損的訂單需要歷史訂單來找平倉單 (本輪才成交的也一樣)
+        has_brackets = any(o.take_profit or o.stop_loss for o in orders)
+        history = []
+        if unresolved or has_brackets:
+            history = self._fetch(self.client.get_history_orders, symbol, page_size=self.history_page_size)
+            if history is None:
+                fetch_failed, history = True, []
+            for row in history:
+                self._index(row, by_oid, by_id)
+
+        missing = []
+        for order in orders:
+            if order.state == FILLED:
+                continue
+            row = self._match(order, by_oid, by_id)
+            if row is not None:
+                self._apply(order, row)
+            elif order.order_id:
+                missing.append(order)
+            elif (order.state == UNKNOWN and not fetch_failed
+                  and time.time() - order.last_attempt_at > self.not_found_grace):
+                # 交易所查無此 client_oid：請求沒有送達，之後也不會成交
+                self._transition(order, REJECTED, error="交易所查無此訂單")
+                print(f"🚫 [OrderTracker] 交易所查無訂單，視為未送達: {order.client_oid}")
+
+        # 掛單 / 歷史清單外的少數訂單才逐筆查詢
+        missing = missing[:self.max_detail_lookups]
+        if missing:
+            self.lookups += len(missing)
+            with ThreadPoolExecutor(max_workers=min(len(missing), 4)) as pool:
+                details = list(pool.map(lambda o: self.client.get_order_detail(o.order_id), missing))
+            for order, detail in zip(missing, details):
+                if isinstance(detail, dict) and detail.get("status"):
+                    self._apply(order, detail)
+
+        brackets = [o for o in orders if o.state == FILLED and not o.terminal]
+        if brackets:
+            self._match_exits(brackets, history)
+
+    @staticmethod
+    def _index(row, by_oid, by_id):
+        if row.get("client_oid"):
+            by_oid[str(row["client_oid"])] = row
+        if row.get("order_id"):
+            by_id[str(row["order_id"])] = row
+
+    @staticmethod
+    def _match(order, by_oid, by_id):
+        return by_oid.get(order.client_oid) or (by_id.get(order.order_id) if order.order_id else None)
+
+    def _apply(self, order, row):
+        state = EXCHANGE_STATUS.get(str(row.get("status", "")).lower())
+        if state is None:
+            return
+        filled = float(row.get("filled_qty") or 0)
+        if state == CANCELED and filled > 0:
+            state = FILLED  # IOC 部分成交後取消：以成交部分為準
+        fields = {"order_id": str(row.get("order_id") or "") or None}
+        if filled > 0:
+            fields.update(filled_qty=str(row.get("filled_qty")), price_avg=str(row.get("price_avg")),
+                          filled_at=int(row.get("createTime") or 0))
+        if order.state in (SUBMITTED, UNKNOWN) and state != ACKED:
+            # 直接從送出跳到成交 / 取消時補上 ack
+            self._transition(order, ACKED, **fields)
+        self._transition(order, state, **fields)
+
+    def _match_exits(self, orders, history):
+        """在歷史訂單中找成交後的平倉單，判斷是止盈還是止損"""
+        used = {o.exit_order_id for o in self.orders.values() if o.exit_order_id}
+        for order in orders:
+            close_side = CLOSE_SIDE.get(order.side)
+            since = order.filled_at
+            exits = [r for r in history
+                     if str(r.get("type")) == close_side and str(r.get("status")) == "filled"
+                     and int(r.get("createTime") or 0) >= since and str(r.get("order_id")) not in used]
+            if not exits:
+                continue
+            row = min(exits, key=lambda r: int(r.get("createTime") or 0))
+            used.add(str(row.get("order_id")))
+            price = float(row.get("price_avg") or 0)
+            self._transition(order, self._exit_state(order, row, price),
+                             exit_order_id=str(row.get("order_id")), exit_price=str(row.get("price_avg")))
+
+    @staticmethod
+    def _exit_state(order, row, price):
+        trigger = row.get("trigger")
+        if trigger == "TP":
+            return TP_TRIGGERED
+        if trigger == "SL":
+            return SL_TRIGGERED
+        long_side = order.side == "1"
+        tp = float(order.take_profit) if order.take_profit else None
+        sl = float(order.stop_loss) if order.stop_loss else None
+        if tp is not None and (price >= tp * 0.999 if long_side else price <= tp * 1.001):
+            return TP_TRIGGERED
+        if sl is not None and (price <= sl * 1.001 if long_side else price >= sl * 0.999):
+            return SL_TRIGGERED
+        return CLOSED
+
+    def stats(self):
+        counts = {}
+        with self.lock:
+            for o in self.orders.values():
+                counts[o.state] = counts.get(o.state, 0) + 1
+        return {"orders": len(self.orders), "states": counts, "lookups": self.lookups}
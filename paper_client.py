@@ -0,0 +1,405 @@
+"""
+紙上交易 (Paper Trading) 客戶端
+
+與 WeexClient 相同介面，但所有下單、倉位與餘額都在記憶體中模擬：
+- 市價單以最新串流價格成交
+- 限價單與預設止盈/止損 (presetTakeProfitPrice / presetStopLossPrice) 在 on_tick 時撮合
+- get_all_positions / get_open_orders 直接由本地狀態回答
+- 行情類查詢 (K 線、伺服器時間) 轉交給真實的 market_client
+
+每個 tick 的成本：先比較價格是否落在「不需處理的安全區間」內，大多數 tick 只需兩次比較。
+"""
+import time
+from threading import Lock
+import config
+from exchange_client import ClientOrderIdGenerator
+from ai_logger import save_local_log
+
+SIDE_OPEN_LONG = "1"
+SIDE_OPEN_SHORT = "2"
+SIDE_CLOSE_LONG = "3"
+SIDE_CLOSE_SHORT = "4"
+
+
+class PaperClient:
+    def __init__(self, market_client=None, balance=10000.0, fee_rate=0.0006, leverage=20):
+        self.market_client = market_client
+        self.id_gen = ClientOrderIdGenerator(machine_id=99)
+        self.lock = Lock()
+        self.balance = float(balance)
+        self.fee_rate = fee_rate
+        self.leverage = leverage
+
+        self.last_prices = {}      # symbol -> 最新價
+        self.positions = {}        # (symbol, "LONG"/"SHORT") -> position dict
+        self.open_orders = {}      # order_id -> 限價單
+        self.brackets = {}         # order_id -> 止盈止損 (symbol, side, size, tp, sl)
+        self.history_orders = []
+        self.fills = []
+        self.realized_pnl = 0.0
+        self._next_id = 0
+
+        # symbol -> (low, high)：價格在 (low, high) 之間時不會觸發任何東西
+        self._quiet_band = {}
+
+    # --- 行情 (轉交給真實客戶端) ---
+    def _map_interval(self, interval):
+        if self.market_client is not None:
+            return self.market_client._map_interval(interval)
+        mapping = {
+            "MINUTE_1": "1m", "MINUTE_5": "5m", "MINUTE_15": "15m", "MINUTE_30": "30m",
+            "HOUR_1": "1h", "HOUR_4": "4h", "HOUR_12": "12h", "DAY_1": "1d", "WEEK_1": "1w"
+        }
+        return mapping.get(interval, "1m")
+
+    def get_history_candles(self, symbol, granularity, start_time=None, end_time=None, limit=100):
+        if self.market_client is None:
+            return []
+        return self.market_client.get_history_candles(symbol, granularity, start_time=start_time,
+                                                      end_time=end_time, limit=limit)
+
+    def get_server_time(self):
+        return {"timestamp": int(time.time() * 1000)}
+
+    def error_rate(self, window=60):
+        """只有行情請求會打到交易所"""
+        if self.market_client is not None and hasattr(self.market_client, "error_rate"):
+            return self.market_client.error_rate(window)
+        return 0, 0.0
+
+    def get_contracts(self, symbol=None):
+        if self.market_client is None or not hasattr(self.market_client, "get_contracts"):
+            return []
+        return self.market_client.get_contracts(symbol)
+
+    # --- 撮合 ---
+    def on_tick(self, symbol, price):
+        """串流價格更新：撮合限價單與止盈止損"""
+        price = float(price)
+        self.last_prices[symbol] = price
+        band = self._quiet_band.get(symbol)
+        if band is None or band[0] < price < band[1]:
+            return
+        with self.lock:
+            self._match(symbol, price)
+
+    def _match(self, symbol, price):
+        for order_id, order in list(self.open_orders.items()):
+            if order["symbol"] != symbol:
+                continue
+            limit = float(order["price"])
+            buy = order["type"] in (SIDE_OPEN_LONG, SIDE_CLOSE_SHORT)
+            if (buy and price <= limit) or (not buy and price >= limit):
+                del self.open_orders[order_id]
+                self._fill(order, limit)
+
+        for order_id, b in list(self.brackets.items()):
+            if b["symbol"] != symbol:
+                continue
+            long_side = b["side"] == "LONG"
+            tp_hit = b["tp"] is not None and (price >= b["tp"] if long_side else price <= b["tp"])
+            sl_hit = b["sl"] is not None and (price <= b["sl"] if long_side else price >= b["sl"])
+            if not (tp_hit or sl_hit):
+                continue
+            del self.brackets[order_id]
+            # 止損以觸發當下的 tick 價成交 (模擬跳空滑價)，止盈以觸發價成交
+            exit_price = price if sl_hit else b["tp"]
+            close_side = SIDE_CLOSE_LONG if long_side else SIDE_CLOSE_SHORT
+            trigger = "SL" if sl_hit else "TP"
+            order = self._new_order(symbol, close_side, b["size"], exit_price, match_price="1")
+            order["trigger"] = trigger
+            self._fill(order, exit_price)
+            print(f"🧾 [Paper] {symbol} {b['side']} 觸發{'止損' if sl_hit else '止盈'} @ {exit_price:.2f}")
+
+        self._update_quiet_band(symbol)
+
+    def _update_quiet_band(self, symbol):
+        """重新計算安全區間：任何觸發價都在區間外"""
+        low, high = float("-inf"), float("inf")
+        for order in self.open_orders.values():
+            if order["symbol"] != symbol:
+                continue
+            limit = float(order["price"])
+            if order["type"] in (SIDE_OPEN_LONG, SIDE_CLOSE_SHORT):
+                low = max(low, limit)
+            else:
+                high = min(high, limit)
+        for b in self.brackets.values():
+            if b["symbol"] != symbol:
+                continue
+            long_side = b["side"] == "LONG"
+            for level, is_upper in ((b["tp"], long_side), (b["sl"], not long_side)):
+                if level is None:
+                    continue
+                if is_upper:
+                    high = min(high, level)
+                else:
+                    low = max(low, level)
+        if low == float("-inf") and high == float("inf"):
+            self._quiet_band.pop(symbol, None)
+        else:
+            self._quiet_band[symbol] = (low, high)
+
+    def _new_order(self, symbol, side, size, price, match_price="0", order_type="0",
+                   client_oid=None, tp=None, sl=None):
+        self._next_id += 1
+        return {
+            "symbol": symbol,
+            "order_id": f"paper-{self._next_id}",
+            "client_oid": str(client_oid or self.id_gen.generate()),
+            "size": str(size),
+            "type": str(side),
+            "order_type": str(order_type),
+            "match_price": str(match_price),
+            "price": str(price) if price is not None else "0",
+            "presetTakeProfitPrice": str(tp) if tp else None,
+            "presetStopLossPrice": str(sl) if sl else None,
+            "filled_qty": "0",
+            "price_avg": "0",
+            "status": "open",
+            "createTime": str(int(time.time() * 1000)),
+        }
+
+    def _fill(self, order, price):
+        symbol = order["symbol"]
+        side = order["type"]
+        size = float(order["size"])
+        fee = size * price * self.fee_rate
+        pnl = 0.0
+
+        pos_side = "LONG" if side in (SIDE_OPEN_LONG, SIDE_CLOSE_LONG) else "SHORT"
+        key = (symbol, pos_side)
+        pos = self.positions.get(key)
+
+        if side in (SIDE_OPEN_LONG, SIDE_OPEN_SHORT):
+            if pos is None:
+                pos = {
+                    "symbol": symbol, "side": pos_side, "size": 0.0, "open_value": 0.0,
+                    "leverage": str(self.leverage), "margin_mode": "SHARED",
+                    "created_time": str(int(time.time() * 1000)),
+                }
+                self.positions[key] = pos
+            pos["size"] += size
+            pos["open_value"] += size * price
+            tp = order.get("presetTakeProfitPrice")
+            sl = order.get("presetStopLossPrice")
+            if tp or sl:
+                self.brackets[order["order_id"]] = {
+                    "symbol": symbol, "side": pos_side, "size": size,
+                    "tp": float(tp) if tp else None, "sl": float(sl) if sl else None,
+                }
+        else:
+            if pos is None or pos["size"] <= 0:
+                order["status"] = "canceled"
+                self.history_orders.append(order)
+                return
+            size = min(size, pos["size"])
+            avg = pos["open_value"] / pos["size"]
+            pnl = (price - avg) * size if pos_side == "LONG" else (avg - price) * size
+            pos["open_value"] -= avg * size
+            pos["size"] -= size
+            if pos["size"] <= 1e-12:
+                del self.positions[key]
+                for oid in [k for k, b in self.brackets.items() if b["symbol"] == symbol and b["side"] == pos_side]:
+                    del self.brackets[oid]
+
+        self.balance += pnl - fee
+        self.realized_pnl += pnl
+        order.update(filled_qty=str(size), price_avg=f"{price:.8g}", status="filled",
+                     fee=f"{fee:.8f}", totalProfits=f"{pnl:.8f}")
+        self.history_orders.append(order)
+        self.fills.append({
+            "tradeId": f"paper-fill-{len(self.fills) + 1}", "orderId": order["order_id"], "symbol": symbol, "type": side,
+            "fillSize": str(size), "fillValue": f"{size * price:.8f}", "fillFee": f"{fee:.8f}",
+            "realizePnl": f"{pnl:.8f}", "createdTime": int(time.time() * 1000),
+        })
+        self._update_quiet_band(symbol)
+
+    # --- 交易介面 (與 WeexClient 相同簽名) ---
+    def place_order(self, side, size, price=None, match_price="0", order_type="0",
+                    client_oid=None, preset_take_profit=None, preset_stop_loss=None, margin_mode=None, extra_params=None):
+        if str(match_price) == "0" and not price:
+            raise ValueError("Limit order requires price")
+        symbol = (extra_params or {}).get("symbol", config.SYMBOL)
+
+        with self.lock:
+            order = self._new_order(symbol, side, size, price, match_price, order_type, client_oid,
+                                    preset_take_profit, preset_stop_loss)
+            print(f"🧾 [Paper] 下單: 方向={side} | 數量={size} | 價格={price or '市價'}")
+            if str(match_price) == "1":
+                last = self.last_prices.get(symbol)
+                if last is None:
+                    print(f"⚠️ [Paper] {symbol} 尚無串流價格，無法以市價成交")
+                    return {"code": "40000", "msg": "no market price yet"}
+                self._fill(order, last)
+            elif str(order_type) in ("2", "3"):
+                # FOK / IOC 限價：以最新價判斷能否立即成交，否則直接取消
+                last = self.last_prices.get(symbol)
+                marketable = last is not None and (
+                    last <= float(price) if str(side) in (SIDE_OPEN_LONG, SIDE_CLOSE_SHORT) else last >= float(price))
+                if marketable:
+                    self._fill(order, last)
+                else:
+                    order["status"] = "canceled"
+                    self.history_orders.append(order)
+            else:
+                self.open_orders[order["order_id"]] = order
+                self._update_quiet_band(symbol)
+            return {"client_oid": order["client_oid"], "order_id": order["order_id"]}
+
+    def place_batch_orders(self, orders, symbol=None, margin_mode=None):
+        """批次下單 (與 WeexClient 相同回傳格式)：逐筆在本地撮合"""
+        results = []
+        for order in orders:
+            order = dict(order)
+            if symbol:
+                order["extra_params"] = {"symbol": symbol}
+            try:
+                res = self.place_order(margin_mode=margin_mode, **order)
+            except ValueError as e:
+                res = {"code": "40017", "msg": str(e)}
+            if "order_id" not in res:
+                res = dict(res, client_oid=order.get("client_oid"))
+            results.append(res)
+        return results
+
+    def get_all_positions(self, symbol=None, strict=False):
+        result = []
+        with self.lock:
+            for pos in self.positions.values():
+                if symbol and pos["symbol"] != symbol:
+                    continue
+                avg = pos["open_value"] / pos["size"]
+                last = self.last_prices.get(pos["symbol"], avg)
+                pnl = (last - avg) * pos["size"] if pos["side"] == "LONG" else (avg - last) * pos["size"]
+                result.append({
+                    "symbol": pos["symbol"], "side": pos["side"], "size": f"{pos['size']:.8g}",
+                    "open_value": f"{pos['open_value']:.8f}", "open_avg_price": f"{avg:.8g}",
+                    "leverage": pos["leverage"], "margin_mode": pos["margin_mode"],
+                    "unrealizePnl": f"{pnl:.8f}", "unrealized_pnl": f"{pnl:.8f}",
+                    "created_time": pos["created_time"],
+                })
+        return result
+
+    def get_open_orders(self, symbol=None, order_id=None, start_time=None, end_time=None, limit=100, page=0,
+                        strict=False):
+        symbol = symbol or config.SYMBOL
+        with self.lock:
+            orders = [dict(o) for o in self.open_orders.values() if o["symbol"] == symbol]
+        if order_id:
+            orders = [o for o in orders if o["order_id"] == str(order_id)]
+        return orders[:limit]
+
+    def get_current_plan_orders(self, symbol=None, strict=False):
+        """止盈止損 (計畫單) 以 bracket 形式保存 (本地狀態不會查詢失敗，strict 僅為介面相容)"""
+        symbol = symbol or config.SYMBOL
+        with self.lock:
+            plans = []
+            for oid, b in self.brackets.items():
+                if b["symbol"] != symbol:
+                    continue
+                for plan_type, level in (("TAKE_PROFIT", b["tp"]), ("STOP_LOSS", b["sl"])):
+                    if level is not None:
+                        plans.append({"order_id": oid, "symbol": symbol, "type": plan_type,
+                                      "size": str(b["size"]), "triggerPrice": str(level)})
+        return plans
+
+    def get_history_orders(self, symbol=None, page_size=20, create_date=None, end_create_date=None, strict=False):
+        symbol = symbol or config.SYMBOL
+        with self.lock:
+            orders = [dict(o) for o in self.history_orders if o["symbol"] == symbol]
+        return orders[-int(page_size):][::-1]
+
+    def get_fills(self, symbol=None, limit=100, start_time=None, end_time=None, order_id=None, strict=False):
+        symbol = symbol or config.SYMBOL
+        with self.lock:
+            fills = [dict(f) for f in self.fills if f["symbol"] == symbol
+                     and (not start_time or f["createdTime"] >= int(start_time))
+                     and (not end_time or f["createdTime"] <= int(end_time))
+                     and (not order_id or f["orderId"] == str(order_id))]
+        return fills[-int(limit):][::-1]
+
+    def get_order_detail(self, order_id):
+        with self.lock:
+            if order_id in self.open_orders:
+                return dict(self.open_orders[order_id])
+            for o in self.history_orders:
+                if o["order_id"] == order_id:
+                    return dict(o)
+        return []
+
+    def get_account_assets(self):
+        unrealized = sum(float(p["unrealizePnl"]) for p in self.get_all_positions())
+        return [{
+            "coinName": "USDT",
+            "available": f"{self.balance:.4f}",
+            "frozen": "0",
+            "equity": f"{self.balance + unrealized:.4f}",
+            "unrealizePnl": f"{unrealized:.4f}",
+        }]
+
+    def set_leverage(self, symbol, leverage, margin_mode=1):
+        self.leverage = int(leverage)
+        return {"code": "00000", "msg": "success"}
+
+    def close_all_positions(self, symbol=None):
+        result = []
+        with self.lock:
+            for (sym, side), pos in list(self.positions.items()):
+                if symbol and sym != symbol:
+                    continue
+                price = self.last_prices.get(sym, pos["open_value"] / pos["size"])
+                close_side = SIDE_CLOSE_LONG if side == "LONG" else SIDE_CLOSE_SHORT
+                order = self._new_order(sym, close_side, pos["size"], price, match_price="1")
+                self._fill(order, price)
+                result.append({"positionId": f"{sym}-{side}", "successOrderId": order["order_id"],
+                               "errorMessage": "", "success": True})
+        return result
+
+    def cancel_all_orders(self, symbol=None, cancel_order_type="normal"):
+        result = []
+        with self.lock:
+            if cancel_order_type == "plan":
+                targets = [k for k, b in self.brackets.items() if not symbol or b["symbol"] == symbol]
+                for oid in targets:
+                    del self.brackets[oid]
+                    result.append({"orderId": oid, "success": True})
+            else:
+                targets = [k for k, o in self.open_orders.items() if not symbol or o["symbol"] == symbol]
+                for oid in targets:
+                    order = self.open_orders.pop(oid)
+                    order["status"] = "canceled"
+                    self.history_orders.append(order)
+                    result.append({"orderId": oid, "success": True})
+            for sym in {s for s, _ in self.positions} | set(self._quiet_band):
+                self._update_quiet_band(sym)
+        return result
+
+    def cancel_batch_orders(self, order_ids=None):
+        result = []
+        with self.lock:
+            for oid in order_ids or []:
+                order = self.open_orders.pop(oid, None)
+                if order:
+                    order["status"] = "canceled"
+                    self.history_orders.append(order)
+                    self._update_quiet_band(order["symbol"])
+                result.append({"orderId": oid, "success": order is not None})
+        return result
+
+    def upload_ai_log(self, stage, model, input_data, output_data, explanation, order_id=None):
+        """紙上交易不上傳交易所，只寫本地 Log"""
+        save_local_log(stage, model, input_data, output_data, explanation, order_id)
+        return {"code": "00000", "msg": "paper"}
+
+    def summary(self):
+        """回傳目前模擬帳戶概況"""
+        assets = self.get_account_assets()[0]
+        return {
+            "balance": round(self.balance, 4),
+            "equity": float(assets["equity"]),
+            "realized_pnl": round(self.realized_pnl, 4),
+            "open_positions": len(self.positions),
+            "open_orders": len(self.open_orders),
+            "fills": len(self.fills),
+        }
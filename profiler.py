@@ -0,0 +1,239 @@
+"""
+線上效能剖析 (Profiler)
+
+機器人在實盤變慢時，不必重啟或加 print，直接對執行中的行程：
+
+- 取樣剖析：SamplingProfiler 在背景執行緒每 interval 秒讀一次 sys._current_frames()，
+  累計各執行緒的呼叫堆疊，停止時寫出 collapsed stacks (.folded，每行「執行緒;外層;...;內層 次數」)，
+  可直接交給 flamegraph.pl / speedscope / inferno 產生火焰圖
+- 執行緒快照：thread_stacks() 列出 websocket (market-stream-*)、事件匯流排 (bus-*)、
+  對帳 / 監控等所有執行緒目前的堆疊
+- 未啟動時沒有任何取樣執行緒或 hook，平時的額外負擔為零
+
+觸發方式 (見 main.py)：
+    kill -USR1 <pid>   開始取樣 PROFILE_SECONDS 秒 (取樣中再送一次則提前停止並寫檔)
+    kill -USR2 <pid>   把所有執行緒的堆疊寫入 PROFILE_DIR 並印出
+    # 以下 HTTP 端點需設定 HEALTH_PORT (預設關閉)，以 8787 為例
+    curl "http://127.0.0.1:8787/debug/profile?seconds=10" > bot.folded    取樣 10 秒並直接回傳
+    curl "http://127.0.0.1:8787/debug/profile/start?seconds=60"           背景取樣，結束後寫檔
+    curl "http://127.0.0.1:8787/debug/profile/stop"
+    curl "http://127.0.0.1:8787/debug/stacks"
+"""
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+import config
+
+MAX_SECONDS = 600  # 避免忘記停止
+
+
+def _frame_label(code):
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+
+
+def _thread_names():
+    return {t.ident: t.name for t in threading.enumerate()}
+
+
+def thread_stacks(skip_idents=()):
+    """所有執行緒目前的堆疊 (文字)，最內層在最下面"""
+    names = _thread_names()
+    lines = [f"# {datetime.now().isoformat(timespec='seconds')} pid={os.getpid()} threads={len(names)}"]
+    for ident, frame in sorted(sys._current_frames().items(), key=lambda item: names.get(item[0], "")):
+        if ident in skip_idents:
+            continue
+        lines.append(f"\n--- {names.get(ident, f'thread-{ident}')} (id={ident}) ---")
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f'  File "{code.co_filename}", line {frame.f_lineno}, in {code.co_name}')
+            frame = frame.f_back
+        lines.extend(reversed(stack))
+    return "\n".join(lines) + "\n"
+
+
+class SamplingProfiler:
+    """
+    定時取樣所有執行緒的堆疊 (wall-clock：等待中的執行緒也會出現在結果裡，可以看出卡在哪)
+    同一時間只會有一個取樣執行緒；未啟動時沒有任何負擔
+    """
+
+    def __init__(self, interval=0.005, output_dir="data/profiles"):
+        self.interval = interval
+        self.output_dir = output_dir
+        self.lock = threading.Lock()
+        self.counts = Counter()
+        self.samples = 0
+        self.thread_filter = None
+        self.started_at = None
+        self.last_result = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, seconds=None, interval=None, thread_filter=None):
+        """
+        開始取樣；seconds 到了自動停止並寫檔 (None = 直到 stop()，最長 MAX_SECONDS)
+        thread_filter: 只取樣名稱包含此字串的執行緒 (例如 "market-stream")
+        回傳 False 表示已在取樣中
+        """
+        with self.lock:
+            if self.running:
+                return False
+            self.counts = Counter()
+            self.samples = 0
+            self.thread_filter = thread_filter
+            self.started_at = time.time()
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, args=(min(seconds or MAX_SECONDS, MAX_SECONDS), interval or self.interval),
+                name="profiler", daemon=True)
+            self._thread.start()
+        print(f"🔬 [Profiler] 開始取樣 {seconds or MAX_SECONDS:g} 秒 (間隔 {(interval or self.interval) * 1000:g} ms)")
+        return True
+
+    def _run(self, seconds, interval):
+        me = threading.get_ident()
+        names = _thread_names()
+        deadline = time.perf_counter() + seconds
+        while True:
+            frames = sys._current_frames()
+            if len(frames) != len(names):
+                names = _thread_names()  # 有新執行緒才重建名稱表
+            for ident, frame in frames.items():
+                if ident == me:
+                    continue
+                name = names.get(ident, f"thread-{ident}")
+                if self.thread_filter and self.thread_filter not in name:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(name.replace(";", ":"))
+                self.counts[";".join(reversed(stack))] += 1
+            self.samples += 1
+            if self._stop.wait(interval) or time.perf_counter() >= deadline:
+                break
+        self.last_result = self._write()
+
+    def stop(self, timeout=5.0):
+        """停止取樣並回傳結果 (未在取樣中時回傳上一次的結果)"""
+        thread = self._thread
+        if thread is not None:
+            self._stop.set()
+            thread.join(timeout)
+        return self.last_result
+
+    def wait(self, timeout=None):
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        return self.last_result
+
+    def collapsed(self):
+        """flamegraph.pl 格式：每行「堆疊 次數」"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.counts.most_common())
+
+    def top(self, n=10):
+        """最常出現在最內層的函式 (self time)，依比例排序"""
+        leaves = Counter()
+        for stack, count in self.counts.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        total = sum(leaves.values()) or 1
+        return [{"frame": frame, "samples": count, "pct": round(count * 100 / total, 1)}
+                for frame, count in leaves.most_common(n)]
+
+    def _write(self):
+        result = {"samples": self.samples, "stacks": len(self.counts),
+                  "seconds": round(time.time() - self.started_at, 2), "path": None, "top": self.top()}
+        if self.output_dir and self.counts:
+            try:
+                os.makedirs(self.output_dir, exist_ok=True)
+                path = os.path.join(self.output_dir, f"profile-{datetime.now():%Y%m%d-%H%M%S-%f}.folded")
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(self.collapsed())
+                result["path"] = path
+            except OSError as e:
+                print(f"⚠️ [Profiler] 寫檔失敗: {e}")
+        print(f"🔬 [Profiler] 取樣結束: {result['samples']} 次 / {result['stacks']} 種堆疊 → {result['path']}")
+        return result
+
+    def dump_stacks(self):
+        """所有執行緒的堆疊寫入 output_dir 並回傳文字"""
+        text = thread_stacks(skip_idents={self._thread.ident} if self.running else ())
+        if self.output_dir:
+            try:
+                os.makedirs(self.output_dir, exist_ok=True)
+                path = os.path.join(self.output_dir, f"stacks-{datetime.now():%Y%m%d-%H%M%S-%f}.txt")
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(text)
+                print(f"🧵 [Profiler] 執行緒堆疊已寫入 {path}")
+            except OSError as e:
+                print(f"⚠️ [Profiler] 寫檔失敗: {e}")
+        return text
+
+
+def register_routes(supervisor, profiler):
+    """在 Supervisor 的管理端點掛上 /debug/profile、/debug/profile/start、/debug/profile/stop、/debug/stacks"""
+
+    def profile(query):
+        # 同步取樣並直接回傳 collapsed stacks (text/plain)，適合 curl > bot.folded
+        seconds = min(float(query.get("seconds", 10)), MAX_SECONDS)
+        if not profiler.start(seconds, _interval(query), query.get("thread")):
+            return 409, {"error": "已在取樣中"}
+        profiler.wait(seconds + 5)
+        return 200, profiler.collapsed()
+
+    def start(query):
+        seconds = min(float(query.get("seconds", getattr(config, "PROFILE_SECONDS", 30))), MAX_SECONDS)
+        if not profiler.start(seconds, _interval(query), query.get("thread")):
+            return 409, {"error": "已在取樣中"}
+        return 202, {"started": True, "seconds": seconds}
+
+    def stop(query):
+        if not profiler.running:
+            return 200, {"running": False, "last": profiler.last_result}
+        return 200, profiler.stop()
+
+    supervisor.add_route("/debug/profile", profile)
+    supervisor.add_route("/debug/profile/start", start)
+    supervisor.add_route("/debug/profile/stop", stop)
+    supervisor.add_route("/debug/stacks", lambda query: (200, thread_stacks()))
+
+
+def _interval(query):
+    return float(query["interval_ms"]) / 1000 if query.get("interval_ms") else None
+
+
+def install_signal_handlers(profiler, seconds=30):
+    """
+    SIGUSR1：開始 / 提前停止取樣；SIGUSR2：寫出執行緒堆疊
+    只能在主執行緒呼叫；不支援 SIGUSR1 的平台 (Windows) 直接略過
+    """
+    if not hasattr(signal, "SIGUSR1"):
+        return False
+
+    def toggle(signum, frame):
+        # 訊號處理器在主執行緒執行，只啟動 / 停止背景執行緒，寫檔在取樣執行緒完成
+        if profiler.running:
+            threading.Thread(target=profiler.stop, name="profiler-stop", daemon=True).start()
+        else:
+            profiler.start(seconds)
+
+    def dump(signum, frame):
+        threading.Thread(target=lambda: print(profiler.dump_stacks()), name="profiler-dump", daemon=True).start()
+
+    signal.signal(signal.SIGUSR1, toggle)
+    signal.signal(signal.SIGUSR2, dump)
+    print(f"🔬 [Profiler] kill -USR1 {os.getpid()} 開始取樣 {seconds:g} 秒 | kill -USR2 {os.getpid()} 印出執行緒堆疊")
+    return True
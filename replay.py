@@ -0,0 +1,243 @@
+"""
+行情回放 (Replay Harness)
+
+把錄製的 (market_recorder.py) 或合成的 WebSocket 訊息，依序送進真正的
+MarketStream.on_message → callback_wrapper (main.make_tick_handler) → StrategyManager.on_tick，
+交易所換成 PaperClient、AI 換成本地固定回覆 (ai_provider.LocalProvider)，不會送出任何網路請求。
+
+- --speed 0：盡快回放 (量測最大吞吐量)
+- --speed N：依錄製時間間隔的 N 倍速回放 (例如 100 = 100 倍實盤速度)，並回報排程落後
+- 回報整體吞吐量 (msg/s) 與各階段延遲 (p50 / p99 / max)
+- 交易日誌與本地 AI Log 預設不落地 (--journal / --ai-log 可指定檔案)，不會混進實盤的紀錄
+
+使用方式：
+    python replay.py --record-dir data/market --speed 0
+    python replay.py --synthetic 200000 --depth-every 5
+    python replay.py --record-dir data/market --speed 100 --ai-action LONG --ai-confidence 0.9
+"""
+import argparse
+import json
+import os
+import time
+from contextlib import nullcontext, redirect_stdout
+import config
+import main as bot
+from market_stream import MarketStream
+from market_recorder import read_frames
+from order_book import OrderBook
+from paper_client import PaperClient
+from trade_journal import get_journal
+import ai_logger
+from ai_provider import AIRouter, LocalProvider
+from weex_simulator import PriceModel, DepthModel, WS_INTERVAL_MAP, kline_frame
+
+
+class ReplayMarketClient:
+    """提供 StrategyManager 需要的歷史 K 線 (隨機漫步模型，起點為回放的第一個價格)"""
+    def __init__(self, price_model):
+        self.price_model = price_model
+
+    def _map_interval(self, interval):
+        return WS_INTERVAL_MAP.get(interval, "1m")
+
+    def get_history_candles(self, symbol, granularity, start_time=None, end_time=None, limit=100):
+        return self.price_model.candles(symbol, granularity, end_time, limit)
+
+
+class _NullWebSocket:
+    """MarketStream 回應 pong / 重新訂閱時使用，只計數不送出"""
+    def __init__(self):
+        self.sent = 0
+
+    def send(self, data):
+        self.sent += 1
+
+    def close(self):
+        pass
+
+
+class StageTimer:
+    """包裝函式並記錄每次呼叫耗時"""
+    def __init__(self):
+        self.samples = {}
+
+    def wrap(self, name, fn):
+        samples = self.samples.setdefault(name, [])
+        perf = time.perf_counter
+
+        def timed(*args, **kwargs):
+            started = perf()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                samples.append(perf() - started)
+        return timed
+
+    def report(self):
+        rows = {}
+        for name, values in self.samples.items():
+            if not values:
+                continue
+            ordered = sorted(values)
+            n = len(ordered)
+            rows[name] = {
+                "count": n,
+                "mean_us": sum(ordered) / n * 1e6,
+                "p50_us": ordered[n // 2] * 1e6,
+                "p99_us": ordered[min(int(n * 0.99), n - 1)] * 1e6,
+                "max_us": ordered[-1] * 1e6,
+            }
+        return rows
+
+
+def synthetic_frames(symbol, intervals, count, tick_ms=100, depth_every=0, start_price=95000.0, seed=42,
+                     start_ms=None):
+    """
+    產生 (接收時間 ns, 原始訊息)；kline 依 intervals 輪流，depth_every > 0 時每 N 筆插入一筆深度增量
+    相同 seed 與 start_ms (預設為現在時間) 產生完全相同的訊息序列
+    """
+    prices = PriceModel([symbol], start_price=start_price, seed=seed)
+    depth = DepthModel(prices) if depth_every else None
+    channels = [f"kline.LAST_PRICE.{symbol}.{iv}" for iv in intervals]
+    depth_channel = f"depth.{symbol}.{getattr(config, 'DEPTH_LEVELS', 15)}"
+    start_ms = int(time.time() * 1000) if start_ms is None else start_ms
+    if depth:
+        yield start_ms * 1_000_000, json.dumps(
+            {"event": "payload", "channel": depth_channel, "data": [depth.snapshot(symbol)]})
+    for i in range(count):
+        ts = start_ms + i * tick_ms
+        yield ts * 1_000_000, json.dumps(kline_frame(prices, channels[i % len(channels)], now_ms=ts))
+        if depth and i % depth_every == 0:
+            yield ts * 1_000_000, json.dumps(
+                {"event": "payload", "channel": depth_channel, "data": [depth.step(symbol)]})
+
+
+def first_price(frames):
+    for _, message in frames:
+        try:
+            data = json.loads(message)
+            if str(data.get("channel", "")).startswith("kline."):
+                item = data["data"][0] if isinstance(data["data"], list) else data["data"]
+                return float(item.get("close") or item.get("c"))
+        except (ValueError, KeyError, TypeError, IndexError, AttributeError):
+            continue
+    return None
+
+
+def run_replay(frames, speed=0.0, start_price=95000.0, ai_action="WAIT", ai_confidence=0.0,
+               ai_latency=0.0, ai_deadline=8.0, quiet=True, journal_path=":memory:", ai_log_path=None):
+    """
+    回放 frames (可迭代的 (接收時間 ns, 訊息))，回傳統計報表
+    """
+    get_journal(journal_path)  # 先建立日誌實例，避免回放寫進正式的交易日誌
+    ai_logger.set_log_file(ai_log_path)  # 本地 AI Log 同理 (預設不寫檔)，不混進 logs/ai_history.jsonl
+    timer = StageTimer()
+    out = open(os.devnull, "w", encoding="utf-8") if quiet else None
+
+    try:
+        with redirect_stdout(out) if quiet else nullcontext():
+            client = PaperClient(market_client=ReplayMarketClient(PriceModel([bot.SYMBOL], start_price=start_price)))
+            ai_provider = LocalProvider(ai_action, ai_confidence, latency=ai_latency, name="replay")
+            strategy = bot.StrategyManager(client, ai=AIRouter([ai_provider], deadline=ai_deadline))
+            order_book = OrderBook(bot.SYMBOL, max_age=getattr(config, "ORDER_BOOK_MAX_AGE", 5.0))
+            strategy.order_book = order_book
+
+            # 以實例屬性包裝各階段 (make_tick_handler 透過同一物件呼叫)
+            client.on_tick = timer.wrap("paper.on_tick", client.on_tick)
+            strategy.on_tick = timer.wrap("strategy.on_tick", strategy.on_tick)
+            handler = bot.make_tick_handler(strategy, client, order_book=order_book,
+                                            paper_trading=True, refresh_history=False)
+            stream = MarketStream(bot.SYMBOL, bot.INTERVALS, timer.wrap("callback_wrapper", handler),
+                                  order_book=order_book)
+            on_message = timer.wrap("on_message (end-to-end)", stream.on_message)
+            ws = _NullWebSocket()
+
+            count = 0
+            max_lag = 0.0
+            first_ns = None
+            started = time.perf_counter()
+            for recv_ns, message in frames:
+                if speed > 0:
+                    if first_ns is None:
+                        first_ns = recv_ns
+                    target = started + (recv_ns - first_ns) / 1e9 / speed
+                    delay = target - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                    else:
+                        max_lag = max(max_lag, -delay)
+                on_message(ws, message)
+                count += 1
+            elapsed = time.perf_counter() - started
+            strategy.bus.drain(timeout=10)
+    finally:
+        if out is not None:
+            out.close()
+
+    return {
+        "frames": count,
+        "elapsed_s": elapsed,
+        "throughput": count / elapsed if elapsed > 0 else 0.0,
+        "speed": speed,
+        "max_schedule_lag_ms": max_lag * 1000,
+        "stages": timer.report(),
+        "ai_calls": ai_provider.calls,
+        "ai": strategy.ai.report(),
+        "orders": len(client.history_orders),
+        "paper": client.summary(),
+        "book_gaps": order_book.gaps,
+        "bus": strategy.bus.stats(),
+    }
+
+
+def print_report(report):
+    print(f"\n🎬 回放完成: {report['frames']} 筆訊息 | {report['elapsed_s']:.2f}s | "
+          f"吞吐量 {report['throughput']:,.0f} msg/s")
+    if report["speed"] > 0:
+        print(f"⏩ 倍速 x{report['speed']} | 最大排程落後 {report['max_schedule_lag_ms']:.1f} ms")
+    print(f"{'階段':<26}{'次數':>10}{'平均(us)':>12}{'p50(us)':>12}{'p99(us)':>12}{'max(us)':>12}")
+    for name, s in report["stages"].items():
+        print(f"{name:<28}{s['count']:>10}{s['mean_us']:>12.1f}{s['p50_us']:>12.1f}{s['p99_us']:>12.1f}{s['max_us']:>12.1f}")
+    print(f"🤖 AI 呼叫: {report['ai_calls']} | 🧾 訂單: {report['orders']} | 訂單簿缺口: {report['book_gaps']}")
+    for name, s in report["ai"]["providers"].items():
+        print(f"🤖 [AI] {name}: {s} | 無合法回覆: {report['ai']['fallbacks']}")
+    print(f"🧾 [Paper] {report['paper']}")
+    for name, s in report["bus"].items():
+        print(f"🚌 [EventBus] {name}: {s}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="以錄製或合成行情回放完整策略流程")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--record-dir", help="market_recorder.py 錄製的資料夾")
+    source.add_argument("--synthetic", type=int, help="產生 N 筆合成 kline 訊息")
+    parser.add_argument("--prefix", default=None, help="只回放指定 prefix 的錄製檔")
+    parser.add_argument("--speed", type=float, default=0.0, help="倍速 (0 = 盡快)")
+    parser.add_argument("--tick-ms", type=int, default=100, help="合成訊息的間隔 (ms)")
+    parser.add_argument("--depth-every", type=int, default=0, help="合成時每 N 筆 kline 插入一筆深度增量")
+    parser.add_argument("--ai-action", default="WAIT", choices=["WAIT", "LONG"])
+    parser.add_argument("--ai-confidence", type=float, default=0.0)
+    parser.add_argument("--ai-latency", type=float, default=0.0, help="模擬 AI 回應時間 (秒)")
+    parser.add_argument("--ai-deadline", type=float, default=8.0, help="AI 截止時間 (秒)，逾時依 AI_TIMEOUT_FALLBACK 處理")
+    parser.add_argument("--journal", default=":memory:", help="交易日誌路徑 (預設不落地)")
+    parser.add_argument("--ai-log", default=None, help="本地 AI Log (JSONL) 路徑 (預設不落地)")
+    parser.add_argument("--verbose", action="store_true", help="顯示策略輸出")
+    args = parser.parse_args()
+
+    if args.record_dir:
+        start_price = first_price(read_frames(args.record_dir, args.prefix)) or 95000.0
+        frames = read_frames(args.record_dir, args.prefix)
+    else:
+        start_price = 95000.0
+        frames = synthetic_frames(bot.SYMBOL, bot.INTERVALS, args.synthetic, tick_ms=args.tick_ms,
+                                  depth_every=args.depth_every, start_price=start_price)
+
+    report = run_replay(frames, speed=args.speed, start_price=start_price, ai_action=args.ai_action,
+                        ai_confidence=args.ai_confidence, ai_latency=args.ai_latency,
+                        ai_deadline=args.ai_deadline, quiet=not args.verbose, journal_path=args.journal,
+                        ai_log_path=args.ai_log)
+    print_report(report)
+
+
+if __name__ == "__main__":
+    main()
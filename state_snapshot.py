@@ -0,0 +1,157 @@
+"""
+策略狀態快照 (Warm Restart)
+
+重啟時不必從零開始：
+- 冷卻計時 (last_trade_time / last_ai_req_time) 立即還原，COOLDOWN_HOURS 不會因重啟而失效
+- K 線緩衝區從快照還原，只補抓快照之後缺少的 K 線，不用重新下載整段歷史
+- 前高 / 前低等策略基準一併保存；RSI / 布林由還原後的 K 線重算 (結果與原本相同)
+
+檔案為緊湊的 JSON，先寫入暫存檔並 fsync，再以 os.replace 原子替換，
+寫到一半當機也不會留下損壞的快照。
+序列化與 fsync 由 SnapshotWriter 的背景執行緒完成，行情 (tick) 執行緒只交出最新狀態；
+短時間內的多次請求合併為一次寫入。
+"""
+import json
+import os
+import threading
+import time
+
+SNAPSHOT_VERSION = 1
+
+
+def save_snapshot(path, state):
+    """原子寫入快照，回傳寫入的位元組數"""
+    data = json.dumps(dict(state, version=SNAPSHOT_VERSION, saved_at=time.time()),
+                      separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp.{os.getpid()}.{threading.get_ident()}"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return len(data)
+
+
+class SnapshotWriter:
+    """
+    背景快照寫入器
+    request() 只記下最新的狀態並喚醒寫入執行緒，立即返回；兩次寫入至少間隔 min_interval 秒，
+    期間的請求只保留最新一份。urgent=True (例如下單後的冷卻計時) 不等間隔，盡快寫入
+    """
+
+    def __init__(self, path, min_interval=5.0):
+        self.path = path
+        self.min_interval = min_interval
+        self.cond = threading.Condition()
+        self.pending = None
+        self.urgent = False
+        self.busy = False
+        self.running = True
+        self.last_write = 0.0
+        self.writes = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.thread = threading.Thread(target=self._run, name="state-snapshot", daemon=True)
+        self.thread.start()
+
+    def request(self, state, urgent=False):
+        """state 交出後不可再修改 (寫入執行緒稍後才序列化)"""
+        with self.cond:
+            if self.pending is not None:
+                self.coalesced += 1
+            self.pending = state
+            self.urgent = self.urgent or urgent
+            self.cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while self.running and self.pending is None:
+                    self.cond.wait()
+                if self.pending is None:
+                    return  # 已停止且沒有待寫入的狀態
+                delay = self.last_write + self.min_interval - time.time()
+                if delay > 0 and self.running and not self.urgent:
+                    self.cond.wait(delay)
+                    continue
+                state, self.pending, self.urgent = self.pending, None, False
+                self.busy = True
+            try:
+                save_snapshot(self.path, state)
+                self.writes += 1
+            except (OSError, TypeError, ValueError) as e:
+                self.errors += 1
+                print(f"⚠️ 狀態快照寫入失敗: {e}")
+            finally:
+                with self.cond:
+                    self.last_write = time.time()
+                    self.busy = False
+                    self.cond.notify_all()
+
+    def flush(self, timeout=5.0):
+        """立即寫出待寫入的狀態並等待完成 (測試 / 關機前使用)"""
+        deadline = time.time() + timeout
+        with self.cond:
+            if self.pending is not None:
+                self.urgent = True
+                self.cond.notify_all()
+            while self.pending is not None or self.busy:
+                remaining = deadline - time.time()
+                if remaining <= 0 or not self.thread.is_alive():
+                    return False
+                self.cond.wait(remaining)
+        return True
+
+    def close(self, timeout=5.0):
+        flushed = self.flush(timeout)
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        self.thread.join(timeout)
+        return flushed
+
+    def stats(self):
+        return {"writes": self.writes, "coalesced": self.coalesced, "errors": self.errors,
+                "pending": self.pending is not None}
+
+
+def load_snapshot(path, symbol=None, interval=None):
+    """
+    讀取並驗證快照；檔案不存在、損壞、版本或交易對不符時回傳 None
+    週期不符時仍回傳快照 (冷卻計時照樣有效)，但移除 K 線資料
+    """
+    try:
+        with open(path, "rb") as f:
+            snapshot = json.loads(f.read())
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"⚠️ 狀態快照讀取失敗，忽略: {e}")
+        return None
+    if not isinstance(snapshot, dict) or snapshot.get("version") != SNAPSHOT_VERSION:
+        print(f"⚠️ 狀態快照版本不符，忽略: {path}")
+        return None
+    if symbol and snapshot.get("symbol") != symbol:
+        print(f"⚠️ 狀態快照交易對不符 ({snapshot.get('symbol')} != {symbol})，忽略")
+        return None
+    if interval and snapshot.get("interval") != interval:
+        print(f"⚠️ 狀態快照週期不符 ({snapshot.get('interval')} != {interval})，只還原冷卻計時")
+        snapshot["candles"] = []
+    return snapshot
+
+
+def missing_candles(last_open_ms, now_ms, interval_ms):
+    """最後一根 K 線 (開盤時間) 之後，到現在為止新開的 K 線數量"""
+    if last_open_ms is None or now_ms <= last_open_ms:
+        return 0
+    return int((now_ms - last_open_ms) // interval_ms)
+
+
+def merge_candles(old_rows, new_rows, limit):
+    """以開盤時間合併兩段 K 線 (新資料覆蓋舊資料，例如快照時尚未收盤的那根)，保留最新 limit 根"""
+    merged = {int(row[0]): row for row in old_rows}
+    for row in new_rows:
+        merged[int(row[0])] = row
+    return [merged[t] for t in sorted(merged)][-limit:]
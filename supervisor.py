@@ -0,0 +1,231 @@
+"""
+健康監控 (Supervisor)
+
+取代 main.py 原本閒置的 while True 迴圈，定期檢查：
+- 行情：每個 K 線頻道最後收到資料的時間 → 超過 FEED_STALE_SECONDS 強制重連，並暫停進場直到恢復
+  (depth 頻道不列入：訂單簿過期時下單自動改回市價，不影響進場)
+- 歷史 K 線：最後一次成功更新的時間 → 超過 HISTORY_MAX_AGE 重新下載，並暫停進場直到更新成功
+- REST：最近 60 秒的錯誤率 (逾時 / 連線錯誤 / 5xx) → 超過 MAX_REST_ERROR_RATE 暫停進場
+- 回呼處理耗時：行情回呼的平均耗時 → 超過 MAX_CALLBACK_MS 暫停進場 (代表處理的價格已經落後)
+- 停機旗標：kill_switch.py 寫入的 HALT_FILE 存在時暫停進場，直到 kill_switch.py --resume 清除
+
+另提供 HTTP 健康檢查端點 (GET /health，正常 200 / 異常 503，內容為 JSON)，
+其他模組可用 add_route() 掛上自己的管理端點。
+"""
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import config
+from kill_switch import is_halted
+
+FEED_STALE = "feed_stale"
+HISTORY_STALE = "history_stale"
+REST_ERRORS = "rest_errors"
+CALLBACK_LAG = "callback_lag"
+HALTED = "halted"
+
+
+def interval_seconds(interval):
+    """"MINUTE_5" -> 300, "HOUR_4" -> 14400"""
+    unit, value = interval.split("_")
+    return int(value) * {"MINUTE": 60, "HOUR": 3600, "DAY": 86400, "WEEK": 604800}[unit]
+
+
+class _HealthHandler(BaseHTTPRequestHandler):
+    server_version = "WeexBotHealth/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        route = self.server.routes.get(parsed.path)
+        if route is None:
+            return self._reply(404, {"error": f"unknown path {parsed.path}"})
+        query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        try:
+            status, payload = route(query)
+        except Exception as e:
+            status, payload = 500, {"error": str(e)}
+        self._reply(status, payload)
+
+    def _reply(self, status, payload):
+        if isinstance(payload, (bytes, str)):
+            data = payload.encode('utf-8') if isinstance(payload, str) else payload
+            content_type = "text/plain; charset=utf-8"
+        else:
+            data = json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8')
+            content_type = "application/json"
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class Supervisor:
+    def __init__(self, stream, strategy, client, check_interval=5.0, feed_stale_seconds=30.0,
+                 history_max_age=None, max_rest_error_rate=0.5, min_rest_requests=5,
+                 max_callback_ms=500.0, reconnect_cooldown=30.0, reseed_cooldown=60.0):
+        self.stream = stream
+        self.strategy = strategy
+        self.client = client
+        self.check_interval = check_interval
+        self.feed_stale_seconds = feed_stale_seconds
+        # 歷史 K 線至少每 15 分鐘會更新一次 (should_refresh_data 的保底機制)
+        self.history_max_age = history_max_age or max(2 * interval_seconds(config.STRATEGY_INTERVAL), 900) + 120
+        self.max_rest_error_rate = max_rest_error_rate
+        self.min_rest_requests = min_rest_requests
+        self.max_callback_ms = max_callback_ms
+        self.reconnect_cooldown = reconnect_cooldown
+        self.reseed_cooldown = reseed_cooldown
+
+        self.started_at = time.time()
+        self.last_reconnect = 0.0
+        self.last_reseed = 0.0
+        self.last_check = None
+        self.callback_peak_ms = 0.0       # 上一個檢查週期內的最大回呼耗時
+        self.actions = deque(maxlen=50)   # 最近的自動處置 (時間, 動作, 原因)
+        self.server = None
+        self.routes = {"/health": self._health_route}
+        self._stop = threading.Event()
+
+    # --- 檢查 ---
+    def _act(self, action, detail):
+        print(f"🩺 [Supervisor] {action}: {detail}")
+        self.actions.append({"ts": time.time(), "action": action, "detail": detail})
+
+    def _set_paused(self, reason, paused, detail=""):
+        if paused:
+            self.strategy.pause(reason, detail)
+        else:
+            self.strategy.resume(reason)
+
+    def check(self):
+        now = time.time()
+        self.last_check = now
+
+        # 1. 行情頻道
+        stale = {ch: round(self.stream.message_age(ch), 1) for ch in self.stream.feed_channels()
+                 if self.stream.message_age(ch) > self.feed_stale_seconds}
+        if stale:
+            self._set_paused(FEED_STALE, True, f"{stale}")
+            if now - self.last_reconnect > self.reconnect_cooldown:
+                self.last_reconnect = now
+                self._act("reconnect", f"行情中斷 {stale}")
+                self.stream.reconnect()
+        else:
+            self._set_paused(FEED_STALE, False)
+
+        # 2. 歷史 K 線
+        history_age = now - self.strategy.last_history_refresh if self.strategy.last_history_refresh else None
+        if history_age is None:
+            # 啟動時的下載失敗：不用等到 history_max_age 才重試
+            history_stale = now - self.started_at > self.reseed_cooldown
+        else:
+            history_stale = history_age > self.history_max_age
+        if history_stale:
+            self._set_paused(HISTORY_STALE, True, f"歷史資料 {history_age and round(history_age)} 秒未更新")
+            if now - self.last_reseed > self.reseed_cooldown:
+                self.last_reseed = now
+                self._act("reseed_history", f"歷史資料過期 ({history_age and round(history_age)} 秒)")
+                self.strategy.seed_history_async()
+        else:
+            self._set_paused(HISTORY_STALE, False)
+
+        # 3. REST 錯誤率
+        requests_count, error_rate = self._rest_error_rate()
+        too_many_errors = requests_count >= self.min_rest_requests and error_rate > self.max_rest_error_rate
+        self._set_paused(REST_ERRORS, too_many_errors, f"{requests_count} 筆請求錯誤率 {error_rate:.0%}")
+
+        # 4. 行情回呼耗時
+        self.callback_peak_ms = self.stream.reset_callback_stats()
+        lagging = self.stream.callback_ms_avg > self.max_callback_ms
+        self._set_paused(CALLBACK_LAG, lagging, f"平均 {self.stream.callback_ms_avg:.0f} ms")
+
+        # 5. 停機旗標 (kill switch)
+        halted = is_halted()
+        self._set_paused(HALTED, halted is not None, halted or "")
+        return self.healthy()
+
+    def _rest_error_rate(self):
+        error_rate = getattr(self.client, "error_rate", None)
+        return error_rate(60) if error_rate else (0, 0.0)
+
+    def healthy(self):
+        return not self.strategy.pause_reasons
+
+    def status(self):
+        now = time.time()
+        requests_count, error_rate = self._rest_error_rate()
+        history_refresh = self.strategy.last_history_refresh
+        status = {
+            "healthy": self.healthy(),
+            "paused": dict(self.strategy.pause_reasons),
+            "uptime_s": round(now - self.started_at, 1),
+            "last_check_age_s": round(now - self.last_check, 1) if self.last_check else None,
+            "feed": {
+                "running": self.stream.is_running(),
+                "connects": self.stream.connects,
+                "channels": {ch: round(self.stream.message_age(ch), 2) for ch in self.stream.channels()},
+            },
+            "history_age_s": round(now - history_refresh, 1) if history_refresh else None,
+            "rest": {"requests_60s": requests_count, "error_rate": round(error_rate, 4)},
+            "callback_ms": {"avg": round(self.stream.callback_ms_avg, 3),
+                            "max": round(max(self.callback_peak_ms, self.stream.callback_ms_max), 3)},
+            "actions": list(self.actions)[-10:],
+        }
+        bus = getattr(self.strategy, "bus", None)
+        if bus is not None:
+            status["bus"] = bus.stats()
+        orders = getattr(self.strategy, "orders", None)
+        if orders is not None:
+            status["orders"] = orders.stats()
+        accounts = getattr(self.strategy, "accounts", None)
+        if accounts is not None:
+            status["accounts"] = accounts.stats()
+        ai = getattr(self.strategy, "ai", None)
+        if ai is not None:
+            status["ai"] = ai.report()
+        ai_batcher = getattr(self.strategy, "ai_batcher", None)
+        if ai_batcher is not None:
+            status["ai"]["batcher"] = ai_batcher.report()
+        return status
+
+    # --- HTTP 端點 ---
+    def _health_route(self, query):
+        status = self.status()
+        return (200 if status["healthy"] else 503), status
+
+    def add_route(self, path, handler):
+        """handler(query_dict) -> (http_status, dict / str)"""
+        self.routes[path] = handler
+        if self.server is not None:
+            self.server.routes = self.routes
+
+    def serve(self, host="127.0.0.1", port=8787):
+        self.server = ThreadingHTTPServer((host, port), _HealthHandler)
+        self.server.daemon_threads = True
+        self.server.routes = self.routes
+        threading.Thread(target=self.server.serve_forever, name="health-http", daemon=True).start()
+        print(f"🩺 健康檢查端點: http://{host}:{self.server.server_address[1]}/health")
+        return self.server
+
+    # --- 主迴圈 ---
+    def run(self):
+        """阻塞執行定期檢查 (取代主程式的 while True)"""
+        while not self._stop.wait(self.check_interval):
+            try:
+                self.check()
+            except Exception as e:
+                print(f"❌ [Supervisor] 檢查失敗: {e}")
+
+    def stop(self):
+        self._stop.set()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
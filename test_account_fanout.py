@@ -0,0 +1,80 @@
+import unittest
+import sys
+import time
+
+# 模擬 config 模組，避免讀取真實檔案
+class MockConfig:
+    SYMBOL = "cmt_btcusdt"
+    REST_URL = "https://mock.api"
+    API_KEY = "mock_key"
+    SECRET_KEY = "mock_secret"
+    PASSPHRASE = "mock_pass"
+
+sys.modules.setdefault('config', MockConfig)
+import config
+
+from paper_client import PaperClient
+from account_fanout import Account, FanoutDispatcher, load_accounts, risk_check
+
+
+def paper_account(name, multiplier=1.0, max_positions=1):
+    client = PaperClient()
+    client.on_tick(config.SYMBOL, 50000)
+    return Account(name, client, size_multiplier=multiplier, max_open_orders=5,
+                   max_positions=max_positions, max_position_size=1)
+
+
+class TestAccountFanout(unittest.TestCase):
+    def test_scale_rounds_down_to_step(self):
+        account = paper_account("a", multiplier=0.5)
+        self.assertEqual(account.scale("0.003", "0.001"), "0.001")
+        self.assertEqual(account.scale("0.010"), "0.005")
+        self.assertEqual(paper_account("b", multiplier=3).scale("0.001", "0.001"), "0.003")
+        self.assertEqual(account.scale("0.001", "0.001"), "0.000")
+
+    def test_risk_check_per_account(self):
+        account = paper_account("a")
+        self.assertEqual(account.check_risk(config.SYMBOL), (True, ""))
+        account.client.place_order(side=1, size="0.01", match_price="1")
+        ok, reason = account.check_risk(config.SYMBOL)
+        self.assertFalse(ok)
+        self.assertIn("已有倉位", reason)
+        # 其他帳戶不受影響
+        self.assertTrue(risk_check(paper_account("b").client, config.SYMBOL, 5, 1, 1)[0])
+
+    def test_dispatch_runs_accounts_in_parallel(self):
+        accounts = [paper_account(f"acct{i}", multiplier=i + 1) for i in range(3)]
+        dispatcher = FanoutDispatcher(accounts)
+        try:
+            def submit(account):
+                time.sleep(0.05)
+                if account.name == "acct2":
+                    raise RuntimeError("boom")
+                return account.orders.submit(side=1, size=account.scale("0.01", "0.001"),
+                                             match_price="1").result()
+
+            report = dispatcher.dispatch(submit)
+            # 並行執行：總耗時接近單一帳戶，而非三倍
+            self.assertLess(report["elapsed_ms"], 140)
+            self.assertEqual(report["accounts"]["acct2"]["error"], "boom")
+            self.assertIsNotNone(report["accounts"]["acct0"]["result"]["order_id"])
+            self.assertGreaterEqual(report["spread_ms"], 0)
+            self.assertEqual(accounts[1].client.get_all_positions(config.SYMBOL)[0]["size"], "0.02")
+            self.assertEqual(len(dispatcher.trackers()), 3)
+            self.assertEqual(dispatcher.stats()["dispatches"], 1)
+        finally:
+            dispatcher.shutdown()
+
+    def test_load_accounts(self):
+        accounts = load_accounts(
+            [{"name": "main", "size_multiplier": 2, "max_open_orders": 3, "max_positions": 1, "max_position_size": 1},
+             {"max_open_orders": 1, "max_positions": 1, "max_position_size": 1}],
+            client_factory=lambda entry, i: PaperClient())
+        self.assertEqual([a.name for a in accounts], ["main", "account_1"])
+        self.assertEqual(accounts[0].size_multiplier, 2.0)
+        with self.assertRaises(ValueError):
+            FanoutDispatcher([])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import unittest
+import sys
+import json
+import threading
+
+# 模擬 config 模組，避免讀取真實檔案
+class MockConfig:
+    SYMBOL = "cmt_btcusdt"
+    REST_URL = "https://mock.api"
+    API_KEY = "mock_key"
+    SECRET_KEY = "mock_secret"
+    PASSPHRASE = "mock_pass"
+
+sys.modules.setdefault('config', MockConfig)
+
+from ai_provider import AIRouter, LocalProvider
+from ai_batcher import AIBatcher, parse_batch
+
+SYSTEM = "你是一位資深量化交易員。" * 20
+INSTRUCTIONS = "【分析要求】觀察趨勢、尋找疲弱訊號、判斷布林通道，並以 JSON 回傳決策。" * 10
+SYMBOLS = ["cmt_btcusdt", "cmt_ethusdt", "cmt_solusdt", "cmt_dogeusdt"]
+
+
+def rsi_rule(market_data):
+    return {"action": "LONG" if market_data["rsi"] > 70 else "WAIT", "confidence": 0.8, "explanation": "rsi"}
+
+
+class PartialProvider(LocalProvider):
+    """批次回覆漏掉指定交易對 (編號依執行緒抵達順序而定，所以以交易對名稱挑選)"""
+    def __init__(self, drop_symbol, **kwargs):
+        super().__init__(**kwargs)
+        self.drop_symbol = drop_symbol
+
+    def complete(self, system_prompt, user_prompt, market_data=None, timeout=None, max_tokens=None):
+        content = json.loads(super().complete(system_prompt, user_prompt, market_data, timeout, max_tokens))
+        content["decisions"] = [d for d in content["decisions"] if d["symbol"] != self.drop_symbol]
+        return json.dumps(content)
+
+
+class TestAIBatcher(unittest.TestCase):
+    def run_concurrently(self, batcher, symbols):
+        results = {}
+
+        def consult(i, symbol):
+            results[symbol] = batcher.decide(symbol, SYSTEM, f"交易對: {symbol} | RSI {60 + i * 5}",
+                                             INSTRUCTIONS, market_data={"rsi": 60 + i * 5})
+
+        threads = [threading.Thread(target=consult, args=(i, s)) for i, s in enumerate(symbols)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return results
+
+    def test_symbols_in_same_window_share_one_completion(self):
+        provider = LocalProvider(rule=rsi_rule, latency=0.05)
+        router = AIRouter([provider], deadline=2.0)
+        results = self.run_concurrently(AIBatcher(router, window=0.1), SYMBOLS)
+        self.assertEqual(provider.calls, 1)
+        self.assertEqual([results[s][0]["action"] for s in SYMBOLS], ["WAIT", "WAIT", "WAIT", "LONG"])
+        self.assertTrue(all(results[s][1]["batch_size"] == 4 for s in SYMBOLS))
+        batch_tokens = provider.usage["prompt_tokens"]
+
+        # 對照：逐一呼叫時 system prompt 與分析要求重複送了 4 次
+        single = LocalProvider(rule=rsi_rule)
+        single_router = AIRouter([single], deadline=2.0)
+        for i, symbol in enumerate(SYMBOLS):
+            single_router.decide(SYSTEM, f"交易對: {symbol} | RSI {60 + i * 5}" + INSTRUCTIONS,
+                                 market_data={"rsi": 60 + i * 5})
+        self.assertEqual(single.calls, 4)
+        self.assertLess(batch_tokens, single.usage["prompt_tokens"] / 2)
+        router.shutdown()
+        single_router.shutdown()
+
+    def test_single_request_uses_plain_prompt(self):
+        provider = LocalProvider("LONG", 0.9)
+        router = AIRouter([provider])
+        decision, meta = AIBatcher(router, window=0.01).decide("cmt_btcusdt", SYSTEM, "資料", INSTRUCTIONS)
+        self.assertEqual(decision["action"], "LONG")
+        self.assertEqual(meta["batch_size"], 1)
+        router.shutdown()
+
+    def test_missing_verdict_only_affects_that_symbol(self):
+        router = AIRouter([PartialProvider(SYMBOLS[2], rule=rsi_rule)], deadline=2.0)
+        batcher = AIBatcher(router, window=0.1)
+        results = self.run_concurrently(batcher, SYMBOLS[:3])
+        self.assertEqual(results[SYMBOLS[0]][0]["action"], "WAIT")
+        self.assertEqual(results[SYMBOLS[1]][0]["action"], "WAIT")
+        self.assertIsNone(results[SYMBOLS[2]][0])
+        self.assertIn("缺少", results[SYMBOLS[2]][1]["reason"])
+        self.assertEqual(batcher.report()["missing"], 1)
+        router.shutdown()
+
+    def test_parse_batch(self):
+        content = '```json\n{"decisions": [{"id": 0, "action": "LONG", "confidence": 0.7}, ' \
+                  '{"id": 1, "action": "SHORT", "confidence": 0.7}, {"id": 9, "action": "WAIT", "confidence": 0}]}\n```'
+        self.assertEqual(list(parse_batch(content, {0, 1})), [0])
+        with self.assertRaises(ValueError):
+            parse_batch('{"decisions": []}', {0})
+
+
+if __name__ == '__main__':
+    unittest.main()
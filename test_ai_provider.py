@@ -0,0 +1,108 @@
+import unittest
+import sys
+import time
+
+# 模擬 config 模組，避免讀取真實檔案
+class MockConfig:
+    SYMBOL = "cmt_btcusdt"
+    REST_URL = "https://mock.api"
+    API_KEY = "mock_key"
+    SECRET_KEY = "mock_secret"
+    PASSPHRASE = "mock_pass"
+
+sys.modules.setdefault('config', MockConfig)
+
+from ai_provider import AIRouter, LocalProvider, LatencyStats, parse_decision
+
+
+class BrokenProvider(LocalProvider):
+    def complete(self, system_prompt, user_prompt, market_data=None, timeout=None, max_tokens=None):
+        self.calls += 1
+        return '{"action": "BUY_EVERYTHING", "confidence": 2}'
+
+
+class TestAIProvider(unittest.TestCase):
+    def setUp(self):
+        self.routers = []
+
+    def tearDown(self):
+        for router in self.routers:
+            router.shutdown()
+
+    def router(self, providers, **kwargs):
+        router = AIRouter(providers, **kwargs)
+        self.routers.append(router)
+        return router
+
+    def test_parse_decision(self):
+        decision = parse_decision('```json\n{"action": "long", "confidence": "0.7", "explanation": "ok"}\n```')
+        self.assertEqual(decision, {"action": "LONG", "confidence": 0.7, "explanation": "ok"})
+        for bad in ('not json', '[]', '{"action": "SHORT", "confidence": 0.5}', '{"action": "WAIT", "confidence": 1.5}'):
+            with self.assertRaises(ValueError):
+                parse_decision(bad)
+
+    def test_deadline_returns_fallback(self):
+        slow = LocalProvider("LONG", 0.9, latency=0.5)
+        router = self.router([slow], deadline=0.1)
+        started = time.perf_counter()
+        decision, meta = router.decide("sys", "user")
+        self.assertLess(time.perf_counter() - started, 0.3)
+        self.assertIsNone(decision)
+        self.assertIn("未回覆", meta["reason"])
+        self.assertTrue(meta["timed_out"])
+        self.assertEqual(router.fallbacks, 1)
+        self.assertEqual(router.stats["local"].counts["timeout"], 1)
+
+    def test_hedge_takes_first_valid_answer(self):
+        slow = LocalProvider("WAIT", 0.1, latency=0.5, name="slow")
+        fast = LocalProvider("LONG", 0.8, latency=0.02, name="fast")
+        router = self.router([slow, fast], deadline=1.0, hedge=True)
+        decision, meta = router.decide("sys", "user")
+        self.assertEqual(decision["action"], "LONG")
+        self.assertEqual(meta["provider"], "fast")
+        self.assertLess(meta["latency_ms"], 300)
+        self.assertEqual(router.stats["fast"].counts["won"], 1)
+
+    def test_hedge_delay_and_invalid_answer(self):
+        # 主要後端回覆格式錯誤 → 不等對沖延遲，立刻改送第二個後端
+        broken = BrokenProvider(name="broken")
+        backup = LocalProvider("WAIT", 0.3, name="backup")
+        router = self.router([broken, backup], deadline=1.0, hedge=True, hedge_delay=0.5)
+        started = time.perf_counter()
+        decision, meta = router.decide("sys", "user")
+        self.assertLess(time.perf_counter() - started, 0.3)
+        self.assertEqual(meta["provider"], "backup")
+        self.assertEqual(router.stats["broken"].counts["invalid"], 1)
+
+        # 後端全部回覆格式錯誤：不算逾時 (不能改用規則下單)
+        decision, meta = self.router([BrokenProvider(name="broken")], deadline=1.0).decide("sys", "user")
+        self.assertIsNone(decision)
+        self.assertFalse(meta["timed_out"])
+
+        # 主要後端夠快時不送出對沖請求
+        fast = LocalProvider("LONG", 0.9, name="primary")
+        spare = LocalProvider("WAIT", 0.1, name="spare")
+        router = self.router([fast, spare], deadline=1.0, hedge=True, hedge_delay=0.5)
+        self.assertEqual(router.decide("sys", "user")[1]["provider"], "primary")
+        self.assertEqual(spare.calls, 0)
+
+    def test_local_rule_is_deterministic(self):
+        provider = LocalProvider(rule=lambda m: {"action": "LONG" if m["rsi"] > 70 else "WAIT",
+                                                 "confidence": 0.8, "explanation": "rsi"})
+        router = self.router([provider])
+        self.assertEqual(router.decide("s", "u", market_data={"rsi": 75})[0]["action"], "LONG")
+        self.assertEqual(router.decide("s", "u", market_data={"rsi": 50})[0]["action"], "WAIT")
+
+    def test_latency_stats(self):
+        stats = LatencyStats()
+        for ms in range(1, 101):
+            stats.record("ok", float(ms))
+        snapshot = stats.snapshot()
+        self.assertEqual(snapshot["ok"], 100)
+        self.assertEqual(snapshot["p50_ms"], 51.0)
+        self.assertEqual(snapshot["p99_ms"], 100.0)
+        self.assertEqual(snapshot["max_ms"], 100.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+import sys
+from unittest.mock import patch
+
+# 模擬 config 模組，避免讀取真實檔案
+class MockConfig:
+    SYMBOL = "cmt_btcusdt"
+    REST_URL = "https://mock.api"
+    API_KEY = "mock_key"
+    SECRET_KEY = "mock_secret"
+    PASSPHRASE = "mock_pass"
+
+sys.modules.setdefault('config', MockConfig)
+
+from check_account import TTLCache, _dashboard_lines
+
+
+class Loader:
+    def __init__(self, *values):
+        self.values = list(values)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.values.pop(0)
+
+
+class TestTTLCache(unittest.TestCase):
+    def test_hit_until_expiry(self):
+        cache = TTLCache()
+        loader = Loader({"v": 1}, {"v": 2})
+        with patch("check_account.time.time", return_value=1000.0):
+            self.assertEqual(cache.get("detail", loader, ttl=300), {"v": 1})
+        with patch("check_account.time.time", return_value=1299.0):
+            self.assertEqual(cache.get("detail", loader, ttl=300), {"v": 1})
+        self.assertEqual(loader.calls, 1)
+        with patch("check_account.time.time", return_value=1300.0):
+            self.assertEqual(cache.get("detail", loader, ttl=300), {"v": 2})
+        self.assertEqual(loader.calls, 2)
+
+    def test_failed_load_is_not_cached(self):
+        cache = TTLCache()
+        loader = Loader(None, {"v": 1})
+        with patch("check_account.time.time", return_value=1000.0):
+            self.assertIsNone(cache.get("detail", loader, ttl=300))
+            self.assertEqual(cache.get("detail", loader, ttl=300), {"v": 1})
+        self.assertEqual(loader.calls, 2)
+
+    def test_dashboard_lines(self):
+        assets = [{"coinName": "USDT", "equity": "100", "available": "90", "frozen": "10", "unrealizePnl": "1.5"}]
+        positions = [{"side": "LONG", "leverage": "20", "size": "0.05", "open_avg_price": "100", "unrealizePnl": "2"}]
+        detail = {"account": {"leverageSetting": [{"symbol": "cmt_btcusdt", "cross_leverage": "20"}],
+                              "defaultFeeSetting": {"taker_fee_rate": "0.0006", "maker_fee_rate": "0.0002"}}}
+        lines = _dashboard_lines((assets, positions, [], detail, 0.05), 5)
+        text = "\n".join(lines)
+        self.assertIn("權益 100.0000", text)
+        self.assertIn("📊 [持倉] (1)", text)
+        self.assertIn("✅ 無掛單", text)
+        self.assertIn("全倉槓桿 x20 | Taker 0.0006", text)
+
+
+if __name__ == '__main__':
+    unittest.main()
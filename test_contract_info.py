@@ -0,0 +1,89 @@
+import unittest
+import sys
+import threading
+import time
+
+# 模擬 config 模組，避免讀取真實檔案
+class MockConfig:
+    SYMBOL = "cmt_btcusdt"
+    REST_URL = "https://mock.api"
+    API_KEY = "mock_key"
+    SECRET_KEY = "mock_secret"
+    PASSPHRASE = "mock_pass"
+
+sys.modules.setdefault('config', MockConfig)
+import config
+
+from contract_info import ContractSpec, ContractInfoCache, ContractError
+from exchange_client import WeexClient
+from weex_simulator import WeexSimulator
+
+BTC = {
+    "symbol": "cmt_btcusdt", "tick_size": "1", "priceEndStep": "5", "size_increment": "3",
+    "minOrderSize": "0.001", "maxOrderSize": "100", "minLeverage": "1", "maxLeverage": "125",
+}
+
+
+class TestContractSpec(unittest.TestCase):
+    def setUp(self):
+        self.spec = ContractSpec.from_api(BTC)
+
+    def test_parse_steps(self):
+        self.assertEqual(str(self.spec.tick_size), "0.5")
+        self.assertEqual(str(self.spec.size_step), "0.001")
+
+    def test_rounding(self):
+        self.assertEqual(self.spec.round_price(95012.74), "95012.5")
+        self.assertEqual(self.spec.round_price(95012.76), "95013.0")
+        self.assertEqual(self.spec.round_price(95012.99, "down"), "95012.5")
+        self.assertEqual(self.spec.round_size("0.05999"), "0.059")
+
+    def test_validate(self):
+        self.assertEqual(self.spec.validate("0.05", "95012.5"), [])
+        self.assertEqual(len(self.spec.validate("0.0005")), 2)  # 不是 step 倍數 + 小於最小量
+        self.assertEqual(len(self.spec.validate("0.05", "95012.3")), 1)
+        self.assertEqual(len(self.spec.validate(leverage=200)), 1)
+        with self.assertRaises(ContractError):
+            self.spec.check("1000")
+
+
+class TestContractInfoCache(unittest.TestCase):
+    def test_loads_from_simulator(self):
+        with WeexSimulator(api_key=config.API_KEY, secret_key=config.SECRET_KEY, passphrase=config.PASSPHRASE,
+                           symbols=[config.SYMBOL, "cmt_ethusdt"]) as sim:
+            cache = ContractInfoCache(WeexClient(base_url=sim.rest_url))
+            self.assertTrue(cache.load())
+            spec = cache.get(config.SYMBOL)
+            self.assertIsNotNone(spec)
+            self.assertEqual(str(spec.tick_size), "0.1")
+            self.assertIn("cmt_ethusdt", cache.specs)
+            self.assertIsNone(cache.get("cmt_unknown"))
+
+    def test_get_never_loads_synchronously(self):
+        """快取是空的時候 get() 立即回傳 None，改在背景載入"""
+        release = threading.Event()
+
+        class SlowClient:
+            calls = 0
+
+            def get_contracts(self):
+                SlowClient.calls += 1
+                release.wait(5)
+                return [{"symbol": config.SYMBOL, "tick_size": "1", "size_increment": "3"}]
+
+        cache = ContractInfoCache(SlowClient(), retry_interval=60)
+        started = time.perf_counter()
+        self.assertIsNone(cache.get(config.SYMBOL))
+        self.assertIsNone(cache.get(config.SYMBOL))
+        self.assertLess(time.perf_counter() - started, 0.5)
+        release.set()
+        for _ in range(50):
+            if cache.specs:
+                break
+            time.sleep(0.05)
+        self.assertIsNotNone(cache.get(config.SYMBOL))
+        self.assertEqual(SlowClient.calls, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+import threading
+import time
+
+from event_bus import EventBus, TICK, ORDER_ACKED
+
+
+class TestEventBus(unittest.TestCase):
+    def setUp(self):
+        self.bus = EventBus()
+
+    def tearDown(self):
+        self.bus.stop(timeout=1)
+
+    def test_routes_by_type(self):
+        ticks, orders = [], []
+        self.bus.subscribe("ticks", lambda e: ticks.append(e.data["price"]), types=[TICK])
+        self.bus.subscribe("orders", lambda e: orders.append(e.data), types=[ORDER_ACKED])
+        for i in range(5):
+            self.bus.publish(TICK, interval="MINUTE_1", price=i)
+        self.bus.publish(ORDER_ACKED, strategy="x")
+        self.assertTrue(self.bus.drain(2))
+        self.assertEqual(ticks, [0, 1, 2, 3, 4])
+        self.assertEqual(orders, [{"strategy": "x"}])
+        self.assertIsNone(self.bus.publish("unknown"))
+
+    def test_slow_consumer_never_blocks_publisher(self):
+        release = threading.Event()
+        seen = []
+
+        def slow(event):
+            release.wait(2)
+            seen.append(event.data["price"])
+
+        self.bus.subscribe("slow", slow, types=[TICK], maxsize=3)
+        started = time.perf_counter()
+        for i in range(1000):
+            self.bus.publish(TICK, interval="MINUTE_1", price=i)
+        self.assertLess(time.perf_counter() - started, 0.5)
+        release.set()
+        self.assertTrue(self.bus.drain(2))
+        stats = self.bus.stats()["slow"]
+        # 第一筆已在處理中，其餘只保留最新的 3 筆
+        self.assertEqual(seen[-3:], [997, 998, 999])
+        self.assertEqual(stats["dropped"] + stats["delivered"], 1000)
+
+    def test_block_policy_never_drops(self):
+        """稽核用 (交易日誌) 的訂閱者：佇列滿時發佈者等待，所有事件依序送達"""
+        release = threading.Event()
+        seen = []
+
+        def slow(event):
+            release.wait(2)
+            seen.append(event.data["strategy"])
+
+        self.bus.subscribe("audit", slow, types=[ORDER_ACKED], maxsize=2, policy="block")
+        publisher = threading.Thread(
+            target=lambda: [self.bus.publish(ORDER_ACKED, strategy=i) for i in range(20)], daemon=True)
+        publisher.start()
+        publisher.join(0.3)
+        self.assertTrue(publisher.is_alive())  # 佇列已滿，發佈者在等待空位
+        release.set()
+        publisher.join(2)
+        self.assertFalse(publisher.is_alive())
+        self.assertTrue(self.bus.drain(2))
+        stats = self.bus.stats()["audit"]
+        self.assertEqual(seen, list(range(20)))
+        self.assertEqual(stats["dropped"], 0)
+        self.assertGreater(stats["blocked"], 0)
+
+        # 已停止的 block 訂閱者改在發佈者執行緒處理，不遺失
+        self.bus.consumers["audit"].stop()
+        self.bus.publish(ORDER_ACKED, strategy="late")
+        self.assertEqual(seen[-1], "late")
+
+    def test_handler_error_is_counted(self):
+        def boom(event):
+            raise RuntimeError("boom")
+        self.bus.subscribe("boom", boom, inline=True)
+        self.bus.publish(TICK, interval="MINUTE_1", price=1)
+        self.assertEqual(self.bus.stats()["boom"]["errors"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
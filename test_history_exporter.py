@@ -0,0 +1,157 @@
+import unittest
+import sys
+import os
+import json
+import tempfile
+
+# 模擬 config 模組，避免讀取真實檔案
+class MockConfig:
+    SYMBOL = "cmt_btcusdt"
+    REST_URL = "https://mock.api"
+    API_KEY = "mock_key"
+    SECRET_KEY = "mock_secret"
+    PASSPHRASE = "mock_pass"
+
+sys.modules.setdefault('config', MockConfig)
+import config
+
+from exchange_client import WeexClient
+from weex_simulator import WeexSimulator
+from history_exporter import HistoryExporter, DAY_MS
+
+START_MS = 1_700_000_000_000
+
+
+class InterruptedClient:
+    """前 n 次成交查詢正常，之後連線中斷 (模擬匯出到一半被終止)"""
+    def __init__(self, client, n):
+        self.client = client
+        self.remaining = n
+
+    def get_fills(self, **kwargs):
+        if self.remaining <= 0:
+            raise ConnectionError("connection reset")
+        self.remaining -= 1
+        return self.client.get_fills(**kwargs)
+
+
+class DroppingClient(WeexClient):
+    """成交查詢的前 n 次沒有回應 (逾時 / 連線錯誤時 _send_request 回傳 None)"""
+    def __init__(self, n, **kwargs):
+        super().__init__(**kwargs)
+        self.remaining = n
+
+    def _send_request(self, method, endpoint, query_params="", body_dict=None):
+        if endpoint.endswith("/order/fills") and self.remaining > 0:
+            self.remaining -= 1
+            return None
+        return super()._send_request(method, endpoint, query_params, body_dict)
+
+
+def read_ids(path, key):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line)[key] for line in f]
+
+
+class TestHistoryExporter(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.sim = WeexSimulator(
+            api_key=config.API_KEY, secret_key=config.SECRET_KEY, passphrase=config.PASSPHRASE,
+            symbols=[config.SYMBOL], push_rate=1, ping_interval=5,
+        ).start()
+        # 250 筆成交、每 3 筆同一毫秒 (分頁邊界會切在同毫秒的紀錄中間)，分佈在兩天內
+        for i in range(250):
+            ts = START_MS + (i // 3) * 2_000_000
+            cls.sim.state.fills.append({
+                "tradeId": f"t{i}", "orderId": f"o{i}", "symbol": config.SYMBOL, "createdTime": ts,
+                "fillSize": "0.01", "fillValue": "1", "fillFee": "0.0006", "realizePnl": "0",
+            })
+            cls.sim.state.orders[f"o{i}"] = {
+                "symbol": config.SYMBOL, "order_id": f"o{i}", "client_oid": "", "status": "filled",
+                "createTime": str(ts), "size": "0.01", "type": "1",
+            }
+        cls.fill_ids = {f"t{i}" for i in range(250)}
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.sim.stop()
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.client = WeexClient(base_url=self.sim.rest_url)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_paginates_all_records_exactly_once(self):
+        exporter = HistoryExporter(self.client, out_dir=self.tmp.name, rate=1000, workers=4)
+        counts = exporter.export(config.SYMBOL, START_MS, START_MS + 2 * DAY_MS)
+        self.assertEqual(counts, {"fills": 250, "orders": 250})
+        fills = read_ids(os.path.join(self.tmp.name, f"{config.SYMBOL}_fills.jsonl"), "tradeId")
+        self.assertEqual(sorted(fills), sorted(self.fill_ids))
+        orders = read_ids(os.path.join(self.tmp.name, f"{config.SYMBOL}_orders.jsonl"), "order_id")
+        self.assertEqual(len(set(orders)), len(orders))
+        self.assertEqual(len(orders), 250)
+
+    def test_resume_after_interruption(self):
+        path = os.path.join(self.tmp.name, f"{config.SYMBOL}_fills.jsonl")
+        interrupted = HistoryExporter(InterruptedClient(self.client, 2), out_dir=self.tmp.name, rate=1000, workers=1,
+                                      backoff=0)
+        partial = interrupted.export(config.SYMBOL, START_MS, START_MS + 2 * DAY_MS, kinds=("fills",))
+        self.assertLess(partial["fills"], 250)
+        self.assertGreater(partial["fills"], 0)
+
+        # 重跑：從游標繼續，已寫入的紀錄不會重複
+        resumed = HistoryExporter(self.client, out_dir=self.tmp.name, rate=1000, workers=1)
+        counts = resumed.export(config.SYMBOL, START_MS, START_MS + 2 * DAY_MS, kinds=("fills",))
+        self.assertEqual(partial["fills"] + counts["fills"], 250)
+        self.assertEqual(sorted(read_ids(path, "tradeId")), sorted(self.fill_ids))
+
+        # 全部完成後再跑一次不會再寫入
+        again = HistoryExporter(self.client, out_dir=self.tmp.name, rate=1000, workers=1)
+        self.assertEqual(again.export(config.SYMBOL, START_MS, START_MS + 2 * DAY_MS, kinds=("fills",)),
+                         {"fills": 0})
+
+    def test_failed_fetch_is_retried_not_treated_as_end(self):
+        """沒有回應不是「沒有資料」：重試後照樣完整匯出"""
+        client = DroppingClient(3, base_url=self.sim.rest_url)
+        exporter = HistoryExporter(client, out_dir=self.tmp.name, rate=1000, workers=1, backoff=0)
+        counts = exporter.export(config.SYMBOL, START_MS, START_MS + 2 * DAY_MS, kinds=("fills",))
+        self.assertEqual(counts, {"fills": 250})
+        self.assertEqual(client.remaining, 0)
+
+    def test_persistent_failure_never_marks_window_done(self):
+        path = os.path.join(self.tmp.name, f"{config.SYMBOL}_fills.jsonl")
+        dead = DroppingClient(10 ** 6, base_url=self.sim.rest_url)
+        failed = HistoryExporter(dead, out_dir=self.tmp.name, rate=1000, workers=2, max_retries=2, backoff=0)
+        self.assertEqual(failed.export(config.SYMBOL, START_MS, START_MS + 2 * DAY_MS, kinds=("fills",)),
+                         {"fills": 0})
+        self.assertFalse(any(v.get("done") for k, v in failed.state.data.items() if not k.startswith("_")))
+
+        resumed = HistoryExporter(self.client, out_dir=self.tmp.name, rate=1000, workers=2)
+        self.assertEqual(resumed.export(config.SYMBOL, START_MS, START_MS + 2 * DAY_MS, kinds=("fills",)),
+                         {"fills": 250})
+        self.assertEqual(sorted(read_ids(path, "tradeId")), sorted(self.fill_ids))
+
+    def test_records_written_after_last_cursor_are_not_duplicated(self):
+        """寫入後、游標更新前中斷：重跑時截掉未確認的部分再從游標重抓"""
+        path = os.path.join(self.tmp.name, f"{config.SYMBOL}_fills.jsonl")
+        interrupted = HistoryExporter(InterruptedClient(self.client, 2), out_dir=self.tmp.name, rate=1000, workers=1,
+                                      max_retries=0)
+        partial = interrupted.export(config.SYMBOL, START_MS, START_MS + 2 * DAY_MS, kinds=("fills",))
+        self.assertGreater(partial["fills"], 0)
+        # 模擬下一頁已寫入檔案、但游標還沒更新就當機
+        with open(path, "a", encoding="utf-8") as f:
+            for line in open(path, encoding="utf-8").readlines()[:5]:
+                f.write(line)
+
+        resumed = HistoryExporter(self.client, out_dir=self.tmp.name, rate=1000, workers=1)
+        resumed.export(config.SYMBOL, START_MS, START_MS + 2 * DAY_MS, kinds=("fills",))
+        ids = read_ids(path, "tradeId")
+        self.assertEqual(len(ids), 250)
+        self.assertEqual(sorted(ids), sorted(self.fill_ids))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import unittest
+import random
+
+import numpy as np
+import pandas as pd
+
+import indicators
+
+try:
+    import pandas_ta as ta
+except ImportError:
+    ta = None
+
+
+def reference_rsi(closes, length):
+    """與 pandas_ta.rsi 相同的算法 (RMA = ewm(alpha=1/length, min_periods=length))"""
+    s = pd.Series(closes, dtype=float)
+    negative = s.diff()
+    positive = negative.copy()
+    positive[positive < 0] = 0
+    negative[negative > 0] = 0
+    pos_avg = positive.ewm(alpha=1 / length, min_periods=length).mean()
+    neg_avg = negative.ewm(alpha=1 / length, min_periods=length).mean()
+    return (100 * pos_avg / (pos_avg + neg_avg.abs())).to_numpy()
+
+
+def reference_bbands(closes, length, std):
+    """與 pandas_ta.bbands 相同的算法 (SMA 中軌、ddof=0 標準差)"""
+    s = pd.Series(closes, dtype=float)
+    mid = s.rolling(length).mean()
+    sd = s.rolling(length).std(ddof=0)
+    lower, upper = mid - std * sd, mid + std * sd
+    return {"lower": lower.to_numpy(), "mid": mid.to_numpy(), "upper": upper.to_numpy(),
+            "bandwidth": (100 * (upper - lower) / mid).to_numpy(),
+            "percent": ((s - lower) / (upper - lower)).to_numpy()}
+
+
+def random_closes(seed, n=200, start=95000.0):
+    rng = random.Random(seed)
+    closes = [start]
+    for _ in range(n - 1):
+        closes.append(closes[-1] * (1 + rng.gauss(0, 0.003)))
+    return closes
+
+
+class TestIndicators(unittest.TestCase):
+    def assertSeriesEqual(self, actual, expected, rtol=1e-9):
+        np.testing.assert_array_equal(np.isnan(actual), np.isnan(expected))
+        np.testing.assert_allclose(actual, expected, rtol=rtol, equal_nan=True)
+
+    def test_rsi_matches_reference(self):
+        for seed in range(5):
+            closes = random_closes(seed)
+            for length in (7, 14, 21):
+                self.assertSeriesEqual(indicators.rsi(closes, length), reference_rsi(closes, length))
+
+    def test_bbands_match_reference(self):
+        closes = random_closes(1)
+        for length, std in ((20, 2.0), (14, 1.5)):
+            bands = indicators.bbands(closes, length, std)
+            expected = reference_bbands(closes, length, std)
+            for key in expected:
+                self.assertSeriesEqual(bands[key], expected[key])
+        # band_width 為比例 (RANGE_BB_WIDTH 的定義)，BBB 為百分比
+        expected = reference_bbands(closes, 20, 2.0)
+        self.assertSeriesEqual(indicators.band_width(closes, 20, 2.0) * 100, expected["bandwidth"])
+
+    def test_matrix_equals_row_by_row(self):
+        # 長度不同的交易對左側補 NaN，一次計算的結果與逐一計算相同
+        series = [random_closes(seed, n=n) for seed, n in enumerate((200, 150, 60, 25))]
+        matrix = indicators.pad_left(series)
+        self.assertEqual(matrix.shape, (4, 200))
+        columns = indicators.indicator_columns(matrix, 14, 20, 2.0)
+        for i, closes in enumerate(series):
+            single = indicators.indicator_columns(closes, 14, 20, 2.0)
+            for name, values in single.items():
+                self.assertSeriesEqual(columns[name][i, -len(closes):], values)
+
+    def test_short_and_flat_series(self):
+        self.assertTrue(np.isnan(indicators.rsi([1.0, 2.0, 3.0], 14)).all())
+        self.assertTrue(np.isnan(indicators.bbands([1.0, 2.0], 20, 2.0)["mid"]).all())
+        flat = indicators.bbands([100.0] * 30, 20, 2.0)
+        self.assertEqual(flat["mid"][-1], 100.0)
+        self.assertTrue(np.isfinite(flat["percent"][-1]))
+
+    def test_column_names(self):
+        columns = indicators.indicator_columns(random_closes(2, n=50), 14, 20, 2)
+        self.assertEqual(sorted(columns), ["BBB_20_2.0", "BBL_20_2.0", "BBM_20_2.0", "BBP_20_2.0", "BBU_20_2.0", "RSI"])
+
+    @unittest.skipIf(ta is None, "pandas_ta 未安裝")
+    def test_matches_pandas_ta(self):
+        close = pd.Series(random_closes(3))
+        self.assertSeriesEqual(indicators.rsi(close.to_numpy(), 14), ta.rsi(close, length=14).to_numpy())
+        bb = ta.bbands(close, length=20, std=2.0)
+        columns = indicators.indicator_columns(close.to_numpy(), 14, 20, 2.0)
+        for name in bb.columns:
+            self.assertSeriesEqual(columns[name], bb[name].to_numpy())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+import unittest
+import sys
+import os
+import tempfile
+from unittest.mock import patch
+
+# 模擬 config 模組，避免讀取真實檔案
+class MockConfig:
+    SYMBOL = "cmt_btcusdt"
+    REST_URL = "https://mock.api"
+    API_KEY = "mock_key"
+    SECRET_KEY = "mock_secret"
+    PASSPHRASE = "mock_pass"
+
+sys.modules.setdefault('config', MockConfig)
+import config
+
+from exchange_client import WeexClient, QueryError
+from weex_simulator import WeexSimulator
+import kill_switch
+
+
+class TestKillSwitch(unittest.TestCase):
+    def setUp(self):
+        self.sim = WeexSimulator(
+            api_key=config.API_KEY, secret_key=config.SECRET_KEY, passphrase=config.PASSPHRASE,
+            symbols=[config.SYMBOL], push_rate=1, ping_interval=5,
+        ).start()
+        self.client = WeexClient(base_url=self.sim.rest_url)
+
+    def tearDown(self):
+        self.sim.stop()
+
+    def open_position_and_orders(self, client):
+        client.place_order(side=1, size="0.05", match_price="1")
+        client.place_order(side=1, size="0.01", price="1000", match_price="0")
+        self.assertEqual(len(client.get_all_positions(config.SYMBOL)), 1)
+        self.assertEqual(len(client.get_open_orders(config.SYMBOL)), 1)
+
+    def test_flatten_clears_positions_and_orders(self):
+        self.open_position_and_orders(self.client)
+        report = kill_switch.flatten_all({"main": self.client}, symbols=[config.SYMBOL], deadline_seconds=5)
+        self.assertTrue(report["flat"])
+        self.assertIsNotNone(report["time_to_flat"])
+        self.assertEqual(self.client.get_all_positions(config.SYMBOL, strict=True), [])
+        self.assertEqual(self.client.get_open_orders(config.SYMBOL, strict=True), [])
+
+    def test_failed_query_is_not_flat(self):
+        """倉位查詢失敗時不能回報已清空，而是重試到期限"""
+        self.open_position_and_orders(self.client)
+        endpoint = "/capi/v2/account/position/allPosition"
+        self.sim.faults.configure(endpoint, error_rate=1.0)
+        try:
+            with self.assertRaises(QueryError):
+                self.client.get_all_positions(strict=True)
+
+            report = kill_switch.flatten_all({"main": self.client}, symbols=[config.SYMBOL], deadline_seconds=1)
+        finally:
+            self.sim.faults.configure(endpoint, error_rate=0.0)
+        account = report["accounts"][0]
+        self.assertFalse(report["flat"])
+        self.assertIsNone(report["time_to_flat"])
+        self.assertEqual(account["residual"][config.SYMBOL]["positions"], -1)
+        self.assertGreaterEqual(account["elapsed"], 1)
+        self.assertGreater(account["attempts"], 1)
+
+    def test_unreachable_exchange_is_not_flat(self):
+        dead = WeexClient(base_url="http://127.0.0.1:1", timeout=0.5)
+        report = kill_switch.flatten_all({"dead": dead}, symbols=[config.SYMBOL], deadline_seconds=0.5)
+        self.assertFalse(report["flat"])
+        self.assertEqual(report["accounts"][0]["residual"][config.SYMBOL],
+                         {"positions": -1, "orders": -1, "plans": -1})
+
+    def test_other_symbols_are_verified(self):
+        """撤單是帳戶層級，驗證也要涵蓋合約列表上的其他交易對，而不只是 symbols"""
+        with WeexSimulator(api_key=config.API_KEY, secret_key=config.SECRET_KEY, passphrase=config.PASSPHRASE,
+                           symbols=[config.SYMBOL, "cmt_ethusdt"], push_rate=1, ping_interval=5) as sim:
+            client = WeexClient(base_url=sim.rest_url)
+            client.place_order(side=1, size="0.01", price="10", match_price="0",
+                               extra_params={"symbol": "cmt_ethusdt"})
+            self.assertEqual(len(client.get_open_orders("cmt_ethusdt", strict=True)), 1)
+
+            endpoint = "/capi/v2/order/cancelAllOrders"
+            sim.faults.configure(endpoint, error_rate=1.0)
+            try:
+                report = kill_switch.flatten_all({"main": client}, symbols=[config.SYMBOL], deadline_seconds=1)
+            finally:
+                sim.faults.configure(endpoint, error_rate=0.0)
+            self.assertFalse(report["flat"])
+            self.assertEqual(report["accounts"][0]["residual"]["cmt_ethusdt"]["orders"], 1)
+
+            report = kill_switch.flatten_all({"main": client}, symbols=[config.SYMBOL], deadline_seconds=5)
+            self.assertTrue(report["flat"])
+            self.assertEqual(report["accounts"][0]["symbols_checked"], 2)
+            self.assertEqual(client.get_open_orders("cmt_ethusdt", strict=True), [])
+
+    def test_unknown_contract_list_is_not_flat(self):
+        endpoint = "/capi/v2/market/contracts"
+        self.sim.faults.configure(endpoint, error_rate=1.0)
+        try:
+            report = kill_switch.flatten_all({"main": self.client}, symbols=[config.SYMBOL], deadline_seconds=2)
+        finally:
+            self.sim.faults.configure(endpoint, error_rate=0.0)
+        account = report["accounts"][0]
+        self.assertEqual(account["residual"], {})  # 指定的交易對已清空
+        self.assertFalse(account["all_symbols"])
+        self.assertFalse(report["flat"])  # 但沒驗證到其他交易對，不能宣稱已清空
+
+    def test_default_clients_include_accounts(self):
+        sub = WeexClient(base_url=self.sim.rest_url, machine_id=10)
+        self.open_position_and_orders(sub)
+        accounts = [{"name": "sub1", "api_key": config.API_KEY, "secret_key": config.SECRET_KEY,
+                     "passphrase": config.PASSPHRASE, "max_open_orders": 10, "max_positions": 1,
+                     "max_position_size": 1}]
+        with patch.object(config, "REST_URL", self.sim.rest_url, create=True), \
+                patch.object(config, "ACCOUNTS", accounts, create=True):
+            report = kill_switch.flatten_all(symbols=[config.SYMBOL], deadline_seconds=5)
+        self.assertEqual(sorted(a["account"] for a in report["accounts"]), ["default", "sub1"])
+        self.assertTrue(report["flat"])
+
+    def test_halt_flag_round_trip(self):
+        with tempfile.TemporaryDirectory() as tmp, \
+                patch.object(config, "HALT_FILE", os.path.join(tmp, "sub", "HALT"), create=True):
+            self.assertIsNone(kill_switch.is_halted())
+            kill_switch.halt("manual test")
+            self.assertEqual(kill_switch.is_halted(), "manual test")
+            self.assertTrue(kill_switch.clear_halt())
+            self.assertIsNone(kill_switch.is_halted())
+            self.assertFalse(kill_switch.clear_halt())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import unittest
+import sys
+import os
+import subprocess
+import tempfile
+import threading
+
+# 模擬 config 模組，避免讀取真實檔案
+class MockConfig:
+    SYMBOL = "cmt_btcusdt"
+    REST_URL = "https://mock.api"
+    API_KEY = "mock_key"
+    SECRET_KEY = "mock_secret"
+    PASSPHRASE = "mock_pass"
+
+sys.modules.setdefault('config', MockConfig)
+
+from lazy_import import lazy_module, preload
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 被 import 時記錄次數的探針模組
+PROBE_SOURCE = """
+import sys
+sys.lazy_probe_loads = getattr(sys, "lazy_probe_loads", 0) + 1
+VALUE = 42
+"""
+
+CONFIG_SOURCE = """
+SYMBOL = "cmt_btcusdt"
+REST_URL = "https://mock.api"
+API_KEY = "mock_key"
+SECRET_KEY = "mock_secret"
+PASSPHRASE = "mock_pass"
+STRATEGY_INTERVAL = "MINUTE_5"
+AI_TEMPERATURE = None
+AI_MAX_TOKENS = None
+"""
+
+
+class TestLazyImport(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.name = f"lazy_probe_{id(self)}"
+        with open(os.path.join(self.tmp.name, self.name + ".py"), "w", encoding="utf-8") as f:
+            f.write(PROBE_SOURCE)
+        sys.path.insert(0, self.tmp.name)
+        sys.lazy_probe_loads = 0
+
+    def tearDown(self):
+        sys.path.remove(self.tmp.name)
+        sys.modules.pop(self.name, None)
+        del sys.lazy_probe_loads
+        self.tmp.cleanup()
+
+    def test_import_deferred_until_first_attribute(self):
+        probe = lazy_module(self.name)
+        self.assertNotIn(self.name, sys.modules)
+        self.assertEqual(sys.lazy_probe_loads, 0)
+        self.assertEqual(probe.VALUE, 42)
+        self.assertIn(self.name, sys.modules)
+        self.assertEqual(probe.VALUE, 42)
+        self.assertEqual(sys.lazy_probe_loads, 1)
+
+    def test_concurrent_first_access_loads_once(self):
+        probe = lazy_module(self.name)
+        values = []
+        threads = [threading.Thread(target=lambda: values.append(probe.VALUE)) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(values, [42] * 8)
+        self.assertEqual(sys.lazy_probe_loads, 1)
+
+    def test_preload_in_background(self):
+        probe = lazy_module(self.name)
+        preload(probe, "lazy_probe_missing_module").join(5)  # 載入失敗只印警告，不影響其他模組
+        self.assertIn(self.name, sys.modules)
+        self.assertEqual(sys.lazy_probe_loads, 1)
+        self.assertEqual(probe.VALUE, 42)
+        self.assertEqual(sys.lazy_probe_loads, 1)
+
+    def test_entry_points_do_not_import_heavy_modules(self):
+        """main.py / check_account.py 冷啟動時不載入 pandas / openai"""
+        with open(os.path.join(self.tmp.name, "config.py"), "w", encoding="utf-8") as f:
+            f.write(CONFIG_SOURCE)
+        code = ("import sys, main, check_account; "
+                "print('loaded=' + ','.join(m for m in ('pandas', 'openai', 'pandas_ta') if m in sys.modules))")
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join([self.tmp.name, REPO_DIR]))
+        result = subprocess.run([sys.executable, "-c", code], cwd=self.tmp.name, env=env,
+                                capture_output=True, text=True, timeout=60)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip().splitlines()[-1], "loaded=")
+
+
+if __name__ == '__main__':
+    unittest.main()
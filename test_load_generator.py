@@ -0,0 +1,71 @@
+import unittest
+import sys
+import json
+import threading
+
+# 模擬 config 模組，避免讀取真實檔案
+class MockConfig:
+    SYMBOL = "cmt_btcusdt"
+    REST_URL = "https://mock.api"
+    API_KEY = "mock_key"
+    SECRET_KEY = "mock_secret"
+    PASSPHRASE = "mock_pass"
+
+sys.modules.setdefault('config', MockConfig)
+
+from load_generator import LoadFrameFactory, sent_at, evaluate_stage, find_saturation, run_load
+from weex_simulator import PriceModel
+
+
+def stage(target, sent, delivered, p99, per_core=1000.0):
+    return evaluate_stage({"target": target, "sent": sent, "sent_per_s": sent, "delivered": delivered,
+                           "delivered_per_s": delivered, "lag_p99_ms": p99, "per_core": per_core}, max_lag_ms=100)
+
+
+class TestLoadGenerator(unittest.TestCase):
+    def test_frames_accumulate_candle_and_carry_send_time(self):
+        factory = LoadFrameFactory(PriceModel(["cmt_btcusdt"]))
+        channel = "kline.LAST_PRICE.cmt_btcusdt.MINUTE_15"
+        frames = [factory(channel) for _ in range(20)]
+        first, last = frames[0]["data"][0], frames[-1]["data"][0]
+        self.assertEqual(first["open"], last["open"])
+        closes = [float(f["data"][0]["close"]) for f in frames]
+        self.assertEqual(float(last["high"]), max(closes))
+        self.assertEqual(float(last["low"]), min(closes))
+        self.assertGreater(float(last["volume"]), float(first["volume"]))
+
+        message = json.dumps(frames[-1])
+        self.assertAlmostEqual(sent_at(message), frames[-1]["sentAt"], places=6)
+        self.assertIsNone(sent_at('{"event": "ping", "time": "1"}'))
+
+    def test_saturation_is_highest_sustained_stage(self):
+        stages = [stage(500, 500, 500, 5), stage(1000, 1000, 990, 40), stage(2000, 2000, 1400, 900)]
+        self.assertEqual([s["sustained"] for s in stages], [True, True, False])
+        self.assertEqual(find_saturation(stages)["throughput"], 990)
+        # 處理量跟得上但延遲超過門檻也算落後
+        self.assertFalse(stage(500, 500, 500, 150)["sustained"])
+        self.assertTrue(stage(4000, 3000, 3000, 10)["generator_bound"])
+        self.assertIsNone(find_saturation([stage(500, 500, 100, 900)]))
+
+    def test_end_to_end_through_market_stream(self):
+        counts = {}
+        lock = threading.Lock()
+
+        def factory(symbol):
+            def callback(interval, price):
+                with lock:
+                    counts[(symbol, interval)] = counts.get((symbol, interval), 0) + 1
+            return callback
+
+        report = run_load(symbols=2, intervals=["MINUTE_1", "MINUTE_15"], rates=[200], duration=1.0,
+                          ping_interval=0.3, handler_factory=factory)
+        result = report["stages"][0]
+        self.assertEqual(report["channels"], 4)
+        self.assertEqual(len(counts), 4)
+        self.assertGreater(result["delivered"], 100)
+        self.assertIsNotNone(result["lag_p99_ms"])
+        self.assertEqual(report["disconnects"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
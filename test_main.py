@@ -0,0 +1,143 @@
+import unittest
+import sys
+import os
+import json
+import subprocess
+import tempfile
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def run_with_bot(script):
+    """
+    main.py 需要完整設定 (模組層級就會讀取)，在子行程以 config_example.py 為設定執行，
+    避免與其他測試共用的 MockConfig 互相影響；回傳 script 最後一行印出的 JSON
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(os.path.join(REPO_DIR, "config_example.py"), encoding="utf-8") as f:
+            source = f.read()
+        with open(os.path.join(tmp, "config.py"), "w", encoding="utf-8") as f:
+            f.write(source)
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join([tmp, REPO_DIR]))
+        result = subprocess.run([sys.executable, "-c", script], cwd=tmp, env=env,
+                                capture_output=True, text=True, timeout=120)
+    if result.returncode != 0:
+        raise AssertionError(result.stderr)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+SETUP = """
+import json, math, random
+import numpy as np
+import main as bot
+from ai_provider import AIRouter, LocalProvider
+from paper_client import PaperClient
+
+def manager():
+    return bot.StrategyManager(PaperClient(), seed_history=False, ai=AIRouter([LocalProvider()]))
+
+def klines(n, seed, start_ms=1_700_000_000_000):
+    rng = random.Random(seed)
+    price, rows = 95000.0, []
+    for i in range(n):
+        price *= 1 + rng.gauss(0, 0.003)
+        rows.append([str(start_ms + i * 300_000), str(price), str(price * 1.002), str(price * 0.998),
+                     str(price), "10", "100"])
+    rng.shuffle(rows)  # 交易所回傳的順序不保證
+    return rows
+
+def plan(strategy):
+    p = strategy.trigger_plan
+    return None if p is None else {k: v for k, v in vars(p).items()}
+"""
+
+APPLY_MANY = SETUP + """
+histories = [klines(n, seed) for seed, n in enumerate([30, 120, 200, 1])]
+single = [manager() for _ in histories]
+for strategy, raw in zip(single, histories):
+    strategy._apply_klines(raw)
+many = [manager() for _ in histories]
+bot.apply_klines_many(many, histories)
+
+result = []
+for a, b in zip(single, many):
+    numeric = [c for c in a.history_df.columns if a.history_df[c].dtype.kind == "f"]
+    result.append({
+        "columns": list(a.history_df.columns) == list(b.history_df.columns),
+        "values": all(np.allclose(a.history_df[c], b.history_df[c], equal_nan=True, rtol=0, atol=1e-9)
+                      for c in numeric),
+        "rows": len(b.history_df),
+        "prev": [float(a.prev_high), float(a.prev_low)] == [float(b.prev_high), float(b.prev_low)],
+        "plan": json.dumps(plan(a), sort_keys=True) == json.dumps(plan(b), sort_keys=True),
+        "raw": a.raw_klines == b.raw_klines,
+        "has_plan": b.trigger_plan is not None,
+    })
+
+# refresh_history_many：各自下載，下載失敗的略過
+class History:
+    def __init__(self, raw):
+        self.raw = raw
+
+    def get_history_candles(self, **kwargs):
+        return self.raw
+
+fleet = [manager() for _ in range(3)]
+for strategy, raw in zip(fleet, [histories[1], None, histories[2]]):
+    strategy.market_data = History(raw)
+refreshed = bot.refresh_history_many(fleet)
+print(json.dumps({"apply": result, "refreshed": refreshed,
+                  "ready": [s.history_ready.is_set() for s in fleet],
+                  "same": fleet[2].history_df["RSI"].equals(single[2].history_df["RSI"])}))
+"""
+
+
+REPLAN = SETUP + """
+strategy = manager()
+seen = []
+original = strategy._build_trigger_plan
+
+def spy(df, prev_high):
+    # 建立觸發價位時，新的 K 線還不能被 tick 執行緒看到
+    seen.append(strategy.history_df is df)
+    return original(df, prev_high)
+
+strategy._build_trigger_plan = spy
+strategy._apply_klines(klines(120, 1))
+first = plan(strategy)
+strategy._apply_klines(klines(120, 2))
+rebuilt = plan(strategy)
+expected = vars(bot.StrategyManager._build_trigger_plan(strategy, strategy.history_df, strategy.prev_high))
+strategy._apply_klines(klines(1, 3))
+print(json.dumps({"seen": seen, "changed": first != rebuilt,
+                  "matches": json.dumps(rebuilt, sort_keys=True) == json.dumps(expected, sort_keys=True),
+                  "short": plan(strategy), "rows": len(strategy.history_df)}))
+"""
+
+
+class TestApplyKlines(unittest.TestCase):
+    def test_plan_published_with_history(self):
+        """觸發價位由新的 K 線算好後才與 history_df 一起更新；K 線不足兩根時清除舊的觸發價位"""
+        output = run_with_bot(REPLAN)
+        self.assertEqual(output["seen"], [False, False])
+        self.assertTrue(output["changed"])
+        self.assertTrue(output["matches"])
+        self.assertIsNone(output["short"])
+        self.assertEqual(output["rows"], 1)
+
+
+class TestApplyKlinesMany(unittest.TestCase):
+    def test_matches_per_manager_apply(self):
+        """多交易對一次向量化計算的結果，與各自呼叫 _apply_klines 完全相同 (歷史長度各不相同)"""
+        output = run_with_bot(APPLY_MANY)
+        result = output["apply"]
+        self.assertEqual([r["rows"] for r in result], [30, 120, 200, 1])
+        self.assertEqual([r["has_plan"] for r in result], [True, True, True, False])
+        for r in result:
+            self.assertEqual(r, dict(r, columns=True, values=True, prev=True, plan=True, raw=True))
+        self.assertEqual(output["refreshed"], 2)
+        self.assertEqual(output["ready"], [True, False, True])
+        self.assertTrue(output["same"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+import unittest
+import sys
+import os
+import time
+import tempfile
+import threading
+
+# 模擬 config 模組，避免讀取真實檔案
+class MockConfig:
+    SYMBOL = "cmt_btcusdt"
+    REST_URL = "https://mock.api"
+    API_KEY = "mock_key"
+    SECRET_KEY = "mock_secret"
+    PASSPHRASE = "mock_pass"
+
+sys.modules.setdefault('config', MockConfig)
+import config
+
+from exchange_client import WeexClient
+from market_stream import MarketStream
+from order_book import OrderBook
+from weex_simulator import WeexSimulator
+from market_data_daemon import MarketDataDaemon, MarketDataClient, CandleBuffer
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+class TestMarketDataDaemon(unittest.TestCase):
+    def setUp(self):
+        self.sim = WeexSimulator(
+            api_key=config.API_KEY, secret_key=config.SECRET_KEY, passphrase=config.PASSPHRASE,
+            symbols=[config.SYMBOL], push_rate=50,
+        ).start()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "market.sock")
+        self.daemon = MarketDataDaemon(self.path, url=self.sim.ws_url,
+                                       rest_client=WeexClient(base_url=self.sim.rest_url)).start()
+        self.streams = []
+
+    def tearDown(self):
+        for stream in self.streams:
+            stream.on_close = lambda *args: None  # 測試結束時不重連
+            stream.ws.close()
+        self.daemon.stop()
+        self.sim.stop()
+        self.tmp.cleanup()
+
+    def attach(self, intervals, order_book=None):
+        ticks = []
+        stream = MarketStream(config.SYMBOL, intervals, lambda interval, price: ticks.append((interval, price)),
+                              order_book=order_book, depth_levels=15, daemon_socket=self.path)
+        stream.start()
+        self.streams.append(stream)
+        return stream, ticks
+
+    def test_many_streams_share_one_upstream_connection(self):
+        book_a, book_b = OrderBook(config.SYMBOL), OrderBook(config.SYMBOL)
+        _, ticks_a = self.attach(["MINUTE_1"], order_book=book_a)
+        stream_b, ticks_b = self.attach(["MINUTE_1", "MINUTE_5"], order_book=book_b)
+
+        self.assertTrue(wait_for(lambda: len(ticks_a) >= 5 and any(i == "MINUTE_5" for i, _ in ticks_b)))
+        # 兩個機器人、三個頻道 → 交易所只有一條連線
+        self.assertEqual(len(self.sim.connections), 1)
+        self.assertEqual(len(self.daemon.upstream.channels()), 3)
+        self.assertNotIn("MINUTE_5", {i for i, _ in ticks_a})
+        # 後加入的機器人也拿得到訂單簿快照
+        self.assertTrue(wait_for(lambda: book_a.is_fresh() and book_b.is_fresh()))
+        self.assertLess(stream_b.message_age(f"kline.LAST_PRICE.{config.SYMBOL}.MINUTE_1"), 1.0)
+
+        # 最後一個訂閱者離開才向交易所退訂
+        stream_b.on_close = lambda *args: None
+        stream_b.ws.close()
+        self.streams.remove(stream_b)
+        self.assertTrue(wait_for(lambda: f"kline.LAST_PRICE.{config.SYMBOL}.MINUTE_5" not in self.daemon.upstream.channels()))
+        self.assertIn(f"kline.LAST_PRICE.{config.SYMBOL}.MINUTE_1", self.daemon.upstream.channels())
+
+    def test_candles_served_from_shared_buffer(self):
+        self.attach(["MINUTE_5"])
+        self.assertTrue(wait_for(lambda: self.daemon.counters["frames"] > 0))
+        clients = [MarketDataClient(self.path) for _ in range(5)]
+        results = [None] * len(clients)
+
+        def fetch(i):
+            results[i] = clients[i].get_history_candles(config.SYMBOL, "5m", end_time=int(time.time() * 1000), limit=100)
+
+        threads = [threading.Thread(target=fetch, args=(i,)) for i in range(len(clients))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertTrue(all(len(rows) == 100 and len(rows[0]) == 7 for rows in results))
+        # 5 個機器人同時查詢只下載一次
+        self.assertEqual(self.daemon.counters["candle_rest"], 1)
+        self.assertEqual(self.daemon.counters["candle_hits"], 4)
+        stats = clients[0].stats()
+        self.assertEqual(stats["upstream_connects"], 1)
+        self.assertEqual(stats["buffers"], {f"{config.SYMBOL}.MINUTE_5": 500})
+
+    def test_client_falls_back_to_rest(self):
+        client = MarketDataClient(os.path.join(self.tmp.name, "missing.sock"),
+                                  fallback=WeexClient(base_url=self.sim.rest_url))
+        rows = client.get_history_candles(config.SYMBOL, "1m", limit=10)
+        self.assertEqual(len(rows), 10)
+        self.assertEqual(client.fallbacks, 1)
+
+
+class TestCandleBuffer(unittest.TestCase):
+    def test_push_updates_last_and_appends(self):
+        buffer = CandleBuffer(limit=3)
+        buffer.update({"startTime": "0", "close": "1"})  # 尚未下載歷史前忽略
+        self.assertEqual(len(buffer), 0)
+        buffer.seed([[str(t), "1", "2", "0.5", "1.5", "10", "15"] for t in (0, 60_000, 120_000)])
+        buffer.update({"startTime": "120000", "open": "1", "high": "3", "low": "1", "close": "2.5", "volume": "12"})
+        self.assertEqual(buffer.latest(1)[0][2:6], ["3", "0.5", "2.5", "12"])
+        buffer.update({"startTime": "180000", "open": "2.5", "high": "2.6", "low": "2.4", "close": "2.6", "volume": "1"})
+        rows = buffer.latest(10)
+        self.assertEqual([r[0] for r in rows], ["60000", "120000", "180000"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+import os
+import tempfile
+
+from market_recorder import MarketRecorder, read_frames, list_segments
+
+
+class TestMarketRecorder(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_roundtrip_with_rotation(self):
+        rec = MarketRecorder(self.dir, prefix="btc", segment_bytes=200)
+        frames = [f'{{"event":"payload","n":{i}}}' for i in range(50)]
+        for i, f in enumerate(frames):
+            rec.record(f, recv_ns=1_000 + i)
+        rec.close()
+
+        self.assertGreater(len(list_segments(self.dir, "btc")), 1)
+        got = list(read_frames(self.dir))
+        self.assertEqual([t for t, _ in got], [1_000 + i for i in range(50)])
+        self.assertEqual([m for _, m in got], frames)
+        self.assertEqual(len(list(read_frames(self.dir, start_ns=1_010, end_ns=1_019))), 10)
+
+    def test_merges_prefixes_and_skips_truncated_tail(self):
+        a = MarketRecorder(self.dir, prefix="a")
+        b = MarketRecorder(self.dir, prefix="b")
+        for i in range(5):
+            a.record(f"a{i}", recv_ns=10 + 2 * i)
+            b.record(f"b{i}", recv_ns=11 + 2 * i)
+        a.close()
+        b.close()
+        # 模擬程序中斷：最後一筆只寫了一半
+        path = list_segments(self.dir, "b")[-1]
+        with open(path, "r+b") as f:
+            f.truncate(os.path.getsize(path) - 1)
+
+        got = [m for _, m in read_frames(self.dir)]
+        self.assertEqual(got, ["a0", "b0", "a1", "b1", "a2", "b2", "a3", "b3", "a4"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import unittest
+import sys
+import os
+import json
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+# 模擬 config 模組，避免讀取真實檔案
+class MockConfig:
+    SYMBOL = "cmt_btcusdt"
+    REST_URL = "https://mock.api"
+    API_KEY = "mock_key"
+    SECRET_KEY = "mock_secret"
+    PASSPHRASE = "mock_pass"
+    STRATEGY_INTERVAL = "MINUTE_5"
+    COOLDOWN_HOURS = 0
+
+sys.modules.setdefault('config', MockConfig)
+
+from optimizer import (SharedSeries, backtest, config_key, indicator_key, iter_grid, sample_space,
+                       run_sweep, top_results)
+
+PARAMS = {"rsi_period": 14, "rsi_overbought": 70, "bb_length": 20, "bb_std": 2.0, "range_bb_width": 0.01,
+          "range_tp": 0.008, "range_sl": 0.006, "breakout_tp": 0.015, "breakout_sl": 0.01}
+SETTINGS = {"fee_rate": 0.0006, "cooldown_bars": 0}
+
+
+def candles(close):
+    close = np.asarray(close, dtype=float)
+    return pd.DataFrame({"time": np.arange(len(close)) * 300_000, "open": close,
+                         "high": close * 1.0001, "low": close * 0.9999, "close": close, "vol": 1.0})
+
+
+def run_backtest(df, params):
+    shared = SharedSeries(df, [indicator_key(params)])
+    try:
+        arr = np.ndarray(shared.shape, dtype=np.float64, buffer=shared.shm.buf)
+        result = backtest(params, arr, shared.index, SETTINGS)
+        del arr
+        return result
+    finally:
+        shared.close()
+
+
+class TestOptimizer(unittest.TestCase):
+    def test_sample_space_is_unique_and_reproducible(self):
+        space = {"a": [1, 2, 3], "b": [10, 20], "c": [0.1, 0.2, 0.3, 0.4]}
+        picked = sample_space(space, 10, seed=7)
+        self.assertEqual(len({config_key(p) for p in picked}), 10)
+        self.assertEqual(picked, sample_space(space, 10, seed=7))
+        self.assertEqual(len(sample_space(space, 100)), 24)  # 超過網格大小 → 完整網格
+        self.assertEqual(len(list(iter_grid(space))), 24)
+
+    def test_backtest_breakout_takes_profit(self):
+        """穩定上漲 (RSI 100、每根突破前高)：每筆突破單都以止盈出場"""
+        df = candles(100 * 1.005 ** np.arange(120))
+        result = run_backtest(df, PARAMS)
+        self.assertGreater(result["trades"], 5)
+        self.assertEqual(result["win_rate"], 1.0)
+        self.assertEqual(result["max_drawdown"], 0.0)
+        self.assertAlmostEqual(result["total_return"],
+                               result["trades"] * (PARAMS["breakout_tp"] - 2 * SETTINGS["fee_rate"]), places=5)
+
+    def test_run_sweep_resumes_and_matches_single_process(self):
+        rng = np.random.default_rng(3)
+        df = candles(100 * np.exp(np.cumsum(rng.normal(0, 0.004, 600))))
+        space = dict({k: [v] for k, v in PARAMS.items()}, rsi_period=[7, 14], range_bb_width=[0.02, 0.05],
+                     breakout_tp=[0.01, 0.02])
+        configs = list(iter_grid(space))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "results.jsonl")
+            run_sweep(df, configs[:3], path, workers=2, chunk_size=2, fee_rate=SETTINGS["fee_rate"],
+                      cooldown_hours=0, interval="MINUTE_5")
+            # 續跑：已完成的組合不再重算
+            run_sweep(df, configs, path, workers=2, chunk_size=2, fee_rate=SETTINGS["fee_rate"],
+                      cooldown_hours=0, interval="MINUTE_5")
+            with open(path, encoding="utf-8") as f:
+                rows = [json.loads(line) for line in f]
+            self.assertEqual(len(rows), len(configs))
+            self.assertEqual({r["key"] for r in rows}, {config_key(p) for p in configs})
+
+            for row in rows:
+                expected = run_backtest(df, row["params"])
+                self.assertEqual({k: row[k] for k in expected}, expected)
+            best = top_results(path, n=1, min_trades=0)[0]
+            self.assertEqual(best["total_return"], max(r["total_return"] for r in rows))
+
+            # 改手續費或重新下載 K 線後，同一組參數要重算，排名不混用舊結果
+            run_sweep(df, configs, path, workers=2, chunk_size=2, fee_rate=0.001,
+                      cooldown_hours=0, interval="MINUTE_5")
+            run_sweep(df.iloc[50:].reset_index(drop=True), configs, path, workers=2, chunk_size=2,
+                      fee_rate=0.001, cooldown_hours=0, interval="MINUTE_5")
+            with open(path, encoding="utf-8") as f:
+                rows = [json.loads(line) for line in f]
+            self.assertEqual(len(rows), 3 * len(configs))
+            self.assertEqual(len({r["run"] for r in rows}), 3)
+            latest = top_results(path, n=100, min_trades=0)
+            self.assertEqual(len(latest), len(configs))
+            self.assertEqual({r["run"] for r in latest}, {rows[-1]["run"]})
+            self.assertEqual(len(top_results(path, n=100, min_trades=0, run=rows[0]["run"])), len(configs))
+
+
+if __name__ == '__main__':
+    unittest.main()
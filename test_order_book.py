@@ -0,0 +1,110 @@
+import unittest
+import sys
+import time
+
+# 模擬 config 模組，避免讀取真實檔案
+class MockConfig:
+    SYMBOL = "cmt_btcusdt"
+    REST_URL = "https://mock.api"
+    API_KEY = "mock_key"
+    SECRET_KEY = "mock_secret"
+    PASSPHRASE = "mock_pass"
+
+sys.modules.setdefault('config', MockConfig)
+import config
+
+from order_book import OrderBook, plan_market_order, plan_ladder, BUY, SELL
+from market_stream import MarketStream
+from weex_simulator import WeexSimulator
+
+
+class TestOrderBook(unittest.TestCase):
+    def setUp(self):
+        self.book = OrderBook(config.SYMBOL)
+        self.book.apply_snapshot(
+            bids=[["99.9", "1"], ["99.8", "2"], ["99.5", "5"]],
+            asks=[{"price": "100.1", "size": "1"}, {"price": "100.2", "size": "2"}, {"price": "100.5", "size": "5"}],
+            version=10,
+        )
+
+    def test_queries(self):
+        self.assertEqual(self.book.best_bid(), (99.9, 1.0))
+        self.assertEqual(self.book.best_ask(), (100.1, 1.0))
+        self.assertAlmostEqual(self.book.mid(), 100.0)
+        self.assertAlmostEqual(self.book.spread_bps(), 20.0)
+        self.assertAlmostEqual(self.book.depth_within_bps(20, BUY), 3.0)
+        avg, filled = self.book.expected_fill(2, BUY)
+        self.assertAlmostEqual(avg, 100.15)
+        self.assertEqual(filled, 2.0)
+        avg, filled = self.book.expected_fill(100, SELL)
+        self.assertEqual(filled, 8.0)
+
+    def test_delta_and_gap(self):
+        self.assertTrue(self.book.apply_delta(bids=[["99.9", "0"]], asks=[["100.0", "3"]],
+                                              start_version=11, end_version=11))
+        self.assertEqual(self.book.best_bid(), (99.8, 2.0))
+        self.assertEqual(self.book.best_ask(), (100.0, 3.0))
+        # 重複的增量略過
+        self.assertTrue(self.book.apply_delta(bids=[["99.8", "0"]], asks=[], start_version=11, end_version=11))
+        self.assertEqual(self.book.best_bid(), (99.8, 2.0))
+        # 跳號 -> 失效
+        self.assertFalse(self.book.apply_delta(bids=[], asks=[], start_version=13, end_version=13))
+        self.assertFalse(self.book.ready)
+
+    def test_plan_market_order(self):
+        plan = plan_market_order(self.book, "0.5", BUY, max_slippage_bps=10)
+        self.assertEqual(plan["action"], "market")
+        # 3 張會吃到 100.2，滑價 > 10 bps -> 縮成 1 張 IOC 限價
+        plan = plan_market_order(self.book, "3.00", BUY, max_slippage_bps=10)
+        self.assertEqual(plan["action"], "ioc_limit")
+        self.assertEqual(plan["size"], "1.00")
+        self.assertAlmostEqual(plan["price"], 100.1)
+        self.assertEqual(plan_market_order(self.book, "3", BUY, max_slippage_bps=5)["action"], "skip")
+        self.assertEqual(plan_market_order(None, "3", BUY)["reason"], "no_book")
+
+    def test_plan_ladder(self):
+        legs = plan_ladder(100.0, "0.0010", 3, 0.001, BUY, size_step="0.0001")
+        self.assertEqual([q for _, q in legs], ["0.0004", "0.0003", "0.0003"])
+        self.assertEqual([round(p, 6) for p, _ in legs], [100.0, 99.9, 99.8])
+        self.assertAlmostEqual(plan_ladder(100.0, "2", 2, 0.01, SELL)[1][0], 101.0)
+        # 數量不夠分時不產生 0 數量的檔位
+        self.assertEqual(plan_ladder(100.0, "0.0002", 3, 0.001, BUY, size_step="0.0001"), [(100.0, "0.0002")])
+
+
+class TestDepthStream(unittest.TestCase):
+    def test_stream_maintains_book_and_recovers_from_gap(self):
+        sim = WeexSimulator(
+            api_key=config.API_KEY, secret_key=config.SECRET_KEY, passphrase=config.PASSPHRASE,
+            symbols=[config.SYMBOL], push_rate=50,
+        ).start()
+        book = OrderBook(config.SYMBOL)
+        stream = MarketStream(config.SYMBOL, [], lambda *args: None, url=sim.ws_url, order_book=book)
+        stream.on_close = lambda *args: None  # 測試結束時不重連
+        stream.start()
+        try:
+            deadline = time.time() + 5
+            while time.time() < deadline and not (book.ready and book.version and book.version > 5):
+                time.sleep(0.02)
+            self.assertTrue(book.ready)
+
+            sim.depth.inject_gap(config.SYMBOL)
+            deadline = time.time() + 5
+            while time.time() < deadline and not (book.gaps and book.ready):
+                time.sleep(0.02)
+            self.assertEqual(book.gaps, 1)
+            self.assertTrue(book.ready)
+
+            # 暫停推送後，本地訂單簿應與模擬器一致
+            sim.push_rate = 0
+            time.sleep(0.2)
+            server = sim.depth.books[config.SYMBOL]
+            self.assertEqual(book.version, server["version"])
+            self.assertEqual(book.best_bid()[0], max(float(p) for p in server["bids"]))
+            self.assertEqual(book.best_ask()[0], min(float(p) for p in server["asks"]))
+        finally:
+            stream.ws.close()
+            sim.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
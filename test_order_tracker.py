@@ -0,0 +1,169 @@
+import unittest
+import sys
+import time
+
+# 模擬 config 模組，避免讀取真實檔案
+class MockConfig:
+    SYMBOL = "cmt_btcusdt"
+    REST_URL = "https://mock.api"
+    API_KEY = "mock_key"
+    SECRET_KEY = "mock_secret"
+    PASSPHRASE = "mock_pass"
+
+sys.modules.setdefault('config', MockConfig)
+import config
+
+from exchange_client import WeexClient
+from paper_client import PaperClient
+from weex_simulator import WeexSimulator
+from order_tracker import (OrderTracker, ACKED, FILLED, REJECTED, UNKNOWN, CANCELED,
+                           TP_TRIGGERED, SL_TRIGGERED)
+
+
+class LostResponseClient(WeexClient):
+    """第一次下單送達但回應遺失，重送時交易所回覆 client_oid 重複"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sent = set()
+
+    def place_order(self, client_oid=None, **kwargs):
+        if client_oid in self.sent:
+            return {"code": "40015", "msg": "Duplicate clientOid"}
+        self.sent.add(client_oid)
+        super().place_order(client_oid=client_oid, **kwargs)
+        return None
+
+
+class TestTrackerWithSimulator(unittest.TestCase):
+    def setUp(self):
+        self.sim = WeexSimulator(
+            api_key=config.API_KEY, secret_key=config.SECRET_KEY, passphrase=config.PASSPHRASE,
+            symbols=[config.SYMBOL],
+        ).start()
+        self.client = WeexClient(base_url=self.sim.rest_url, timeout=0.2)
+        self.tracker = OrderTracker(self.client, retry_backoff=0.05)
+
+    def tearDown(self):
+        self.sim.stop()
+
+    def test_timeout_resubmits_same_client_oid_without_duplicates(self):
+        """下單逾時 (交易所其實收到了) → 同一 client_oid 重送，只會有一筆訂單、一個倉位"""
+        self.sim.faults.configure("/capi/v2/order/placeOrder", latency_ms=400)
+        order = self.tracker.submit(side=1, size="0.01", match_price="1")
+        self.assertEqual(order.attempts, 3)
+
+        time.sleep(1.0)  # 等模擬交易所處理完延遲的請求
+        self.tracker.reconcile()
+        self.assertEqual(order.state, FILLED)
+        self.assertIsNotNone(order.order_id)
+        self.assertEqual(len(self.sim.state.orders), 1)
+        self.assertEqual(self.sim.state.positions[(config.SYMBOL, "LONG")]["size"], "0.01")
+
+    def test_unknown_orders_resolved_in_batch(self):
+        self.sim.faults.configure("/capi/v2/order/placeOrder", error_rate=1.0)
+        orders = [self.tracker.submit(side=1, size="0.01", price="1000", match_price="0") for _ in range(5)]
+        self.assertTrue(all(o.state == UNKNOWN for o in orders))
+        self.sim.faults.configure("/capi/v2/order/placeOrder", error_rate=0.0)
+
+        # 其中兩筆實際上有送達 (模擬回應遺失)
+        for o in orders[:2]:
+            self.sim.state.place_order({"symbol": config.SYMBOL, "type": "1", "size": "0.01",
+                                        "price": "1000", "client_oid": o.client_oid})
+        self.tracker.not_found_grace = 0
+        self.tracker.lookups = 0
+        self.tracker.reconcile()
+        self.assertEqual(self.tracker.lookups, 2)  # 一次掛單 + 一次歷史訂單
+        self.assertEqual([o.state for o in orders], [ACKED, ACKED, REJECTED, REJECTED, REJECTED])
+
+        self.client.cancel_all_orders(symbol=config.SYMBOL)
+        self.tracker.reconcile()
+        self.assertEqual(orders[0].state, CANCELED)
+
+    def test_duplicate_client_oid_is_reconciled_not_rejected(self):
+        tracker = OrderTracker(LostResponseClient(base_url=self.sim.rest_url), retry_backoff=0.01)
+        order = tracker.submit(side=1, size="0.01", price="1000", match_price="0")
+        self.assertEqual(order.attempts, 2)  # 回覆重複後不再重送
+        self.assertEqual(order.state, ACKED)
+        self.assertEqual(len(self.sim.state.orders), 1)
+
+    def test_failed_lookup_does_not_reject_unknown_orders(self):
+        """對帳查詢失敗 (交易所斷線) 不能把 UNKNOWN 判成查無訂單"""
+        self.sim.faults.configure("/capi/v2/order/placeOrder", error_rate=1.0)
+        order = self.tracker.submit(side=1, size="0.01", price="1000", match_price="0")
+        self.sim.faults.configure("/capi/v2/order/placeOrder", error_rate=0.0)
+        self.assertEqual(order.state, UNKNOWN)
+
+        self.tracker.not_found_grace = 0
+        self.sim.faults.configure("/capi/v2/order/history", error_rate=1.0)
+        self.tracker.reconcile()
+        self.assertEqual(order.state, UNKNOWN)
+
+        self.sim.faults.configure("/capi/v2/order/history", error_rate=0.0)
+        self.tracker.reconcile()
+        self.assertEqual(order.state, REJECTED)
+
+    def test_batch_orders_chunked_and_mapped_per_order(self):
+        orders = [{"side": 1, "size": "0.01", "price": str(1000 + i), "match_price": "0"} for i in range(25)]
+        orders[7]["size"] = "0"  # 交易所拒絕這一筆，其餘照常
+        before = self.sim.stats["requests"]
+        tracked = self.tracker.submit_batch(orders)
+        self.assertEqual(self.sim.stats["requests"] - before, 2)  # 20 + 5
+        self.assertEqual(tracked[7].state, REJECTED)
+        self.assertEqual(sum(o.state == ACKED for o in tracked), 24)
+        by_oid = {o["client_oid"]: o for o in self.sim.state.orders.values()}
+        for order, item in zip(tracked, orders):
+            if order.state == ACKED:
+                self.assertEqual(by_oid[order.client_oid]["price"], item["price"])
+
+
+class TestTrackerWithPaperClient(unittest.TestCase):
+    def setUp(self):
+        self.client = PaperClient(balance=1000.0, fee_rate=0.0)
+        self.client.on_tick(config.SYMBOL, 100.0)
+        self.tracker = OrderTracker(self.client)
+
+    def test_take_profit_and_stop_loss_tracked(self):
+        tp = self.tracker.submit(side=1, size="1", match_price="1",
+                                 preset_take_profit="102", preset_stop_loss="98")
+        self.assertEqual(tp.state, ACKED)
+        self.tracker.reconcile()
+        self.assertEqual(tp.state, FILLED)
+        self.client.on_tick(config.SYMBOL, 102.5)
+        self.tracker.reconcile()
+        self.assertEqual(tp.state, TP_TRIGGERED)
+
+        sl = self.tracker.submit(side=1, size="1", match_price="1",
+                                 preset_take_profit="104", preset_stop_loss="101")
+        self.client.on_tick(config.SYMBOL, 100.5)
+        self.tracker.reconcile()
+        self.assertEqual(sl.state, SL_TRIGGERED)
+        self.assertEqual(self.tracker.active(), [])
+
+    def test_expired_ladder_legs_are_canceled(self):
+        legs = [{"side": 1, "size": "1", "price": price, "match_price": "0", "order_type": "0"}
+                for price in ("99", "98")]
+        tracked = self.tracker.submit_batch(legs, ttl=60)
+        self.assertEqual([o.state for o in tracked], [ACKED, ACKED])
+        self.assertEqual(self.tracker.cancel_expired(), [])  # 尚未到期
+
+        self.client.on_tick(config.SYMBOL, 98.9)  # 只有第一檔成交
+        self.tracker.reconcile()
+        self.assertEqual(tracked[0].state, FILLED)
+        self.assertEqual(self.tracker.cancel_expired(now=time.time() + 61), [tracked[1]])
+        self.tracker.reconcile()
+        self.assertEqual(tracked[1].state, CANCELED)
+        self.assertEqual(self.client.get_open_orders(config.SYMBOL), [])
+        self.assertEqual(self.tracker.cancel_expired(now=time.time() + 61), [])
+
+    def test_rejected_order_is_not_retried(self):
+        client = PaperClient()  # 沒有串流價格，市價單會被拒絕
+        tracker = OrderTracker(client)
+        order = tracker.submit(side=1, size="1", match_price="1")
+        self.assertEqual(order.state, REJECTED)
+        self.assertEqual(order.attempts, 1)
+        self.assertIsNone(order.result())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+import sys
+
+# 模擬 config 模組，避免讀取真實檔案
+class MockConfig:
+    SYMBOL = "cmt_btcusdt"
+    REST_URL = "https://mock.api"
+    API_KEY = "mock_key"
+    SECRET_KEY = "mock_secret"
+    PASSPHRASE = "mock_pass"
+
+sys.modules.setdefault('config', MockConfig)
+
+from paper_client import PaperClient
+
+SYMBOL = "cmt_btcusdt"
+
+
+class TestPaperClient(unittest.TestCase):
+    def setUp(self):
+        self.client = PaperClient(balance=1000.0, fee_rate=0.0)
+        self.client.on_tick(SYMBOL, 100.0)
+
+    def test_market_order_fills_at_stream_price(self):
+        res = self.client.place_order(side=1, size="2", match_price="1")
+        self.assertTrue(res["order_id"].startswith("paper-"))
+        positions = self.client.get_all_positions(SYMBOL)
+        self.assertEqual(len(positions), 1)
+        self.assertEqual(positions[0]["side"], "LONG")
+        self.assertAlmostEqual(float(positions[0]["open_avg_price"]), 100.0)
+
+    def test_take_profit_triggers_on_tick(self):
+        self.client.place_order(side=1, size="1", match_price="1",
+                                preset_take_profit="102", preset_stop_loss="98")
+        self.client.on_tick(SYMBOL, 101.0)
+        self.assertEqual(len(self.client.get_all_positions(SYMBOL)), 1)
+        self.client.on_tick(SYMBOL, 102.5)
+        self.assertEqual(self.client.get_all_positions(SYMBOL), [])
+        self.assertAlmostEqual(self.client.realized_pnl, 2.0)
+        self.assertAlmostEqual(self.client.balance, 1002.0)
+
+    def test_stop_loss_fills_at_gap_price(self):
+        self.client.place_order(side=1, size="1", match_price="1",
+                                preset_take_profit="102", preset_stop_loss="98")
+        self.client.on_tick(SYMBOL, 97.0)
+        self.assertEqual(self.client.get_all_positions(SYMBOL), [])
+        self.assertAlmostEqual(self.client.realized_pnl, -3.0)
+
+    def test_limit_order_rests_until_crossed(self):
+        self.client.place_order(side=1, size="1", price="95", match_price="0")
+        self.assertEqual(len(self.client.get_open_orders(SYMBOL)), 1)
+        self.client.on_tick(SYMBOL, 96.0)
+        self.assertEqual(len(self.client.get_open_orders(SYMBOL)), 1)
+        self.client.on_tick(SYMBOL, 94.0)
+        self.assertEqual(self.client.get_open_orders(SYMBOL), [])
+        self.assertAlmostEqual(float(self.client.get_all_positions(SYMBOL)[0]["open_avg_price"]), 95.0)
+
+    def test_close_all_and_cancel_all(self):
+        self.client.place_order(side=2, size="1", match_price="1")
+        self.client.place_order(side=1, size="1", price="90", match_price="0")
+        self.client.on_tick(SYMBOL, 99.0)
+        self.assertTrue(self.client.close_all_positions(SYMBOL)[0]["success"])
+        self.assertEqual(len(self.client.cancel_all_orders(SYMBOL)), 1)
+        self.assertAlmostEqual(self.client.realized_pnl, 1.0)
+        self.assertNotIn(SYMBOL, self.client._quiet_band)
+
+
+if __name__ == '__main__':
+    unittest.main()
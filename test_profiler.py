@@ -0,0 +1,112 @@
+import unittest
+import sys
+import os
+import signal
+import tempfile
+import threading
+import time
+
+# 模擬 config 模組，避免讀取真實檔案
+class MockConfig:
+    SYMBOL = "cmt_btcusdt"
+    REST_URL = "https://mock.api"
+    API_KEY = "mock_key"
+    SECRET_KEY = "mock_secret"
+    PASSPHRASE = "mock_pass"
+
+sys.modules.setdefault('config', MockConfig)
+
+from profiler import SamplingProfiler, register_routes, install_signal_handlers, thread_stacks
+
+
+def busy_loop(stop):
+    while not stop.is_set():
+        sum(i * i for i in range(200))
+
+
+class FakeSupervisor:
+    def __init__(self):
+        self.routes = {}
+
+    def add_route(self, path, handler):
+        self.routes[path] = handler
+
+
+class TestProfiler(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.profiler = SamplingProfiler(interval=0.002, output_dir=self.tmp.name)
+        self.stop_worker = threading.Event()
+        self.worker = threading.Thread(target=busy_loop, args=(self.stop_worker,), name="busy-worker", daemon=True)
+        self.worker.start()
+
+    def tearDown(self):
+        self.profiler.stop()
+        self.stop_worker.set()
+        self.worker.join()
+        self.tmp.cleanup()
+
+    def test_idle_profiler_has_no_thread(self):
+        self.assertFalse(self.profiler.running)
+        self.assertNotIn("profiler", [t.name for t in threading.enumerate()])
+
+    def test_sampling_writes_collapsed_stacks(self):
+        self.assertTrue(self.profiler.start(seconds=0.3))
+        self.assertFalse(self.profiler.start(seconds=0.3))  # 同一時間只能有一個取樣
+        result = self.profiler.wait(5)
+        self.assertFalse(self.profiler.running)
+        self.assertGreater(result["samples"], 10)
+
+        with open(result["path"], encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        busy = [line for line in lines if line.startswith("busy-worker;")]
+        self.assertTrue(busy)
+        stack, count = busy[0].rsplit(" ", 1)
+        self.assertIn("busy_loop (test_profiler.py:", stack)
+        self.assertGreater(int(count), 0)
+        self.assertFalse(any(line.startswith("profiler;") for line in lines))
+
+    def test_stop_early_and_thread_filter(self):
+        self.profiler.start(seconds=60, thread_filter="busy")
+        time.sleep(0.1)
+        result = self.profiler.stop()
+        self.assertLess(result["seconds"], 5)
+        self.assertTrue(all(line.startswith("busy-worker;") for line in self.profiler.collapsed().splitlines()))
+        self.assertIn("busy_loop", result["top"][0]["frame"] + "".join(t["frame"] for t in result["top"]))
+
+    def test_thread_stacks_and_routes(self):
+        text = thread_stacks()
+        self.assertIn("--- busy-worker", text)
+        self.assertIn("in busy_loop", text)
+
+        sup = FakeSupervisor()
+        register_routes(sup, self.profiler)
+        status, body = sup.routes["/debug/profile"]({"seconds": "0.2", "interval_ms": "2"})
+        self.assertEqual(status, 200)
+        self.assertIn("busy-worker;", body)
+        self.assertEqual(sup.routes["/debug/profile/start"]({"seconds": "30"})[0], 202)
+        self.assertEqual(sup.routes["/debug/profile/start"]({"seconds": "30"})[0], 409)
+        status, result = sup.routes["/debug/profile/stop"]({})
+        self.assertEqual(status, 200)
+        self.assertIsNotNone(result["path"])
+        self.assertIn("busy_loop", sup.routes["/debug/stacks"]({})[1])
+
+    @unittest.skipUnless(hasattr(signal, "SIGUSR1"), "平台不支援 SIGUSR1")
+    def test_signal_toggles_sampling(self):
+        previous = signal.getsignal(signal.SIGUSR1), signal.getsignal(signal.SIGUSR2)
+        try:
+            install_signal_handlers(self.profiler, seconds=30)
+            os.kill(os.getpid(), signal.SIGUSR1)
+            time.sleep(0.1)
+            self.assertTrue(self.profiler.running)
+            os.kill(os.getpid(), signal.SIGUSR1)
+            time.sleep(0.2)
+            self.assertFalse(self.profiler.running)
+            self.assertIsNotNone(self.profiler.last_result["path"])
+        finally:
+            signal.signal(signal.SIGUSR1, previous[0])
+            signal.signal(signal.SIGUSR2, previous[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+import sys
+import os
+import json
+import subprocess
+import tempfile
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# replay.py 會 import main (需要完整設定)，在子行程以 config_example.py 為設定執行，
+# 避免與其他測試共用的 MockConfig 互相影響，也避免在專案目錄寫入 logs/
+CONFIG_OVERRIDES = """
+COOLDOWN_HOURS = 0
+AI_COOLDOWN_SECONDS = 0
+"""
+
+REPLAY_SCRIPT = """
+import json, time
+import main as bot
+import replay
+
+START_MS = int(time.time() // 86400 * 86400 * 1000)  # 固定起點 (今天 00:00 UTC)，K 線切分也相同
+
+
+def run(seed):
+    frames = replay.synthetic_frames(bot.SYMBOL, bot.INTERVALS, 2000, depth_every=5, seed=seed,
+                                     start_ms=START_MS)
+    report = replay.run_replay(frames, ai_action="LONG", ai_confidence=0.9)
+    # 只保留與時間無關的結果 (耗時、延遲分位數每次都不同)
+    return {"frames": report["frames"], "ai_calls": report["ai_calls"], "orders": report["orders"],
+            "paper": report["paper"], "book_gaps": report["book_gaps"],
+            "fallbacks": report["ai"]["fallbacks"],
+            "delivered": {name: s["delivered"] for name, s in report["bus"].items()}}
+
+print(json.dumps([run(7), run(7), run(8)]))
+"""
+
+
+class TestReplay(unittest.TestCase):
+    def test_same_seed_replays_identically(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            with open(os.path.join(REPO_DIR, "config_example.py"), encoding="utf-8") as f:
+                source = f.read()
+            with open(os.path.join(tmp, "config.py"), "w", encoding="utf-8") as f:
+                f.write(source + "\n" + CONFIG_OVERRIDES)
+            env = dict(os.environ, PYTHONPATH=os.pathsep.join([tmp, REPO_DIR]))
+            result = subprocess.run([sys.executable, "-c", REPLAY_SCRIPT], cwd=tmp, env=env,
+                                    capture_output=True, text=True, timeout=300)
+            # 合成的交易不能寫進本地 AI Log (trade_journal ingest-logs 會讀取)
+            ai_log = os.path.join(tmp, "logs", "ai_history.jsonl")
+            self.assertFalse(os.path.exists(ai_log) and os.path.getsize(ai_log))
+        self.assertEqual(result.returncode, 0, result.stderr)
+        first, second, other = json.loads(result.stdout.strip().splitlines()[-1])
+
+        self.assertEqual(first, second)
+        self.assertEqual(first["frames"], 2000 + 2000 // 5 + 1)
+        self.assertEqual(first["book_gaps"], 0)
+        self.assertGreater(first["orders"], 0)  # 確實走到下單，而不是兩次都什麼都沒做
+        self.assertGreater(first["delivered"]["trade_log"], 0)
+        self.assertNotEqual(first["paper"], other["paper"])  # 不同種子 → 不同行情與結果
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import unittest
+import os
+import json
+import tempfile
+import time
+
+from state_snapshot import SnapshotWriter, save_snapshot, load_snapshot, missing_candles, merge_candles
+
+
+def candle(t, close):
+    return [str(t), "1", str(close + 1), str(close - 1), str(close), "10", "100"]
+
+
+class TestStateSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "state", "strategy_state.json")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def state(self, **overrides):
+        state = {"symbol": "cmt_btcusdt", "interval": "MINUTE_5",
+                 "strategy": {"last_trade_time": 1700000000.0, "last_ai_req_time": 1700000100.0},
+                 "candles": [candle(t * 300_000, 100 + t) for t in range(3)]}
+        state.update(overrides)
+        return state
+
+    def test_round_trip(self):
+        save_snapshot(self.path, self.state())
+        snapshot = load_snapshot(self.path, symbol="cmt_btcusdt", interval="MINUTE_5")
+        self.assertEqual(snapshot["strategy"]["last_trade_time"], 1700000000.0)
+        self.assertEqual(len(snapshot["candles"]), 3)
+        self.assertIn("saved_at", snapshot)
+        # 沒有殘留暫存檔
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), ["strategy_state.json"])
+
+    def test_failed_write_keeps_previous_snapshot(self):
+        save_snapshot(self.path, self.state())
+        with self.assertRaises(TypeError):
+            save_snapshot(self.path, self.state(candles=object()))
+        self.assertEqual(len(load_snapshot(self.path)["candles"]), 3)
+
+    def test_validation(self):
+        self.assertIsNone(load_snapshot(self.path))
+        save_snapshot(self.path, self.state())
+        self.assertIsNone(load_snapshot(self.path, symbol="cmt_ethusdt"))
+        # 週期不同：冷卻計時仍有效，但 K 線不能用
+        snapshot = load_snapshot(self.path, symbol="cmt_btcusdt", interval="HOUR_1")
+        self.assertEqual(snapshot["candles"], [])
+        self.assertEqual(snapshot["strategy"]["last_ai_req_time"], 1700000100.0)
+        with open(self.path, "w") as f:
+            f.write('{"version": 1, "symbol": "cmt_btc')
+        self.assertIsNone(load_snapshot(self.path))
+        with open(self.path, "w") as f:
+            json.dump({"version": 999}, f)
+        self.assertIsNone(load_snapshot(self.path))
+
+    def test_backfill_helpers(self):
+        self.assertEqual(missing_candles(0, 300_000 * 4 + 5, 300_000), 4)
+        self.assertEqual(missing_candles(600_000, 600_000, 300_000), 0)
+        old = [candle(t * 300_000, 100) for t in range(5)]
+        new = [candle(t * 300_000, 200) for t in range(4, 7)]
+        merged = merge_candles(old, new, limit=5)
+        self.assertEqual([int(r[0]) // 300_000 for r in merged], [2, 3, 4, 5, 6])
+        # 快照時未收盤的那根以新資料為準
+        self.assertEqual(merged[2][4], "200")
+
+    def test_writer_coalesces_off_the_caller_thread(self):
+        writer = SnapshotWriter(self.path, min_interval=60)
+        try:
+            writer.request(self.state())
+            self.assertTrue(writer.flush(2))
+            started = time.perf_counter()
+            for i in range(100):
+                writer.request(self.state(strategy={"last_ai_req_time": float(i)}))
+            self.assertLess(time.perf_counter() - started, 0.5)
+            time.sleep(0.2)
+            # 間隔內的請求不寫檔，只保留最新一份
+            self.assertEqual(writer.writes, 1)
+            self.assertEqual(load_snapshot(self.path)["strategy"]["last_ai_req_time"], 1700000100.0)
+
+            writer.request(self.state(strategy={"last_ai_req_time": 42.0}), urgent=True)
+            self.assertTrue(writer.flush(2))
+            self.assertEqual(writer.writes, 2)
+            self.assertEqual(writer.coalesced, 100)
+            self.assertEqual(load_snapshot(self.path)["strategy"]["last_ai_req_time"], 42.0)
+        finally:
+            writer.close(2)
+        self.assertFalse(writer.thread.is_alive())
+
+    def test_writer_close_writes_pending_state(self):
+        writer = SnapshotWriter(self.path, min_interval=60)
+        writer.request(self.state())
+        writer.flush(2)
+        writer.request(self.state(candles=[]))
+        self.assertTrue(writer.close(2))
+        self.assertEqual(load_snapshot(self.path)["candles"], [])
+        self.assertEqual(writer.stats(), {"writes": 2, "coalesced": 0, "errors": 0, "pending": False})
+
+
+if __name__ == '__main__':
+    unittest.main()
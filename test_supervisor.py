@@ -0,0 +1,142 @@
+import unittest
+import sys
+import json
+import time
+import urllib.request
+import urllib.error
+
+# 模擬 config 模組，避免讀取真實檔案
+class MockConfig:
+    SYMBOL = "cmt_btcusdt"
+    REST_URL = "https://mock.api"
+    API_KEY = "mock_key"
+    SECRET_KEY = "mock_secret"
+    PASSPHRASE = "mock_pass"
+    STRATEGY_INTERVAL = "MINUTE_5"
+
+sys.modules.setdefault('config', MockConfig)
+
+from supervisor import Supervisor, FEED_STALE, HISTORY_STALE, REST_ERRORS, interval_seconds
+
+
+class FakeStream:
+    def __init__(self):
+        self.ages = {"kline.LAST_PRICE.cmt_btcusdt.MINUTE_1": 1.0}
+        self.reconnects = 0
+        self.connects = 1
+        self.callback_ms_avg = 0.2
+        self.callback_ms_max = 1.0
+
+    def channels(self):
+        return list(self.ages)
+
+    def feed_channels(self):
+        return [ch for ch in self.ages if not ch.startswith("depth.")]
+
+    def message_age(self, channel):
+        return self.ages[channel]
+
+    def reset_callback_stats(self):
+        return self.callback_ms_max
+
+    def is_running(self):
+        return True
+
+    def reconnect(self):
+        self.reconnects += 1
+
+
+class FakeStrategy:
+    def __init__(self):
+        self.pause_reasons = {}
+        self.last_history_refresh = time.time()
+        self.reseeds = 0
+
+    def pause(self, reason, detail=""):
+        self.pause_reasons[reason] = detail
+
+    def resume(self, reason):
+        self.pause_reasons.pop(reason, None)
+
+    def seed_history_async(self):
+        self.reseeds += 1
+
+
+class FakeClient:
+    def __init__(self):
+        self.rate = (0, 0.0)
+
+    def error_rate(self, window=60):
+        return self.rate
+
+
+class TestSupervisor(unittest.TestCase):
+    def setUp(self):
+        self.stream = FakeStream()
+        self.strategy = FakeStrategy()
+        self.client = FakeClient()
+        self.sup = Supervisor(self.stream, self.strategy, self.client, feed_stale_seconds=10,
+                              history_max_age=600, reconnect_cooldown=30)
+
+    def test_stale_feed_reconnects_and_pauses_until_recovered(self):
+        self.assertTrue(self.sup.check())
+        self.stream.ages["kline.LAST_PRICE.cmt_btcusdt.MINUTE_1"] = 45.0
+        self.assertFalse(self.sup.check())
+        self.assertIn(FEED_STALE, self.strategy.pause_reasons)
+        self.assertEqual(self.stream.reconnects, 1)
+        self.sup.check()  # 冷卻時間內不重複重連
+        self.assertEqual(self.stream.reconnects, 1)
+
+        self.stream.ages["kline.LAST_PRICE.cmt_btcusdt.MINUTE_1"] = 0.5
+        self.assertTrue(self.sup.check())
+        self.assertEqual(self.strategy.pause_reasons, {})
+
+    def test_silent_depth_channel_does_not_pause(self):
+        """depth 頻道沒有資料只影響訂單簿，不暫停進場也不重連"""
+        self.stream.ages["depth.cmt_btcusdt.15"] = float("inf")
+        self.assertTrue(self.sup.check())
+        self.assertNotIn(FEED_STALE, self.strategy.pause_reasons)
+        self.assertEqual(self.stream.reconnects, 0)
+
+    def test_stale_history_reseeds(self):
+        self.strategy.last_history_refresh = time.time() - 900
+        self.assertFalse(self.sup.check())
+        self.assertIn(HISTORY_STALE, self.strategy.pause_reasons)
+        self.assertEqual(self.strategy.reseeds, 1)
+        self.strategy.last_history_refresh = time.time()
+        self.assertTrue(self.sup.check())
+
+    def test_rest_errors_pause_trading(self):
+        self.client.rate = (3, 1.0)  # 樣本太少不判斷
+        self.assertTrue(self.sup.check())
+        self.client.rate = (20, 0.8)
+        self.assertFalse(self.sup.check())
+        self.assertIn(REST_ERRORS, self.strategy.pause_reasons)
+
+    def test_health_endpoint(self):
+        self.sup.add_route("/ping", lambda q: (200, "pong " + q.get("x", "")))
+        server = self.sup.serve(port=0)
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+        try:
+            with urllib.request.urlopen(base + "/health", timeout=2) as resp:
+                self.assertEqual(resp.status, 200)
+                self.assertTrue(json.loads(resp.read())["healthy"])
+            with urllib.request.urlopen(base + "/ping?x=1", timeout=2) as resp:
+                self.assertEqual(resp.read(), b"pong 1")
+
+            self.client.rate = (20, 0.9)
+            self.sup.check()
+            with self.assertRaises(urllib.error.HTTPError) as ctx:
+                urllib.request.urlopen(base + "/health", timeout=2)
+            self.assertEqual(ctx.exception.code, 503)
+            self.assertIn(REST_ERRORS, json.loads(ctx.exception.read())["paused"])
+        finally:
+            self.sup.stop()
+
+    def test_interval_seconds(self):
+        self.assertEqual(interval_seconds("MINUTE_5"), 300)
+        self.assertEqual(interval_seconds("HOUR_4"), 14400)
+
+
+if __name__ == '__main__':
+    unittest.main()
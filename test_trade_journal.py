@@ -0,0 +1,87 @@
+import unittest
+import time
+
+from trade_journal import TradeJournal
+
+DAY_MS = 86_400_000
+
+
+class TestTradeJournal(unittest.TestCase):
+    def setUp(self):
+        self.journal = TradeJournal(":memory:")
+        self.now = int(time.time() * 1000)
+
+    def tearDown(self):
+        self.journal.close()
+
+    def _decision(self, ts, action="LONG", confidence=0.8):
+        return {
+            "timestamp": "2026-01-01 00:00:00",
+            "stage": "Decision Making",
+            "model": "gpt-test",
+            "input": {"market_snapshot": {"price": 100.0}, "timestamp": ts},
+            "output": {"action": action, "confidence": confidence, "explanation": "test"},
+            "explanation": "test",
+            "order_id": None,
+        }
+
+    def test_duplicate_decisions_are_ignored(self):
+        record = self._decision(self.now)
+        self.journal.record_decision(record)
+        self.journal.record_decision(dict(record))
+        stats = self.journal.ai_decision_stats(self.now - DAY_MS)
+        self.assertEqual(stats[0]["n"], 1)
+        self.assertAlmostEqual(stats[0]["avg_confidence"], 0.8)
+
+    def test_closing_fills_attributed_to_opening_strategy(self):
+        """止盈止損的平倉成交沒有策略名稱，應歸屬到最近一張開倉單"""
+        j = self.journal
+        j.record_order("o1", "c1", "cmt_btcusdt", "breakout_momentum_ai", 1, 0.05, 100,
+                       decision_source="AI_ASSISTED", ts=self.now - 3000)
+        j.record_order("o2", "c2", "cmt_btcusdt", "range_reversion", 1, 0.04, 100,
+                       decision_source="RULE_BASED", ts=self.now - 2 * DAY_MS)
+        j.record_fills([
+            {"tradeId": "f1", "orderId": "o1", "symbol": "cmt_btcusdt", "createdTime": self.now - 3000,
+             "fillSize": "0.05", "fillValue": "5", "fillFee": "0.003", "realizePnl": "0"},
+            {"tradeId": "f2", "orderId": "tp-1", "symbol": "cmt_btcusdt", "createdTime": self.now - 1000,
+             "fillSize": "0.05", "fillValue": "5.15", "fillFee": "0.003", "realizePnl": "0.15"},
+            {"tradeId": "f2", "orderId": "tp-1", "symbol": "cmt_btcusdt", "createdTime": self.now - 1000,
+             "fillSize": "0.05", "fillValue": "5.15", "fillFee": "0.003", "realizePnl": "0.15"},
+        ])
+
+        breakout = j.ai_approved_breakout_pnl(self.now - DAY_MS)
+        self.assertEqual(breakout["fills"], 2)
+        self.assertEqual(breakout["orders"], 1)
+        self.assertAlmostEqual(breakout["net"], 0.15 - 0.006)
+
+        by_strategy = {r["strategy"]: r for r in j.pnl_by_strategy(self.now - 7 * DAY_MS)}
+        self.assertNotIn("range_reversion", by_strategy)
+        self.assertAlmostEqual(by_strategy["breakout_momentum_ai"]["pnl"], 0.15)
+
+    def test_rule_fallback_breakouts_are_not_ai_approved(self):
+        """AI 逾時改用規則下的突破單 (RULE_BASED) 不計入 AI 核准績效，但仍算在策略總績效"""
+        j = self.journal
+        j.record_order("o1", "c1", "cmt_btcusdt", "breakout_momentum_ai", 1, 0.05, 100,
+                       decision_source="RULE_BASED", ts=self.now - 3000)
+        j.record_fills([
+            {"tradeId": "f1", "orderId": "o1", "symbol": "cmt_btcusdt", "createdTime": self.now - 3000,
+             "fillSize": "0.05", "fillValue": "5", "fillFee": "0.003", "realizePnl": "0"},
+            {"tradeId": "f2", "orderId": "sl-1", "symbol": "cmt_btcusdt", "createdTime": self.now - 1000,
+             "fillSize": "0.05", "fillValue": "4.9", "fillFee": "0.003", "realizePnl": "-0.1"},
+        ])
+        breakout = j.ai_approved_breakout_pnl(self.now - DAY_MS)
+        self.assertEqual((breakout["fills"], breakout["orders"]), (0, 0))
+        by_strategy = {r["strategy"]: r for r in j.pnl_by_strategy(self.now - DAY_MS)}
+        self.assertAlmostEqual(by_strategy["breakout_momentum_ai"]["pnl"], -0.1)
+
+    def test_order_upsert_keeps_strategy(self):
+        j = self.journal
+        j.record_order("o1", "c1", "cmt_btcusdt", "range_reversion", 1, 0.04, ts=self.now)
+        j.record_order("o1", "c1", "cmt_btcusdt", None, 1, 0.04, status="filled", ts=self.now)
+        row = j.recent_orders(limit=1)[0]
+        self.assertEqual(row["strategy"], "range_reversion")
+        self.assertEqual(row["status"], "filled")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+import math
+import random
+
+import pandas as pd
+
+from trigger_plan import WilderState, build_trigger_plan
+
+
+def reference_rsi(closes, length):
+    """與 pandas_ta.rsi 相同的算法 (RMA = ewm(alpha=1/length, min_periods=length))"""
+    s = pd.Series(closes, dtype=float)
+    negative = s.diff()
+    positive = negative.copy()
+    positive[positive < 0] = 0
+    negative[negative > 0] = 0
+    pos_avg = positive.ewm(alpha=1 / length, min_periods=length).mean()
+    neg_avg = negative.ewm(alpha=1 / length, min_periods=length).mean()
+    return (100 * pos_avg / (pos_avg + neg_avg.abs())).iloc[-1]
+
+
+def random_closes(seed, n=100, start=95000.0):
+    rng = random.Random(seed)
+    closes = [start]
+    for _ in range(n - 1):
+        closes.append(closes[-1] * (1 + rng.gauss(0, 0.003)))
+    return closes
+
+
+class TestWilderInversion(unittest.TestCase):
+    def test_rsi_matches_reference(self):
+        for seed in range(5):
+            closes = random_closes(seed)
+            state = WilderState(closes, 14)
+            for price in (closes[-1] * 0.99, closes[-1], closes[-1] * 1.01):
+                self.assertAlmostEqual(state.rsi_at(price), reference_rsi(closes + [price], 14), places=8)
+
+    def test_cross_price_inverts_rsi(self):
+        for seed in range(5):
+            closes = random_closes(seed)
+            state = WilderState(closes, 14)
+            for level in (40, 70):
+                p = state.cross_price(level)
+                self.assertAlmostEqual(reference_rsi(closes + [p], 14), level, places=6)
+                self.assertGreater(reference_rsi(closes + [p * 1.0001], 14), level)
+                self.assertLess(reference_rsi(closes + [p * 0.9999], 14), level)
+
+    def test_not_enough_history(self):
+        state = WilderState([1.0, 2.0, 3.0], 14)
+        self.assertTrue(math.isnan(state.rsi_at(4.0)))
+        self.assertEqual(state.cross_price(70), math.inf)
+
+
+class TestTriggerPlan(unittest.TestCase):
+    def test_plan_never_skips_a_real_signal(self):
+        """暴力掃描價格：只要完整計算會觸發，may_trigger 一定要是 True"""
+        for seed in range(4):
+            closes = random_closes(seed)
+            last = closes[-1]
+            prev_high = last * 1.002
+            bb_upper = last * 1.004
+            bb_lower = last * 0.995
+            for is_range in (True, False):
+                plan = build_trigger_plan(closes, 14, prev_high, bb_upper, bb_lower, is_range, 70)
+                skipped = 0
+                for i in range(-400, 400, 4):
+                    price = last * (1 + i / 40000)
+                    rsi = reference_rsi(closes + [price], 14)
+                    range_signal = is_range and bb_lower < price < bb_lower * 1.005 and rsi > 40
+                    breakout = price > prev_high * 1.001 and (rsi > 70 or price > bb_upper * 1.001)
+                    if range_signal or breakout:
+                        self.assertTrue(plan.may_trigger(price), (seed, is_range, price))
+                    elif not plan.may_trigger(price):
+                        skipped += 1
+                # 大部分價格應該走快速路徑
+                self.assertGreater(skipped, 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import unittest
+import sys
+import time
+import threading
+
+# 模擬 config 模組，避免讀取真實檔案
+class MockConfig:
+    SYMBOL = "cmt_btcusdt"
+    REST_URL = "https://mock.api"
+    API_KEY = "mock_key"
+    SECRET_KEY = "mock_secret"
+    PASSPHRASE = "mock_pass"
+
+sys.modules.setdefault('config', MockConfig)
+import config
+
+from exchange_client import WeexClient
+from market_stream import MarketStream
+from weex_simulator import WeexSimulator
+
+
+class TestWeexSimulator(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.sim = WeexSimulator(
+            api_key=config.API_KEY, secret_key=config.SECRET_KEY, passphrase=config.PASSPHRASE,
+            symbols=[config.SYMBOL], push_rate=50, ping_interval=0.2,
+        ).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.sim.stop()
+
+    def setUp(self):
+        self.client = WeexClient(base_url=self.sim.rest_url)
+
+    def test_market_order_opens_position(self):
+        """市價開多後，倉位與 closePositions 應反映在模擬帳戶"""
+        res = self.client.place_order(side=1, size="0.05", match_price="1")
+        self.assertIn("order_id", res)
+
+        positions = self.client.get_all_positions(config.SYMBOL)
+        self.assertEqual(len(positions), 1)
+        self.assertEqual(positions[0]["side"], "LONG")
+
+        closed = self.client.close_all_positions(symbol=config.SYMBOL)
+        self.assertTrue(closed[0]["success"])
+        self.assertEqual(self.client.get_all_positions(config.SYMBOL), [])
+
+    def test_limit_order_and_cancel(self):
+        self.client.place_order(side=1, size="0.01", price="1000", match_price="0")
+        self.assertEqual(len(self.client.get_open_orders(config.SYMBOL)), 1)
+        res = self.client.cancel_all_orders(symbol=config.SYMBOL)
+        self.assertTrue(all(item["success"] for item in res))
+        self.assertEqual(self.client.get_open_orders(config.SYMBOL), [])
+
+    def test_history_candles(self):
+        rows = self.client.get_history_candles(config.SYMBOL, "5m", end_time=int(time.time() * 1000), limit=50)
+        self.assertEqual(len(rows), 50)
+        self.assertEqual(len(rows[0]), 7)
+
+    def test_bad_signature_rejected(self):
+        self.client.secret_key = "wrong_secret"
+        res = self.client.get_account_assets()
+        self.assertEqual(res.get("code"), "40001")
+
+    def test_injected_error(self):
+        self.sim.faults.configure("/capi/v2/account/assets", error_rate=1.0)
+        try:
+            res = self.client.get_account_assets()
+            self.assertEqual(res.get("code"), "50000")
+        finally:
+            self.sim.faults.configure("/capi/v2/account/assets", error_rate=0.0)
+
+    def test_market_stream_receives_ticks_and_answers_ping(self):
+        received = []
+        got_ticks = threading.Event()
+
+        def on_price(interval, price):
+            received.append((interval, price))
+            if len(received) >= 5:
+                got_ticks.set()
+
+        stream = MarketStream(config.SYMBOL, ["MINUTE_1"], on_price, url=self.sim.ws_url)
+        stream.on_close = lambda *args: None  # 測試結束時不重連
+        stream.start()
+        try:
+            self.assertTrue(got_ticks.wait(5))
+            self.assertEqual(received[0][0], "MINUTE_1")
+            deadline = time.time() + 3
+            while time.time() < deadline and not any(c.ping_rtts for c in self.sim.connections):
+                time.sleep(0.05)
+            self.assertTrue(any(c.ping_rtts for c in self.sim.connections))
+        finally:
+            stream.ws.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
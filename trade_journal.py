@@ -0,0 +1,351 @@
+"""
+本地交易日誌 (SQLite Trade Journal)
+
+把 AI / 規則決策、訂單與成交明細寫進同一個有索引的 SQLite 資料庫，
+取代手動翻 logs/ai_history.jsonl 的方式。
+
+- decisions: save_local_log 的每一筆紀錄 (AI 判斷、下單決策)
+- orders:    execute_trade 送出的每一張單 (含策略名稱、client_oid、TP/SL)
+- fills:     交易所成交明細 (sync_fills 定期同步，或從 history_exporter 的 JSONL 匯入)
+
+索引：時間、交易對、策略、client_oid、order_id。
+平倉成交 (止盈/止損觸發) 沒有策略名稱，查詢時歸屬到同交易對最近一張開倉單的策略。
+
+使用方式：
+    python trade_journal.py report --days 7
+    python trade_journal.py ingest-logs             # 匯入 logs/ai_history.jsonl*
+    python trade_journal.py ingest-fills exports/cmt_btcusdt_fills.jsonl
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+DEFAULT_DB_PATH = os.path.join("logs", "trade_journal.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS decisions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    record_hash TEXT UNIQUE,
+    ts INTEGER NOT NULL,
+    symbol TEXT,
+    strategy TEXT,
+    decision_source TEXT,
+    stage TEXT,
+    model TEXT,
+    action TEXT,
+    confidence REAL,
+    price REAL,
+    client_oid TEXT,
+    order_id TEXT,
+    explanation TEXT,
+    payload TEXT
+);
+CREATE TABLE IF NOT EXISTS orders (
+    order_id TEXT PRIMARY KEY,
+    client_oid TEXT,
+    ts INTEGER NOT NULL,
+    symbol TEXT,
+    strategy TEXT,
+    decision_source TEXT,
+    side TEXT,
+    size REAL,
+    price REAL,
+    take_profit REAL,
+    stop_loss REAL,
+    status TEXT,
+    payload TEXT
+);
+CREATE TABLE IF NOT EXISTS fills (
+    fill_id TEXT PRIMARY KEY,
+    order_id TEXT,
+    ts INTEGER NOT NULL,
+    symbol TEXT,
+    side TEXT,
+    size REAL,
+    value REAL,
+    fee REAL,
+    pnl REAL,
+    payload TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_decisions_ts ON decisions(ts);
+CREATE INDEX IF NOT EXISTS idx_decisions_symbol_ts ON decisions(symbol, ts);
+CREATE INDEX IF NOT EXISTS idx_decisions_strategy_ts ON decisions(strategy, ts);
+CREATE INDEX IF NOT EXISTS idx_decisions_order_id ON decisions(order_id);
+CREATE INDEX IF NOT EXISTS idx_decisions_client_oid ON decisions(client_oid);
+CREATE INDEX IF NOT EXISTS idx_orders_ts ON orders(ts);
+CREATE INDEX IF NOT EXISTS idx_orders_symbol_ts ON orders(symbol, ts);
+CREATE INDEX IF NOT EXISTS idx_orders_strategy_ts ON orders(strategy, ts);
+CREATE INDEX IF NOT EXISTS idx_orders_client_oid ON orders(client_oid);
+CREATE INDEX IF NOT EXISTS idx_fills_ts ON fills(ts);
+CREATE INDEX IF NOT EXISTS idx_fills_symbol_ts ON fills(symbol, ts);
+CREATE INDEX IF NOT EXISTS idx_fills_order_id ON fills(order_id);
+"""
+
+# AI 核准下單的決策來源 (main.DECISION_AI)；AI 逾時改用規則下單時記為 RULE_BASED
+AI_DECISION_SOURCE = "AI_ASSISTED"
+
+# 成交歸屬策略 / 決策來源：自己的訂單有策略就用；否則 (止盈止損觸發的平倉單) 取同交易對最近一張開倉單
+ATTRIBUTED_FILLS = """
+SELECT f.*,
+       COALESCE(o.strategy, (
+           SELECT o2.strategy FROM orders o2
+           WHERE o2.symbol = f.symbol AND o2.ts <= f.ts AND o2.strategy IS NOT NULL
+           ORDER BY o2.ts DESC LIMIT 1
+       )) AS strategy,
+       CASE WHEN o.strategy IS NOT NULL THEN o.decision_source ELSE (
+           SELECT o2.decision_source FROM orders o2
+           WHERE o2.symbol = f.symbol AND o2.ts <= f.ts AND o2.strategy IS NOT NULL
+           ORDER BY o2.ts DESC LIMIT 1
+       ) END AS decision_source
+FROM fills f LEFT JOIN orders o ON o.order_id = f.order_id
+WHERE f.ts >= :since AND f.ts < :until
+"""
+
+
+def _to_float(value):
+    try:
+        return float(value) if value not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_ms(value):
+    """接受毫秒時間戳或 'YYYY-mm-dd HH:MM:SS' 字串"""
+    if value is None:
+        return int(time.time() * 1000)
+    if isinstance(value, (int, float)) or str(value).isdigit():
+        return int(value)
+    return int(datetime.strptime(str(value), "%Y-%m-%d %H:%M:%S").timestamp() * 1000)
+
+
+class TradeJournal:
+    def __init__(self, path=DEFAULT_DB_PATH):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.executescript(SCHEMA)
+
+    def _execute(self, sql, params=()):
+        with self.lock, self.conn:
+            return self.conn.execute(sql, params)
+
+    def _executemany(self, sql, rows):
+        with self.lock, self.conn:
+            self.conn.executemany(sql, rows)
+
+    def query(self, sql, params=()):
+        with self.lock:
+            return [dict(r) for r in self.conn.execute(sql, params).fetchall()]
+
+    # --- 寫入 ---
+    def record_decision(self, record):
+        """record 格式與 ai_logger.save_local_log 寫入 JSONL 的內容相同"""
+        inp = record.get("input") or {}
+        out = record.get("output") or {}
+        snapshot = inp.get("market_snapshot") or {}
+        context = inp.get("context") or {}
+        payload = json.dumps(record, ensure_ascii=False, default=str, sort_keys=True)
+        # 同一筆紀錄 (即時寫入 + 事後從 JSONL 補匯入) 以內容雜湊去重
+        self._execute(
+            "INSERT OR IGNORE INTO decisions (record_hash, ts, symbol, strategy, decision_source, stage, model,"
+            " action, confidence, price, client_oid, order_id, explanation, payload)"
+            " VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
+            (
+                hashlib.sha1(payload.encode("utf-8")).hexdigest(),
+                _to_ms(inp.get("timestamp") or record.get("timestamp")),
+                inp.get("symbol"),
+                inp.get("strategy"),
+                inp.get("decision_source"),
+                record.get("stage"),
+                record.get("model"),
+                out.get("action"),
+                _to_float(out.get("confidence", context.get("ai_confidence"))),
+                _to_float(inp.get("price", snapshot.get("price"))),
+                out.get("client_oid"),
+                record.get("order_id") or out.get("order_id"),
+                record.get("explanation"),
+                payload,
+            ),
+        )
+
+    def record_order(self, order_id, client_oid, symbol, strategy, side, size, price=None,
+                     take_profit=None, stop_loss=None, decision_source=None, status="submitted", ts=None, payload=None):
+        self._execute(
+            "INSERT INTO orders (order_id, client_oid, ts, symbol, strategy, decision_source, side, size, price,"
+            " take_profit, stop_loss, status, payload) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)"
+            " ON CONFLICT(order_id) DO UPDATE SET status=excluded.status,"
+            " strategy=COALESCE(excluded.strategy, orders.strategy)",
+            (
+                str(order_id or client_oid), client_oid, _to_ms(ts), symbol, strategy, decision_source,
+                str(side), _to_float(size), _to_float(price), _to_float(take_profit), _to_float(stop_loss),
+                status, json.dumps(payload, ensure_ascii=False, default=str) if payload is not None else None,
+            ),
+        )
+
+    def record_fills(self, fills):
+        """交易所成交明細 (get_fills 或匯出的 JSONL)，重複的 fill_id 會被忽略"""
+        rows = []
+        for f in fills:
+            fill_id = f.get("tradeId") or f.get("id") or f.get("fillId")
+            if fill_id is None:
+                continue
+            rows.append((
+                str(fill_id), str(f.get("orderId") or f.get("order_id") or ""),
+                _to_ms(f.get("createdTime") or f.get("cTime")), f.get("symbol"),
+                str(f.get("type") or f.get("orderSide") or f.get("direction") or ""),
+                _to_float(f.get("fillSize")), _to_float(f.get("fillValue")),
+                _to_float(f.get("fillFee")), _to_float(f.get("realizePnl")) or 0.0,
+                json.dumps(f, ensure_ascii=False, default=str),
+            ))
+        self._executemany(
+            "INSERT OR IGNORE INTO fills (fill_id, order_id, ts, symbol, side, size, value, fee, pnl, payload)"
+            " VALUES (?,?,?,?,?,?,?,?,?,?)", rows)
+        return len(rows)
+
+    # --- 匯入 / 同步 ---
+    def sync_fills(self, client, symbol, limit=100):
+        """從交易所拉取最近的成交明細"""
+        fills = client.get_fills(symbol=symbol, limit=limit)
+        return self.record_fills(fills) if isinstance(fills, list) else 0
+
+    def ingest_jsonl(self, path, kind="decisions"):
+        count = 0
+        batch = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    batch.append(json.loads(line))
+                except ValueError:
+                    continue
+                if len(batch) >= 1000:
+                    count += self._ingest_batch(batch, kind)
+                    batch = []
+        return count + self._ingest_batch(batch, kind)
+
+    def _ingest_batch(self, batch, kind):
+        if kind == "fills":
+            return self.record_fills(batch)
+        for record in batch:
+            self.record_decision(record)
+        return len(batch)
+
+    # --- 預先寫好的分析查詢 ---
+    def pnl_by_strategy(self, since_ms, until_ms=None):
+        return self.query(
+            f"SELECT strategy, COUNT(*) AS fills, SUM(pnl) AS pnl, SUM(fee) AS fees, SUM(pnl) - SUM(fee) AS net"
+            f" FROM ({ATTRIBUTED_FILLS}) GROUP BY strategy ORDER BY net DESC",
+            {"since": since_ms, "until": until_ms or 2 ** 62})
+
+    def daily_pnl(self, since_ms, until_ms=None, strategy=None):
+        sql = (f"SELECT date(ts / 1000, 'unixepoch', 'localtime') AS day, SUM(pnl) - SUM(fee) AS net,"
+               f" COUNT(*) AS fills FROM ({ATTRIBUTED_FILLS})")
+        params = {"since": since_ms, "until": until_ms or 2 ** 62}
+        if strategy:
+            sql += " WHERE strategy = :strategy"
+            params["strategy"] = strategy
+        return self.query(sql + " GROUP BY day ORDER BY day", params)
+
+    def ai_approved_breakout_pnl(self, since_ms, until_ms=None):
+        """
+        AI 放行的突破單績效 (例如：上週 AI 核准的突破單賺了多少)
+        只計入 decision_source = AI_ASSISTED 的訂單；AI 逾時改用規則下的單 (RULE_BASED) 不算 AI 核准
+        """
+        rows = self.query(
+            f"SELECT COUNT(*) AS fills, COALESCE(SUM(pnl), 0) AS pnl, COALESCE(SUM(fee), 0) AS fees,"
+            f" SUM(CASE WHEN pnl > 0 THEN 1 ELSE 0 END) AS wins, SUM(CASE WHEN pnl < 0 THEN 1 ELSE 0 END) AS losses"
+            f" FROM ({ATTRIBUTED_FILLS}) WHERE strategy = 'breakout_momentum_ai' AND decision_source = :source",
+            {"since": since_ms, "until": until_ms or 2 ** 62, "source": AI_DECISION_SOURCE})
+        row = rows[0]
+        row["net"] = row["pnl"] - row["fees"]
+        row["orders"] = self.query(
+            "SELECT COUNT(*) AS n FROM orders WHERE strategy = 'breakout_momentum_ai' AND decision_source = ?"
+            " AND ts >= ? AND ts < ?",
+            (AI_DECISION_SOURCE, since_ms, until_ms or 2 ** 62))[0]["n"]
+        return row
+
+    def ai_decision_stats(self, since_ms, until_ms=None):
+        return self.query(
+            "SELECT stage, model, action, COUNT(*) AS n, AVG(confidence) AS avg_confidence FROM decisions"
+            " WHERE ts >= ? AND ts < ? GROUP BY stage, model, action ORDER BY n DESC",
+            (since_ms, until_ms or 2 ** 62))
+
+    def recent_orders(self, limit=20, symbol=None):
+        if symbol:
+            return self.query("SELECT * FROM orders WHERE symbol = ? ORDER BY ts DESC LIMIT ?", (symbol, limit))
+        return self.query("SELECT * FROM orders ORDER BY ts DESC LIMIT ?", (limit,))
+
+    def close(self):
+        self.conn.close()
+
+
+_journal = None
+_journal_lock = threading.Lock()
+
+
+def get_journal(path=None):
+    """全域共用的日誌實例 (延遲建立)"""
+    global _journal
+    with _journal_lock:
+        if _journal is None:
+            try:
+                import config
+                path = path or getattr(config, "TRADE_JOURNAL_PATH", DEFAULT_DB_PATH)
+            except ImportError:
+                path = path or DEFAULT_DB_PATH
+            _journal = TradeJournal(path)
+        return _journal
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地交易日誌 (SQLite)")
+    parser.add_argument("--db", default=None)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_report = sub.add_parser("report", help="績效報告")
+    p_report.add_argument("--days", type=float, default=7)
+    p_logs = sub.add_parser("ingest-logs", help="匯入 AI 決策 JSONL (含輪替檔)")
+    p_logs.add_argument("pattern", nargs="?", default=os.path.join("logs", "ai_history.jsonl*"))
+    p_fills = sub.add_parser("ingest-fills", help="匯入 history_exporter 產生的成交 JSONL")
+    p_fills.add_argument("path")
+    sub.add_parser("sync", help="同步交易所最近成交")
+    args = parser.parse_args()
+
+    journal = get_journal(args.db)
+    if args.cmd == "report":
+        since = int((time.time() - args.days * 86400) * 1000)
+        started = time.perf_counter()
+        by_strategy = journal.pnl_by_strategy(since)
+        breakout = journal.ai_approved_breakout_pnl(since)
+        stats = journal.ai_decision_stats(since)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        print(f"\n📒 近 {args.days:g} 天績效 (查詢耗時 {elapsed_ms:.1f} ms)")
+        for row in by_strategy:
+            print(f"  • {row['strategy'] or '未歸屬'}: 淨損益 {row['net'] or 0:.4f} | 成交 {row['fills']} 筆")
+        print(f"🤖 AI 放行突破單: 下單 {breakout['orders']} 張 | 淨損益 {breakout['net']:.4f} | "
+              f"勝 {breakout['wins'] or 0} / 負 {breakout['losses'] or 0}")
+        for row in stats:
+            print(f"  • {row['stage']} / {row['model']} / {row['action']}: {row['n']} 次, "
+                  f"平均信心 {row['avg_confidence'] or 0:.2f}")
+    elif args.cmd == "ingest-logs":
+        for path in sorted(glob.glob(args.pattern)):
+            print(f"📥 {path}: {journal.ingest_jsonl(path)} 筆")
+    elif args.cmd == "ingest-fills":
+        print(f"📥 {args.path}: {journal.ingest_jsonl(args.path, kind='fills')} 筆")
+    elif args.cmd == "sync":
+        import config
+        from exchange_client import WeexClient
+        print(f"🔄 同步 {journal.sync_fills(WeexClient(), config.SYMBOL)} 筆成交")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+每根 K 線預先計算的觸發價位 (Trigger Plan)
+
+策略在每個 tick 都把現價接到歷史收盤價後面重算 RSI，再判斷區間 / 突破條件。
+在同一根 K 線內，除了現價以外的輸入都不變，所以每個條件都可以換算成單一的價格門檻：
+
+- 區間抄底：bb_lower < 價格 < bb_lower * 1.005 且 即時 RSI > 40
+- 假突破：  價格 > prev_high * 1.001 且 (即時 RSI > RSI_OVERBOUGHT 或 價格 > bb_upper * 1.001)
+
+「即時 RSI > 門檻」可反推 Wilder 平滑 (pandas_ta.rsi 使用的 RMA，即 ewm(alpha=1/length, adjust=True))
+得到對應的價格：RSI 對現價單調遞增，所以 RSI > L 等價於 價格 > P(L)。
+
+K 線收盤時 build_trigger_plan() 算一次，之後每個 tick 只需 may_trigger() 幾次比較；
+只有可能觸發時才跑完整的指標計算 (最終判斷仍以完整計算為準，門檻附近留有浮點容差)。
+"""
+import math
+
+# 比較時的相對容差：門檻附近一律交給完整計算判斷
+TOLERANCE = 1e-9
+
+
+class WilderState:
+    """
+    RMA (adjust=True 的 ewm) 的累加狀態
+    對收盤價差分 d：up_num = Σ (1-α)^k * max(d, 0)，down_num 同理，den = Σ (1-α)^k
+    """
+
+    def __init__(self, closes, length):
+        self.length = length
+        decay = 1.0 - 1.0 / length
+        up = down = den = 0.0
+        prev = None
+        count = 0
+        for c in closes:
+            c = float(c)
+            if prev is not None:
+                d = c - prev
+                up = decay * up + (d if d > 0 else 0.0)
+                down = decay * down + (-d if d < 0 else 0.0)
+                den = decay * den + 1.0
+                count += 1
+            prev = c
+        self.decay = decay
+        self.up_num = up
+        self.down_num = down
+        self.count = count
+        self.last_close = prev
+
+    def ready(self):
+        """加上下一筆後是否已有 length 個差分 (否則 pandas_ta 回傳 NaN)"""
+        return self.last_close is not None and self.count + 1 >= self.length
+
+    def rsi_at(self, price):
+        """把 price 接在最後一筆收盤價後的 RSI (與 ta.rsi(concat(closes, [price])).iloc[-1] 相同)"""
+        if not self.ready():
+            return float("nan")
+        d = float(price) - self.last_close
+        up = self.decay * self.up_num + (d if d > 0 else 0.0)
+        down = self.decay * self.down_num + (-d if d < 0 else 0.0)
+        if up + down == 0:
+            return float("nan")
+        return 100.0 * up / (up + down)
+
+    def cross_price(self, level):
+        """
+        RSI 剛好等於 level 的價格；RSI > level 等價於 價格 > 回傳值
+        資料不足時回傳 inf (永遠不會超過)
+        """
+        if not self.ready():
+            return math.inf
+        r = level / 100.0
+        up = self.decay * self.up_num
+        down = self.decay * self.down_num
+        if up + down == 0:
+            return self.last_close
+        if up / (up + down) < r:
+            # 需要上漲 d：(up + d) / (up + d + down) = r
+            return self.last_close + (r * down / (1.0 - r) - up)
+        # 需要下跌 |d|：up / (up + down + |d|) = r
+        return self.last_close - (up / r - up - down)
+
+
+def _num(value, default=math.nan):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return default
+    return value
+
+
+class TriggerPlan:
+    def __init__(self, is_range, range_low, range_high, rsi_floor_price,
+                 breakout_price, rsi_overbought_price, bb_upper_price, bb_upper):
+        self.is_range = is_range
+        self.range_low = range_low
+        self.range_high = range_high
+        self.rsi_floor_price = rsi_floor_price
+        self.breakout_price = breakout_price
+        self.rsi_overbought_price = rsi_overbought_price
+        self.bb_upper_price = bb_upper_price
+        self.bb_upper = bb_upper
+        # 突破條件的實際門檻：必須同時超過前高，且超過 RSI 或布林任一門檻
+        self.breakout_trigger = max(breakout_price, min(rsi_overbought_price, bb_upper_price))
+
+    def may_trigger(self, price):
+        """價格是否可能觸發任一進場條件 (False 代表可以直接略過這個 tick)"""
+        tol = abs(price) * TOLERANCE
+        if self.is_range and (self.range_low - tol < price < self.range_high + tol
+                              and price > self.rsi_floor_price - tol):
+            return True
+        return price > self.breakout_trigger - tol
+
+    def as_dict(self):
+        return dict(self.__dict__)
+
+
+def build_trigger_plan(closes, rsi_length, prev_high, bb_upper, bb_lower, is_range,
+                       rsi_overbought, rsi_floor=40.0):
+    """
+    依收盤的歷史資料建立觸發價位
+    bb_upper / bb_lower 為最後一列的布林上下軌 (可能是 NaN，NaN 的條件永遠不成立)
+    """
+    state = WilderState(closes, rsi_length)
+    bb_upper = _num(bb_upper)
+    bb_lower = _num(bb_lower)
+    # NaN 比較永遠為 False，換成 inf 表示「永遠不會超過」
+    bb_upper_price = bb_upper * 1.001 if not math.isnan(bb_upper) else math.inf
+    range_ok = is_range and not math.isnan(bb_lower)
+    return TriggerPlan(
+        is_range=range_ok,
+        range_low=bb_lower if range_ok else math.inf,
+        range_high=bb_lower * 1.005 if range_ok else -math.inf,
+        rsi_floor_price=state.cross_price(rsi_floor),
+        breakout_price=_num(prev_high, math.inf) * 1.001,
+        rsi_overbought_price=state.cross_price(rsi_overbought),
+        bb_upper_price=bb_upper_price,
+        bb_upper=bb_upper,
+    )
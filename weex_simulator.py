@@ -0,0 +1,843 @@
+"""
+WEEX 本地模擬交易所 (REST + WebSocket)
+
+用途：
+- 在離線環境下跑完整的機器人 (main.py / check_account.py)，測試真實的序列化、簽名、重連與吞吐量
+- 支援注入延遲、錯誤率，以及設定 WebSocket 推送速率做壓力測試
+
+使用方式：
+    python weex_simulator.py --rest-port 8080 --ws-port 8081 --rate 50
+
+    然後在 config.py 指向本地：
+    REST_URL = "http://127.0.0.1:8080"
+    WS_URL = "ws://127.0.0.1:8081/v2/ws/public"
+"""
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import random
+import socket
+import socketserver
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+WS_MAGIC = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+INTERVAL_MS = {
+    "1m": 60_000, "5m": 300_000, "15m": 900_000, "30m": 1_800_000,
+    "1h": 3_600_000, "4h": 14_400_000, "12h": 43_200_000, "1d": 86_400_000, "1w": 604_800_000,
+}
+WS_INTERVAL_MAP = {
+    "MINUTE_1": "1m", "MINUTE_5": "5m", "MINUTE_15": "15m", "MINUTE_30": "30m",
+    "HOUR_1": "1h", "HOUR_4": "4h", "HOUR_12": "12h", "DAY_1": "1d", "WEEK_1": "1w",
+}
+
+
+def sign(secret_key, message):
+    """與 WeexClient / MarketStream 相同的 HMAC-SHA256 + Base64 簽名"""
+    digest = hmac.new(secret_key.encode('utf-8'), message.encode('utf-8'), hashlib.sha256).digest()
+    return base64.b64encode(digest).decode('utf-8')
+
+
+class PriceModel:
+    """簡單的隨機漫步價格模型 (固定 seed 可重現)"""
+
+    def __init__(self, symbols, start_price=95000.0, volatility=0.0005, seed=42):
+        self.rng = random.Random(seed)
+        self.volatility = volatility
+        self.prices = {s: float(start_price) for s in symbols}
+        self.lock = threading.Lock()
+
+    def last(self, symbol):
+        with self.lock:
+            return self.prices.setdefault(symbol, next(iter(self.prices.values()), 100.0))
+
+    def step(self, symbol):
+        with self.lock:
+            price = self.prices.setdefault(symbol, next(iter(self.prices.values()), 100.0))
+            price *= 1 + self.rng.gauss(0, self.volatility)
+            self.prices[symbol] = price
+            return price
+
+    def candles(self, symbol, granularity, end_time, limit):
+        """產生以當前價格結尾的歷史 K 線 (往回推算)"""
+        step_ms = INTERVAL_MS.get(granularity, 60_000)
+        end_time = int(end_time or time.time() * 1000)
+        last_open = end_time - end_time % step_ms
+        rng = random.Random(f"{symbol}-{granularity}-{last_open}")
+        close = self.last(symbol)
+        rows = []
+        for i in range(limit):
+            open_time = last_open - i * step_ms
+            open_ = close * (1 + rng.gauss(0, self.volatility * 3))
+            high = max(open_, close) * (1 + abs(rng.gauss(0, self.volatility)))
+            low = min(open_, close) * (1 - abs(rng.gauss(0, self.volatility)))
+            vol = abs(rng.gauss(50, 15))
+            rows.append([str(open_time), f"{open_:.2f}", f"{high:.2f}", f"{low:.2f}",
+                         f"{close:.2f}", f"{vol:.4f}", f"{vol * close:.2f}"])
+            close = open_
+        rows.reverse()
+        return rows
+
+
+def kline_frame(price_model, channel, now_ms=None):
+    """依頻道產生一筆 kline 推送 (格式與 MarketStream.on_message 解析的一致)"""
+    parts = channel.split(".")
+    symbol, interval = parts[2], parts[3]
+    price = price_model.step(symbol)
+    step_ms = INTERVAL_MS.get(WS_INTERVAL_MAP.get(interval, "1m"), 60_000)
+    now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+    return {
+        "event": "payload",
+        "channel": channel,
+        "data": [{
+            "symbol": symbol, "startTime": str(now_ms - now_ms % step_ms),
+            "open": f"{price:.2f}", "high": f"{price:.2f}", "low": f"{price:.2f}",
+            "close": f"{price:.2f}", "volume": "1", "ts": str(now_ms),
+        }],
+    }
+
+
+class DepthModel:
+    """
+    以 PriceModel 的最新價為中心產生 L2 訂單簿，每次 step 推出一筆增量 (版本號連續)
+    inject_gap() 可讓下一筆增量跳號，用來測試客戶端的缺口處理
+    """
+
+    def __init__(self, price_model, levels=20, tick=0.1, seed=11):
+        self.price_model = price_model
+        self.levels = levels
+        self.tick = tick
+        self.rng = random.Random(seed)
+        self.books = {}     # symbol -> {"bids": {price_str: size_str}, "asks": {...}, "version": int}
+        self._gap = set()
+        self.lock = threading.Lock()
+
+    def _target(self, symbol):
+        mid = self.price_model.last(symbol)
+        best_bid = (int(mid / self.tick) - 1) * self.tick
+        best_ask = best_bid + 2 * self.tick
+        bids, asks = {}, {}
+        for i in range(self.levels):
+            bids[f"{best_bid - i * self.tick:.1f}"] = f"{self.rng.uniform(0.05, 2.0):.3f}"
+            asks[f"{best_ask + i * self.tick:.1f}"] = f"{self.rng.uniform(0.05, 2.0):.3f}"
+        return bids, asks
+
+    def snapshot(self, symbol):
+        with self.lock:
+            book = self.books.get(symbol)
+            if book is None:
+                bids, asks = self._target(symbol)
+                book = self.books[symbol] = {"bids": bids, "asks": asks, "version": 1}
+            return {
+                "depthType": "SNAPSHOT", "startVersion": book["version"], "endVersion": book["version"],
+                "bids": [[p, q] for p, q in book["bids"].items()],
+                "asks": [[p, q] for p, q in book["asks"].items()],
+            }
+
+    def step(self, symbol):
+        """價格移動後重算訂單簿，回傳與上一版的差異 (size 為 0 代表刪除該價位)"""
+        self.snapshot(symbol)
+        with self.lock:
+            book = self.books[symbol]
+            bids, asks = self._target(symbol)
+            # 只保留部分價位的數量變化，讓增量更接近真實
+            for new, old in ((bids, book["bids"]), (asks, book["asks"])):
+                for price in new:
+                    if price in old and self.rng.random() < 0.7:
+                        new[price] = old[price]
+            delta = {"bids": [], "asks": []}
+            for side, new in (("bids", bids), ("asks", asks)):
+                old = book[side]
+                delta[side] += [[p, "0"] for p in old if p not in new]
+                delta[side] += [[p, q] for p, q in new.items() if old.get(p) != q]
+            start = book["version"] + 1
+            if symbol in self._gap:
+                self._gap.discard(symbol)
+                start += 1
+            book.update(bids=bids, asks=asks, version=start)
+            return {"depthType": "CHANGED", "startVersion": start, "endVersion": start, **delta}
+
+    def inject_gap(self, symbol):
+        self._gap.add(symbol)
+
+
+class ExchangeState:
+    """模擬帳戶：訂單、倉位、資產與 AI Log"""
+
+    def __init__(self, price_model, balance=10000.0):
+        self.price_model = price_model
+        self.lock = threading.Lock()
+        self.balance = balance
+        self.orders = {}        # order_id -> order dict
+        self.positions = {}     # (symbol, side) -> position dict
+        self.plan_orders = {}   # order_id -> 止盈止損計畫單
+        self.fills = []
+        self.ai_logs = []
+        self.client_oids = {}   # client_oid -> order_id (冪等)
+        self._next_id = 700000000000000000
+
+    def _new_id(self):
+        self._next_id += 1
+        return str(self._next_id)
+
+    def place_order(self, body):
+        symbol = body.get("symbol")
+        side = str(body.get("type"))
+        size = float(body.get("size", 0))
+        if size <= 0 or side not in ("1", "2", "3", "4"):
+            raise ValueError("invalid size or type")
+        with self.lock:
+            client_oid = str(body.get("client_oid") or "")
+            if client_oid and client_oid in self.client_oids:
+                return {"client_oid": client_oid, "order_id": self.client_oids[client_oid]}
+
+            order_id = self._new_id()
+            now_ms = int(time.time() * 1000)
+            order = {
+                "symbol": symbol, "order_id": order_id, "client_oid": client_oid,
+                "size": str(size), "type": side, "order_type": str(body.get("order_type", "0")),
+                "price": str(body.get("price", "0")), "filled_qty": "0", "price_avg": "0",
+                "status": "open", "createTime": str(now_ms),
+                "presetTakeProfitPrice": body.get("presetTakeProfitPrice"),
+                "presetStopLossPrice": body.get("presetStopLossPrice"),
+            }
+            self.orders[order_id] = order
+            if client_oid:
+                self.client_oids[client_oid] = order_id
+            if str(body.get("match_price", "0")) == "1":
+                self._fill(order, self.price_model.last(symbol))
+            for key, plan_type in (("presetTakeProfitPrice", "TAKE_PROFIT"), ("presetStopLossPrice", "STOP_LOSS")):
+                if body.get(key):
+                    plan_id = self._new_id()
+                    self.plan_orders[plan_id] = {
+                        "symbol": symbol, "order_id": plan_id, "type": plan_type, "size": str(size),
+                        "triggerPrice": str(body[key]), "status": "open", "createTime": str(now_ms),
+                    }
+        return {"client_oid": client_oid, "order_id": order_id}
+
+    def batch_orders(self, body):
+        """批次下單：逐筆套用 place_order，單筆失敗不影響其他筆"""
+        info = []
+        for item in body.get("orderDataList") or []:
+            order = dict(item, symbol=body.get("symbol"))
+            try:
+                res = self.place_order(order)
+                info.append({"order_id": res["order_id"], "client_oid": res["client_oid"], "result": True,
+                             "error_code": "", "error_message": ""})
+            except ValueError as e:
+                info.append({"order_id": "", "client_oid": item.get("client_oid"), "result": False,
+                             "error_code": "40017", "error_message": str(e)})
+        return {"order_info": info, "result": all(i["result"] for i in info)}
+
+    def _fill(self, order, price):
+        size = float(order["size"])
+        order.update(filled_qty=order["size"], price_avg=f"{price:.2f}", status="filled")
+        self.fills.append({
+            "tradeId": self._new_id(), "orderId": order["order_id"], "symbol": order["symbol"],
+            "type": order["type"], "fillSize": order["size"], "fillValue": f"{size * price:.4f}",
+            "fillFee": f"{size * price * 0.0006:.6f}", "createdTime": int(time.time() * 1000),
+        })
+        side = "LONG" if order["type"] in ("1", "3") else "SHORT"
+        key = (order["symbol"], side)
+        pos = self.positions.get(key)
+        if order["type"] in ("1", "2"):
+            if pos is None:
+                pos = {
+                    "id": self._new_id(), "symbol": order["symbol"], "side": side, "size": "0",
+                    "open_value": "0", "leverage": "20", "margin_mode": "SHARED",
+                    "created_time": order["createTime"],
+                }
+                self.positions[key] = pos
+            pos["size"] = str(float(pos["size"]) + size)
+            pos["open_value"] = f"{float(pos['open_value']) + size * price:.4f}"
+            pos["open_avg_price"] = f"{float(pos['open_value']) / float(pos['size']):.2f}"
+        elif pos is not None:
+            remaining = max(float(pos["size"]) - size, 0.0)
+            if remaining <= 0:
+                del self.positions[key]
+            else:
+                pos["size"] = str(remaining)
+
+    def open_orders(self, symbol):
+        with self.lock:
+            return [o for o in self.orders.values() if o["status"] == "open" and o["symbol"] == symbol]
+
+    def all_positions(self):
+        with self.lock:
+            result = []
+            for pos in self.positions.values():
+                last = self.price_model.last(pos["symbol"])
+                size = float(pos["size"])
+                avg = float(pos.get("open_avg_price", last))
+                pnl = (last - avg) * size if pos["side"] == "LONG" else (avg - last) * size
+                result.append(dict(pos, unrealizePnl=f"{pnl:.4f}", unrealized_pnl=f"{pnl:.4f}"))
+            return result
+
+    def history_orders(self, symbol, start_ms, end_ms, page_size):
+        """非掛單中的歷史訂單，由新到舊"""
+        with self.lock:
+            rows = [o for o in self.orders.values()
+                    if o["symbol"] == symbol and o["status"] != "open"
+                    and start_ms <= int(o["createTime"]) <= end_ms]
+        rows.sort(key=lambda o: int(o["createTime"]), reverse=True)
+        return rows[:page_size]
+
+    def fill_page(self, symbol, start_ms, end_ms, limit):
+        """成交明細，由新到舊 (格式: {"list": [...], "nextFlag": bool})"""
+        with self.lock:
+            rows = [f for f in self.fills if f["symbol"] == symbol and start_ms <= f["createdTime"] <= end_ms]
+        rows.sort(key=lambda f: f["createdTime"], reverse=True)
+        return {"list": rows[:limit], "nextFlag": len(rows) > limit, "totals": len(rows)}
+
+    def open_plan_orders(self, symbol):
+        with self.lock:
+            return [o for o in self.plan_orders.values() if o["status"] == "open" and o["symbol"] == symbol]
+
+    def cancel_all(self, symbol=None, cancel_order_type="normal"):
+        with self.lock:
+            result = []
+            book = self.plan_orders if cancel_order_type == "plan" else self.orders
+            for o in book.values():
+                if o["status"] == "open" and (symbol is None or o["symbol"] == symbol):
+                    o["status"] = "canceled"
+                    result.append({"orderId": o["order_id"], "success": True})
+            return result
+
+    def close_positions(self, symbol=None):
+        with self.lock:
+            result = []
+            for key, pos in list(self.positions.items()):
+                if symbol is not None and pos["symbol"] != symbol:
+                    continue
+                del self.positions[key]
+                result.append({
+                    "positionId": pos["id"], "successOrderId": self._new_id(),
+                    "errorMessage": "", "success": True,
+                })
+            return result
+
+    def assets(self):
+        with self.lock:
+            return [{
+                "coinName": "USDT", "available": f"{self.balance:.4f}", "frozen": "0",
+                "equity": f"{self.balance:.4f}", "unrealizePnl": "0",
+            }]
+
+
+class FaultInjector:
+    """延遲與錯誤注入 (可針對單一 endpoint 設定)"""
+
+    def __init__(self, latency_ms=0, jitter_ms=0, error_rate=0.0, seed=7):
+        self.default = {"latency_ms": latency_ms, "jitter_ms": jitter_ms, "error_rate": error_rate}
+        self.per_endpoint = {}
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def configure(self, endpoint=None, **kwargs):
+        with self.lock:
+            target = self.default if endpoint is None else self.per_endpoint.setdefault(endpoint, dict(self.default))
+            target.update(kwargs)
+
+    def apply(self, endpoint):
+        """回傳 True 表示此次請求要模擬錯誤"""
+        with self.lock:
+            rule = self.per_endpoint.get(endpoint, self.default)
+            delay = rule["latency_ms"] + self.rng.uniform(0, rule["jitter_ms"])
+            fail = self.rng.random() < rule["error_rate"]
+        if delay > 0:
+            time.sleep(delay / 1000)
+        return fail
+
+
+class _RestHandler(BaseHTTPRequestHandler):
+    server_version = "WeexSimulator/1.0"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        if self.server.sim.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def _reply(self, status, payload):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        try:
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # 客戶端已逾時斷線
+
+    def _error(self, status, code, msg):
+        self._reply(status, {"code": code, "msg": msg, "requestTime": int(time.time() * 1000)})
+
+    def _dispatch(self, method):
+        sim = self.server.sim
+        parsed = urlparse(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        body_str = self.rfile.read(length).decode('utf-8') if length else ""
+        query_string = f"?{parsed.query}" if parsed.query else ""
+        sim.stats["requests"] += 1
+
+        if sim.verify_signature:
+            ok, reason = sim.verify_rest_signature(self.headers, method, parsed.path, query_string, body_str)
+            if not ok:
+                sim.stats["auth_failures"] += 1
+                return self._error(401, "40001", reason)
+
+        if sim.faults.apply(parsed.path):
+            sim.stats["injected_errors"] += 1
+            return self._error(500, "50000", "injected error")
+
+        route = sim.routes.get((method, parsed.path))
+        if route is None:
+            return self._error(404, "40404", f"unknown endpoint {method} {parsed.path}")
+
+        query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        try:
+            body = json.loads(body_str) if body_str else {}
+            self._reply(200, route(query, body))
+        except (ValueError, KeyError) as e:
+            self._error(400, "40017", str(e))
+
+
+class _WsConnection:
+    """單一 WebSocket 連線 (伺服器端，最小化 RFC 6455 實作)"""
+
+    def __init__(self, sim, sock):
+        self.sim = sim
+        self.sock = sock
+        self.send_lock = threading.Lock()
+        self.channels = set()
+        self.alive = True
+        self.last_pong = time.time()
+        self.ping_rtts = []
+
+    def send_text(self, text):
+        payload = text.encode('utf-8')
+        header = bytearray([0x81])
+        n = len(payload)
+        if n < 126:
+            header.append(n)
+        elif n < 65536:
+            header.append(126)
+            header += struct.pack("!H", n)
+        else:
+            header.append(127)
+            header += struct.pack("!Q", n)
+        try:
+            with self.send_lock:
+                self.sock.sendall(bytes(header) + payload)
+            return True
+        except OSError:
+            self.alive = False
+            return False
+
+    def send_json(self, obj):
+        return self.send_text(json.dumps(obj))
+
+    def close(self):
+        if not self.alive:
+            return
+        self.alive = False
+        try:
+            with self.send_lock:
+                self.sock.sendall(b"\x88\x00")
+        except OSError:
+            pass
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def _recv_exact(self, n):
+        buf = b""
+        while len(buf) < n:
+            chunk = self.sock.recv(n - len(buf))
+            if not chunk:
+                raise ConnectionError("socket closed")
+            buf += chunk
+        return buf
+
+    def read_frame(self):
+        b1, b2 = self._recv_exact(2)
+        opcode = b1 & 0x0F
+        length = b2 & 0x7F
+        if length == 126:
+            length = struct.unpack("!H", self._recv_exact(2))[0]
+        elif length == 127:
+            length = struct.unpack("!Q", self._recv_exact(8))[0]
+        mask = self._recv_exact(4) if b2 & 0x80 else None
+        payload = self._recv_exact(length) if length else b""
+        if mask:
+            payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+        return opcode, payload
+
+    def handle_text(self, text):
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError:
+            if text == "pong":
+                self.last_pong = time.time()
+            return
+        event = data.get("event")
+        if event == "subscribe":
+            channel = data.get("channel")
+            self.channels.add(channel)
+            self.send_json({"event": "subscribed", "channel": channel})
+            if channel and channel.startswith("depth."):
+                self.send_json(self.sim.depth_frame(channel, snapshot=True))
+        elif event == "unsubscribe":
+            self.channels.discard(data.get("channel"))
+        elif event == "pong":
+            self.last_pong = time.time()
+            try:
+                self.ping_rtts.append(time.time() * 1000 - int(data.get("time")))
+            except (TypeError, ValueError):
+                pass
+
+
+class _WsHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        sim = self.server.sim
+        sock = self.request
+        try:
+            request = b""
+            while b"\r\n\r\n" not in request:
+                chunk = sock.recv(4096)
+                if not chunk:
+                    return
+                request += chunk
+            lines = request.split(b"\r\n\r\n")[0].decode('utf-8').split("\r\n")
+            path = lines[0].split(" ")[1]
+            headers = {}
+            for line in lines[1:]:
+                if ":" in line:
+                    k, v = line.split(":", 1)
+                    headers[k.strip().lower()] = v.strip()
+
+            if sim.verify_signature and not sim.verify_ws_signature(headers, urlparse(path).path):
+                sim.stats["auth_failures"] += 1
+                sock.sendall(b"HTTP/1.1 401 Unauthorized\r\nContent-Length: 0\r\n\r\n")
+                return
+
+            accept = base64.b64encode(
+                hashlib.sha1((headers.get("sec-websocket-key", "") + WS_MAGIC).encode()).digest()
+            ).decode()
+            sock.sendall(
+                "HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                f"Sec-WebSocket-Accept: {accept}\r\n\r\n".encode()
+            )
+        except (OSError, IndexError, UnicodeDecodeError):
+            return
+
+        conn = _WsConnection(sim, sock)
+        sim.register(conn)
+        try:
+            while conn.alive:
+                opcode, payload = conn.read_frame()
+                if opcode == 0x8:
+                    break
+                if opcode == 0x9:
+                    with conn.send_lock:
+                        sock.sendall(bytes([0x8A, len(payload)]) + payload)
+                elif opcode == 0x1:
+                    conn.handle_text(payload.decode('utf-8'))
+        except (ConnectionError, OSError, ValueError):
+            pass
+        finally:
+            conn.alive = False
+            sim.unregister(conn)
+
+
+class _ThreadingTCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class WeexSimulator:
+    """
+    本地模擬 WEEX 合約交易所
+
+    - REST: WeexClient 使用的 endpoint (簽名驗證、延遲/錯誤注入)
+    - WebSocket: kline.LAST_PRICE / depth 頻道 + 伺服器主動 ping / 客戶端 pong 協議
+    - push_rate: 每條連線每秒推送的訊息數，可於執行中調整
+    """
+
+    def __init__(self, host="127.0.0.1", rest_port=0, ws_port=0,
+                 api_key="sim_key", secret_key="sim_secret", passphrase="sim_pass",
+                 symbols=("cmt_btcusdt",), start_price=95000.0,
+                 latency_ms=0, jitter_ms=0, error_rate=0.0,
+                 push_rate=1.0, burst_every=0, burst_size=0,
+                 ping_interval=30, pong_timeout=60,
+                 verify_signature=True, max_clock_skew_ms=30_000, verbose=False):
+        self.host = host
+        self.api_key = api_key
+        self.secret_key = secret_key
+        self.passphrase = passphrase
+        self.verify_signature = verify_signature
+        self.max_clock_skew_ms = max_clock_skew_ms
+        self.verbose = verbose
+
+        self.prices = PriceModel(symbols, start_price=start_price)
+        self.state = ExchangeState(self.prices)
+        self.depth = DepthModel(self.prices)
+        self.faults = FaultInjector(latency_ms, jitter_ms, error_rate)
+
+        self.push_rate = push_rate
+        self.burst_every = burst_every      # 每 N 秒來一次突發
+        self.burst_size = burst_size        # 突發時額外推送的訊息數
+        self.ping_interval = ping_interval
+        self.pong_timeout = pong_timeout
+        self.frame_factory = self.kline_frame
+
+        self.stats = {"requests": 0, "auth_failures": 0, "injected_errors": 0, "ws_messages": 0}
+        self.connections = set()
+        self.conn_lock = threading.Lock()
+        self._stop = threading.Event()
+
+        self.routes = {
+            ("GET", "/capi/v2/market/time"): lambda q, b: {"epoch": str(time.time()), "iso": "", "timestamp": int(time.time() * 1000)},
+            ("GET", "/capi/v2/market/historyCandles"): self._history_candles,
+            ("GET", "/capi/v2/market/contracts"): self._contracts,
+            ("GET", "/capi/v2/account/assets"): lambda q, b: self.state.assets(),
+            ("GET", "/capi/v2/account/position/allPosition"): lambda q, b: self.state.all_positions(),
+            ("GET", "/capi/v2/order/current"): lambda q, b: self.state.open_orders(q.get("symbol")),
+            ("GET", "/capi/v2/order/detail"): self._order_detail,
+            ("GET", "/capi/v2/order/history"): lambda q, b: self.state.history_orders(
+                q["symbol"], int(q.get("createDate", 0)), int(q.get("endCreateDate", 2 ** 62)), int(q.get("pageSize", 20))),
+            ("GET", "/capi/v2/order/fills"): lambda q, b: self.state.fill_page(
+                q["symbol"], int(q.get("startTime", 0)), int(q.get("endTime", 2 ** 62)), int(q.get("limit", 100))),
+            ("POST", "/capi/v2/order/placeOrder"): lambda q, b: self.state.place_order(b),
+            ("POST", "/capi/v2/order/batchOrders"): lambda q, b: self.state.batch_orders(b),
+            ("GET", "/capi/v2/order/currentPlan"): lambda q, b: self.state.open_plan_orders(q.get("symbol")),
+            ("POST", "/capi/v2/order/cancelAllOrders"): lambda q, b: self.state.cancel_all(
+                b.get("symbol"), b.get("cancelOrderType", "normal")),
+            ("POST", "/capi/v2/order/closePositions"): lambda q, b: self.state.close_positions(b.get("symbol")),
+            ("POST", "/capi/v2/order/uploadAiLog"): self._upload_ai_log,
+        }
+
+        self.rest_server = ThreadingHTTPServer((host, rest_port), _RestHandler)
+        self.rest_server.daemon_threads = True
+        self.rest_server.sim = self
+        self.ws_server = _ThreadingTCPServer((host, ws_port), _WsHandler)
+        self.ws_server.sim = self
+        self.threads = []
+
+    # --- URL ---
+    @property
+    def rest_url(self):
+        return f"http://{self.host}:{self.rest_server.server_address[1]}"
+
+    @property
+    def ws_url(self):
+        return f"ws://{self.host}:{self.ws_server.server_address[1]}/v2/ws/public"
+
+    # --- 簽名驗證 ---
+    def _check_common(self, key, passphrase, timestamp):
+        if key != self.api_key or passphrase != self.passphrase:
+            return False, "invalid api key or passphrase"
+        try:
+            skew = abs(int(time.time() * 1000) - int(timestamp))
+        except (TypeError, ValueError):
+            return False, "invalid timestamp"
+        if skew > self.max_clock_skew_ms:
+            return False, f"timestamp expired (skew {skew} ms)"
+        return True, ""
+
+    def verify_rest_signature(self, headers, method, path, query_string, body):
+        timestamp = headers.get("ACCESS-TIMESTAMP")
+        ok, reason = self._check_common(headers.get("ACCESS-KEY"), headers.get("ACCESS-PASSPHRASE"), timestamp)
+        if not ok:
+            return ok, reason
+        expected = sign(self.secret_key, timestamp + method.upper() + path + query_string + body)
+        if not hmac.compare_digest(expected, headers.get("ACCESS-SIGN") or ""):
+            return False, "signature mismatch"
+        return True, ""
+
+    def verify_ws_signature(self, headers, path):
+        timestamp = headers.get("access-timestamp")
+        ok, _ = self._check_common(headers.get("access-key"), headers.get("access-passphrase"), timestamp)
+        if not ok:
+            return False
+        return hmac.compare_digest(sign(self.secret_key, timestamp + path), headers.get("access-sign") or "")
+
+    # --- REST 路由 ---
+    def _history_candles(self, query, body):
+        limit = min(int(query.get("limit", 100)), 1000)
+        end_time = query.get("endTime") or query.get("startTime")
+        return self.prices.candles(query["symbol"], query.get("granularity", "1m"), end_time, limit)
+
+    def _contracts(self, query, body):
+        symbols = [query["symbol"]] if query.get("symbol") else list(self.prices.prices)
+        return [{
+            "symbol": s, "coin": "USDT", "quote_currency": "USDT",
+            "tick_size": "1", "priceEndStep": "1", "size_increment": "4",
+            "minOrderSize": "0.0001", "maxOrderSize": "1200",
+            "minLeverage": "1", "maxLeverage": "400",
+            "makerFeeRate": "0.0002", "takerFeeRate": "0.0008",
+        } for s in symbols]
+
+    def _order_detail(self, query, body):
+        order = self.state.orders.get(query.get("orderId"))
+        if order is None:
+            raise KeyError("order not found")
+        return order
+
+    def _upload_ai_log(self, query, body):
+        self.state.ai_logs.append(body)
+        return {"code": "00000", "msg": "success", "requestTime": int(time.time() * 1000), "data": "upload success"}
+
+    # --- WebSocket ---
+    def register(self, conn):
+        with self.conn_lock:
+            self.connections.add(conn)
+
+    def unregister(self, conn):
+        with self.conn_lock:
+            self.connections.discard(conn)
+
+    def kline_frame(self, channel):
+        return kline_frame(self.prices, channel)
+
+    def depth_frame(self, channel, snapshot=False):
+        """depth.{symbol}.{levels} 頻道：訂閱時推快照，之後推增量"""
+        symbol = channel.split(".")[1]
+        data = self.depth.snapshot(symbol) if snapshot else self.depth.step(symbol)
+        return {"event": "payload", "channel": channel, "data": [data]}
+
+    def _snapshot_connections(self):
+        with self.conn_lock:
+            return [c for c in self.connections if c.alive]
+
+    def _push_loop(self):
+        last_burst = time.time()
+        next_push = time.perf_counter()
+        while not self._stop.is_set():
+            rate = self.push_rate
+            if rate <= 0:
+                time.sleep(0.05)
+                next_push = time.perf_counter()
+                continue
+            count = 1
+            if self.burst_every and time.time() - last_burst >= self.burst_every:
+                count += self.burst_size
+                last_burst = time.time()
+            connections = self._snapshot_connections()
+            # 同一交易對的 depth 增量所有連線共用 (版本號全域連續)
+            depth_frames = {}
+            for conn in connections:
+                for channel in list(conn.channels):
+                    if channel and channel.startswith("depth."):
+                        if channel not in depth_frames:
+                            depth_frames[channel] = [self.depth_frame(channel) for _ in range(count)]
+                        for frame in depth_frames[channel]:
+                            if conn.send_json(frame):
+                                self.stats["ws_messages"] += 1
+                        continue
+                    if not channel or not channel.startswith("kline."):
+                        continue
+                    for _ in range(count):
+                        if conn.send_json(self.frame_factory(channel)):
+                            self.stats["ws_messages"] += 1
+            next_push += 1.0 / rate
+            delay = next_push - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            elif delay < -1.0:
+                # 落後太多就不追趕，避免一次噴出大量訊息
+                next_push = time.perf_counter()
+
+    def _ping_loop(self):
+        while not self._stop.wait(self.ping_interval):
+            now = time.time()
+            for conn in self._snapshot_connections():
+                if now - conn.last_pong > self.pong_timeout:
+                    conn.close()
+                    continue
+                conn.send_json({"event": "ping", "time": str(int(now * 1000))})
+
+    def drop_connections(self):
+        """強制中斷所有 WebSocket 連線 (測試重連用)"""
+        for conn in self._snapshot_connections():
+            conn.close()
+
+    # --- 生命週期 ---
+    def start(self):
+        for target in (self.rest_server.serve_forever, self.ws_server.serve_forever, self._push_loop, self._ping_loop):
+            t = threading.Thread(target=target, daemon=True)
+            t.start()
+            self.threads.append(t)
+        print(f"🧪 WEEX 模擬器已啟動 | REST={self.rest_url} | WS={self.ws_url}")
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self.drop_connections()
+        self.rest_server.shutdown()
+        self.ws_server.shutdown()
+        self.rest_server.server_close()
+        self.ws_server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WEEX 本地模擬交易所")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--rest-port", type=int, default=8080)
+    parser.add_argument("--ws-port", type=int, default=8081)
+    parser.add_argument("--symbol", action="append", help="可重複指定多個交易對")
+    parser.add_argument("--price", type=float, default=95000.0, help="起始價格")
+    parser.add_argument("--rate", type=float, default=1.0, help="每條連線每秒推送訊息數")
+    parser.add_argument("--burst-every", type=float, default=0, help="每 N 秒一次突發")
+    parser.add_argument("--burst-size", type=int, default=0, help="突發額外訊息數")
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--ping-interval", type=float, default=30)
+    parser.add_argument("--no-verify", action="store_true", help="關閉簽名驗證")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    try:
+        import config
+        keys = dict(api_key=config.API_KEY, secret_key=config.SECRET_KEY, passphrase=config.PASSPHRASE)
+        symbols = args.symbol or [config.SYMBOL]
+    except ImportError:
+        keys = {}
+        symbols = args.symbol or ["cmt_btcusdt"]
+
+    sim = WeexSimulator(
+        host=args.host, rest_port=args.rest_port, ws_port=args.ws_port, symbols=symbols,
+        start_price=args.price, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate, push_rate=args.rate, burst_every=args.burst_every,
+        burst_size=args.burst_size, ping_interval=args.ping_interval,
+        verify_signature=not args.no_verify, verbose=args.verbose, **keys
+    ).start()
+    try:
+        while True:
+            time.sleep(10)
+            print(f"📈 統計: {sim.stats} | 連線數: {len(sim.connections)}")
+    except KeyboardInterrupt:
+        sim.stop()
+
+
+if __name__ == "__main__":
+    main()